@@ -6,6 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
+    # Test runs get their own settings (per-process cache); other runners set DJANGO_SETTINGS_MODULE
+    if sys.argv[1:2] == ['test']:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'therapy_connected.settings_test')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'therapy_connected.settings')
     try:
         from django.core.management import execute_from_command_line
@@ -1066,3 +1066,10 @@ if PURGE_UNUSED:
     print(f"[PURGE] Completed purge step. Mode={mode}\n")
 else:
     print("(Purge disabled – set LOOKUP_PURGE=1 to enable cleanup of non-canonical rows; add LOOKUP_PURGE_DRY_RUN=1 for simulation.)")
+
+# Seeding/purging uses queryset.update()/delete(), which send no per-row signals; mark cached lookup options stale
+try:
+    from users.lookups import bump_lookup_version
+    bump_lookup_version()
+except Exception as e:
+    print(f"(Could not bump lookup version: {e})")
@@ -76,6 +76,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.visitor_zip.VisitorZipMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -108,6 +109,35 @@ DATABASES = {
     'default': dj_database_url.config(default=f'sqlite:///{BASE_DIR}/db.sqlite3')
 }
 
+# Cache
+# CACHE_URL selects the backend shared by all workers (see users/cache_utils.py):
+#   unset / locmem://             per-process memory (development; always used by settings_test.py)
+#   file:///var/tmp/tc-cache      file-based, shared by the workers on one host
+#   redis://host:6379/0           Redis or any Redis-protocol server (needs the `redis` package)
+#   memcached://host:11211        memcached (needs `pymemcache`)
+
+def _cache_config(url):
+    from urllib.parse import urlparse
+    parsed = urlparse(url)
+    if parsed.scheme in ('redis', 'rediss'):
+        backend, location = 'django.core.cache.backends.redis.RedisCache', url
+    elif parsed.scheme == 'memcached':
+        backend, location = 'django.core.cache.backends.memcached.PyMemcacheCache', parsed.netloc
+    elif parsed.scheme == 'file':
+        backend, location = 'django.core.cache.backends.filebased.FileBasedCache', parsed.path
+    else:
+        backend, location = 'django.core.cache.backends.locmem.LocMemCache', 'therapy-connected'
+    return {
+        'BACKEND': backend,
+        'LOCATION': location,
+        'TIMEOUT': 300,
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'tc'),
+    }
+
+
+CACHE_URL = os.getenv('CACHE_URL', '')
+CACHES = {'default': _cache_config(CACHE_URL)}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -188,6 +218,21 @@ STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 # Stock Image Providers (optional)
 PEXELS_API_KEY = os.getenv('PEXELS_API_KEY')
 UNSPLASH_ACCESS_KEY = os.getenv('UNSPLASH_ACCESS_KEY')
+# Force one backend of users/stock_search.py: pexels, unsplash, picsum or fake (local, for tests)
+STOCK_IMAGE_PROVIDER = os.getenv('STOCK_IMAGE_PROVIDER', '')
+
+# Mixed into every ETag (users/conditional.py); set per release so template / asset changes
+# are not masked by validators browsers and CDNs already hold
+CONDITIONAL_GET_SALT = os.getenv('RELEASE_VERSION', '')
+
+# Processes used to encode image variants (users/image_utils.py); unset = min(4, CPUs), 0 or 1 = in-process
+if os.getenv('IMAGE_ENCODE_WORKERS'):
+    IMAGE_ENCODE_WORKERS = int(os.getenv('IMAGE_ENCODE_WORKERS'))
+
+# On-disk cache of the stock image proxy (users/image_proxy.py); unset = <tmp>/therapy_connected_image_proxy
+if os.getenv('IMAGE_PROXY_CACHE_DIR'):
+    IMAGE_PROXY_CACHE_DIR = os.getenv('IMAGE_PROXY_CACHE_DIR')
+IMAGE_PROXY_CACHE_MAX_BYTES = int(os.getenv('IMAGE_PROXY_CACHE_MAX_MB', '512')) * 1024 * 1024
 
 # Use custom login URL for @login_required
 LOGIN_URL = '/users/login/'
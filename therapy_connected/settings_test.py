@@ -0,0 +1,12 @@
+"""Settings for test runs.
+
+`manage.py test` selects this module; other runners need
+DJANGO_SETTINGS_MODULE=therapy_connected.settings_test. Tests always get the
+per-process locmem cache, whatever CACHE_URL points the environment at, so a run
+never reads or flushes a shared Redis / memcached / file cache.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import _cache_config
+
+CACHE_URL = ''
+CACHES = {'default': _cache_config(CACHE_URL)}
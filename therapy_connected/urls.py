@@ -22,6 +22,7 @@ from django.contrib.sitemaps.views import sitemap
 from users.sitemaps import TherapistProfileSitemap
 from . import views
 from users import views as user_views  # for public_therapist_profile if needed
+from users import views_images
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -32,6 +33,7 @@ urlpatterns = [
     path('set_zip/', views.set_zip, name='set_zip'),
     path('geo_zip/', views.geo_zip, name='geo_zip'),
     path('therapists/', views.therapists_page, name='therapists_page'),
+    path('api/therapists/search/', views.api_therapists_search, name='api_therapists_search'),
     # SEO-friendly therapist public profile pages (slug under /therapists/)
     path('therapists/<slug:slug>/', user_views.public_therapist_profile, name='therapist_profile_public_slug'),
     # XML sitemap exposing therapist profile slugs
@@ -39,6 +41,8 @@ urlpatterns = [
     path('features/', views.features_page, name='features_page'),
     path('pricing/', views.pricing_page, name='pricing_page'),
     path('about/', views.about_page, name='about_page'),
+    # On-demand width / format variants of processed images (users/image_resize.py)
+    path('img/<slug:kind>/<int:pk>/<slug:key>/<int:width>.<slug:fmt>', views_images.resized_image, name='resized_image'),
     path('', include('users.urls_blog')),
 ]
 
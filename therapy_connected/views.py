@@ -4,11 +4,11 @@ def about_page(request):
 from django.shortcuts import render, redirect
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
 from django.http import JsonResponse
 from users.models import SubscriptionType, TherapistProfileStats
 from users.models_profile import TherapistProfile
 from users.models_blog import BlogPost
+from users.visitor_zip import get_user_zip, set_user_zip
 
 # Features page view
 def features_page(request):
@@ -18,6 +18,57 @@ def features_page(request):
 def pricing_page(request):
     plans = SubscriptionType.objects.filter(active=True).order_by('price_monthly')
     return render(request, 'pricing.html', {'plans': plans})
+def _therapists_page_json(request, user_zip, cursor):
+    """JSON variant of the cursor-paginated directory (?cursor=...&format=json)."""
+    from users.directory import InvalidCursor, seek_page
+    from users.search_api import card_records, json_response
+    try:
+        page = seek_page(request.GET, user_zip, cursor=cursor, with_counts=False)
+    except InvalidCursor as e:
+        return json_response({'error': str(e)}, status=400)
+    results, user_ids = card_records(page.rows)
+    from users.stats_buffer import record_impressions
+    record_impressions(user_ids, start_rank=page.offset + 1)
+    return json_response({'results': results, 'next_cursor': page.next_cursor})
+
+
+def api_therapists_search(request):
+    """Directory search as compact JSON: same filters as /therapists/, cursor paginated.
+
+    GET params: the directory filters (q, tier, sort, license, specialty, ...), zip (defaults
+    to the visitor's ZIP cookie), cursor, limit (max 50), fields (comma separated, see
+    users.search_api.CARD_FIELDS) and facets=0/1 (default: first page only).
+    """
+    from django.utils.cache import patch_vary_headers
+    from users.directory import InvalidCursor, seek_page
+    from users.search_api import card_records, compact_counts, json_response, parse_fields, parse_limit
+    if request.method != 'GET':
+        return json_response({'error': 'Invalid request method'}, status=405)
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+    limit = parse_limit(request.GET.get('limit'))
+    user_zip = request.GET.get('zip', '').strip() or get_user_zip(request)
+    cursor = request.GET.get('cursor', '').strip()
+    facets_opt = request.GET.get('facets', '').strip()
+    with_counts = facets_opt in ('1', 'true') if facets_opt else not cursor
+    try:
+        page = seek_page(request.GET, user_zip, cursor=cursor, limit=limit, with_counts=with_counts)
+    except InvalidCursor as e:
+        return json_response({'error': str(e)}, status=400)
+    results, user_ids = card_records(page.rows, fields)
+    from users.stats_buffer import record_impressions
+    record_impressions(user_ids, start_rank=page.offset + 1)
+    payload = {'count': page.total, 'results': results, 'next_cursor': page.next_cursor}
+    if with_counts:
+        payload['facets'] = compact_counts(page.facet_counts)
+    response = json_response(payload)
+    # The default ZIP comes from the visitor's cookie
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
 def therapists_page(request):
     query = request.GET.get('q', '').strip()
     tier = request.GET.get('tier', '').strip()
@@ -37,215 +88,204 @@ def therapists_page(request):
     lgbtqia_ids = [v for v in request.GET.getlist('lgbtqia') if v.strip()]
     other_identity_ids = [v for v in request.GET.getlist('other_identity') if v.strip()]
     sort_opt = request.GET.get('sort', 'distance').strip()  # distance|name (recent removed)
-    therapists = TherapistProfile.objects.filter(user__is_active=True, user__onboarding_status='active').only('id','first_name','last_name','slug','license_type','credentials_note','intro_statement','personal_statement_q1').prefetch_related('locations')
-    # Prefetch for filters
-    therapists = therapists.prefetch_related(
-        'participant_types', 'age_groups', 'types_of_therapy__therapy_type',
-        'race_ethnicities__race_ethnicity', 'faiths__faith', 'lgbtqia_identities__lgbtqia', 'other_identities__other_identity'
-    )
-    if query:
-        from users.utils.state_normalize import normalize_state
-        normalized_query = normalize_state(query)
-        q_obj = (
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(credentials__license_type__name__icontains=query) |
-            Q(credentials__license_type__description__icontains=query) |
-            Q(locations__city__icontains=query) |
-            Q(locations__state__icontains=query) |
-            Q(locations__state__iexact=normalized_query) |
-            Q(personal_statement_q1__icontains=query) |
-            Q(personal_statement_q2__icontains=query) |
-            Q(personal_statement_q3__icontains=query)
-        )
-        therapists = therapists.filter(q_obj)
-    if tier:
-        therapists = therapists.filter(license_type__name__iexact=tier)
-    # accepting / intro_call filtering removed
-    def to_int_list(values):
-        out = []
-        for v in values:
-            try:
-                out.append(int(v))
-            except (TypeError, ValueError):
+    user_zip = get_user_zip(request)
+    # ?cursor= (empty for the first page) switches to keyset pagination; see users/directory.py
+    cursor_mode = 'cursor' in request.GET
+    cursor = request.GET.get('cursor', '').strip()
+    if cursor_mode and request.GET.get('format') == 'json':
+        return _therapists_page_json(request, user_zip, cursor)
+
+    def hydrate_cards(page_rows):
+        """Load only the visible profiles; attach distance / closest_location for template usage."""
+        by_id = TherapistProfile.objects.select_related('user', 'license_type').prefetch_related(
+            'locations', 'participant_types', 'age_groups', 'specialties__specialty'
+        ).in_bulk([r[0] for r in page_rows])
+        cards = []
+        for tid, distance, closest_zip in page_rows:
+            therapist = by_id.get(tid)
+            if therapist is None:
                 continue
-        return out
+            therapist.distance = distance
+            if closest_zip:
+                for loc in therapist.locations.all():
+                    if (loc.zip or '')[:5] == closest_zip:
+                        therapist.closest_location = loc
+                        break
+            cards.append(therapist)
+        return cards
 
-    int_license_ids = to_int_list(license_ids)
-    if int_license_ids:
-        therapists = therapists.filter(license_type__id__in=int_license_ids)
-    int_participant_ids = to_int_list(participant_ids)
-    if int_participant_ids:
-        therapists = therapists.filter(participant_types__id__in=int_participant_ids)
-    int_age_ids = to_int_list(age_ids)
-    if int_age_ids:
-        therapists = therapists.filter(age_groups__id__in=int_age_ids)
-    int_therapy_type_ids = to_int_list(therapy_type_ids)
-    if int_therapy_type_ids:
-        therapists = therapists.filter(types_of_therapy__therapy_type__id__in=int_therapy_type_ids)
-    int_specialty_ids = to_int_list(specialty_ids)
-    if int_specialty_ids:
-        therapists = therapists.filter(specialties__specialty__id__in=int_specialty_ids)
-    # Identity filters application
-    int_gender_ids = to_int_list(gender_ids)
-    if int_gender_ids:
-        therapists = therapists.filter(gender_id__in=int_gender_ids)
-    int_race_ids = to_int_list(race_ids)
-    if int_race_ids:
-        therapists = therapists.filter(race_ethnicities__race_ethnicity__id__in=int_race_ids)
-    int_faith_ids = to_int_list(faith_ids)
-    if int_faith_ids:
-        therapists = therapists.filter(faiths__faith__id__in=int_faith_ids)
-    int_lgbtqia_ids = to_int_list(lgbtqia_ids)
-    if int_lgbtqia_ids:
-        therapists = therapists.filter(lgbtqia_identities__lgbtqia__id__in=int_lgbtqia_ids)
-    int_other_identity_ids = to_int_list(other_identity_ids)
-    if int_other_identity_ids:
-        therapists = therapists.filter(other_identities__other_identity__id__in=int_other_identity_ids)
-    # Ensure distinct after multi joins
-    therapists = therapists.distinct()
-    # Ensure any legacy profiles missing slug have one (best-effort, avoids 404 for card link)
-    from django.utils.text import slugify
-    dirty = []
-    for tp in therapists:
-        if not getattr(tp, 'slug', ''):
+    def build_directory_page():
+        from django.template.loader import render_to_string
+        # Facet filters resolve against the in-process bitmap index (users/facet_index.py); the query box goes through
+        # the full-text backend (users/fulltext.py). Cards for the current page are hydrated afterwards.
+        from users.search import search_documents
+        from users.facet_index import ids_of
+        from users.fulltext import blend_relevance_distance
+        from users.directory import InvalidCursor, resolve_candidates, seek_page
+        # Ensure any legacy profiles missing slug have one (best-effort, avoids 404 for card link)
+        from django.utils.text import slugify
+        dirty = []
+        for tp in TherapistProfile.objects.filter(slug='', search_document__listed=True):
             base = f"{tp.first_name} {tp.last_name}".strip() or str(tp.pk)
             tp.slug = slugify(base)[:150]
             dirty.append(tp)
-    if dirty:
-        try:
-            TherapistProfile.objects.bulk_update(dirty, ['slug'])
-        except Exception:
-            pass
-    # Removed specialty filtering due to missing PracticeAreaTag model
+        if dirty:
+            try:
+                TherapistProfile.objects.bulk_update(dirty, ['slug'])
+            except Exception:
+                pass
 
-    user_zip = request.session.get('user_zip')
-    # Distance-based default ordering and filtering
-    if user_zip and sort_opt == 'distance':
-        try:
-            import math, re
-            from users.models_profile import ZipCode
-            user_zip_clean = re.match(r"\d{5}", user_zip or "")
-            user_zip_clean = user_zip_clean.group(0) if user_zip_clean else user_zip
-            user_zip_row = ZipCode.objects.filter(pk=user_zip_clean).first()
-            if not user_zip_row:
-                raise ValueError('User ZIP not found in ZipCode table')
-            # Preload all distinct location zips appearing in queryset
-            location_zips = set(therapists.values_list('locations__zip', flat=True))
-            zip_rows = {z.zip: z for z in ZipCode.objects.filter(zip__in=location_zips)}
+        if cursor_mode:
+            # Keyset pagination: each page is a seek from the cursor, so deep pages cost the same as the first
+            try:
+                page = seek_page(request.GET, user_zip, cursor=cursor)
+            except InvalidCursor:
+                # Stale cursor (sort or ZIP changed since): start over from the first page
+                page = seek_page(request.GET, user_zip)
+            cards = hydrate_cards(page.rows)
+            return {
+                'count': None,
+                'number': None,
+                'offset': page.offset,
+                'next_cursor': page.next_cursor,
+                'user_ids': [therapist.user_id for therapist in cards],
+                'cards_html': render_to_string('partials/therapist_card_list.html', {'therapists': cards}),
+                'facet_counts': page.facet_counts,
+            }
 
-            def haversine(lat1, lon1, lat2, lon2):
-                R = 3958.8
-                phi1 = math.radians(lat1)
-                phi2 = math.radians(lat2)
-                dphi = math.radians(lat2 - lat1)
-                dlambda = math.radians(lon2 - lon1)
-                a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-                c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-                return R * c
+        facet_index, facet_filters, text_scores, text_bits = resolve_candidates(request.GET)
+        matched_ids = ids_of(facet_index.match(facet_filters, within=text_bits))
+        # "N matching" badges for every filter option
+        facet_counts = facet_index.counts(facet_filters, within=text_bits)
+        RADIUS = 150
+        MAX_RESULTS = 150
+        # Rank lightweight (profile_id, distance, closest_zip) tuples first; only the visible page is hydrated below
+        ranked = []
+        # Distance-based default ordering and filtering
+        if user_zip and sort_opt == 'distance':
+            try:
+                import re
+                from users.zip_index import get_zip_index
+                from users.geo import nearest_locations
+                user_zip_clean = re.match(r"\d{5}", user_zip or "")
+                user_zip_clean = user_zip_clean.group(0) if user_zip_clean else user_zip
+                index = get_zip_index()
+                origin = index.coords(user_zip_clean)
+                if not origin:
+                    raise ValueError('User ZIP not found in ZipCode table')
+                # Nearest location per therapist for the whole candidate set in one batched pass
+                best = nearest_locations(origin[0], origin[1], facet_index.location_rows(matched_ids), index=index)
+                if text_scores is not None:
+                    # Query present: order by text relevance blended with proximity
+                    blended = blend_relevance_distance(
+                        {tid: text_scores.get(tid, 0.0) for tid in matched_ids},
+                        {tid: d for tid, (d, _) in best.items()}, RADIUS,
+                    )
+                    ordered = sorted(matched_ids, key=lambda tid: blended[tid], reverse=True)[:MAX_RESULTS]
+                    ranked = [(tid, round(best[tid][0], 1), best[tid][1]) if tid in best else (tid, None, None) for tid in ordered]
+                else:
+                    by_distance = sorted(((tid, round(d, 1), z5) for tid, (d, z5) in best.items()), key=lambda r: r[1])
+                    within_radius = [r for r in by_distance if best[r[0]][0] <= RADIUS]
+                    if len(within_radius) >= MAX_RESULTS:
+                        ranked = within_radius
+                    else:
+                        # Too few nearby: top up with the nearest out-of-radius therapists, then those without a resolvable ZIP
+                        ranked = by_distance
+                        if len(ranked) < MAX_RESULTS:
+                            ranked += [(tid, None, None) for tid in matched_ids if tid not in best]
+                        ranked = ranked[:MAX_RESULTS]
+            except Exception:
+                ranked = [(tid, None, None) for tid in facet_index.order_by_recent(matched_ids)[:MAX_RESULTS]]
+        else:
+            # No user zip (or name sort): order in memory, up to 150
+            if sort_opt == 'name':
+                ordered = facet_index.order_by_name(matched_ids)
+            elif text_scores is not None:  # query without a zip -> most relevant first
+                ordered = sorted(matched_ids, key=lambda tid: text_scores.get(tid, 0.0), reverse=True)
+            else:  # distance requested but no zip -> fallback recent
+                ordered = facet_index.order_by_recent(matched_ids)
+            ranked = [(tid, None, None) for tid in ordered[:MAX_RESULTS]]
 
-            def compute_min_distance(therapist):
-                min_d = None
-                nearest_loc = None
-                for loc in therapist.locations.all():
-                    zr = zip_rows.get(getattr(loc, 'zip', None))
-                    if zr:
-                        d = haversine(float(user_zip_row.latitude), float(user_zip_row.longitude), float(zr.latitude), float(zr.longitude))
-                        if min_d is None or d < min_d:
-                            min_d = d
-                            nearest_loc = loc
-                if nearest_loc is not None:
-                    # Attach for template usage (city/state display of closest location)
-                    therapist.closest_location = nearest_loc
-                return round(min_d, 1) if min_d is not None else None
+        # Absolute fallback: if still empty, relax filters (include non-active onboarding)
+        if not ranked:
+            fallback_ids = search_documents(listed_only=False).order_by('-last_login').values_list('therapist_id', flat=True)[:MAX_RESULTS]
+            ranked = [(tid, None, None) for tid in fallback_ids]
 
-            therapists = list(therapists.distinct())
-            for t in therapists:
-                t.distance = compute_min_distance(t)
-            therapists.sort(key=lambda t: t.distance if t.distance is not None else float('inf'))
-            RADIUS = 150
-            within_radius = [t for t in therapists if t.distance is not None and t.distance <= RADIUS]
-            if len(within_radius) >= 150:
-                therapists = within_radius
-            else:
-                therapists = (within_radius + [t for t in therapists if t not in within_radius])[:150]
-        except Exception:
-            therapists = list(therapists.distinct().order_by('-user__last_login')[:150])
-            for t in therapists:
-                t.distance = None
-    else:
-        # No user zip: just take most recently active up to 150
-        base_qs = therapists.distinct()
-        if sort_opt == 'name':
-            base_qs = base_qs.order_by('last_name', 'first_name')
-        else:  # distance requested but no zip -> fallback recent
-            base_qs = base_qs.order_by('-user__last_login')
-        therapists = list(base_qs[:150])
-        for t in therapists:
-            t.distance = None
-
-    # Absolute fallback: if still empty, relax filters (include non-active onboarding) then still ensure distance attr
-    if not therapists:
-        fallback_qs = TherapistProfile.objects.filter(user__is_active=True).prefetch_related('locations').order_by('-user__last_login')[:150]
-        therapists = list(fallback_qs)
-        for t in therapists:
-            if not hasattr(t, 'distance'):
-                t.distance = None
+        from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+        page = request.GET.get('page', 1)
+        paginator = Paginator(ranked, 10)
+        try:
+            therapists_page_obj = paginator.page(page)
+        except PageNotAnInteger:
+            therapists_page_obj = paginator.page(1)
+        except EmptyPage:
+            therapists_page_obj = paginator.page(paginator.num_pages)
 
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    page = request.GET.get('page', 1)
-    paginator = Paginator(therapists, 10)
-    try:
-        therapists_page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        therapists_page_obj = paginator.page(1)
-    except EmptyPage:
-        therapists_page_obj = paginator.page(paginator.num_pages)
+        cards = hydrate_cards(list(therapists_page_obj.object_list))
+        return {
+            'count': paginator.count,
+            'number': therapists_page_obj.number,
+            'offset': therapists_page_obj.start_index() - 1 if paginator.count else 0,
+            'next_cursor': None,
+            'user_ids': [therapist.user_id for therapist in cards],
+            'cards_html': render_to_string('partials/therapist_card_list.html', {'therapists': cards}),
+            'facet_counts': facet_counts,
+        }
 
-    # Ensure .distance is always set for template consistency
-    for therapist in therapists_page_obj.object_list:
-        if not hasattr(therapist, 'distance') or therapist.distance is None:
-            therapist.distance = None
+    # Anonymous visitors share rendered pages per (ZIP, filters, page); see users/page_cache.py
+    from users import page_cache
+    if page_cache.cacheable(request):
+        key = page_cache.fragment_key(
+            'directory', ('directory',),
+            page_cache.normalized_zip(user_zip), page_cache.filter_signature(request.GET), request.GET.get('page', 1),
+        )
+        result = page_cache.get_or_build('directory', key, build_directory_page)
+    else:
+        result = build_directory_page()
+    from django.core.paginator import Paginator
+    from django.utils.safestring import mark_safe
+    facet_counts = result['facet_counts']
+    next_cursor_url = None
+    if cursor_mode:
+        paginator = therapists_page_obj = None
+        if result['next_cursor']:
+            params = request.GET.copy()
+            params.pop('page', None)
+            params['cursor'] = result['next_cursor']
+            next_cursor_url = '?' + params.urlencode()
+    else:
+        paginator = Paginator(range(result['count']), 10)
+        therapists_page_obj = paginator.page(result['number'])
 
-    # After pagination, log search impressions and rank
-    today = timezone.now().date()
-    for idx, therapist in enumerate(therapists_page_obj.object_list, start=1):
-        stats, _ = TherapistProfileStats.objects.get_or_create(therapist=therapist.user, date=today)
-        stats.search_impressions += 1
-        stats.search_rank = idx  # last rank seen for today
-        stats.save()
+    # After pagination, log search impressions and rank (buffered; flushed in bulk by users/stats_buffer.py)
+    from users.stats_buffer import record_impressions
+    # Entries cached before 'offset' existed start at rank 1
+    record_impressions(result['user_ids'], start_rank=result.get('offset', 0) + 1)
 
     # Zip meta for display
-    user_zip_city = None
-    user_zip_state = None
-    if user_zip:
-        try:
-            from users.models_profile import ZipCode
-            zrow = ZipCode.objects.filter(pk=user_zip[:5]).first()
-            if zrow:
-                user_zip_city = zrow.city
-                user_zip_state = zrow.state
-        except Exception:
-            pass
-    # Provide lookup lists for advanced filter UI
-    from users.models_profile import (
-    LicenseType, ParticipantType, AgeGroup, TherapyType, SpecialtyLookup,
-        Gender, RaceEthnicity, Faith, LGBTQIA, OtherIdentity
-    )
-    license_types = LicenseType.objects.all().order_by('name')
-    participant_types = ParticipantType.objects.all().order_by('name')
-    age_groups = AgeGroup.objects.all().order_by('name')
-    therapy_types = TherapyType.objects.all().order_by('name')
-    specialties_lookup = SpecialtyLookup.objects.all().order_by('name')
-    genders = Gender.objects.all().order_by('name')
-    race_ethnicities = RaceEthnicity.objects.all().order_by('name')
-    faiths = Faith.objects.all().order_by('name')
-    lgbtqia_identities = LGBTQIA.objects.all().order_by('name')
-    other_identities = OtherIdentity.objects.all().order_by('name')
+    from users.location_utils import get_zip_city_state
+    user_zip_city, user_zip_state = get_zip_city_state(user_zip)
+    # Provide lookup lists for advanced filter UI (served from the process-wide lookup registry)
+    from users.lookups import options_by_name
+    license_types = options_by_name('license_type')
+    participant_types = options_by_name('participant_type')
+    age_groups = options_by_name('age_group')
+    therapy_types = options_by_name('therapy_type')
+    specialties_lookup = options_by_name('specialty')
+    genders = options_by_name('gender')
+    race_ethnicities = options_by_name('race_ethnicity')
+    faiths = options_by_name('faith')
+    lgbtqia_identities = options_by_name('lgbtqia')
+    other_identities = options_by_name('other_identity')
     return render(request, 'therapists.html', {
         'therapists': therapists_page_obj,
+        'therapist_user_ids': result['user_ids'],
+        'cards_html': mark_safe(result['cards_html']),
         'paginator': paginator,
         'page_obj': therapists_page_obj,
+        'cursor_mode': cursor_mode,
+        'next_cursor': result['next_cursor'],
+        'next_cursor_url': next_cursor_url,
         'user_zip': user_zip,
         'user_zip_city': user_zip_city,
         'user_zip_state': user_zip_state,
@@ -264,6 +304,7 @@ def therapists_page(request):
     'filter_other_identity': other_identity_ids,
     'filter_specialty': specialty_ids,
     'filter_sort': sort_opt,
+    'facet_counts': facet_counts,
     # Lookup lists
     'license_types': license_types,
     'participant_types_list': participant_types,
@@ -286,13 +327,15 @@ def set_zip(request):
             ensure_zipcode(zip_code)
         except Exception:
             pass
-        request.session['user_zip'] = zip_code[:5]
-        return JsonResponse({'status': 'ok', 'zip': zip_code[:5]})
+        # Stored in a signed cookie rather than the session so anonymous visitors need no session row
+        response = JsonResponse({'status': 'ok', 'zip': zip_code[:5]})
+        set_user_zip(response, zip_code[:5])
+        return response
     return JsonResponse({'status': 'error', 'message': 'No zip provided'}, status=400)
 
 def geo_zip(request):
-    """Return nearest stored ZIP for provided lat/lon using local ZipCode table.
-    If table is empty returns 404. (Future: add bounding-box prefilter or spatial index.)
+    """Return nearest stored ZIP for provided lat/lon using the in-process ZIP spatial index.
+    If table is empty returns 404.
     """
     try:
         lat = float(request.GET.get('lat', ''))
@@ -318,7 +361,7 @@ def home(request):
     """Home page view that now attaches closest_location similar to therapists_page.
     Shows top therapists (max 6) ordered by distance if user_zip known.
     """
-    user_zip = request.session.get('user_zip')
+    user_zip = get_user_zip(request)
     DEFAULT_ZIP = "10001"
     if not user_zip:
         user_zip = DEFAULT_ZIP
@@ -327,105 +370,108 @@ def home(request):
         user_zip_is_default = False
 
     query = request.GET.get('q', '').strip()
-    therapists = (TherapistProfile.objects
-                  .filter(user__is_active=True, user__onboarding_status='active')
-                  .prefetch_related('locations'))
-    if query:
-        from users.utils.state_normalize import normalize_state
-        normalized_query = normalize_state(query)
-        q_obj = (
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(personal_statement_q1__icontains=query) |
-            Q(personal_statement_q2__icontains=query) |
-            Q(personal_statement_q3__icontains=query) |
-            Q(intro_statement__icontains=query) |
-            Q(locations__city__icontains=query) |
-            Q(locations__state__icontains=query) |
-            Q(locations__state__iexact=normalized_query) |
-            Q(credentials_note__icontains=query)
-        )
-        therapists = therapists.filter(q_obj)
 
-    import math, re
-    from users.models_profile import ZipCode
-    # Clean user zip & fetch row
+    import re
+    from users.zip_index import get_zip_index
+    from users.geo import nearest_location_for
+    from users.nearby import nearest_for_zip, top_k_nearest
+    # Clean user zip; coordinates come from the ZIP index
     user_zip_clean = re.match(r"\d{5}", user_zip or "")
     user_zip_clean = user_zip_clean.group(0) if user_zip_clean else user_zip
-    user_zip_row = ZipCode.objects.filter(pk=user_zip_clean).first()
-
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 3958.8
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return R * c
-
-    # Preload all location zip rows once
-    therapist_zips = set(therapists.values_list('locations__zip', flat=True))
-    zip_rows = {z.zip: z for z in ZipCode.objects.filter(zip__in=therapist_zips)}
+    zip_index = get_zip_index()
+    origin = zip_index.coords(user_zip_clean)
 
     def compute_min_distance_and_attach(therapist):
         """Compute min distance for therapist; set therapist.closest_location; return rounded miles or None."""
-        if not user_zip_row:
+        if not origin:
             return None
-        min_d = None
-        nearest_loc = None
-        for loc in therapist.locations.all():
-            zr = zip_rows.get(getattr(loc, 'zip', None))
-            if zr:
-                d = haversine(float(user_zip_row.latitude), float(user_zip_row.longitude), float(zr.latitude), float(zr.longitude))
-                if min_d is None or d < min_d:
-                    min_d = d
-                    nearest_loc = loc
+        min_d, nearest_loc = nearest_location_for(origin[0], origin[1], therapist.locations.all(), index=zip_index)
         if nearest_loc is not None:
             therapist.closest_location = nearest_loc
         return round(min_d, 1) if min_d is not None else None
 
-    therapists = list(therapists.distinct())
-    for t in therapists:
-        t.distance = compute_min_distance_and_attach(t)
+    def build_home_sections():
+        # Six closest listed therapists via ring-expanding top-k over the facet index (users/nearby.py);
+        # the no-query result is cached per origin ZIP
+        from users.facet_index import bits_of, get_facet_index, ids_of
+        facet_index = get_facet_index()
+        if query:
+            # Full-text backend (names, license, places, statements); see users/fulltext.py
+            from users.fulltext import search as fulltext_search
+            within = bits_of(fulltext_search(query))
+            if origin:
+                nearest = top_k_nearest(origin[0], origin[1], 6, within=within, facet_index=facet_index, zip_index=zip_index)
+            else:
+                nearest = [(tid, None, None) for tid in ids_of(facet_index.match(within=within))[:6]]
+        elif origin:
+            nearest = nearest_for_zip(user_zip_clean, 6)
+        else:
+            nearest = [(tid, None, None) for tid in ids_of(facet_index.match())[:6]]
+        profiles = TherapistProfile.objects.select_related('user', 'license_type').prefetch_related(
+            'locations', 'participant_types', 'age_groups', 'specialties__specialty', 'types_of_therapy__therapy_type'
+        ).in_bulk([tid for tid, _, _ in nearest])
+        therapists_final = []
+        for tid, d, z5 in nearest:
+            t = profiles.get(tid)
+            if t is None:
+                continue
+            t.distance = round(d, 1) if d is not None else None
+            if z5:
+                t.closest_location = next((loc for loc in t.locations.all() if (loc.zip or '')[:5] == z5), None)
+            therapists_final.append(t)
 
-    # Order by distance (None last) and limit to 6
-    therapists_final = sorted(therapists, key=lambda t: t.distance if t.distance is not None else float('inf'))[:6]
+        from users.models_featured import FeaturedTherapistHistory, FeaturedBlogPostHistory
+        today = timezone.now().date()
+        # Try to get today's featured therapist and blog post from history
+        featured_therapist_entry = FeaturedTherapistHistory.objects.filter(date=today).first()
+        featured_blog_entry = FeaturedBlogPostHistory.objects.filter(date=today).first()
+        top_therapist = featured_therapist_entry.therapist if featured_therapist_entry else (therapists_final[0] if therapists_final else None)
+        # Ensure top_therapist has distance / closest_location if sourced from history outside therapists_final
+        if top_therapist and not hasattr(top_therapist, 'distance'):
+            try:
+                top_therapist.distance = compute_min_distance_and_attach(top_therapist)
+            except Exception:
+                top_therapist.distance = None
+        # Do not show members-only posts on the public homepage carousel
+        top_blog_post = None
+        if featured_blog_entry and getattr(featured_blog_entry, 'blog_post', None):
+            bp = featured_blog_entry.blog_post
+            vis = getattr(bp, 'visibility', 'public')
+            if getattr(bp, 'published', False) and vis in ('public', 'both'):
+                top_blog_post = bp
+        if top_blog_post is None:
+            top_blog_post = (BlogPost.objects
+                             .filter(published=True, visibility__in=['public', 'both'])
+                             .order_by('-created_at')
+                             .first())
+        from django.template.loader import render_to_string
+        return {
+            'carousel_html': render_to_string('partials/carousel_section.html', {
+                'top_therapist': top_therapist, 'top_blog_post': top_blog_post,
+            }),
+            'top_therapists_html': render_to_string('partials/top_therapists_section.html', {
+                'therapists': therapists_final,
+            }),
+        }
 
-    from users.models_featured import FeaturedTherapistHistory, FeaturedBlogPostHistory
-    today = timezone.now().date()
-    # Try to get today's featured therapist and blog post from history
-    featured_therapist_entry = FeaturedTherapistHistory.objects.filter(date=today).first()
-    featured_blog_entry = FeaturedBlogPostHistory.objects.filter(date=today).first()
-    top_therapist = featured_therapist_entry.therapist if featured_therapist_entry else (therapists_final[0] if therapists_final else None)
-    # Ensure top_therapist has distance / closest_location if sourced from history outside therapists_final
-    if top_therapist and not hasattr(top_therapist, 'distance'):
-        try:
-            top_therapist.distance = compute_min_distance_and_attach(top_therapist)
-        except Exception:
-            top_therapist.distance = None
-    # Do not show members-only posts on the public homepage carousel
-    top_blog_post = None
-    if featured_blog_entry and getattr(featured_blog_entry, 'blog_post', None):
-        bp = featured_blog_entry.blog_post
-        vis = getattr(bp, 'visibility', 'public')
-        if getattr(bp, 'published', False) and vis in ('public', 'both'):
-            top_blog_post = bp
-    if top_blog_post is None:
-        top_blog_post = (BlogPost.objects
-                         .filter(published=True, visibility__in=['public', 'both'])
-                         .order_by('-created_at')
-                         .first())
-    # Add city/state meta for current zip
-    user_zip_city = None
-    user_zip_state = None
-    if user_zip_row:
-        user_zip_city = user_zip_row.city
-        user_zip_state = user_zip_row.state
+    # Anonymous visitors share the rendered sections per (ZIP, query, day); see users/page_cache.py
+    from users import page_cache
+    if page_cache.cacheable(request):
+        key = page_cache.fragment_key(
+            'home', ('directory', 'featured', 'blog'),
+            page_cache.normalized_zip(user_zip_clean), page_cache.filter_signature(request.GET),
+            timezone.now().date().isoformat(),
+        )
+        sections = page_cache.get_or_build('home', key, build_home_sections)
+    else:
+        sections = build_home_sections()
+    from django.utils.safestring import mark_safe
+    # Add city/state meta for current zip (shared ZIP cache, see users/location_utils.py)
+    from users.location_utils import get_zip_city_state
+    user_zip_city, user_zip_state = get_zip_city_state(user_zip_clean)
     return render(request, 'home.html', {
-        'therapists': therapists_final,
-        'top_blog_post': top_blog_post,
-        'top_therapist': top_therapist,
+        'carousel_html': mark_safe(sections['carousel_html']),
+        'top_therapists_html': mark_safe(sections['top_therapists_html']),
         'user_zip': user_zip,
         'user_zip_city': user_zip_city,
         'user_zip_state': user_zip_state,
@@ -156,6 +156,7 @@ from .models_profile import (
     Faith, Gender, InsuranceProvider, LGBTQIA, LicenseType, PaymentMethod,
     RaceEthnicity, TherapyType, Title, SpecialtyLookup, OtherIdentity, LookupMaintenance
 )
+from .lookups import bump_lookup_version
 import subprocess, sys, os
 
 @admin.action(description="Run lookup purge DRY-RUN (simulated)")
@@ -164,6 +165,7 @@ def purge_lookup_dry_run(modeladmin, request, queryset):
     env['LOOKUP_PURGE'] = '1'
     env['LOOKUP_PURGE_DRY_RUN'] = '1'
     subprocess.run([sys.executable, 'manage.py', 'shell'], input=open('seed_lookups.py', 'rb').read(), env=env)
+    bump_lookup_version()
     modeladmin.message_user(request, "Dry-run purge completed. Check server logs for details.")
 
 @admin.action(description="Execute lookup purge (DESTRUCTIVE)")
@@ -172,6 +174,8 @@ def purge_lookup_execute(modeladmin, request, queryset):
     env['LOOKUP_PURGE'] = '1'
     env['LOOKUP_PURGE_DRY_RUN'] = '0'
     subprocess.run([sys.executable, 'manage.py', 'shell'], input=open('seed_lookups.py', 'rb').read(), env=env)
+    # The purge runs in a subprocess with queryset deletes/updates; refresh cached lookup options here
+    bump_lookup_version()
     modeladmin.message_user(request, "Lookup purge executed. Review logs.")
 
 class LicenseTypeAdmin(admin.ModelAdmin):
@@ -200,3 +204,23 @@ class TherapistProfileStatsAdmin(admin.ModelAdmin):
     search_fields = ('therapist__email',)
 
 admin.site.register(TherapistProfileStats, TherapistProfileStatsAdmin)
+
+from .models_jobs import ImageJob
+
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'object_id', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('file_name', 'last_error')
+    readonly_fields = ('content_sha256', 'pipeline_version', 'locked_at', 'locked_by', 'created_at', 'updated_at')
+
+admin.site.register(ImageJob, ImageJobAdmin)
+
+from .models_blobs import ImageBlob
+
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'unreferenced_since', 'created_at')
+    list_filter = ('ref_count',)
+    search_fields = ('sha256', 'name')
+    readonly_fields = ('sha256', 'name', 'size', 'ref_count', 'meta', 'created_at', 'unreferenced_since')
+
+admin.site.register(ImageBlob, ImageBlobAdmin)
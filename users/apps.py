@@ -10,3 +10,10 @@ class UsersConfig(AppConfig):
             from . import signals  # noqa: F401
         except Exception:
             pass
+        # Derived tables are filled by live code once the schema is current (not inside migrations)
+        from django.db.models.signals import post_migrate
+        from .fulltext import ensure_after_migrate
+        from .search import sync_after_migrate
+        # Full-text triggers first, so rebuilt documents are indexed as they are written
+        post_migrate.connect(ensure_after_migrate, sender=self, dispatch_uid='users_fulltext_after_migrate')
+        post_migrate.connect(sync_after_migrate, sender=self, dispatch_uid='users_search_documents_after_migrate')
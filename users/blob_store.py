@@ -0,0 +1,328 @@
+"""Content-addressed storage for uploaded images, shared across profiles, galleries, blogs and feed.
+
+An uploaded image is stored once, under the sha256 of its bytes:
+
+    blobs/<sha[:2]>/<sha>.<ext>        (normalized: <sha>__normalized.jpg, variants: <sha>__thumb.jpg, ...)
+
+The blob file is immutable: the image pipeline writes its outputs under their own
+names, so every row naming the blob keeps reading the uploaded bytes.
+
+A pre_save signal hashes every not-yet-stored upload of the fields in BLOB_FIELDS.
+When an ImageBlob with that hash exists, the field is pointed at the blob's name and
+nothing is written; otherwise the bytes are saved at the blob name and a row is
+created. For processed kinds (profile photo, gallery image, blog image) the blob
+also caches the pipeline's meta, which is copied onto the duplicate upload so
+`image_jobs.enqueue_image()` sees it as current and queues nothing: a stock photo
+picked by fifty authors is stored, uploaded to S3 and resized once.
+
+`ImageBlob.ref_count` tracks how many file fields name the blob: the post_init
+signal remembers the loaded name, post_save adds / drops references when it
+changes and post_delete drops the deleted row's reference. Files behind blob names
+are never deleted by views (`release_file()`); `manage.py gc_image_blobs` removes
+blobs that stayed unreferenced for a grace period, recounting references from the
+tables first so a missed signal (e.g. a queryset update) cannot delete a file that
+is still in use.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models_blobs import ImageBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs'
+GC_GRACE_SECONDS = 24 * 60 * 60
+
+# Stored extension per upload extension; anything else (video, documents) is stored the usual way
+IMAGE_EXTENSIONS = {'jpg': 'jpg', 'jpeg': 'jpg', 'png': 'png', 'gif': 'gif', 'webp': 'webp', 'bmp': 'bmp'}
+
+# kind -> (model label, file field, meta field or None, media type field or None)
+BLOB_FIELDS = {
+    'profile_photo': ('users.TherapistProfile', 'profile_photo', 'profile_photo_meta', None),
+    'gallery_image': ('users.GalleryImage', 'image', 'image_meta', None),
+    'blog_image': ('users.BlogPost', 'image', 'image_meta', None),
+    'blog_media': ('users.BlogMedia', 'file', None, 'type'),
+    'feed_media': ('users.FeedMedia', 'file', None, 'type'),
+}
+
+
+def _model(kind: str):
+    from django.apps import apps
+    return apps.get_model(BLOB_FIELDS[kind][0])
+
+
+def blob_name(sha256: str, ext: str) -> str:
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256}.{ext}'
+
+
+def is_blob_name(name: Optional[str]) -> bool:
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/')
+
+
+def _extension(name: str) -> Optional[str]:
+    ext = os.path.splitext(name or '')[1].lstrip('.').lower()
+    return IMAGE_EXTENSIONS.get(ext)
+
+
+def _hash_content(content) -> Tuple[str, int]:
+    h = hashlib.sha256()
+    size = 0
+    content.seek(0)
+    for chunk in iter(lambda: content.read(1024 * 1024), b''):
+        h.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return h.hexdigest(), size
+
+
+def _reusable_meta(meta: Optional[dict]) -> bool:
+    from users.image_jobs import STATUS_READY
+    from users.image_utils import PIPELINE_VERSION
+    meta = meta or {}
+    return meta.get('status') == STATUS_READY and meta.get('pipeline_version') == PIPELINE_VERSION
+
+
+def _store(storage, sha: str, ext: str, size: int, content) -> ImageBlob:
+    name = blob_name(sha, ext)
+    # An existing file at a content-addressed name already holds these bytes (e.g. a rolled-back upload)
+    if not storage.exists(name):
+        saved = storage.save(name, content)
+        if saved != name:
+            # Lost a race with a concurrent upload of the same bytes: keep the first copy
+            storage.delete(saved)
+    try:
+        with transaction.atomic():
+            blob, _ = ImageBlob.objects.get_or_create(sha256=sha, defaults={'name': name, 'size': size})
+    except IntegrityError:
+        blob = ImageBlob.objects.get(sha256=sha)
+    return blob
+
+
+def _intact(storage, blob: ImageBlob) -> bool:
+    """The blob file exists and still holds the uploaded bytes."""
+    if not storage.exists(blob.name):
+        return False
+    # Blobs processed before normalized JPEGs got their own name were normalized in place
+    return (blob.meta or {}).get('normalized') != os.path.basename(blob.name)
+
+
+def attach_upload(kind: str, instance) -> bool:
+    """Point a not-yet-stored image upload at its blob (storing it first if new); False when not applicable."""
+    _, file_field, meta_field, type_field = BLOB_FIELDS[kind]
+    field_file = getattr(instance, file_field, None)
+    if not field_file or getattr(field_file, '_committed', True):
+        return False
+    if type_field and getattr(instance, type_field, None) != 'image':
+        return False
+    ext = _extension(field_file.name)
+    if ext is None:
+        return False
+    content = field_file.file
+    sha, size = _hash_content(content)
+    storage = field_file.storage
+    blob = ImageBlob.objects.filter(sha256=sha).first()
+    if blob is None:
+        blob = _store(storage, sha, ext, size, content)
+    elif not _intact(storage, blob):
+        # Row without its original (storage restored / wiped, or normalized in place): store the bytes again and reprocess
+        if storage.exists(blob.name):
+            storage.delete(blob.name)
+        storage.save(blob.name, content)
+        ImageBlob.objects.filter(pk=blob.pk).update(meta={}, size=size)
+        blob.meta = {}
+    # A plain name assigns a stored (committed) file, so FileField.pre_save writes nothing
+    setattr(instance, file_field, blob.name)
+    if meta_field and _reusable_meta(blob.meta):
+        setattr(instance, meta_field, dict(blob.meta))
+    return True
+
+
+def cached_meta(name: str) -> Optional[dict]:
+    """The blob's processed meta when it is current for this pipeline, else None."""
+    if not is_blob_name(name):
+        return None
+    meta = ImageBlob.objects.filter(name=name).values_list('meta', flat=True).first()
+    return dict(meta) if _reusable_meta(meta) else None
+
+
+def remember_meta(name: str, meta: dict) -> None:
+    """Cache a processed meta on the blob so later duplicates skip processing."""
+    if is_blob_name(name) and _reusable_meta(meta):
+        ImageBlob.objects.filter(name=name).update(meta=meta)
+
+
+# --- Reference counting ------------------------------------------------------------------------
+
+def _loaded_name(kind: str, instance) -> Optional[str]:
+    """The field's current name, or None when the field is deferred (reading it would query)."""
+    file_field = BLOB_FIELDS[kind][1]
+    if file_field not in instance.__dict__:
+        return None
+    value = instance.__dict__[file_field]
+    return getattr(value, 'name', value) or ''
+
+
+def remember_loaded_name(kind: str, instance) -> None:
+    instance._blob_name = _loaded_name(kind, instance)
+
+
+def add_ref(name: str) -> None:
+    if is_blob_name(name):
+        ImageBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, unreferenced_since=None)
+
+
+def drop_ref(name: str) -> None:
+    if not is_blob_name(name):
+        return
+    ImageBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    ImageBlob.objects.filter(name=name, ref_count=0, unreferenced_since__isnull=True).update(
+        unreferenced_since=timezone.now())
+
+
+def sync_refs(kind: str, instance) -> None:
+    """After a save: move the reference from the loaded name to the saved one."""
+    new = _loaded_name(kind, instance)
+    old = getattr(instance, '_blob_name', None)
+    if new is None or new == old:
+        return
+    add_ref(new)
+    if old:
+        drop_ref(old)
+    instance._blob_name = new
+
+
+def release_file(field_file) -> None:
+    """Delete a file a view is discarding, unless it is a shared blob (left to gc_image_blobs)."""
+    if not field_file:
+        return
+    if is_blob_name(field_file.name):
+        return
+    field_file.delete(save=False)
+
+
+# --- Garbage collection ------------------------------------------------------------------------
+
+def references(name: str) -> int:
+    """Authoritative reference count: rows of every BLOB_FIELDS model naming the blob."""
+    return sum(_model(kind).objects.filter(**{spec[1]: name}).count() for kind, spec in BLOB_FIELDS.items())
+
+
+def blob_files(blob: ImageBlob, storage=None) -> List[str]:
+    """Storage names belonging to a blob: the original, the normalized JPEG and every variant."""
+    from users.image_utils import VARIANTS
+    directory, base = os.path.split(blob.name)
+    stem = os.path.splitext(base)[0]
+    names = {blob.name, f'{directory}/{stem}.jpg', f'{directory}/{stem}__normalized.jpg'}
+    for label, _, _, _ in VARIANTS:
+        names.update((f'{directory}/{stem}__{label}.jpg', f'{directory}/{stem}__{label}.webp'))
+    for variant in ((blob.meta or {}).get('variants') or {}).values():
+        for rel in (variant.get('jpg'), variant.get('webp')):
+            if rel:
+                names.add(f'{directory}/{rel}')
+    # Width / format variants rendered on demand by /img/ (users/image_resize.py)
+    from django.core.files.storage import default_storage
+    from users.image_resize import variant_names
+    names.update(variant_names(storage or default_storage, blob.name))
+    return sorted(names)
+
+
+def _delete_files(storage, names: List[str]) -> int:
+    deleted = 0
+    for name in names:
+        try:
+            if storage.exists(name):
+                storage.delete(name)
+                deleted += 1
+        except Exception as e:
+            logger.warning("Failed to delete blob file %s: %s", name, e)
+    return deleted
+
+
+def recount(blob: ImageBlob) -> int:
+    refs = references(blob.name)
+    if refs != blob.ref_count:
+        ImageBlob.objects.filter(pk=blob.pk).update(
+            ref_count=refs, unreferenced_since=None if refs else (blob.unreferenced_since or timezone.now()))
+    return refs
+
+
+def collect_garbage(grace_seconds: int = GC_GRACE_SECONDS, dry_run: bool = False,
+                    recount_all: bool = False, orphans: bool = False, storage=None) -> Dict[str, int]:
+    """Delete blobs unreferenced for longer than `grace_seconds`; returns counters."""
+    from django.core.files.storage import default_storage
+    from django.db.models import Q
+    storage = storage or default_storage
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    result = {'recounted': 0, 'blobs': 0, 'files': 0, 'orphan_files': 0}
+    if recount_all:
+        for blob in ImageBlob.objects.iterator():
+            if recount(blob) != blob.ref_count:
+                result['recounted'] += 1
+    due = ImageBlob.objects.filter(ref_count=0).filter(
+        Q(unreferenced_since__lt=cutoff) | Q(unreferenced_since__isnull=True, created_at__lt=cutoff))
+    for blob in due.iterator():
+        if recount(blob):
+            # A reference the counters missed: keep it
+            result['recounted'] += 1
+            continue
+        result['blobs'] += 1
+        if dry_run:
+            continue
+        # Conditional delete: a duplicate upload that took a reference meanwhile keeps the blob
+        if ImageBlob.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+            result['files'] += _delete_files(storage, blob_files(blob, storage))
+    if orphans:
+        result['orphan_files'] = _collect_orphans(storage, cutoff, dry_run)
+    return result
+
+
+def _collect_orphans(storage, cutoff, dry_run: bool) -> int:
+    """Files under blobs/ whose hash has no ImageBlob row (e.g. uploads whose transaction rolled back)."""
+    deleted = 0
+    try:
+        shards, _ = storage.listdir(BLOB_PREFIX)
+    except Exception as e:
+        logger.warning("Cannot list %s/: %s", BLOB_PREFIX, e)
+        return 0
+    for shard in shards:
+        _, files = storage.listdir(f'{BLOB_PREFIX}/{shard}')
+        by_sha: Dict[str, List[str]] = {}
+        for base in files:
+            by_sha.setdefault(base[:64], []).append(f'{BLOB_PREFIX}/{shard}/{base}')
+        known = set(ImageBlob.objects.filter(sha256__in=list(by_sha)).values_list('sha256', flat=True))
+        for sha, names in by_sha.items():
+            if sha in known:
+                continue
+            try:
+                if max(storage.get_modified_time(n) for n in names) >= cutoff:
+                    continue
+            except Exception:
+                # Backend without modification times: never guess
+                continue
+            deleted += len(names) if dry_run else _delete_files(storage, names)
+    return deleted
+
+
+__all__ = [
+    "BLOB_PREFIX",
+    "BLOB_FIELDS",
+    "blob_name",
+    "is_blob_name",
+    "attach_upload",
+    "cached_meta",
+    "remember_meta",
+    "add_ref",
+    "drop_ref",
+    "sync_refs",
+    "release_file",
+    "references",
+    "blob_files",
+    "collect_garbage",
+]
@@ -0,0 +1,359 @@
+"""Shared caching helpers on top of the configured Django cache (settings.CACHES).
+
+The backend is chosen with CACHE_URL (see settings.py): per-process locmem for
+development and tests, a file-based cache shared by the workers on one host, or
+Redis / memcached. Everything here degrades to "compute it again" when the backend
+errors, so a cache outage slows requests down but does not fail them.
+
+    make_key('zip.meta', '10001')        'zip.meta:3:10001' (namespace version 3)
+    bump_namespace('zip.meta')           every key made under the namespace moves
+
+    ZIP_META = TieredCache('zip.meta', maxsize=4096, timeout=86400)
+    ZIP_META.get_or_set('10001', load)   process LRU -> shared cache -> load()
+
+TieredCache keeps a bounded per-process LRU (LRUCache) in front of the shared
+backend, so hot keys cost no network round trip while a value computed by one
+gunicorn worker is reused by the others. The front cache compares the shared
+namespace version at most every VERSION_CHECK_SECONDS and empties itself when the
+version moved, which bounds how long another worker's invalidation goes unseen.
+None is a legitimate cached value (negative lookups are cached too).
+
+Hit / miss counts are kept per cache name in process; `stats()` returns them with
+hit rates and CacheStats can log them every N lookups.
+
+SharedRateLimit counts calls per fixed window in the shared backend, so a quota
+(an external API's requests per hour) holds across all workers instead of per
+process. On a per-process backend (the locmem default) a shared count is
+impossible, so its per-worker fallback decides instead.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 300
+VERSION_CHECK_SECONDS = 5.0
+MAX_RAW_KEY_LENGTH = 200
+
+MISSING = object()
+_SAFE_KEY = re.compile(r'^[\w.:,=@/-]+$')
+
+
+def _cache():
+    from django.core.cache import cache
+    return cache
+
+
+def is_shared(alias: str = 'default') -> bool:
+    """False for backends other processes cannot see (locmem, dummy): what they hold is per worker."""
+    from django.core.cache import caches
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+# --- Keys and versioned invalidation -----------------------------------------------------------
+
+def _version_key(namespace: str) -> str:
+    return f'ns:{namespace}'
+
+
+def namespace_version(namespace: str) -> int:
+    """Current version of `namespace` in the shared cache (created as 1 when missing)."""
+    cache = _cache()
+    value = cache.get(_version_key(namespace))
+    if value is None:
+        cache.add(_version_key(namespace), 1, None)
+        value = cache.get(_version_key(namespace)) or 1
+    return value
+
+
+def bump_namespace(*namespaces: str, on_commit: bool = True) -> None:
+    """Move every key made under `namespaces`; by default once the current transaction commits."""
+    def _bump():
+        cache = _cache()
+        for namespace in namespaces:
+            try:
+                cache.incr(_version_key(namespace))
+            except ValueError:
+                # Missing (evicted / never read): any fresh value differs from what readers cached
+                cache.set(_version_key(namespace), int(time.time()), None)
+
+    if on_commit:
+        from django.db import transaction
+        transaction.on_commit(_bump)
+    else:
+        _bump()
+
+
+def make_key(namespace: str, *parts, version: Optional[int] = None) -> str:
+    """'<namespace>:<version>:<parts>'; long or unsafe parts (memcached rules) are hashed."""
+    if version is None:
+        version = namespace_version(namespace)
+    raw = '|'.join(str(p) for p in parts)
+    if len(raw) > MAX_RAW_KEY_LENGTH or not _SAFE_KEY.match(raw or '-'):
+        raw = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f'{namespace}:{version}:{raw}'
+
+
+# --- Counters ---------------------------------------------------------------------------------
+
+class CacheStats:
+    """Thread-safe {name: {outcome: n}} counters; `hits` / `misses` give the hit rate."""
+
+    def __init__(self, label: str = 'Cache', log_every: int = 0):
+        self.label = label
+        self.log_every = log_every
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._lookups = 0
+
+    def count(self, name: str, outcome: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(name, {'hits': 0, 'misses': 0})
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome not in ('hits', 'misses'):
+                return
+            self._lookups += 1
+            log_now = self.log_every and self._lookups % self.log_every == 0
+        if log_now:
+            logger.info("%s: %s", self.label, self.snapshot())
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            out = {}
+            for name, c in self._counts.items():
+                total = c['hits'] + c['misses']
+                out[name] = dict(c, hit_rate=round(c['hits'] / total, 3) if total else 0.0)
+            return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._lookups = 0
+
+
+_STATS = CacheStats('Shared caches')
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """{cache name: {hits, misses, local_hits, errors, hit_rate}} for every TieredCache in this process."""
+    return _STATS.snapshot()
+
+
+# --- Shared rate limits -----------------------------------------------------------------------
+
+class SharedRateLimit:
+    """At most `capacity` acquisitions per fixed `window` seconds, counted across workers; never blocks.
+
+    Each attempt is one `incr` of '<name>:<window number>' in the shared cache and a
+    refused attempt is handed back with `decr`. Redis and memcached increment
+    atomically, so the limit is exact there; the file-based backend reads and rewrites,
+    so workers racing on it can overshoot (use it for development only). When the backend
+    errors or is per process (`is_shared()` is False), `fallback` (any object with
+    try_acquire(reserve) and tokens, e.g. a token bucket holding this worker's share) decides.
+    """
+
+    def __init__(self, name: str, capacity: int, window: float, fallback=None):
+        self.name = name
+        self.capacity = capacity
+        self.window = window
+        self.fallback = fallback
+
+    def _key(self) -> str:
+        return f'ratelimit:{self.name}:{int(time.time() // self.window)}'
+
+    def try_acquire(self, reserve: float = 0) -> bool:
+        """Take one call unless that would leave fewer than `reserve` in the current window."""
+        key = self._key()
+        timeout = int(self.window) + 60
+        try:
+            cache = _cache()
+            if self.fallback is not None and not is_shared():
+                return self.fallback.try_acquire(reserve)
+            cache.add(key, 0, timeout)
+            try:
+                used = cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(key, 1, timeout)
+                used = 1
+            if used + reserve <= self.capacity:
+                return True
+            cache.decr(key)
+            return False
+        except Exception as e:
+            logger.warning("Shared rate limit %s unavailable: %s", self.name, e)
+            return self.fallback.try_acquire(reserve) if self.fallback is not None else True
+
+    @property
+    def tokens(self) -> float:
+        """Calls left in the current window."""
+        try:
+            cache = _cache()
+            if self.fallback is not None and not is_shared():
+                return self.fallback.tokens
+            return self.capacity - (cache.get(self._key()) or 0)
+        except Exception as e:
+            logger.warning("Shared rate limit %s unavailable: %s", self.name, e)
+            return self.fallback.tokens if self.fallback is not None else self.capacity
+
+
+# --- Per-process front cache ------------------------------------------------------------------
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used map with an optional per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# --- Two-level cache --------------------------------------------------------------------------
+
+class TieredCache:
+    """Per-process LRU in front of the shared Django cache, under one versioned namespace."""
+
+    def __init__(self, namespace: str, maxsize: int = 1024, timeout: Optional[int] = DEFAULT_TIMEOUT,
+                 local_ttl: Optional[float] = 60):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local = LRUCache(maxsize, local_ttl)
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_version(self) -> Optional[int]:
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return self._version
+        with self._lock:
+            try:
+                version = namespace_version(self.namespace)
+            except Exception as e:
+                logger.warning("Cache version lookup for %s failed: %s", self.namespace, e)
+                _STATS.count(self.namespace, 'errors')
+                return self._version
+            if version != self._version:
+                self.local.clear()
+                self._version = version
+            self._checked_at = now
+            return version
+
+    def _shared_key(self, key, version) -> str:
+        return make_key(self.namespace, key, version=version)
+
+    def get(self, key, default=None):
+        value = self.get_or_set(key, None)
+        return default if value is MISSING else value
+
+    def get_or_set(self, key, builder: Optional[Callable[[], object]]):
+        """Cached value for `key`, computing and storing `builder()` on a miss (MISSING if no builder)."""
+        version = self._current_version()
+        value = self.local.get(key)
+        if value is not MISSING:
+            _STATS.count(self.namespace, 'hits')
+            _STATS.count(self.namespace, 'local_hits')
+            return value
+        if version is not None:
+            try:
+                wrapped = _cache().get(self._shared_key(key, version))
+            except Exception as e:
+                logger.warning("Shared cache read for %s failed: %s", self.namespace, e)
+                _STATS.count(self.namespace, 'errors')
+                wrapped = None
+            if wrapped is not None:
+                # Stored as a 1-tuple so a cached None is distinguishable from a miss
+                self.local.set(key, wrapped[0])
+                _STATS.count(self.namespace, 'hits')
+                return wrapped[0]
+        _STATS.count(self.namespace, 'misses')
+        if builder is None:
+            return MISSING
+        value = builder()
+        self.set(key, value, version=version)
+        return value
+
+    def set(self, key, value, version: Optional[int] = None) -> None:
+        self.local.set(key, value)
+        if version is None:
+            version = self._current_version()
+        if version is None:
+            return
+        try:
+            _cache().set(self._shared_key(key, version), (value,), self.timeout)
+        except Exception as e:
+            logger.warning("Shared cache write for %s failed: %s", self.namespace, e)
+            _STATS.count(self.namespace, 'errors')
+
+    def delete(self, key) -> None:
+        self.local.delete(key)
+        version = self._current_version()
+        if version is None:
+            return
+        try:
+            _cache().delete(self._shared_key(key, version))
+        except Exception as e:
+            logger.warning("Shared cache delete for %s failed: %s", self.namespace, e)
+
+    def invalidate(self) -> None:
+        """Drop every entry in every worker (other workers notice within VERSION_CHECK_SECONDS)."""
+        self.local.clear()
+        self._version = None
+        try:
+            bump_namespace(self.namespace, on_commit=False)
+        except Exception as e:
+            logger.warning("Cache invalidation for %s failed: %s", self.namespace, e)
+
+
+__all__ = [
+    "DEFAULT_TIMEOUT",
+    "MISSING",
+    "namespace_version",
+    "bump_namespace",
+    "make_key",
+    "CacheStats",
+    "stats",
+    "is_shared",
+    "SharedRateLimit",
+    "LRUCache",
+    "TieredCache",
+]
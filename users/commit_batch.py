@@ -0,0 +1,55 @@
+"""Ids collected during a transaction and processed once, when it commits.
+
+Signal handlers add the profiles whose derived rows (search documents, profile
+snapshots) must be rebuilt; a request touching twenty of a profile's tables rebuilds
+it once:
+
+    SEARCH_REFRESH = CommitBatch('search documents', refresh_search_documents)
+    SEARCH_REFRESH.add(therapist_id)   # flushed on commit (immediately in autocommit)
+
+Only the public `transaction.on_commit` API is used. Every add registers a callback
+(a cheap no-op once the batch is flushed) instead of inspecting the connection's
+pending callbacks: a rolled-back transaction drops its callbacks, and the ids it
+collected are flushed with the next commit on the thread rather than orphaned. The
+flush functions rebuild from the current rows, so flushing an extra id is harmless.
+"""
+import logging
+import threading
+from typing import Callable, Hashable, Set
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class CommitBatch:
+    """Per-thread set of items handed to `flush(items)` once the current transaction commits."""
+
+    def __init__(self, label: str, flush: Callable[[Set[Hashable]], object]):
+        self.label = label
+        self.flush = flush
+        self._local = threading.local()
+
+    def add(self, item: Hashable) -> None:
+        if not item:
+            return
+        items = getattr(self._local, 'items', None)
+        if items is None:
+            items = self._local.items = set()
+        items.add(item)
+        transaction.on_commit(self._run)
+
+    def _run(self) -> None:
+        items = getattr(self._local, 'items', None)
+        self._local.items = None
+        if not items:
+            return
+        try:
+            self.flush(items)
+        except Exception as e:
+            logger.warning("Failed to refresh %s %s: %s", self.label, sorted(items), e)
+
+
+__all__ = [
+    "CommitBatch",
+]
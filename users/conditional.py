@@ -0,0 +1,75 @@
+"""Conditional GET (ETag / Last-Modified) for pages rendered from versioned content.
+
+    @conditional_get(profile_validators, anonymous_only=True)
+    def public_therapist_profile(request, slug): ...
+
+The validator function receives the view's arguments and returns
+`(version_parts, last_modified)` from a cheap query (a snapshot row's `updated_at`,
+a blog aggregate, ...), or None when it cannot tell, in which case the view runs
+without validators. The ETag hashes the version parts together with CONDITIONAL_GET_SALT
+(bump per release so template changes are not hidden behind old validators).
+If the request's If-None-Match / If-Modified-Since match, a 304 is returned before
+the view, and its heavy queries, run.
+
+`anonymous_only` is for HTML pages whose chrome differs per signed-in user; JSON
+endpoints can validate every request. Validators that depend on session state
+(such as the visitor's ZIP) must include it in their version parts. Responses get
+`Vary: Cookie` and `Cache-Control: no-cache`, so shared caches must revalidate.
+"""
+import hashlib
+import logging
+from functools import wraps
+from typing import Callable, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+logger = logging.getLogger(__name__)
+
+
+def make_etag(parts: Iterable) -> str:
+    salt = getattr(settings, 'CONDITIONAL_GET_SALT', '')
+    raw = '|'.join(str(p) for p in (salt, *parts))
+    return quote_etag(hashlib.sha1(raw.encode('utf-8')).hexdigest())
+
+
+def conditional_get(validators: Callable[..., Optional[Tuple[Iterable, object]]], anonymous_only: bool = False):
+    """Emit ETag / Last-Modified from `validators` and answer matching requests with 304."""
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            user = getattr(request, 'user', None)
+            if anonymous_only and user is not None and user.is_authenticated:
+                return view(request, *args, **kwargs)
+            try:
+                version = validators(request, *args, **kwargs)
+            except Exception as e:
+                logger.warning("Conditional GET validators for %s failed: %s", view.__name__, e)
+                version = None
+            if version is None:
+                return view(request, *args, **kwargs)
+            parts, last_modified = version
+            etag = make_etag(parts)
+            last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                if not response.has_header('ETag'):
+                    response['ETag'] = etag
+                if last_modified_ts and not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(last_modified_ts)
+                patch_cache_control(response, no_cache=True)
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return inner
+    return decorator
+
+
+__all__ = [
+    "make_etag",
+    "conditional_get",
+]
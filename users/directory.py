@@ -0,0 +1,149 @@
+"""Directory candidate resolution and keyset (cursor) pagination.
+
+`resolve_candidates()` turns directory GET parameters (q, tier, facet filters) into
+a profile bitset over the facet index plus optional text relevance scores; the
+offset-paginated `/therapists/` page and the cursor mode share it.
+
+Cursor mode (`?cursor=` on /therapists/, empty for the first page) fetches each
+page with a seek key instead of an offset, so page N costs about the same as page 1
+and there is no 150-result cap:
+
+    distance    (miles, id)                nearest_after() over the ZIP / facet indexes
+    name        (last, first, id)          FacetIndex.seek('name')
+    recent      (newest login, id)         FacetIndex.seek('recent')  (no ZIP)
+    relevance   (-score, id)               text query, blended with proximity if a ZIP is set
+
+Cursors are opaque signed tokens carrying the sort mode, origin ZIP, last key and
+the number of rows on earlier pages (so impression ranks continue across pages); a
+cursor from another sort or ZIP is rejected with InvalidCursor.
+"""
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from django.core import signing
+
+PAGE_SIZE = 10
+CURSOR_SALT = 'users.directory.cursor'
+RELEVANCE_RADIUS_MILES = 150
+
+# (therapist_id, miles rounded to 0.1 or None, closest zip5 or None)
+Row = Tuple[int, Optional[float], Optional[str]]
+# rows: [Row]; next_cursor: token or None; facet_counts: {facet: {value: n}} or None; total: matching profiles;
+# offset: rows on earlier pages (the first row's rank is offset + 1)
+SeekPage = namedtuple('SeekPage', 'rows next_cursor facet_counts total offset')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def resolve_candidates(params):
+    """(facet_index, facet_filters, text_scores or None, within bitset or None) for directory params."""
+    from users.facet_index import bits_of, get_facet_index
+    from users.fulltext import search as fulltext_search
+    from users.search import parse_facet_filters, search_documents
+    query = (params.get('q') or '').strip()
+    tier = (params.get('tier') or '').strip()
+    facet_index = get_facet_index()
+    facet_filters = parse_facet_filters(params)
+    text_scores = None
+    within = None
+    if query:
+        text_scores = fulltext_search(query)
+        within = bits_of(text_scores)
+    if tier:
+        tier_bits = bits_of(search_documents(tier=tier).values_list('therapist_id', flat=True))
+        within = tier_bits if within is None else within & tier_bits
+    return facet_index, facet_filters, text_scores, within
+
+
+def sort_mode(sort_opt: str, origin, text_scores) -> str:
+    if sort_opt == 'name':
+        return 'name'
+    if text_scores is not None:
+        return 'relevance'
+    return 'distance' if origin else 'recent'
+
+
+def encode_cursor(mode: str, zip5: str, key, offset: int = 0) -> str:
+    # inf (no resolvable location) is not valid JSON; None stands in for it
+    key = [None if isinstance(k, float) and k == float('inf') else k for k in key]
+    return signing.dumps({'m': mode, 'z': zip5, 'k': key, 'o': offset}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token: str, mode: str, zip5: str) -> Tuple[Optional[Tuple], int]:
+    """(seek key, rows on earlier pages) from a cursor token; (None, 0) for the first page (empty token)."""
+    if not token:
+        return None, 0
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(data, dict) or data.get('m') != mode or data.get('z') != zip5 or not isinstance(data.get('k'), list):
+        raise InvalidCursor('Cursor does not match this sort or location')
+    offset = data.get('o')
+    return tuple(float('inf') if k is None else k for k in data['k']), offset if isinstance(offset, int) and offset >= 0 else 0
+
+
+def seek_page(params, user_zip: Optional[str], cursor: str = '', limit: int = PAGE_SIZE,
+              with_counts: bool = True) -> SeekPage:
+    """One keyset page of (therapist_id, miles, zip5) rows; facet counts only when `with_counts`."""
+    import re
+    from users.facet_index import ids_of
+    from users.geo import nearest_locations
+    from users.nearby import nearest_after
+    from users.zip_index import get_zip_index
+    from users.fulltext import blend_relevance_distance
+
+    facet_index, facet_filters, text_scores, within = resolve_candidates(params)
+    bits = facet_index.match(facet_filters, within=within)
+    facet_counts = facet_index.counts(facet_filters, within=within) if with_counts else None
+    m = re.match(r"\d{5}", user_zip or '')
+    zip5 = m.group(0) if m else ''
+    zip_index = get_zip_index()
+    origin = zip_index.coords(zip5) if zip5 else None
+    sort_opt = (params.get('sort') or 'distance').strip()
+    mode = sort_mode(sort_opt, origin, text_scores)
+    after, offset = decode_cursor(cursor, mode, zip5)
+    fetch = limit + 1  # one extra to know whether another page exists
+
+    keys: List[Tuple] = []
+    rows: List[Row] = []
+    if mode == 'distance':
+        hits = nearest_after(origin[0], origin[1], fetch, after=after, within=bits,
+                             facet_index=facet_index, zip_index=zip_index)
+        keys = [(d, tid) for d, tid, _ in hits]
+        rows = [(tid, round(d, 1) if d != float('inf') else None, z) for d, tid, z in hits]
+    elif mode in ('name', 'recent'):
+        keys = facet_index.seek(mode, after, bits, fetch)
+        rows = [(key[-1], None, None) for key in keys]
+        if origin and rows:
+            best = nearest_locations(origin[0], origin[1], facet_index.location_rows([r[0] for r in rows]), index=zip_index)
+            rows = [(tid, round(best[tid][0], 1), best[tid][1]) if tid in best else (tid, None, None) for tid, _, _ in rows]
+    else:
+        # Relevance needs every text match scored; the seek key avoids re-sorting on later pages
+        matched = ids_of(bits)
+        scores = {tid: text_scores.get(tid, 0.0) for tid in matched}
+        best = {}
+        if origin:
+            best = nearest_locations(origin[0], origin[1], facet_index.location_rows(matched), index=zip_index)
+            scores = blend_relevance_distance(scores, {tid: d for tid, (d, _) in best.items()}, RELEVANCE_RADIUS_MILES)
+        ordered = sorted((-score, tid) for tid, score in scores.items())
+        if after:
+            ordered = [k for k in ordered if k > after]
+        keys = ordered[:fetch]
+        rows = [(tid, round(best[tid][0], 1), best[tid][1]) if tid in best else (tid, None, None) for _, tid in keys]
+
+    next_cursor = encode_cursor(mode, zip5, keys[limit - 1], offset + limit) if len(keys) > limit else None
+    return SeekPage(rows[:limit], next_cursor, facet_counts, bits.bit_count(), offset)
+
+
+__all__ = [
+    "PAGE_SIZE",
+    "InvalidCursor",
+    "SeekPage",
+    "resolve_candidates",
+    "encode_cursor",
+    "decode_cursor",
+    "seek_page",
+]
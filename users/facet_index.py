@@ -0,0 +1,343 @@
+"""In-process facet bitmap index over listed TherapistSearchDocument rows.
+
+Every facet value (license 3, faith 7, ...) maps to a bitset of profile ids, held
+as a plain Python int where bit N is set when profile N carries the value. Python
+ints are arbitrary precision and store only as many machine words as the highest
+id needs, so for our dense, auto-increment profile ids they behave like an
+uncompressed-but-compact bitmap; AND/OR/popcount run in C over the whole set.
+
+Filters resolve by intersection (OR within a facet, AND across facets) and
+`counts()` returns "N matching" per option using disjunctive faceting: each
+facet's counts apply every *other* active facet, so options inside the facet the
+user is editing stay meaningful.
+
+Alongside the bitsets the index keeps the few per-profile fields the directory
+ranks by (location ZIPs, name, last login) so a filtered page is ranked without
+a database round trip. It is built lazily per process, patched when search
+documents are refreshed locally, and rebuilt when a periodic check sees the table
+change underneath it (writes from other workers, including logins).
+
+A published index is never mutated: writers patch a copy under _INDEX_LOCK and
+swap it in, so threads reading the previous one without the lock always see a
+consistent snapshot. The exceptions are the sort orders seek() memoizes and the
+login overlay: a login only moves one profile's recency key, so it is recorded in
+a small per-profile dict on the live index (dropping the memoized 'recent' order)
+instead of copying the index, which would also empty every users/nearby.py cache
+entry keyed on the index object.
+
+After patching for its own write, a worker adopts the table's new signature when
+it is exactly what that write produces, so the periodic check does not rebuild the
+index it just patched; any other difference (another worker's write) still does.
+"""
+from bisect import bisect_right
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+FACETS = (
+    'license', 'participant', 'age', 'therapy_type', 'specialty',
+    'gender', 'race', 'faith', 'lgbtqia', 'other_identity',
+)
+# How often (seconds) a worker compares its index against the table signature
+STALE_CHECK_SECONDS = 60
+
+
+def bits_of(ids: Iterable[int]) -> int:
+    bits = 0
+    for i in ids:
+        bits |= 1 << i
+    return bits
+
+
+def ids_of(bits: int) -> List[int]:
+    """Ascending ids of the set bits."""
+    if not bits:
+        return []
+    s = bin(bits)[:1:-1]  # least significant bit first
+    return [i for i, c in enumerate(s) if c == '1']
+
+
+class FacetIndex:
+    """Facet bitsets plus ranking fields for listed profiles. Use get_facet_index()."""
+
+    def __init__(self, rows: Iterable[Tuple] = ()):
+        self._bits: Dict[str, Dict[int, int]] = {f: {} for f in FACETS}
+        self._all = 0
+        # profile id -> (facets, zips, last_name, first_name, last_login)
+        self._docs: Dict[int, Tuple] = {}
+        # zip5 -> bitset of profiles with a location there (spatial prefilter for top-k nearest)
+        self._by_zip: Dict[str, int] = {}
+        # order name -> sorted seek keys, built on demand and dropped on any write
+        self._orders: Dict[str, List[Tuple]] = {}
+        # profile id -> last_login recorded after the row was indexed (set_last_login)
+        self._logins: Dict[int, object] = {}
+        self._logins_changed = 0
+        for row in rows:
+            self.add(*row)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def copy(self, keep_orders: Iterable[str] = ()) -> 'FacetIndex':
+        """Writable copy for a copy-on-write update; `keep_orders` the write will not affect."""
+        clone = FacetIndex()
+        clone._bits = {f: dict(values) for f, values in self._bits.items()}
+        clone._all = self._all
+        clone._docs = dict(self._docs)
+        clone._by_zip = dict(self._by_zip)
+        clone._logins = dict(self._logins)
+        clone._orders = {o: keys for o, keys in self._orders.items() if o in keep_orders}
+        return clone
+
+    def add(self, therapist_id: int, facets, locations, last_name='', first_name='', last_login=None) -> None:
+        if therapist_id in self._docs:
+            self.remove(therapist_id)
+        self._orders.clear()
+        self._logins.pop(therapist_id, None)
+        facets = facets or {}
+        bit = 1 << therapist_id
+        for facet in FACETS:
+            values = self._bits[facet]
+            for v in facets.get(facet) or ():
+                values[v] = values.get(v, 0) | bit
+        self._all |= bit
+        zips = tuple(z for z in ((loc or {}).get('zip') for loc in (locations or ())) if z)
+        self._docs[therapist_id] = (facets, zips, last_name or '', first_name or '', last_login)
+        by_zip = self._by_zip
+        for z in zips:
+            z5 = str(z)[:5]
+            by_zip[z5] = by_zip.get(z5, 0) | bit
+
+    def remove(self, therapist_id: int) -> None:
+        doc = self._docs.pop(therapist_id, None)
+        if doc is None:
+            return
+        self._orders.clear()
+        self._logins.pop(therapist_id, None)
+        mask = ~(1 << therapist_id)
+        for facet in FACETS:
+            values = self._bits[facet]
+            for v in doc[0].get(facet) or ():
+                if v in values:
+                    values[v] &= mask
+                    if not values[v]:
+                        del values[v]
+        by_zip = self._by_zip
+        for z in doc[1]:
+            z5 = str(z)[:5]
+            if z5 in by_zip:
+                by_zip[z5] &= mask
+                if not by_zip[z5]:
+                    del by_zip[z5]
+        self._all &= mask
+
+    def set_last_login(self, therapist_id: int, last_login) -> bool:
+        """Record a login in place (safe on the published index); False when the profile is not listed."""
+        if therapist_id not in self._docs:
+            return False
+        self._logins[therapist_id] = last_login
+        self._logins_changed += 1
+        self._orders.pop('recent', None)
+        return True
+
+    def last_login(self, therapist_id: int):
+        doc = self._docs[therapist_id]
+        return self._logins.get(therapist_id, doc[4])
+
+    def _facet_bits(self, facet: str, values: Iterable[int]) -> int:
+        table = self._bits.get(facet, {})
+        bits = 0
+        for v in values:
+            bits |= table.get(v, 0)
+        return bits
+
+    def match(self, filters: Optional[Dict[str, List[int]]] = None, within: Optional[int] = None) -> int:
+        """Bitset of profiles matching every facet filter (and `within`, when given)."""
+        bits = self._all if within is None else self._all & within
+        for facet, values in (filters or {}).items():
+            if values:
+                bits &= self._facet_bits(facet, values)
+        return bits
+
+    def counts(self, filters: Optional[Dict[str, List[int]]] = None, within: Optional[int] = None) -> Dict[str, Dict[int, int]]:
+        """{facet: {value_id: matching profiles}} with every other active facet applied."""
+        filters = {f: v for f, v in (filters or {}).items() if v}
+        base = self._all if within is None else self._all & within
+        per_facet = {f: self._facet_bits(f, v) for f, v in filters.items()}
+        out: Dict[str, Dict[int, int]] = {}
+        for facet in FACETS:
+            scope = base
+            for other, bits in per_facet.items():
+                if other != facet:
+                    scope &= bits
+            out[facet] = {v: (scope & bits).bit_count() for v, bits in self._bits[facet].items()}
+        return out
+
+    def location_rows(self, ids: Iterable[int]) -> List[Tuple[int, str]]:
+        """(profile_id, zip) pairs for the batched distance kernel."""
+        docs = self._docs
+        return [(tid, z) for tid in ids for z in docs[tid][1]] if docs else []
+
+    def zips_of(self, therapist_id: int) -> Tuple[str, ...]:
+        doc = self._docs.get(therapist_id)
+        return doc[1] if doc else ()
+
+    def by_zip(self) -> Dict[str, int]:
+        """{zip5: bitset of listed profiles with a location in that ZIP}. Treat as read-only."""
+        return self._by_zip
+
+    def seek_key(self, order: str, therapist_id: int, doc) -> Tuple:
+        """Sort key used by seek(): 'name' -> (last, first, id); 'recent' -> newest login first, never-logged-in last."""
+        if order == 'name':
+            return (doc[2], doc[3], therapist_id)
+        last_login = self._logins.get(therapist_id, doc[4])
+        return (0, -last_login.timestamp(), therapist_id) if last_login is not None else (1, 0.0, therapist_id)
+
+    def seek(self, order: str, after: Optional[Tuple], bits: int, limit: int) -> List[Tuple]:
+        """The next `limit` seek keys strictly after `after` whose profile is in `bits` (keyset pagination)."""
+        keys = self._orders.get(order)
+        if keys is None:
+            logins_changed = self._logins_changed
+            keys = sorted(self.seek_key(order, tid, doc) for tid, doc in self._docs.items())
+            # A login recorded meanwhile already dropped this order; do not memoize the old one
+            if order == 'name' or logins_changed == self._logins_changed:
+                self._orders[order] = keys
+        out = []
+        for i in range(bisect_right(keys, tuple(after)) if after else 0, len(keys)):
+            key = keys[i]
+            if bits >> key[-1] & 1:
+                out.append(key)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def order_by_name(self, ids: Iterable[int]) -> List[int]:
+        docs = self._docs
+        return sorted(ids, key=lambda tid: (docs[tid][2], docs[tid][3]))
+
+    def order_by_recent(self, ids: Iterable[int]) -> List[int]:
+        logins = {tid: self.last_login(tid) for tid in ids}
+        with_login = sorted((tid for tid in ids if logins[tid] is not None), key=lambda tid: logins[tid], reverse=True)
+        return with_login + [tid for tid in ids if logins[tid] is None]
+
+
+_INDEX: Optional[FacetIndex] = None
+_INDEX_SIGNATURE = None
+_INDEX_CHECKED_AT = 0.0
+_INDEX_LOCK = Lock()
+
+
+def _signature():
+    from django.db.models import Count, Max
+    from users.models_search import TherapistSearchDocument
+    # last_login is written with update() on login (no updated_at bump), so it is tracked on its own
+    agg = TherapistSearchDocument.objects.filter(listed=True).aggregate(
+        n=Count('pk'), ts=Max('updated_at'), login=Max('last_login'))
+    return agg['n'], agg['ts'], agg['login']
+
+
+def _latest(*values):
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
+
+
+def _advance_signature(count: int, updated_at=None, last_login=None) -> None:
+    """Adopt the table's signature after patching the live index for this worker's own write, but only
+    when it is exactly what that write produces (call under _INDEX_LOCK)."""
+    global _INDEX_SIGNATURE
+    if _INDEX_SIGNATURE is None:
+        return
+    _, old_ts, old_login = _INDEX_SIGNATURE
+    expected = (count, _latest(old_ts, updated_at), _latest(old_login, last_login))
+    try:
+        if _signature() == expected:
+            _INDEX_SIGNATURE = expected
+    except Exception as e:
+        logger.warning("Facet index signature check failed: %s", e)
+
+
+def _build_index() -> FacetIndex:
+    from users.models_search import TherapistSearchDocument
+    rows = (TherapistSearchDocument.objects.filter(listed=True)
+            .values_list('therapist_id', 'facets', 'locations', 'last_name', 'first_name', 'last_login')
+            .iterator(chunk_size=2000))
+    return FacetIndex(rows)
+
+
+def get_facet_index() -> FacetIndex:
+    """Return the process-wide FacetIndex, building or refreshing it when needed."""
+    global _INDEX, _INDEX_SIGNATURE, _INDEX_CHECKED_AT
+    now = time.monotonic()
+    index = _INDEX
+    if index is not None and now - _INDEX_CHECKED_AT < STALE_CHECK_SECONDS:
+        return index
+    with _INDEX_LOCK:
+        if _INDEX is not None and now - _INDEX_CHECKED_AT < STALE_CHECK_SECONDS:
+            return _INDEX
+        signature = _signature()
+        _INDEX_CHECKED_AT = now
+        if _INDEX is not None and signature == _INDEX_SIGNATURE:
+            return _INDEX
+        _INDEX = _build_index()
+        _INDEX_SIGNATURE = signature
+        return _INDEX
+
+
+def invalidate_facet_index() -> None:
+    global _INDEX
+    with _INDEX_LOCK:
+        _INDEX = None
+
+
+def index_documents_written(docs, removed_ids: Iterable[int] = ()) -> None:
+    """Patch the live index after search documents were (re)written or dropped in this process."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            return
+        changed = set(removed_ids) | {d.therapist_id for d in docs}
+        zips = {z for tid in changed for z in _INDEX.zips_of(tid)}
+        index = _INDEX.copy()
+        for tid in removed_ids:
+            index.remove(tid)
+        for d in docs:
+            if d.listed:
+                index.add(d.therapist_id, d.facets, d.locations, d.last_name, d.first_name, d.last_login)
+            else:
+                index.remove(d.therapist_id)
+        zips |= {z for tid in changed for z in index.zips_of(tid)}
+        _INDEX = index
+        listed = [d for d in docs if d.listed]
+        _advance_signature(len(index), _latest(*(d.updated_at for d in listed)),
+                           _latest(*(d.last_login for d in listed)))
+    # Drop cached nearest-therapist lists around the old and new locations
+    from users.nearby import invalidate_area
+    invalidate_area(changed, zips)
+
+
+def index_last_login(user_id: int, last_login) -> None:
+    """Move one listed profile's recency key in place (no copy; see the module docstring)."""
+    if _INDEX is None:
+        return
+    from users.models_search import TherapistSearchDocument
+    tid = TherapistSearchDocument.objects.filter(user_id=user_id).values_list('therapist_id', flat=True).first()
+    if not tid:
+        return
+    with _INDEX_LOCK:
+        if _INDEX is not None and _INDEX.set_last_login(tid, last_login):
+            _advance_signature(len(_INDEX), last_login=last_login)
+
+
+__all__ = [
+    "FACETS",
+    "FacetIndex",
+    "bits_of",
+    "ids_of",
+    "get_facet_index",
+    "invalidate_facet_index",
+    "index_documents_written",
+    "index_last_login",
+]
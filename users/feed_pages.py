@@ -0,0 +1,303 @@
+"""Cursor-paginated members feed and lazily loaded comments.
+
+The feed page used to load the newest 100 visible posts with every comment (and its
+author), reaction and media row prefetched, so one busy thread inflated the whole
+page and anything older than post 100 was unreachable. Now:
+
+  * `feed_page` reads FEED_PAGE_SIZE posts with keyset pagination on
+    (created_at, post id) from the shared public/members index and the user's
+    FeedTimelineEntry rows (users/feed_timeline.py), merges the two and returns an
+    opaque cursor for the next page, so page N costs the same as page 1 (no OFFSET);
+  * posts are hydrated with their media, reaction counts, a comment count and only
+    the latest PREVIEW_COMMENTS top-level comments, picked per post with a
+    ROW_NUMBER() window in one query;
+  * `comment_page` pages a post's top-level comments (newest first) or one
+    comment's replies (oldest first, the reading order of a thread) the same way,
+    for the "View earlier comments" / "View replies" links.
+
+Every request therefore reads a bounded number of rows however busy the feed or a
+thread is.
+
+    members_feed                            first page, rendered
+    /users/api/feed/?cursor=...             next pages: {"posts": [...], "html": "...", "next_cursor": ...}
+    /users/api/feed/<id>/comments/?parent=&cursor=
+"""
+import base64
+import binascii
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+logger = logging.getLogger(__name__)
+
+FEED_PAGE_SIZE = 20
+COMMENT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+PREVIEW_COMMENTS = 2
+
+
+# --- Cursors --------------------------------------------------------------------------------
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    raw = f'{created_at.isoformat()}|{pk}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """(created_at, pk) of the last row already shown; None for the first page. ValueError when malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        stamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(stamp), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'invalid cursor: {e}')
+
+
+def clamp_limit(value, default: int) -> int:
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+# --- Feed -----------------------------------------------------------------------------------
+
+def search_filter(query: str) -> Q:
+    """FeedPost predicate for the feed search box."""
+    return (
+        Q(content__icontains=query) |
+        Q(title__icontains=query) |
+        Q(author__first_name__icontains=query) |
+        Q(author__last_name__icontains=query) |
+        Q(author__username__icontains=query) |
+        Q(repost_of__content__icontains=query) |
+        Q(repost_of__title__icontains=query)
+    )
+
+
+def feed_page(user, cursor: Optional[str] = None, limit: int = FEED_PAGE_SIZE, query: str = '',
+              sort: str = 'recent') -> Tuple[List[Any], Optional[str]]:
+    """One page of the user's feed, newest first, and the cursor of the next page (None at the end).
+
+    sort='top' orders the page by reaction total; pages still follow time order.
+    """
+    from users.feed_timeline import shared_posts
+    from users.models import FeedPost
+    from users.models_feed import FeedTimelineEntry
+    after = decode_cursor(cursor)
+    shared = shared_posts()
+    entries = FeedTimelineEntry.objects.filter(user=user)
+    if after is not None:
+        created_at, post_id = after
+        # created_at__lte gives the planner a range to seek; the OR only breaks ties
+        shared = shared.filter(Q(created_at__lt=created_at) | Q(id__lt=post_id), created_at__lte=created_at)
+        entries = entries.filter(Q(created_at__lt=created_at) | Q(post_id__lt=post_id), created_at__lte=created_at)
+    if query:
+        shared = shared.filter(search_filter(query))
+        entries = entries.filter(post_id__in=FeedPost.objects.filter(search_filter(query)).values('id'))
+    # Each stream is already newest first: the page is the top `limit` of their merge
+    rows = heapq.merge(
+        shared.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit + 1],
+        entries.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit + 1],
+        reverse=True,
+    )
+    rows = list(itertools.islice(rows, limit + 1))
+    next_cursor = encode_cursor(*rows[limit - 1]) if len(rows) > limit else None
+    posts = hydrate_posts([post_id for _, post_id in rows[:limit]])
+    if sort == 'top':
+        posts.sort(key=lambda p: (p.reaction_counts.get('total', 0), p.created_at), reverse=True)
+    return posts, next_cursor
+
+
+def hydrate_posts(post_ids: List[int]) -> List[Any]:
+    """Posts in `post_ids` order with everything the feed card shows, in a fixed number of queries."""
+    from users.models import FeedPost, FeedReaction
+    if not post_ids:
+        return []
+    by_id = {
+        p.id: p for p in FeedPost.objects.filter(id__in=post_ids)
+        .select_related('author', 'repost_of', 'repost_of__author')
+        .prefetch_related('media', 'repost_of__media')
+    }
+    posts = [by_id[pid] for pid in post_ids if pid in by_id]
+
+    # Per-reaction counts, initialized for ALL defined reaction choices
+    all_reactions = list(dict(FeedReaction.REACTION_CHOICES).keys())
+    rc_map = {p.id: dict({r: 0 for r in all_reactions}, total=0) for p in posts}
+    counts = FeedReaction.objects.filter(post_id__in=post_ids).values('post_id', 'reaction').annotate(c=Count('id'))
+    for row in counts:
+        pc = rc_map.get(row['post_id'])
+        if pc is not None and row['reaction'] in pc:
+            pc[row['reaction']] = row['c'] or 0
+            pc['total'] += row['c'] or 0
+
+    comment_counts, previews = _comment_previews(post_ids)
+    for p in posts:
+        p.reaction_counts = rc_map[p.id]
+        total, top_level = comment_counts.get(p.id, (0, 0))
+        p.comment_count = total
+        # Oldest of the preview first, like a thread
+        p.latest_comments = list(reversed(previews.get(p.id, [])))
+        p.earlier_comment_count = max(0, top_level - len(p.latest_comments))
+        # Where "View earlier comments" continues: just past the oldest preview comment
+        oldest = p.latest_comments[0] if p.latest_comments else None
+        p.comments_cursor = encode_cursor(oldest.created_at, oldest.id) if oldest else None
+    _attach_authors(posts)
+    return posts
+
+
+def _comment_previews(post_ids: List[int]):
+    from users.models import FeedComment
+    counts = {
+        row['post_id']: (row['total'], row['top_level'])
+        for row in FeedComment.objects.filter(post_id__in=post_ids).values('post_id')
+        .annotate(total=Count('id'), top_level=Count('id', filter=Q(parent__isnull=True)))
+    }
+    latest = list(
+        FeedComment.objects.filter(post_id__in=post_ids, parent__isnull=True)
+        .annotate(rank=Window(RowNumber(), partition_by=[F('post_id')], order_by=[F('created_at').desc(), F('id').desc()]))
+        .filter(rank__lte=PREVIEW_COMMENTS)
+        .select_related('author')
+        .order_by('post_id', '-created_at', '-id')
+    )
+    _attach_reply_counts(latest)
+    previews: Dict[int, list] = {}
+    for c in latest:
+        previews.setdefault(c.post_id, []).append(c)
+    return counts, previews
+
+
+def _attach_reply_counts(comments) -> None:
+    from users.models import FeedComment
+    ids = [c.id for c in comments]
+    replies = dict(
+        FeedComment.objects.filter(parent_id__in=ids).values('parent_id').annotate(c=Count('id')).values_list('parent_id', 'c')
+    ) if ids else {}
+    for c in comments:
+        c.reply_count = replies.get(c.id, 0)
+
+
+def _display_name(profile, user) -> str:
+    first = (getattr(profile, 'first_name', '') or getattr(user, 'first_name', '') or '').strip()
+    last = (getattr(profile, 'last_name', '') or getattr(user, 'last_name', '') or '').strip()
+    return (f"{first} {last}".strip()) or (getattr(user, 'username', '') or getattr(user, 'email', ''))
+
+
+def _avatar_url(profile) -> Optional[str]:
+    photo = getattr(profile, 'profile_photo', None) if profile else None
+    try:
+        return photo.url if photo else None
+    except Exception:
+        return None
+
+
+def _attach_authors(posts) -> None:
+    """Author (and original author for reposts) avatar, display name and license on each post."""
+    try:
+        from users.models_profile import TherapistProfile
+        author_ids = {p.author_id for p in posts} | {p.repost_of.author_id for p in posts if p.repost_of_id and p.repost_of}
+        profiles = {pr.user_id: pr for pr in TherapistProfile.objects.filter(user_id__in=author_ids).select_related('license_type')}
+    except Exception as e:
+        logger.warning("Failed to load feed author profiles: %s", e)
+        profiles = {}
+    for p in posts:
+        av = profiles.get(p.author_id)
+        p.author_avatar_url = _avatar_url(av)
+        p.author_display_name = _display_name(av, p.author)
+        p.author_license_type = getattr(getattr(av, 'license_type', None), 'name', None)
+        p.author_license_type_short = getattr(getattr(av, 'license_type', None), 'short_description', None)
+        if p.repost_of_id and p.repost_of:
+            pav = profiles.get(p.repost_of.author_id)
+            p.orig_author_avatar_url = _avatar_url(pav)
+            p.orig_author_display_name = _display_name(pav, p.repost_of.author)
+            p.orig_author_license_type = getattr(getattr(pav, 'license_type', None), 'name', None)
+            p.orig_author_license_type_short = getattr(getattr(pav, 'license_type', None), 'short_description', None)
+
+
+# --- Comments -------------------------------------------------------------------------------
+
+def comment_page(post_id: int, parent_id: Optional[int] = None, cursor: Optional[str] = None,
+                 limit: int = COMMENT_PAGE_SIZE) -> Tuple[List[Any], Optional[str]]:
+    """Top-level comments of a post (newest first) or replies to one comment (oldest first), one page at a time."""
+    from users.models import FeedComment
+    after = decode_cursor(cursor)
+    qs = FeedComment.objects.filter(post_id=post_id, parent_id=parent_id).select_related('author')
+    if parent_id is None:
+        if after is not None:
+            qs = qs.filter(Q(created_at__lt=after[0]) | Q(created_at=after[0], id__lt=after[1]))
+        qs = qs.order_by('-created_at', '-id')
+    else:
+        if after is not None:
+            qs = qs.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1]))
+        qs = qs.order_by('created_at', 'id')
+    comments = list(qs[:limit + 1])
+    next_cursor = encode_cursor(comments[limit - 1].created_at, comments[limit - 1].id) if len(comments) > limit else None
+    comments = comments[:limit]
+    _attach_reply_counts(comments)
+    return comments, next_cursor
+
+
+# --- JSON -----------------------------------------------------------------------------------
+
+def serialize_comment(c) -> Dict[str, Any]:
+    return {
+        'id': c.id,
+        'parent_id': c.parent_id,
+        'author_id': c.author_id,
+        'author': f"{c.author.first_name} {c.author.last_name}".strip() or c.author.username,
+        'content': c.content,
+        'created_at': c.created_at.isoformat(),
+        'reply_count': getattr(c, 'reply_count', 0),
+    }
+
+
+def serialize_post(p) -> Dict[str, Any]:
+    base = p.repost_of if p.repost_of_id and p.repost_of else p
+    media = []
+    for m in base.media.all():
+        try:
+            media.append({'type': m.type, 'url': m.file.url})
+        except Exception:
+            continue
+    return {
+        'id': p.id,
+        'author_id': p.author_id,
+        'author': p.author_display_name,
+        'author_avatar_url': p.author_avatar_url,
+        'author_license_type': p.author_license_type,
+        'title': p.title,
+        'content': p.content,
+        'created_at': p.created_at.isoformat(),
+        'visibility': p.visibility,
+        'post_type': p.post_type,
+        'repost_of': p.repost_of_id,
+        'media': media,
+        'reaction_counts': p.reaction_counts,
+        'comment_count': p.comment_count,
+        'earlier_comment_count': p.earlier_comment_count,
+        'comments_cursor': p.comments_cursor,
+        'latest_comments': [serialize_comment(c) for c in p.latest_comments],
+    }
+
+
+__all__ = [
+    "FEED_PAGE_SIZE",
+    "COMMENT_PAGE_SIZE",
+    "PREVIEW_COMMENTS",
+    "encode_cursor",
+    "decode_cursor",
+    "clamp_limit",
+    "search_filter",
+    "feed_page",
+    "hydrate_posts",
+    "comment_page",
+    "serialize_comment",
+    "serialize_post",
+]
@@ -0,0 +1,199 @@
+"""Materialized per-user feed timelines (fan-out on write) for connections-only posts.
+
+A member sees a FeedPost when it is public or members-only, when they wrote it, or
+when it is connections-only and its author is an accepted connection. The feed and
+the new-post poll used to evaluate that per request: collect the viewer's
+connection ids, then OR three predicates over the whole FeedPost table.
+
+Public and members posts are the same for every member, so they are not copied
+per user: readers take them from FeedPost's `feedpost_recent_idx`, a
+(created_at, id, visibility) index scanned newest first. Only connections-only
+posts, whose audience is the author and their connections, are materialized in
+FeedTimelineEntry (users/models_feed.py), one (user, post, created_at) row each.
+Readers merge the two streams:
+
+    a feed page (users/feed_pages.py)  two range scans, (user, -created_at, -post) and the shared index
+    new_post_count(user, since_id)     two range scans, (user, post) and FeedPost ids
+
+Rows are written on commit by signal handlers (users/signals.py):
+
+  * post created / visibility changed -> fan_out_post: a connections post goes to
+    the author and their connections (and leaves users who are no longer among
+    them); a public or members post drops its rows;
+  * connection accepted / removed     -> sync_connection: each side gains or loses
+    the other's connections-only posts.
+
+A post's fan-out is bounded by its author's connections, so it stays in the
+request's on_commit; sign-ups write nothing (a new user has no connections).
+Deleting a post or user cascades to its rows. `manage.py backfill_feed_timelines`
+adds missing rows without removing any; `manage.py repair_feed_timelines` also
+removes rows the rules no longer allow (both take --users).
+"""
+import logging
+from typing import Iterable, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_VISIBILITIES = ('public', 'members')
+BATCH_SIZE = 1000
+
+
+def connected_user_ids(user_id: int) -> Set[int]:
+    """Ids of users with an accepted connection to `user_id` (either direction)."""
+    from users.models import Connection
+    pairs = Connection.objects.filter(
+        Q(requester_id=user_id) | Q(addressee_id=user_id), status='accepted'
+    ).values_list('requester_id', 'addressee_id')
+    ids = {a for pair in pairs for a in pair if a}
+    ids.discard(user_id)
+    return ids
+
+
+def visible_posts(user_id: int):
+    """FeedPost queryset of everything `user_id` may see, evaluated from the rules (the slow path)."""
+    from users.models import FeedPost
+    return FeedPost.objects.filter(
+        Q(visibility__in=PUBLIC_VISIBILITIES) |
+        Q(visibility='connections', author_id__in=list(connected_user_ids(user_id))) |
+        Q(author_id=user_id)
+    )
+
+
+def shared_posts():
+    """Public and members posts: every member's feed reads these directly (feedpost_recent_idx)."""
+    from users.models import FeedPost
+    return FeedPost.objects.filter(visibility__in=PUBLIC_VISIBILITIES)
+
+
+def timeline_posts(user_id: int):
+    """Connections-only posts `user_id` may see: the ones their FeedTimelineEntry rows should hold."""
+    from users.models import FeedPost
+    authors = list(connected_user_ids(user_id)) + [user_id]
+    return FeedPost.objects.filter(visibility='connections', author_id__in=authors)
+
+
+def can_see(user_id: int, post_id: int) -> bool:
+    from users.models_feed import FeedTimelineEntry
+    return (shared_posts().filter(pk=post_id).exists()
+            or FeedTimelineEntry.objects.filter(user_id=user_id, post_id=post_id).exists())
+
+
+def _insert(rows: Iterable[Tuple[int, int, object]]) -> int:
+    """Bulk-insert (user_id, post_id, created_at) rows in batches, skipping ones that already exist."""
+    from users.models_feed import FeedTimelineEntry
+    written = 0
+    batch = []
+    for user_id, post_id, created_at in rows:
+        batch.append(FeedTimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at))
+        if len(batch) >= BATCH_SIZE:
+            FeedTimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+    if batch:
+        FeedTimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def fan_out_post(post_id: int) -> int:
+    """Make the post's timeline rows match its current visibility. Returns rows offered for insert."""
+    from users.models import FeedPost
+    from users.models_feed import FeedTimelineEntry
+    post = FeedPost.objects.filter(pk=post_id).values('author_id', 'visibility', 'created_at').first()
+    if post is None:
+        return 0
+    with transaction.atomic():
+        if post['visibility'] in PUBLIC_VISIBILITIES:
+            # Read from the shared index by everyone; per-user rows would only duplicate it
+            FeedTimelineEntry.objects.filter(post_id=post_id).delete()
+            return 0
+        audience = connected_user_ids(post['author_id']) | {post['author_id']}
+        FeedTimelineEntry.objects.filter(post_id=post_id).exclude(user_id__in=audience).delete()
+        return _insert((uid, post_id, post['created_at']) for uid in audience)
+
+
+def sync_connection(user_a: int, user_b: int) -> None:
+    """Give each side the other's connections-only posts if they are connected, else take them away."""
+    from users.models import FeedPost
+    from users.models_feed import FeedTimelineEntry
+    connected = user_b in connected_user_ids(user_a)
+    with transaction.atomic():
+        for viewer, author in ((user_a, user_b), (user_b, user_a)):
+            if connected:
+                posts = FeedPost.objects.filter(author_id=author, visibility='connections').values_list('id', 'created_at')
+                _insert((viewer, pid, created_at) for pid, created_at in posts.iterator(chunk_size=BATCH_SIZE))
+            else:
+                FeedTimelineEntry.objects.filter(
+                    user_id=viewer, post__author_id=author, post__visibility='connections'
+                ).delete()
+
+
+def backfill_user(user_id: int) -> int:
+    """Insert every connections-only post `user_id` may see that is missing from their timeline. Returns rows offered."""
+    posts = timeline_posts(user_id).order_by().values_list('id', 'created_at')
+    with transaction.atomic():
+        return _insert((user_id, pid, created_at) for pid, created_at in posts.iterator(chunk_size=BATCH_SIZE))
+
+
+def repair_user(user_id: int, dry_run: bool = False) -> Tuple[int, int]:
+    """Reconcile one timeline with the rules. Returns (rows added, rows removed)."""
+    from users.models_feed import FeedTimelineEntry
+    expected = dict(timeline_posts(user_id).order_by().values_list('id', 'created_at'))
+    actual = set(FeedTimelineEntry.objects.filter(user_id=user_id).values_list('post_id', flat=True))
+    missing = [pid for pid in expected if pid not in actual]
+    extra = [pid for pid in actual if pid not in expected]
+    if not dry_run:
+        with transaction.atomic():
+            _insert((user_id, pid, expected[pid]) for pid in missing)
+            for start in range(0, len(extra), BATCH_SIZE):
+                FeedTimelineEntry.objects.filter(user_id=user_id, post_id__in=extra[start:start + BATCH_SIZE]).delete()
+    return len(missing), len(extra)
+
+
+# --- Signal entry points (applied once the current transaction commits) ---------------------
+
+def _on_commit(func, *args) -> None:
+    def run():
+        try:
+            func(*args)
+        except Exception as e:
+            # The next repair_feed_timelines run restores the rows
+            logger.warning("Feed timeline update %s%s failed: %s", func.__name__, args, e)
+    transaction.on_commit(run)
+
+
+def schedule_fan_out(post_id: int) -> None:
+    _on_commit(fan_out_post, post_id)
+
+
+def schedule_connection_sync(user_a: int, user_b: int) -> None:
+    _on_commit(sync_connection, user_a, user_b)
+
+
+# --- Reads ----------------------------------------------------------------------------------
+
+def new_post_count(user, since_id: Optional[int]) -> int:
+    from users.models_feed import FeedTimelineEntry
+    since_id = since_id or 0
+    return (shared_posts().filter(id__gt=since_id).count()
+            + FeedTimelineEntry.objects.filter(user=user, post_id__gt=since_id).count())
+
+
+__all__ = [
+    "PUBLIC_VISIBILITIES",
+    "connected_user_ids",
+    "visible_posts",
+    "shared_posts",
+    "timeline_posts",
+    "can_see",
+    "fan_out_post",
+    "sync_connection",
+    "backfill_user",
+    "repair_user",
+    "schedule_fan_out",
+    "schedule_connection_sync",
+    "new_post_count",
+]
@@ -0,0 +1,259 @@
+"""Pluggable full-text search over TherapistSearchDocument.
+
+The search document carries four weighted text columns:
+
+    name_text       (A / highest)  first + last name
+    license_text    (B)            license type names and descriptions
+    place_text      (C)            cities, state abbreviations and full state names
+    statement_text  (D / lowest)   personal statements, intro statement, credentials note
+
+Backends (picked from the default connection's vendor):
+
+    postgresql  `search_vector` tsvector column, GENERATED from the weighted columns,
+                with a GIN index; ranked with ts_rank_cd.
+    sqlite      FTS5 external-content table kept in sync by triggers on the document
+                table; ranked with bm25() using per-column weights.
+    other       LIKE fallback over the same columns (no ranking).
+
+Every query term is matched as a prefix ("anx" finds "anxiety") and all terms must
+match. `search()` returns {therapist_id: score} with scores normalised to 0..1
+(higher is more relevant) so callers can blend relevance with distance.
+
+These structures live outside the models, so migrations do not create them:
+`ensure_after_migrate` (a post_migrate receiver, see users/apps.py) recreates them
+idempotently after every `migrate`. That also covers SQLite rebuilding the document
+table on most ALTERs, which drops its triggers. `manage.py reindex_fulltext`
+recreates and repopulates them by hand.
+"""
+import logging
+import re
+from typing import Dict
+
+from django.db import DEFAULT_DB_ALIAS, connection
+
+logger = logging.getLogger(__name__)
+
+DOC_TABLE = 'users_therapistsearchdocument'
+FTS_TABLE = 'users_therapistsearchdocument_fts'
+TEXT_COLUMNS = ('name_text', 'license_text', 'place_text', 'statement_text')
+# Relative column weights (name match beats license beats place beats statement)
+SQLITE_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+PG_CONFIG = 'english'
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def query_terms(query: str):
+    return _TERM_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+class FallbackBackend:
+    name = 'like'
+
+    def ensure_schema(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query: str, limit=None) -> Dict[int, float]:
+        from django.db.models import Q
+        from users.models_search import TherapistSearchDocument
+        terms = query_terms(query)
+        if not terms:
+            return {}
+        qs = TherapistSearchDocument.objects.all()
+        for term in terms:
+            any_col = Q()
+            for col in TEXT_COLUMNS:
+                any_col |= Q(**{f"{col}__icontains": term})
+            qs = qs.filter(any_col)
+        ids = qs.values_list('therapist_id', flat=True)
+        if limit:
+            ids = ids[:limit]
+        return {tid: 1.0 for tid in ids}
+
+
+class SQLiteFTS5Backend(FallbackBackend):
+    name = 'sqlite-fts5'
+
+    def ensure_schema(self):
+        cols = ', '.join(TEXT_COLUMNS)
+        new_cols = ', '.join(f'new.{c}' for c in TEXT_COLUMNS)
+        old_cols = ', '.join(f'old.{c}' for c in TEXT_COLUMNS)
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({cols}, "
+            f"content='{DOC_TABLE}', content_rowid='therapist_id', tokenize='porter unicode61')",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOC_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.therapist_id, {new_cols}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOC_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.therapist_id, {old_cols}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {DOC_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.therapist_id, {old_cols}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.therapist_id, {new_cols}); END",
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+                [FTS_TABLE, f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au'],
+            )
+            complete = cursor.fetchone()[0] == 4
+            for sql in statements:
+                cursor.execute(sql)
+            if not complete:
+                # New table or lost triggers (table remade by a migration): the index no longer
+                # mirrors the content table, and 'delete' triggers against it would corrupt it
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    def rebuild(self):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    def search(self, query: str, limit=None) -> Dict[int, float]:
+        terms = query_terms(query)
+        if not terms:
+            return {}
+        # Quoted prefix terms, implicitly AND-ed; quoting neutralises FTS5 operators in user input
+        match = ' '.join(f'"{t}"*' for t in terms)
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        sql = (f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS rank FROM {FTS_TABLE} "
+               f"WHERE {FTS_TABLE} MATCH %s ORDER BY rank")
+        params = [match]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(int(limit))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        if not rows:
+            return {}
+        # bm25 is negative, more negative = better; map onto 0..1 relative to the best hit
+        best = min(r[1] for r in rows) or -1.0
+        return {int(tid): (rank / best if best else 1.0) for tid, rank in rows}
+
+
+class PostgresBackend(FallbackBackend):
+    name = 'postgres-tsvector'
+
+    def _vector_sql(self):
+        parts = [
+            f"setweight(to_tsvector('{PG_CONFIG}', coalesce({col}, '')), '{w}')"
+            for col, w in zip(TEXT_COLUMNS, 'ABCD')
+        ]
+        return ' || '.join(parts)
+
+    def ensure_schema(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {DOC_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS ({self._vector_sql()}) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {DOC_TABLE}_search_vector_gin ON {DOC_TABLE} USING GIN (search_vector)"
+            )
+
+    def rebuild(self):
+        # The vector is a generated column, so it is always current; just refresh the index
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {DOC_TABLE}_search_vector_gin")
+
+    def search(self, query: str, limit=None) -> Dict[int, float]:
+        terms = query_terms(query)
+        if not terms:
+            return {}
+        tsquery = ' & '.join(f"{t}:*" for t in terms)
+        sql = (f"SELECT therapist_id, ts_rank_cd(search_vector, q) AS rank "
+               f"FROM {DOC_TABLE}, to_tsquery('{PG_CONFIG}', %s) q "
+               f"WHERE search_vector @@ q ORDER BY rank DESC")
+        params = [tsquery]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(int(limit))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        if not rows:
+            return {}
+        best = max(r[1] for r in rows) or 1.0
+        return {int(tid): float(rank) / best for tid, rank in rows}
+
+
+def _sqlite_has_fts5() -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            return bool(cursor.fetchone()[0])
+    except Exception:
+        return False
+
+
+_BACKEND = None
+
+
+def get_backend():
+    """Return the full-text backend for the default database connection."""
+    global _BACKEND
+    if _BACKEND is None:
+        vendor = connection.vendor
+        if vendor == 'postgresql':
+            _BACKEND = PostgresBackend()
+        elif vendor == 'sqlite' and _sqlite_has_fts5():
+            _BACKEND = SQLiteFTS5Backend()
+        else:
+            _BACKEND = FallbackBackend()
+    return _BACKEND
+
+
+def ensure_after_migrate(sender=None, using=DEFAULT_DB_ALIAS, apps=None, **kwargs) -> None:
+    """post_migrate: create (or restore) the backend's structures once the text columns exist."""
+    if using != DEFAULT_DB_ALIAS or apps is None:
+        return
+    try:
+        columns = {f.column for f in apps.get_model('users', 'TherapistSearchDocument')._meta.concrete_fields}
+    except LookupError:
+        return
+    if set(TEXT_COLUMNS) <= columns:
+        get_backend().ensure_schema()
+
+
+def search(query: str, limit=None) -> Dict[int, float]:
+    """{therapist_id: relevance 0..1} for documents matching every term of `query`.
+
+    Falls back to the LIKE backend if the native engine errors (e.g. schema not yet created).
+    """
+    backend = get_backend()
+    try:
+        return backend.search(query, limit=limit)
+    except Exception as e:
+        if isinstance(backend, (SQLiteFTS5Backend, PostgresBackend)):
+            logger.warning("Full-text backend %s failed (%s); using LIKE fallback", backend.name, e)
+            return FallbackBackend().search(query, limit=limit)
+        raise
+
+
+def blend_relevance_distance(scores: Dict[int, float], distances: Dict[int, float], radius: float,
+                             relevance_weight: float = 0.7) -> Dict[int, float]:
+    """Combine text relevance (0..1) with proximity into one score (higher is better).
+
+    Proximity is 1 at the origin, falling linearly to 0 at `radius` miles; profiles with
+    no known distance get no proximity credit.
+    """
+    out = {}
+    for tid, rel in scores.items():
+        d = distances.get(tid)
+        proximity = max(0.0, 1.0 - d / radius) if (d is not None and radius) else 0.0
+        out[tid] = relevance_weight * rel + (1.0 - relevance_weight) * proximity
+    return out
+
+
+__all__ = [
+    "TEXT_COLUMNS",
+    "ensure_after_migrate",
+    "get_backend",
+    "search",
+    "blend_relevance_distance",
+    "query_terms",
+]
@@ -0,0 +1,112 @@
+"""Batched distance kernel shared by the search, home and discover views.
+
+Given an origin and a candidate set of (profile_id, zip) location rows, the
+kernel resolves the ZIPs to rows of the ZipIndex's resident float64 centroid
+arrays, gathers them with fancy indexing and computes every great-circle
+distance in one vectorised NumPy pass, then reduces to the nearest location per
+profile with a segmented minimum (no Python loop over rows).
+
+NumPy is optional: when it is not importable the same contract is served by a
+pure-Python loop over the already-float coordinates.
+
+Usage:
+    best = nearest_locations(origin_lat, origin_lng, [(7, '10001'), (7, '10011'), (9, '07030')])
+    best  -> {7: (0.0, '10001'), 9: (3.4, '07030')}
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+from users.zip_index import EARTH_RADIUS_MILES, get_zip_index, haversine_miles
+
+try:
+    import numpy as np
+except Exception:  # optional dependency
+    np = None
+
+
+def _haversine_rows(lat, lng, lat_rad, lng_rad, cos_lat):
+    """Vectorised great-circle miles from one origin (degrees) to centroids already in radians (with their cos(latitude))."""
+    phi1 = np.radians(lat)
+    a = np.sin((lat_rad - phi1) * 0.5) ** 2 + np.cos(phi1) * cos_lat * np.sin((lng_rad - np.radians(lng)) * 0.5) ** 2
+    return EARTH_RADIUS_MILES * 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+
+def _gather(rows, index):
+    """Resolve (profile_id, zip) rows to parallel lists, skipping unknown ZIPs."""
+    ids, zips, lats, lngs = [], [], [], []
+    coords = index.coords
+    for pid, zip_code in rows:
+        ll = coords(zip_code)
+        if ll is None:
+            continue
+        ids.append(pid)
+        zips.append(str(zip_code)[:5])
+        lats.append(ll[0])
+        lngs.append(ll[1])
+    return ids, zips, lats, lngs
+
+
+def nearest_locations(
+    lat: float,
+    lng: float,
+    rows: Iterable[Tuple[int, Optional[str]]],
+    index=None,
+) -> Dict[int, Tuple[float, str]]:
+    """Return {profile_id: (miles, zip5)} for the closest location of each profile.
+
+    Rows whose ZIP is missing from the ZipCode table are ignored, so profiles with
+    no resolvable location are simply absent from the result.
+    """
+    index = index or get_zip_index()
+    if np is None:
+        best: Dict[int, Tuple[float, str]] = {}
+        for pid, z, zlat, zlng in zip(*_gather(rows, index)):
+            d = haversine_miles(lat, lng, zlat, zlng)
+            cur = best.get(pid)
+            if cur is None or d < cur[0]:
+                best[pid] = (d, z)
+        return best
+    rows = rows if isinstance(rows, list) else list(rows)
+    if not rows:
+        return {}
+    _, keys, lat_rad, lng_rad, cos_lat = index.arrays()
+    at = index.rows_of([r[1] for r in rows])
+    found = at >= 0
+    id_arr = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))[found]
+    at = at[found]
+    if not len(at):
+        return {}
+    dist = _haversine_rows(float(lat), float(lng), lat_rad[at], lng_rad[at], cos_lat[at])
+    picks = _group_argmin(id_arr, dist)
+    return dict(zip(id_arr[picks].tolist(), zip(dist[picks].tolist(), [keys[r] for r in at[picks].tolist()])))
+
+
+def _group_argmin(ids, values):
+    """Index of the smallest value for each distinct id (the first one on ties)."""
+    n = len(ids)
+    order = None
+    if n > 1 and not (ids[1:] >= ids[:-1]).all():
+        # Rows usually arrive grouped by profile already; otherwise a stable integer sort groups them
+        order = np.argsort(ids, kind='stable')
+        ids, values = ids[order], values[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    mins = np.minimum.reduceat(values, starts)
+    at_min = np.flatnonzero(values == np.repeat(mins, np.diff(np.r_[starts, n])))
+    group = np.searchsorted(starts, at_min, side='right')
+    picks = at_min[np.r_[True, group[1:] != group[:-1]]]
+    return picks if order is None else order[picks]
+
+
+def nearest_location_for(lat: float, lng: float, locations, index=None):
+    """Return (miles, location) for the closest of a single profile's Location objects, or (None, None)."""
+    locs = list(locations)
+    best = nearest_locations(lat, lng, [(i, getattr(loc, 'zip', None)) for i, loc in enumerate(locs)], index=index)
+    if not best:
+        return None, None
+    i, (d, _) = min(best.items(), key=lambda kv: kv[1][0])
+    return d, locs[i]
+
+
+__all__ = [
+    "nearest_locations",
+    "nearest_location_for",
+]
@@ -0,0 +1,289 @@
+"""Database-backed queue for image variant generation, run outside the request.
+
+Uploading a profile photo, gallery image or blog image used to resize, sharpen and
+encode every variant (JPEG + WEBP, with storage round trips) inside the post_save
+signal, i.e. inside the upload request. Now the signal only calls `enqueue_image()`:
+
+  * nothing happens when the meta already describes this file under the current
+    PIPELINE_VERSION (ordinary profile edits no longer reprocess the photo);
+  * otherwise the meta is marked `{"status": "processing", "source": <file name>}`
+    (variants of a previous file are dropped, so templates fall back to the
+    original upload) and one pending ImageJob is inserted or refreshed.
+
+`manage.py run_image_jobs` claims due jobs with a conditional UPDATE (safe with
+several workers on any database), processes them with users.image_utils and writes
+the meta with `status` "ready" (or "failed" for unusable images). Idempotency is
+keyed on the file's sha256 plus PIPELINE_VERSION: when the stored meta already has
+both (`source_sha256` records the bytes as stored after processing), the variants
+are reused instead of regenerated, as are the variants an earlier job cached on a
+shared ImageBlob (users/blob_store.py). Exceptions are retried with exponential
+backoff up to MAX_ATTEMPTS; jobs left running by a dead worker are requeued after
+LOCK_TIMEOUT_SECONDS.
+"""
+import hashlib
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users import blob_store
+from users.image_utils import PIPELINE_VERSION, process_generic_image
+from users.models_jobs import ImageJob
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+LOCK_TIMEOUT_SECONDS = 15 * 60
+CLAIM_BATCH = 10
+
+# meta['status'] values
+STATUS_PROCESSING = 'processing'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+# job kind -> (model label, file field, meta field)
+TARGETS = {
+    'profile_photo': ('users.TherapistProfile', 'profile_photo', 'profile_photo_meta'),
+    'gallery_image': ('users.GalleryImage', 'image', 'image_meta'),
+    'blog_image': ('users.BlogPost', 'image', 'image_meta'),
+}
+
+
+def _target(kind: str):
+    from django.apps import apps
+    label, file_field, meta_field = TARGETS[kind]
+    return apps.get_model(label), file_field, meta_field
+
+
+def _same_source(meta: dict, file_name: str) -> bool:
+    source = meta.get('source')
+    if source:
+        return source == file_name
+    # Meta written before the queue existed: variants are named after the file stem
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return bool(meta.get('normalized')) and meta.get('normalized') in (f'{stem}.jpg', f'{stem}__normalized.jpg')
+
+
+def is_current(meta: Optional[dict], file_name: str) -> bool:
+    """True when `meta` already describes `file_name` under the current pipeline."""
+    meta = meta or {}
+    return (meta.get('status') != STATUS_PROCESSING
+            and meta.get('pipeline_version') == PIPELINE_VERSION
+            and _same_source(meta, file_name))
+
+
+def enqueue_image(kind: str, instance) -> bool:
+    """Mark the instance's image as processing and queue a job; False when nothing needs doing."""
+    model, file_field, meta_field = _target(kind)
+    field_file = getattr(instance, file_field, None)
+    if not field_file:
+        return False
+    file_name = field_file.name
+    existing = getattr(instance, meta_field, None) or {}
+    if is_current(existing, file_name):
+        return False
+    # Same file under an older pipeline keeps its variants until the job replaces them
+    meta = dict(existing) if _same_source(existing, file_name) else {}
+    meta.update(status=STATUS_PROCESSING, source=file_name)
+    if meta != existing:
+        model.objects.filter(pk=instance.pk).update(**{meta_field: meta})
+        setattr(instance, meta_field, meta)
+    _schedule(kind, instance.pk, file_name)
+    return True
+
+
+def _schedule(kind: str, object_id: int, file_name: str) -> None:
+    # Inserted inside the caller's transaction: a rolled-back upload leaves no job behind
+    fields = {'file_name': file_name, 'run_after': timezone.now(), 'attempts': 0, 'last_error': ''}
+    pending = ImageJob.objects.filter(kind=kind, object_id=object_id, status=ImageJob.STATUS_PENDING)
+    if pending.update(**fields):
+        return
+    try:
+        with transaction.atomic():
+            ImageJob.objects.create(kind=kind, object_id=object_id, **fields)
+    except IntegrityError:
+        # A concurrent request queued the same target first
+        pending.update(**fields)
+
+
+def worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'[:64]
+
+
+def requeue_stale(now=None) -> int:
+    """Return jobs whose worker died mid-run to the queue (or drop them if superseded)."""
+    now = now or timezone.now()
+    requeued = 0
+    cutoff = now - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    for job in ImageJob.objects.filter(status=ImageJob.STATUS_RUNNING, locked_at__lt=cutoff):
+        try:
+            with transaction.atomic():
+                requeued += ImageJob.objects.filter(pk=job.pk, status=ImageJob.STATUS_RUNNING).update(
+                    status=ImageJob.STATUS_PENDING, run_after=now, locked_at=None, locked_by='')
+        except IntegrityError:
+            # A newer pending job for the same target already covers it
+            ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.STATUS_DONE, last_error='superseded')
+    return requeued
+
+
+def claim_next(worker: str) -> Optional[ImageJob]:
+    """Atomically take the oldest due pending job, or None."""
+    now = timezone.now()
+    due = ImageJob.objects.filter(status=ImageJob.STATUS_PENDING, run_after__lte=now)
+    for pk in due.order_by('run_after', 'id').values_list('pk', flat=True)[:CLAIM_BATCH]:
+        claimed = ImageJob.objects.filter(pk=pk, status=ImageJob.STATUS_PENDING).update(
+            status=ImageJob.STATUS_RUNNING, locked_at=now, locked_by=worker, attempts=F('attempts') + 1)
+        if claimed:
+            return ImageJob.objects.get(pk=pk)
+    return None
+
+
+def _file_sha256(field_file) -> str:
+    h = hashlib.sha256()
+    try:
+        fh = open(field_file.path, 'rb')
+    except Exception:
+        fh = field_file.storage.open(field_file.name, 'rb')
+    with fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _after_write(kind: str, object_id: int) -> None:
+    """Propagate new meta to the denormalized readers (meta is written with update(), which sends no signals)."""
+    try:
+        if kind == 'profile_photo':
+            from users.search import schedule_search_refresh
+            schedule_search_refresh(object_id)
+        elif kind == 'blog_image':
+            from users.page_cache import bump_generation
+            bump_generation('blog')
+    except Exception as e:
+        logger.warning("Failed to refresh readers after %s #%s image update: %s", kind, object_id, e)
+
+
+def _finish(job: ImageJob, status: str, error: str = '', **fields) -> None:
+    ImageJob.objects.filter(pk=job.pk).update(status=status, last_error=error[:2000], locked_at=None,
+                                              updated_at=timezone.now(), **fields)
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def run_job(job: ImageJob) -> str:
+    """Process one claimed job; returns the job's final status for this attempt."""
+    try:
+        model, file_field, meta_field = _target(job.kind)
+        obj = model.objects.filter(pk=job.object_id).first()
+        field_file = getattr(obj, file_field, None) if obj is not None else None
+        if not field_file or field_file.name != job.file_name:
+            _finish(job, ImageJob.STATUS_DONE, 'superseded')
+            return ImageJob.STATUS_DONE
+        existing = getattr(obj, meta_field, None) or {}
+        sha = _file_sha256(field_file)
+        shared = blob_store.cached_meta(field_file.name)
+        if (sha in (existing.get('source_sha256'), (existing.get('original') or {}).get('sha256'))
+                and existing.get('pipeline_version') == PIPELINE_VERSION and existing.get('variants')):
+            # Same bytes already processed by this pipeline: reuse the variants
+            meta = dict(existing)
+        elif shared is not None:
+            # A duplicate upload of the same blob was processed first: its variants are these
+            meta = shared
+        else:
+            meta = process_generic_image(field_file)
+            if not meta.get('error'):
+                # Local processing rewrites a non-blob .jpg original in place; remember the bytes now stored
+                try:
+                    sha = _file_sha256(field_file)
+                except Exception:
+                    pass
+        meta.update(source=field_file.name, source_sha256=sha,
+                    status=STATUS_FAILED if meta.get('error') else STATUS_READY)
+        meta.setdefault('pipeline_version', PIPELINE_VERSION)
+        update = {meta_field: meta}
+        if job.kind == 'blog_image':
+            update['updated_at'] = timezone.now()  # moves the blog pages' conditional-GET validators
+        # Only if the file was not replaced while we worked
+        model.objects.filter(pk=obj.pk, **{file_field: job.file_name}).update(**update)
+        blob_store.remember_meta(field_file.name, meta)
+        _after_write(job.kind, obj.pk)
+        _finish(job, ImageJob.STATUS_DONE, meta.get('error') or '',
+                content_sha256=sha, pipeline_version=PIPELINE_VERSION)
+        return ImageJob.STATUS_DONE
+    except Exception as e:
+        error = f'{e.__class__.__name__}: {e}'
+        if job.attempts >= MAX_ATTEMPTS:
+            logger.warning("Image job %s failed permanently after %s attempts: %s", job.pk, job.attempts, error)
+            _mark_target_failed(job)
+            _finish(job, ImageJob.STATUS_FAILED, error)
+            return ImageJob.STATUS_FAILED
+        logger.warning("Image job %s attempt %s failed, retrying: %s", job.pk, job.attempts, error)
+        return _retry(job, error)
+
+
+def _retry(job: ImageJob, error: str) -> str:
+    """Put a failed attempt back in the queue with backoff (or drop it if superseded)."""
+    try:
+        with transaction.atomic():
+            _finish(job, ImageJob.STATUS_PENDING, error,
+                    run_after=timezone.now() + timedelta(seconds=backoff_seconds(job.attempts)))
+        return ImageJob.STATUS_PENDING
+    except IntegrityError:
+        # A newer upload queued a pending job for the same target; it replaces this one
+        _finish(job, ImageJob.STATUS_DONE, 'superseded')
+        return ImageJob.STATUS_DONE
+
+
+def _mark_target_failed(job: ImageJob) -> None:
+    try:
+        model, file_field, meta_field = _target(job.kind)
+        meta = {'status': STATUS_FAILED, 'source': job.file_name, 'pipeline_version': PIPELINE_VERSION,
+                'error': 'processing-failed'}
+        model.objects.filter(pk=job.object_id, **{file_field: job.file_name}).update(**{meta_field: meta})
+    except Exception as e:
+        logger.warning("Failed to mark image job %s target as failed: %s", job.pk, e)
+
+
+def run_pending(max_jobs: Optional[int] = None, worker: Optional[str] = None) -> int:
+    """Process due jobs until the queue is empty (or `max_jobs`); returns the number processed."""
+    worker = worker or worker_id()
+    requeue_stale()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next(worker)
+        if job is None:
+            break
+        try:
+            run_job(job)
+        except Exception as e:
+            # Bookkeeping failed (e.g. the database went away); the stale requeue retries the job
+            logger.warning("Image job %s could not be recorded: %s", job.pk, e)
+        processed += 1
+    return processed
+
+
+__all__ = [
+    "MAX_ATTEMPTS",
+    "TARGETS",
+    "STATUS_PROCESSING",
+    "STATUS_READY",
+    "STATUS_FAILED",
+    "is_current",
+    "enqueue_image",
+    "requeue_stale",
+    "claim_next",
+    "run_job",
+    "run_pending",
+    "backoff_seconds",
+]
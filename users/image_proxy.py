@@ -0,0 +1,532 @@
+"""Streaming, caching proxy for stock images (used by `views.api_proxy_image`).
+
+The blog composer loads Unsplash / Pexels / Picsum images through
+/users/api/proxy/image/?url=... to avoid CORS. Each request used to open a new
+connection, buffer the whole upstream body in the worker and download the same
+image again for every user. `ImageProxy` instead:
+
+  * talks to upstream through one pooled `requests.Session` (keep-alive), follows
+    redirects itself and checks every hop against the allowed hosts;
+  * streams a miss to the client chunk by chunk while teeing it into the cache
+    (`_TeeStream`), so worker memory stays at one chunk per request;
+  * keeps a bounded on-disk LRU cache keyed by the sha256 of the URL: `<key>.body`
+    plus a `<key>.json` with content type, validators and freshness. Files are
+    written to a temp name and renamed, so readers never see partial bodies and
+    several processes can share the directory. Once the total passes `max_bytes`
+    the least recently used entries are deleted down to 90%;
+  * treats an entry as fresh for the upstream max-age (DEFAULT_TTL without one,
+    at most MAX_TTL), then revalidates it with If-None-Match / If-Modified-Since;
+    a 304 refreshes it and an upstream failure serves the stale copy;
+  * coalesces concurrent misses for one URL within a process: the first request
+    fetches, the others wait for it to finish and are served from the cache.
+
+The class takes its cache directory, limits, host list and session as arguments
+so it can be pointed at a local stub server; `get_image_proxy()` returns the
+instance configured from settings (IMAGE_PROXY_CACHE_DIR,
+IMAGE_PROXY_CACHE_MAX_BYTES).
+
+Usage:
+    result = get_image_proxy().fetch(url)     # raises ProxyError
+    result.status -> "HIT" | "MISS" | "REVALIDATED" | "STALE"
+    result.file (cached: an open file) or result.stream (miss: an iterable with close())
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, Optional
+from urllib.parse import urljoin, urlparse
+
+from users.cache_utils import CacheStats
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_HOSTS = frozenset({
+    'images.unsplash.com', 'unsplash.com', 'source.unsplash.com',
+    'www.pexels.com', 'images.pexels.com', 'cdn.pexels.com',
+    'picsum.photos', 'fastly.picsum.photos',
+})
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_OBJECT_BYTES = 15 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+MAX_TTL = 7 * 24 * 3600
+MAX_REDIRECTS = 3
+CHUNK_SIZE = 64 * 1024
+UPSTREAM_TIMEOUT = 10
+# How long a concurrent request for the same URL waits for the first one before fetching itself
+COALESCE_WAIT = 15.0
+# Cache hits bump the entry's mtime (its LRU position) at most this often
+TOUCH_INTERVAL = 60.0
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+_MAX_AGE_RE = re.compile(r'max-age\s*=\s*(\d+)', re.I)
+
+_STATS = CacheStats('Image proxy', log_every=500)
+
+
+class ProxyError(Exception):
+    """A request the proxy refuses or cannot serve; `code` is the JSON error code returned to the client."""
+
+    def __init__(self, code: str, status: int = 502, upstream_status: Optional[int] = None):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+        self.upstream_status = upstream_status
+
+
+@dataclass
+class ProxyResult:
+    status: str
+    content_type: str
+    file: Any = None
+    stream: Optional[Iterable[bytes]] = None
+    length: Optional[int] = None
+    etag: Optional[str] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+# --- Upstream session ---------------------------------------------------------------------
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled session: keep-alive connections to the stock hosts are reused across requests."""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['User-Agent'] = 'TherapyConnected-ImageProxy/1.0'
+                _SESSION = session
+    return _SESSION
+
+
+# --- On-disk LRU cache --------------------------------------------------------------------
+
+class DiskCache:
+    """Bounded directory of `<key>.body` / `<key>.json` pairs; the body's mtime is its LRU position."""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, f'{key}.{ext}')
+
+    def get(self, key: str):
+        """(meta, open body file) or None. The caller owns (and must close) the file."""
+        try:
+            with open(self._path(key, 'json'), 'r', encoding='utf-8') as fh:
+                meta = json.load(fh)
+            body = open(self._path(key, 'body'), 'rb')
+        except (OSError, ValueError):
+            return None
+        try:
+            st = os.fstat(body.fileno())
+            if st.st_size != meta.get('size'):
+                # Meta and body from different writes (a replace in progress): treat as a miss
+                body.close()
+                return None
+            if time.time() - st.st_mtime > TOUCH_INTERVAL:
+                os.utime(self._path(key, 'body'))
+        except OSError:
+            pass
+        return meta, body
+
+    def write_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(meta, fh)
+            os.replace(tmp, self._path(key, 'json'))
+        except Exception:
+            _unlink(tmp)
+            raise
+
+    def writer(self, key: str) -> 'CacheWriter':
+        os.makedirs(self.directory, exist_ok=True)
+        return CacheWriter(self, key)
+
+    def _committed(self, size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _scan_size(self) -> int:
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.body'):
+                        try:
+                            total += entry.stat().st_size
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return total
+
+    def evict(self, target_fraction: float = 0.9) -> int:
+        """Delete least recently used entries until the cache is under target_fraction * max_bytes."""
+        with self._lock:
+            bodies = []
+            now = time.time()
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        if entry.name.endswith('.body'):
+                            bodies.append((st.st_mtime, st.st_size, entry.name[:-5]))
+                        elif entry.name.startswith('.tmp-') and now - st.st_mtime > 3600:
+                            # Left behind by a killed worker
+                            _unlink(entry.path)
+            except OSError:
+                return 0
+            total = sum(size for _, size, _ in bodies)
+            target = int(self.max_bytes * target_fraction)
+            removed = 0
+            for _, size, key in sorted(bodies):
+                if total <= target:
+                    break
+                _unlink(self._path(key, 'json'))
+                _unlink(self._path(key, 'body'))
+                total -= size
+                removed += 1
+            self._size = total
+        if removed:
+            logger.info("Image proxy cache evicted %d entries (%d bytes kept)", removed, total)
+        return removed
+
+
+class CacheWriter:
+    """Temp file that becomes a cache entry on commit(); abort() (or a failed write) discards it."""
+
+    def __init__(self, cache: DiskCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        fd, self.tmp = tempfile.mkstemp(dir=cache.directory, prefix='.tmp-', suffix='.body')
+        self._fh = os.fdopen(fd, 'wb')
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, meta: Dict[str, Any]) -> None:
+        self._fh.close()
+        meta = dict(meta, size=self.size)
+        os.replace(self.tmp, self.cache._path(self.key, 'body'))
+        self.cache.write_meta(self.key, meta)
+        self.cache._committed(self.size)
+
+    def abort(self) -> None:
+        try:
+            self._fh.close()
+        except Exception:
+            pass
+        _unlink(self.tmp)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+# --- Proxy --------------------------------------------------------------------------------
+
+def _freshness(headers) -> Optional[int]:
+    """Seconds the response may be served without revalidation; None when it must not be stored."""
+    cc = (headers.get('Cache-Control') or '').lower()
+    if 'no-store' in cc or 'private' in cc:
+        return None
+    if 'no-cache' in cc:
+        return 0
+    m = _MAX_AGE_RE.search(cc)
+    if m:
+        return min(int(m.group(1)), MAX_TTL)
+    return DEFAULT_TTL
+
+
+def _is_fresh(meta: Dict[str, Any]) -> bool:
+    return time.time() < meta.get('stored_at', 0) + meta.get('ttl', 0)
+
+
+class _TeeStream:
+    """Iterates an upstream response in chunks, copying them into a cache writer.
+
+    Django calls close() once the response is finished or the client goes away:
+    the entry is committed only if the whole body arrived.
+    """
+
+    def __init__(self, proxy: 'ImageProxy', key: str, resp, writer: Optional[CacheWriter],
+                 meta: Dict[str, Any], done: Optional[threading.Event]):
+        self.proxy = proxy
+        self.key = key
+        self.resp = resp
+        self.writer = writer
+        self.meta = meta
+        self.done = done
+        self.complete = False
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.resp.iter_content(self.proxy.chunk_size):
+            if not chunk:
+                continue
+            if self.writer is not None:
+                try:
+                    self.writer.write(chunk)
+                    if self.writer.size > self.proxy.max_object_bytes:
+                        self.writer.abort()
+                        self.writer = None
+                except Exception as e:
+                    logger.warning("Image proxy cache write failed for %s: %s", self.key, e)
+                    self.writer.abort()
+                    self.writer = None
+            yield chunk
+        self.complete = True
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.resp.close()
+        except Exception:
+            pass
+        if self.writer is not None:
+            if self.complete:
+                try:
+                    self.writer.commit(self.meta)
+                except Exception as e:
+                    logger.warning("Image proxy cache commit failed for %s: %s", self.key, e)
+                    self.writer.abort()
+            else:
+                self.writer.abort()
+        self.proxy._release(self.key, self.done)
+
+
+class ImageProxy:
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_object_bytes: int = DEFAULT_MAX_OBJECT_BYTES,
+                 allowed_hosts: Iterable[str] = ALLOWED_HOSTS, session=None,
+                 timeout: float = UPSTREAM_TIMEOUT, chunk_size: int = CHUNK_SIZE):
+        self.cache = DiskCache(cache_dir, max_bytes)
+        self.max_object_bytes = max_object_bytes
+        self.allowed_hosts = frozenset(allowed_hosts)
+        self._session = session
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def session(self):
+        return self._session or get_session()
+
+    def check_url(self, url: str) -> None:
+        try:
+            parsed = urlparse(url)
+        except Exception:
+            raise ProxyError('invalid_url', 400)
+        if parsed.scheme not in ('http', 'https') or parsed.netloc not in self.allowed_hosts:
+            raise ProxyError('forbidden_host', 400)
+
+    @staticmethod
+    def cache_key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _claim(self, key: str):
+        """(True, event) if this request should fetch the URL, else (False, the fetching request's event)."""
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            if event is not None:
+                return False, event
+            event = self._inflight[key] = threading.Event()
+            return True, event
+
+    def _release(self, key: str, done: Optional[threading.Event]) -> None:
+        if done is None:
+            return
+        with self._inflight_lock:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+        done.set()
+
+    def _cached(self, status: str, meta: Dict[str, Any], body) -> ProxyResult:
+        _STATS.count('image_proxy', 'hits')
+        return ProxyResult(status=status, content_type=meta.get('content_type') or 'image/jpeg',
+                           file=body, length=meta.get('size'), etag=meta.get('etag'), meta=meta)
+
+    def fetch(self, url: str) -> ProxyResult:
+        """Serve `url` from the cache or upstream; raises ProxyError for refused or failed requests."""
+        self.check_url(url)
+        key = self.cache_key(url)
+        entry = self.cache.get(key)
+        if entry is not None and _is_fresh(entry[0]):
+            return self._cached('HIT', *entry)
+        leader, done = self._claim(key)
+        if not leader:
+            if entry is not None:
+                # Someone is already revalidating this entry; the stale copy is good enough meanwhile
+                return self._cached('STALE', *entry)
+            done.wait(COALESCE_WAIT)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return self._cached('HIT', *entry)
+            # The first request could not cache it (client went away, too large, no-store): fetch uncoalesced
+            done = None
+        try:
+            return self._fetch_upstream(url, key, entry, done)
+        except BaseException:
+            self._release(key, done)
+            raise
+
+    def _request(self, url: str, headers: Dict[str, str]):
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self.session.get(url, headers=headers, stream=True, timeout=self.timeout,
+                                    allow_redirects=False)
+            if resp.status_code not in _REDIRECT_CODES:
+                return resp
+            location = resp.headers.get('Location')
+            resp.close()
+            if not location:
+                raise ProxyError('upstream', 502, resp.status_code)
+            url = urljoin(url, location)
+            # Every hop must stay on an allowed host, or the proxy becomes an open relay
+            self.check_url(url)
+        raise ProxyError('upstream', 502, 310)
+
+    def _fetch_upstream(self, url: str, key: str, entry, done: Optional[threading.Event]) -> ProxyResult:
+        meta, body = entry if entry is not None else ({}, None)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            resp = self._request(url, headers)
+        except ProxyError:
+            if body is not None:
+                body.close()
+            raise
+        except Exception as e:
+            if body is not None:
+                logger.warning("Image proxy serving stale %s: %s", url, e)
+                self._release(key, done)
+                return self._cached('STALE', meta, body)
+            raise ProxyError('fetch_failed', 502)
+
+        if resp.status_code == 304 and body is not None:
+            resp.close()
+            ttl = _freshness(resp.headers)
+            meta = dict(meta, stored_at=time.time(), ttl=meta.get('ttl', DEFAULT_TTL) if ttl is None else ttl)
+            try:
+                self.cache.write_meta(key, meta)
+            except Exception as e:
+                logger.warning("Image proxy failed to refresh %s: %s", url, e)
+            self._release(key, done)
+            return self._cached('REVALIDATED', meta, body)
+
+        if resp.status_code != 200:
+            resp.close()
+            if body is not None and resp.status_code >= 500:
+                self._release(key, done)
+                return self._cached('STALE', meta, body)
+            if body is not None:
+                body.close()
+            raise ProxyError('upstream', 502, resp.status_code)
+        if body is not None:
+            body.close()
+
+        content_type = (resp.headers.get('Content-Type') or 'image/jpeg').split(';')[0].strip()
+        if not content_type.startswith('image/'):
+            resp.close()
+            raise ProxyError('not_image', 502, resp.status_code)
+        length = None
+        if not resp.headers.get('Content-Encoding'):
+            try:
+                length = int(resp.headers.get('Content-Length'))
+            except (TypeError, ValueError):
+                pass
+        ttl = _freshness(resp.headers)
+        writer = None
+        new_meta = {
+            'url': url,
+            'content_type': content_type,
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+            'ttl': ttl,
+        }
+        if ttl is not None and (length is None or length <= self.max_object_bytes):
+            try:
+                writer = self.cache.writer(key)
+            except Exception as e:
+                logger.warning("Image proxy cache unavailable: %s", e)
+        _STATS.count('image_proxy', 'misses')
+        return ProxyResult(status='MISS', content_type=content_type,
+                           stream=_TeeStream(self, key, resp, writer, new_meta, done),
+                           length=length, etag=new_meta['etag'], meta=new_meta)
+
+
+_PROXY = None
+_PROXY_LOCK = threading.Lock()
+
+
+def get_image_proxy() -> ImageProxy:
+    """The process-wide proxy configured from settings."""
+    global _PROXY
+    if _PROXY is None:
+        with _PROXY_LOCK:
+            if _PROXY is None:
+                from django.conf import settings
+                cache_dir = getattr(settings, 'IMAGE_PROXY_CACHE_DIR', None) or os.path.join(
+                    tempfile.gettempdir(), 'therapy_connected_image_proxy')
+                _PROXY = ImageProxy(
+                    cache_dir,
+                    max_bytes=getattr(settings, 'IMAGE_PROXY_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+                )
+    return _PROXY
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    return _STATS.snapshot()
+
+
+__all__ = [
+    "ALLOWED_HOSTS",
+    "ProxyError",
+    "ProxyResult",
+    "DiskCache",
+    "ImageProxy",
+    "get_session",
+    "get_image_proxy",
+    "stats",
+]
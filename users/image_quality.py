@@ -0,0 +1,195 @@
+"""Vectorized quality metrics for uploaded photos (used by users/image_utils.py).
+
+Every metric is computed on one downsampled copy of the normalized image (longest
+side <= ANALYSIS_SIDE, box-reduced), so the cost is a few milliseconds regardless
+of the upload size:
+
+  * sharpness  - variance of the 4-neighbour Laplacian of the grayscale image
+                 (the usual "variance of Laplacian" blur measure);
+  * noise      - Immerkaer's fast estimate of the Gaussian noise sigma;
+  * exposure   - mean / standard deviation of the luminance and the fraction of
+                 clipped shadow and highlight pixels;
+  * crop hint  - a focal point for square crops: the centroid of the densest
+                 cluster of skin-tone pixels (a face or faces in a profile photo),
+                 or the image centre when there is no convincing cluster.
+
+NumPy is optional: without it the Laplacian (clipped to 8 bits, so on a slightly
+different scale) and exposure statistics come from Pillow filters and histograms,
+the noise estimate is omitted and the crop hint is the centre.
+
+Usage:
+    q = analyze(img)
+    q -> {"sharpness": 412.7, "noise": 2.1, "brightness": 118.4, "contrast": 54.0,
+          "clipped_shadows": 0.002, "clipped_highlights": 0.0, "exposure": "ok",
+          "crop_hint": {"x": 0.48, "y": 0.36, "source": "skin", "confidence": 0.71}}
+    is_blurry(q) -> False
+"""
+import math
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageFilter, ImageStat
+
+try:
+    import numpy as np
+except Exception:  # optional dependency
+    np = None
+
+# Longest side of the analysis copy; thresholds below are calibrated at this size
+ANALYSIS_SIDE = 512
+
+# Laplacian variance below this reads as out of focus / motion blurred (at ANALYSIS_SIDE: a 1600px
+# photo blurred with a ~1.5px Gaussian lands around 30-35, a sharp portrait at 60+)
+BLUR_THRESHOLD = 40.0
+
+# Luminance levels counted as clipped, and the clipped fraction that makes a photo under / over exposed
+SHADOW_LEVEL = 4
+HIGHLIGHT_LEVEL = 251
+CLIPPED_FRACTION = 0.2
+UNDEREXPOSED_MEAN = 50.0
+OVEREXPOSED_MEAN = 210.0
+
+# Skin tone box in YCbCr (Chai & Ngan) and the grid used to find the densest skin cluster
+SKIN_CB = (77, 127)
+SKIN_CR = (133, 173)
+SKIN_MIN_Y = 40
+CROP_GRID = 16
+CROP_WINDOW = 4
+MIN_SKIN_DENSITY = 0.25
+
+
+def _analysis_copy(img: Image.Image) -> Image.Image:
+    factor = math.ceil(max(img.size) / ANALYSIS_SIDE)
+    small = img.reduce(factor) if factor > 1 else img
+    return small if small.mode == "RGB" else small.convert("RGB")
+
+
+def _exposure_verdict(mean: float, shadows: float, highlights: float) -> str:
+    if mean < UNDEREXPOSED_MEAN or shadows > CLIPPED_FRACTION:
+        return "under"
+    if mean > OVEREXPOSED_MEAN or highlights > CLIPPED_FRACTION:
+        return "over"
+    return "ok"
+
+
+def _center_hint() -> Dict[str, Any]:
+    return {"x": 0.5, "y": 0.5, "source": "center", "confidence": 0.0}
+
+
+def _laplacian_variance(g) -> float:
+    lap = g[1:-1, :-2] + g[1:-1, 2:] + g[:-2, 1:-1] + g[2:, 1:-1] - 4.0 * g[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def _noise_sigma(g) -> float:
+    # Immerkaer (1996): sigma = sqrt(pi/2) / (6 (W-2)(H-2)) * sum |I * N|, N = [[1,-2,1],[-2,4,-2],[1,-2,1]]
+    h, w = g.shape
+    if h < 3 or w < 3:
+        return 0.0
+    n = (g[:-2, :-2] + g[:-2, 2:] + g[2:, :-2] + g[2:, 2:]
+         - 2.0 * (g[:-2, 1:-1] + g[1:-1, :-2] + g[1:-1, 2:] + g[2:, 1:-1])
+         + 4.0 * g[1:-1, 1:-1])
+    return float(math.sqrt(math.pi / 2.0) * np.abs(n).sum() / (6.0 * (w - 2) * (h - 2)))
+
+
+def _skin_crop_hint(small: Image.Image) -> Dict[str, Any]:
+    ycc = np.asarray(small.convert("YCbCr"))
+    y, cb, cr = ycc[..., 0], ycc[..., 1], ycc[..., 2]
+    skin = ((cb >= SKIN_CB[0]) & (cb <= SKIN_CB[1]) & (cr >= SKIN_CR[0]) & (cr <= SKIN_CR[1])
+            & (y >= SKIN_MIN_Y))
+    h, w = skin.shape
+    if h < CROP_GRID or w < CROP_GRID:
+        return _center_hint()
+    # Skin density per grid cell, then the densest CROP_WINDOW x CROP_WINDOW block of cells (summed-area table)
+    ys = np.linspace(0, h, CROP_GRID + 1).astype(int)
+    xs = np.linspace(0, w, CROP_GRID + 1).astype(int)
+    cells = np.add.reduceat(np.add.reduceat(skin.astype(np.float32), ys[:-1], axis=0), xs[:-1], axis=1)
+    sat = np.zeros((CROP_GRID + 1, CROP_GRID + 1), dtype=np.float32)
+    sat[1:, 1:] = cells.cumsum(0).cumsum(1)
+    k = CROP_WINDOW
+    windows = sat[k:, k:] - sat[:-k, k:] - sat[k:, :-k] + sat[:-k, :-k]
+    r, c = np.unravel_index(int(windows.argmax()), windows.shape)
+    y0, y1, x0, x1 = ys[r], ys[r + k], xs[c], xs[c + k]
+    area = float((y1 - y0) * (x1 - x0))
+    density = float(windows[r, c]) / area if area else 0.0
+    if density < MIN_SKIN_DENSITY:
+        return _center_hint()
+    py, px = np.nonzero(skin[y0:y1, x0:x1])
+    return {
+        "x": round(float(x0 + px.mean() + 0.5) / w, 3),
+        "y": round(float(y0 + py.mean() + 0.5) / h, 3),
+        "source": "skin",
+        "confidence": round(min(1.0, density), 2),
+    }
+
+
+def _analyze_numpy(small: Image.Image) -> Dict[str, Any]:
+    gray8 = np.asarray(small.convert("L"))
+    g = gray8.astype(np.float32)
+    hist = np.bincount(gray8.ravel(), minlength=256)
+    total = float(gray8.size)
+    shadows = float(hist[:SHADOW_LEVEL + 1].sum()) / total
+    highlights = float(hist[HIGHLIGHT_LEVEL:].sum()) / total
+    mean = float(g.mean())
+    return {
+        "sharpness": round(_laplacian_variance(g), 2),
+        "noise": round(_noise_sigma(g), 2),
+        "brightness": round(mean, 1),
+        "contrast": round(float(g.std()), 1),
+        "clipped_shadows": round(shadows, 4),
+        "clipped_highlights": round(highlights, 4),
+        "exposure": _exposure_verdict(mean, shadows, highlights),
+        "crop_hint": _skin_crop_hint(small),
+    }
+
+
+def _analyze_pil(small: Image.Image) -> Dict[str, Any]:
+    gray = small.convert("L")
+    # Same 4-neighbour Laplacian; offset keeps negative responses inside the 8-bit range
+    lap = gray.filter(ImageFilter.Kernel((3, 3), (0, 1, 0, 1, -4, 1, 0, 1, 0), scale=1, offset=128))
+    stat = ImageStat.Stat(gray)
+    hist = gray.histogram()
+    total = float(sum(hist)) or 1.0
+    shadows = sum(hist[:SHADOW_LEVEL + 1]) / total
+    highlights = sum(hist[HIGHLIGHT_LEVEL:]) / total
+    mean = stat.mean[0]
+    return {
+        "sharpness": round(ImageStat.Stat(lap).var[0], 2),
+        "noise": None,
+        "brightness": round(mean, 1),
+        "contrast": round(stat.stddev[0], 1),
+        "clipped_shadows": round(shadows, 4),
+        "clipped_highlights": round(highlights, 4),
+        "exposure": _exposure_verdict(mean, shadows, highlights),
+        "crop_hint": _center_hint(),
+    }
+
+
+def analyze(img: Image.Image) -> Dict[str, Any]:
+    """Quality scores and crop hint for a decoded image (see module docstring for the keys)."""
+    small = _analysis_copy(img)
+    if np is None:
+        return _analyze_pil(small)
+    return _analyze_numpy(small)
+
+
+def is_blurry(quality: Dict[str, Any]) -> bool:
+    sharpness = quality.get("sharpness")
+    return sharpness is not None and sharpness < BLUR_THRESHOLD
+
+
+def crop_focus(quality: Optional[Dict[str, Any]]) -> Tuple[float, float]:
+    """(x, y) focal point in 0..1 image coordinates; the centre when there is no hint."""
+    hint = (quality or {}).get("crop_hint") or {}
+    try:
+        return min(max(float(hint["x"]), 0.0), 1.0), min(max(float(hint["y"]), 0.0), 1.0)
+    except (KeyError, TypeError, ValueError):
+        return 0.5, 0.5
+
+
+__all__ = [
+    "ANALYSIS_SIDE",
+    "BLUR_THRESHOLD",
+    "analyze",
+    "is_blurry",
+    "crop_focus",
+]
@@ -0,0 +1,184 @@
+"""On-demand width variants of processed images, served by `views_images.resized_image`.
+
+The job pipeline (users/image_jobs.py) still produces the fixed variants, but srcsets
+no longer have to choose between thumb / medium / large: any width in WIDTH_BUCKETS
+can be requested in any of FORMATS as
+
+    /img/<kind>/<pk>/<key>/<width>.<fmt>      e.g. /img/profile/42/9c1f0e7d5a3b2c18/320.webp
+
+`key` is derived from the original's sha256 and the pipeline version (`source_key`),
+so a URL always names the same bytes and is served `immutable`; a new upload or
+a PIPELINE_VERSION bump changes every URL. The first request for a (width, format)
+decodes the normalized original (JPEG draft mode), resizes, sharpens and encodes,
+then stores the result next to the original as `<stem>__<key>_w<width>.<fmt>`;
+later requests (from any worker) read the stored file. Blob garbage collection finds
+these files by listing the directory, so variants of older keys are deleted too.
+Only images their owning page shows publicly are served (see views_images). Renders of the same file
+within one process are serialized, so a burst of identical requests encodes once.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+from users.image_utils import PIPELINE_VERSION, VARIANT_JPEG, VARIANT_WEBP, _sharpen
+
+logger = logging.getLogger(__name__)
+
+# Bump to change every on-demand URL (e.g. after changing encoder settings below)
+RESIZE_VERSION = 1
+
+WIDTH_BUCKETS = (160, 240, 320, 400, 480, 640, 800, 1024, 1280, 1600)
+
+VARIANT_AVIF = dict(quality=60, speed=6)
+
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'webp': 'image/webp', 'avif': 'image/avif'}
+
+# URL kind -> users.image_jobs.TARGETS kind
+URL_KINDS = {
+    'profile': 'profile_photo',
+    'gallery': 'gallery_image',
+    'blog': 'blog_image',
+}
+
+_AVAILABLE_FORMATS = None
+_RENDER_LOCKS: Dict[str, threading.Lock] = {}
+_RENDER_LOCKS_GUARD = threading.Lock()
+
+
+def available_formats() -> Tuple[str, ...]:
+    """Formats this Pillow build can encode (AVIF needs Pillow >= 11.3 built with libavif)."""
+    global _AVAILABLE_FORMATS
+    if _AVAILABLE_FORMATS is None:
+        formats = ['jpg']
+        for fmt in ('webp', 'avif'):
+            try:
+                if features.check(fmt):
+                    formats.append(fmt)
+            except Exception:
+                pass
+        _AVAILABLE_FORMATS = tuple(formats)
+    return _AVAILABLE_FORMATS
+
+
+def source_key(meta: Optional[dict]) -> Optional[str]:
+    """Version key of a processed image's on-demand URLs, or None while it has no normalized original."""
+    meta = meta or {}
+    sha = (meta.get('original') or {}).get('sha256')
+    if not sha or not meta.get('normalized') or meta.get('status') == 'processing':
+        return None
+    raw = f"{sha}:{meta.get('pipeline_version')}:{RESIZE_VERSION}"
+    return hashlib.sha256(raw.encode('ascii')).hexdigest()[:16]
+
+
+def source_width(meta: Optional[dict]) -> Optional[int]:
+    """Width of the normalized original (the xlarge variant is never smaller than it)."""
+    variants = (meta or {}).get('variants') or {}
+    widths = [v.get('width') for v in variants.values() if isinstance(v, dict) and v.get('width')]
+    return max(widths) if widths else None
+
+
+def srcset_widths(meta: Optional[dict]) -> List[int]:
+    """Buckets worth offering for this image: never wider than the normalized original."""
+    width = source_width(meta)
+    if not width:
+        return []
+    return [w for w in WIDTH_BUCKETS if w <= width] or [WIDTH_BUCKETS[0]]
+
+
+def variant_name(file_name: str, key: str, width: int, fmt: str) -> str:
+    directory, base = os.path.split(file_name)
+    stem = os.path.splitext(base)[0]
+    name = f'{stem}__{key}_w{width}.{fmt}'
+    return f'{directory}/{name}' if directory else name
+
+
+def variant_names(storage, file_name: str) -> List[str]:
+    """Stored on-demand variants of `file_name` under any key, current or older (used by blob garbage collection)."""
+    directory, base = os.path.split(file_name)
+    stem = os.path.splitext(base)[0]
+    pattern = re.compile(rf'{re.escape(stem)}__[0-9a-f]{{16}}_w\d+\.(?:{"|".join(CONTENT_TYPES)})')
+    try:
+        _, files = storage.listdir(directory)
+    except Exception as e:
+        logger.warning("Cannot list image variants of %s: %s", file_name, e)
+        return []
+    return [f'{directory}/{f}' if directory else f for f in files if pattern.fullmatch(f)]
+
+
+def render(raw: bytes, width: int, fmt: str) -> bytes:
+    """Resize a normalized original to `width` (never enlarging) and encode it as `fmt`."""
+    img = Image.open(BytesIO(raw))
+    w, h = img.size
+    if width < w:
+        target = (width, max(1, round(h * width / w)))
+        # JPEG: decode at the smallest DCT scale that still covers the target
+        img.draft('RGB', target)
+        img = img.convert('RGB').resize(target, Image.Resampling.LANCZOS)
+    else:
+        img = img.convert('RGB')
+    img = _sharpen(img, is_thumb=width <= 240)
+    buf = BytesIO()
+    if fmt == 'webp':
+        img.save(buf, 'WEBP', **VARIANT_WEBP)
+    elif fmt == 'avif':
+        img.save(buf, 'AVIF', **VARIANT_AVIF)
+    else:
+        img.save(buf, 'JPEG', **VARIANT_JPEG)
+    return buf.getvalue()
+
+
+def _render_lock(name: str) -> threading.Lock:
+    with _RENDER_LOCKS_GUARD:
+        lock = _RENDER_LOCKS.get(name)
+        if lock is None:
+            if len(_RENDER_LOCKS) > 1024:
+                _RENDER_LOCKS.clear()
+            lock = _RENDER_LOCKS[name] = threading.Lock()
+        return lock
+
+
+def _read(storage, name: str) -> bytes:
+    with storage.open(name, 'rb') as fh:
+        return fh.read()
+
+
+def get_variant(storage, file_name: str, meta: dict, width: int, fmt: str) -> bytes:
+    """Bytes of the (width, fmt) variant of a processed image, rendering and storing it on first use."""
+    key = source_key(meta)
+    name = variant_name(file_name, key, width, fmt)
+    with _render_lock(name):
+        if storage.exists(name):
+            return _read(storage, name)
+        normalized = meta['normalized']
+        directory = os.path.dirname(file_name)
+        data = render(_read(storage, f'{directory}/{normalized}' if directory else normalized), width, fmt)
+        try:
+            saved = storage.save(name, ContentFile(data))
+            if saved != name:
+                # Another worker stored it first; both encodes are identical
+                storage.delete(saved)
+        except Exception as e:
+            logger.warning("Failed to store image variant %s: %s", name, e)
+        return data
+
+
+__all__ = [
+    "WIDTH_BUCKETS",
+    "CONTENT_TYPES",
+    "URL_KINDS",
+    "available_formats",
+    "source_key",
+    "source_width",
+    "srcset_widths",
+    "variant_name",
+    "variant_names",
+    "render",
+    "get_variant",
+]
@@ -1,11 +1,43 @@
+"""Profile photo / gallery / blog image pipeline: validation, normalized original and variants.
+
+One pass per upload:
+
+  1. The original is read once into memory; the sha256 is taken from that buffer
+     and the image is decoded from the same buffer (no second read).
+  2. Size and aspect checks use the header only, so rejected images are never
+     decoded. JPEG sources larger than MAX_ORIGINAL_SIDE are decoded at a reduced
+     DCT scale (`Image.draft`) before the exact LANCZOS downscale.
+  3. Variants are produced largest first, each resized from the smallest already
+     produced level that still covers it (a downscale pyramid), instead of every
+     variant resizing the full image again.
+  4. Sharpening and JPEG / WEBP encoding of the normalized original and of every
+     variant are independent, so they run in a bounded process pool
+     (IMAGE_ENCODE_WORKERS, default min(4, CPUs)); with one worker, or if the pool
+     cannot start, they run serially in this process.
+
+Quality scores (sharpness, noise, exposure) come from users/image_quality.py and are
+stored under meta["quality"]; its crop hint positions the square thumbnail.
+
+Metadata and file names are unchanged, except for content-addressed blobs
+(users/blob_store.py): their original is never rewritten or removed, and the
+normalized JPEG is written as `<sha>__normalized.jpg` next to it.
+`manage.py benchmark_images` measures wall time and peak RSS.
+"""
 import os
 import math
 import hashlib
+import logging
+import threading
 from datetime import datetime, timezone
+from io import BytesIO
 from pathlib import Path
 from PIL import Image, ImageFilter, ImageOps
 from django.core.files.base import ContentFile
-from typing import Dict, Any, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from users import image_quality
+
+logger = logging.getLogger(__name__)
 
 # Variant configuration: (label, max_width, max_height, crop_square?)
 VARIANTS = [
@@ -15,7 +47,7 @@ VARIANTS = [
     ("xlarge", 1600, 2000, False),  # retina / high-density displays
 ]
 
-PIPELINE_VERSION = 2  # bumped for xlarge variant introduction
+PIPELINE_VERSION = 3  # bumped for quality scores and focal-point thumbnail crops (2: xlarge variant)
 
 MAX_ORIGINAL_SIDE = 1600
 MIN_ACCEPT_WIDTH = 240
@@ -24,6 +56,13 @@ WARN_MIN_SIDE = 500
 MAX_ASPECT_RATIO = 3.0  # width/height or height/width <= 3
 MAX_FILE_BYTES = 8 * 1024 * 1024
 
+NORMALIZED_JPEG = dict(quality=85, optimize=True, progressive=True)
+VARIANT_JPEG = dict(quality=82, optimize=True, progressive=True)
+VARIANT_WEBP = dict(quality=80, method=6)
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
 
 class ImageQualityFlags:
     LOW_RES = "low_res"
@@ -31,29 +70,6 @@ class ImageQualityFlags:
     REJECTED = "rejected"
 
 
-def _laplacian_variance(img: Image.Image) -> float:
-    # Simple blur detection: convert to gray, apply Laplacian via edge enhancement approximation
-    gray = img.convert("L")
-    # Use built-in filter as proxy; for full Laplacian we'd need numpy/scipy. Keep lightweight.
-    edge = gray.filter(ImageFilter.FIND_EDGES)
-    # Variance of pixel intensities in edge image correlates with sharpness
-    hist = edge.histogram()
-    # compute mean
-    total_pixels = sum(hist)
-    if not total_pixels:
-        return 0.0
-    values = []
-    acc = 0
-    for i, c in enumerate(hist):
-        if c:
-            values.extend([i] * c)
-    # To avoid memory blow-up, approximate using bins
-    # We'll compute mean and variance directly from histogram
-    mean = sum(i * c for i, c in enumerate(hist)) / total_pixels
-    var = sum(((i - mean) ** 2) * c for i, c in enumerate(hist)) / total_pixels
-    return var
-
-
 def _ensure_orientation(img: Image.Image) -> Image.Image:
     try:
         img = ImageOps.exif_transpose(img)
@@ -62,23 +78,40 @@ def _ensure_orientation(img: Image.Image) -> Image.Image:
     return img
 
 
+def _fit_size(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    """Size `Image.thumbnail(box)` would produce for an image of `size` (aspect kept, never enlarged)."""
+    w, h = size
+    x, y = box
+    if x >= w and y >= h:
+        return w, h
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = w / h
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
 def _resize_preserve(img: Image.Image, max_w: int, max_h: int) -> Image.Image:
-    img_c = img.copy()
-    img_c.thumbnail((max_w, max_h), Image.Resampling.LANCZOS)
-    return img_c
+    size = _fit_size(img.size, (max_w, max_h))
+    return img.copy() if size == img.size else img.resize(size, Image.Resampling.LANCZOS)
 
 
-def _square_crop(img: Image.Image, size: int) -> Image.Image:
+def _square_crop(img: Image.Image, size: int, focus: Tuple[float, float] = (0.5, 0.5)) -> Image.Image:
     w, h = img.size
     if w == h:
         return img.resize((size, size), Image.Resampling.LANCZOS)
-    # crop center square
+    # Square centred on the focal point (image_quality crop hint), kept inside the image
     side = min(w, h)
-    left = (w - side) // 2
-    top = (h - side) // 2
+    left = min(max(int(round(focus[0] * w - side / 2)), 0), w - side)
+    top = min(max(int(round(focus[1] * h - side / 2)), 0), h - side)
     box = (left, top, left + side, top + side)
-    cropped = img.crop(box)
-    return cropped.resize((size, size), Image.Resampling.LANCZOS)
+    # resize() crops and scales in one pass when given a source box
+    return img.resize((size, size), Image.Resampling.LANCZOS, box=box)
 
 
 def _hash_bytes(data: bytes) -> str:
@@ -87,111 +120,232 @@ def _hash_bytes(data: bytes) -> str:
     return h.hexdigest()
 
 
-def process_profile_photo(path: str) -> Dict[str, Any]:
-    """Process original profile photo in-place and generate variant files.
-    Returns metadata dict with variant relative paths and quality flags.
-    """
-    meta: Dict[str, Any] = {"variants": {}, "flags": [], "original": {}, "pipeline_version": PIPELINE_VERSION}
-    p = Path(path)
-    if not p.exists():
-        return {"error": "file-missing"}
-    if p.stat().st_size > MAX_FILE_BYTES:
-        return {"error": "file-too-large"}
+# --- Encoding (runs in the process pool) --------------------------------------------------------
+
+def _sharpen(im: Image.Image, is_thumb: bool = False) -> Image.Image:
+    # Mild sharpening for all variants; UnsharpMask for control
+    return im.filter(ImageFilter.UnsharpMask(radius=1.2, percent=(130 if is_thumb else 110), threshold=3))
+
 
+def _encode(task: Tuple[str, Image.Image]) -> Tuple[str, bytes, Optional[bytes]]:
+    """(label, jpeg bytes, webp bytes or None) for one pipeline output; 'normalized' is not sharpened."""
+    label, img = task
+    if label == 'normalized':
+        buf = BytesIO()
+        img.save(buf, "JPEG", **NORMALIZED_JPEG)
+        return label, buf.getvalue(), None
+    img = _sharpen(img, is_thumb=(label == "thumb"))
+    jpg = BytesIO()
+    img.save(jpg, "JPEG", **VARIANT_JPEG)
     try:
-        with open(p, 'rb') as f:
-            raw_bytes = f.read()
-        img = Image.open(Path(path))
-    except Exception as e:
-        return {"error": f"unreadable: {e}"}
+        webp = BytesIO()
+        img.save(webp, "WEBP", **VARIANT_WEBP)
+        webp_bytes = webp.getvalue()
+    except Exception:
+        webp_bytes = None
+    return label, jpg.getvalue(), webp_bytes
 
-    img = _ensure_orientation(img)
-    img = img.convert("RGB")
-    w, h = img.size
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _encode_workers() -> int:
+    from django.conf import settings
+    configured = getattr(settings, 'IMAGE_ENCODE_WORKERS', None)
+    if configured is not None:
+        return max(0, int(configured))
+    return min(4, os.cpu_count() or 1)
+
+
+def _get_pool():
+    global _POOL
+    workers = _encode_workers()
+    if workers <= 1:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: never fork a process that may hold threads / DB connections
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _POOL
+
+
+def _reset_pool(wait: bool = False) -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _encode_all(tasks: List[Tuple[str, Image.Image]]) -> Dict[str, Tuple[bytes, Optional[bytes]]]:
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            return {label: (jpg, webp) for label, jpg, webp in pool.map(_encode, tasks)}
+        except Exception as e:
+            logger.warning("Image encode pool failed, encoding serially: %s", e)
+            _reset_pool()
+    return {label: (jpg, webp) for label, jpg, webp in map(_encode, tasks)}
+
+
+# --- Pipeline -----------------------------------------------------------------------------------
+
+def _analyze(raw: bytes) -> Tuple[Dict[str, Any], Optional[Image.Image]]:
+    """(meta, normalized RGB image or None when the upload is rejected / unreadable)."""
+    meta: Dict[str, Any] = {"variants": {}, "flags": [], "original": {}, "pipeline_version": PIPELINE_VERSION}
+    try:
+        img = Image.open(BytesIO(raw))
+        w, h = img.size
+        try:
+            if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+                w, h = h, w
+        except Exception:
+            pass
+    except Exception as e:
+        return {"error": f"unreadable: {e}"}, None
     meta["original"]["width"] = w
     meta["original"]["height"] = h
-    try:
-        meta["original"]["sha256"] = _hash_bytes(raw_bytes)
-    except Exception:
-        pass
+    meta["original"]["sha256"] = _hash_bytes(raw)
 
-    # Validation
+    # Validation (header only: rejected uploads are never decoded)
     if w < MIN_ACCEPT_WIDTH or h < MIN_ACCEPT_HEIGHT:
         meta["flags"].append(ImageQualityFlags.REJECTED)
         meta["reason"] = "too_small"
-        return meta
+        return meta, None
     if min(w, h) < WARN_MIN_SIDE:
         meta["flags"].append(ImageQualityFlags.LOW_RES)
-
     aspect = max(w / h, h / w)
     if aspect > MAX_ASPECT_RATIO:
         meta["flags"].append(ImageQualityFlags.REJECTED)
         meta["reason"] = "extreme_aspect"
-        return meta
+        return meta, None
 
-    # Downscale original if huge
+    target = None
     if max(w, h) > MAX_ORIGINAL_SIDE:
         scale = MAX_ORIGINAL_SIDE / float(max(w, h))
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        w, h = img.size
+        target = (int(w * scale), int(h * scale))
+    try:
+        if target is not None:
+            # JPEG: decode at the smallest DCT scale that still covers the target (no-op for other formats)
+            raw_w, raw_h = img.size
+            scale = MAX_ORIGINAL_SIDE / float(max(raw_w, raw_h))
+            img.draft('RGB', (math.ceil(raw_w * scale), math.ceil(raw_h * scale)))
+        img = _ensure_orientation(img).convert("RGB")
+    except Exception as e:
+        return {"error": f"unreadable: {e}"}, None
+    if target is not None and img.size != target:
+        img = img.resize(target, Image.Resampling.LANCZOS)
 
-    # Blur detection
+    # Quality scores (blur, noise, exposure) and the thumbnail crop hint
     try:
-        sharpness_var = _laplacian_variance(img)
-        meta["original"]["sharpness_var"] = round(sharpness_var, 2)
-        if sharpness_var < 60:  # heuristic threshold
+        quality = image_quality.analyze(img)
+        meta["quality"] = quality
+        meta["original"]["sharpness_var"] = quality["sharpness"]
+        if image_quality.is_blurry(quality):
             meta["flags"].append(ImageQualityFlags.BLURRY)
-    except Exception:
-        pass
+    except Exception as e:
+        logger.warning("Image quality analysis failed: %s", e)
+    return meta, img
 
-    # Mild sharpening for all variants
-    def sharpen(im: Image.Image, is_thumb=False) -> Image.Image:
-        # Use UnsharpMask for control
-        return im.filter(ImageFilter.UnsharpMask(radius=1.2, percent=(130 if is_thumb else 110), threshold=3))
 
-    base_stem = p.stem  # e.g. 'abc123'
-    base_dir = p.parent
+def _build_variants(img: Image.Image, focus: Tuple[float, float] = (0.5, 0.5)) -> List[Tuple[str, Image.Image]]:
+    """Resize every variant from the smallest already built level that covers it (largest first).
 
-    # Save normalized original (overwrite) as JPEG if not already
-    normalized_path = base_dir / f"{base_stem}.jpg"
-    img.save(normalized_path, "JPEG", quality=85, optimize=True, progressive=True)
-    if normalized_path != p:
-        try:
-            p.unlink()
-        except Exception:
-            pass
+    Square variants are cropped around `focus` (0..1 image coordinates).
+    """
+    levels = [img]
+    out = []
+    for label, max_w, max_h, square in sorted(VARIANTS, key=lambda v: v[1] * v[2], reverse=True):
+        if square:
+            need = (max_w, max_w)
+            source = min((l for l in levels if min(l.size) >= max_w), key=lambda l: l.size[0] * l.size[1], default=img)
+            variant = _square_crop(source, max_w, focus)
+        else:
+            need = _fit_size(img.size, (max_w, max_h))
+            source = min((l for l in levels if l.size[0] >= need[0] and l.size[1] >= need[1]),
+                         key=lambda l: l.size[0] * l.size[1], default=img)
+            variant = source.copy() if source.size == need else source.resize(need, Image.Resampling.LANCZOS)
+            levels.append(variant)
+        out.append((label, variant))
+    return out
+
+
+def normalized_name(stem: str, immutable: bool = False) -> str:
+    """Name of the normalized JPEG next to the original. Content-addressed blobs are immutable
+    (other rows may name the same file), so theirs gets its own name instead of replacing the upload."""
+    return f"{stem}__normalized.jpg" if immutable else f"{stem}.jpg"
+
+
+def _run_pipeline(raw: bytes, write: Callable[[str, bytes], None], stem: str,
+                  immutable: bool = False) -> Dict[str, Any]:
+    """Analyze, resize and encode `raw`; `write(relative_name, data)` stores each output next to the original."""
+    meta, img = _analyze(raw)
+    if img is None:
+        return meta
+    tasks = [('normalized', img)] + _build_variants(img, image_quality.crop_focus(meta.get("quality")))
+    encoded = _encode_all(tasks)
 
-    meta["normalized"] = normalized_path.name
+    normalized = normalized_name(stem, immutable)
+    write(normalized, encoded['normalized'][0])
+    meta["normalized"] = normalized
     meta["processed_at"] = datetime.now(timezone.utc).isoformat()
 
-    # Variants
-    for label, max_w, max_h, square in VARIANTS:
-        if square:
-            variant_img = _square_crop(img, max_w)
-        else:
-            variant_img = _resize_preserve(img, max_w, max_h)
-        variant_img = sharpen(variant_img, is_thumb=(label == "thumb"))
-        jpg_name = f"{base_stem}__{label}.jpg"
-        webp_name = f"{base_stem}__{label}.webp"
-        jpg_path = base_dir / jpg_name
-        webp_path = base_dir / webp_name
-        variant_img.save(jpg_path, "JPEG", quality=82, optimize=True, progressive=True)
-        try:
-            variant_img.save(webp_path, "WEBP", quality=80, method=6)
-            webp_saved = True
-        except Exception:
-            webp_saved = False
+    sizes = {label: variant.size for label, variant in tasks}
+    for label, _, _, _ in VARIANTS:
+        jpg_bytes, webp_bytes = encoded[label]
+        jpg_name = f"{stem}__{label}.jpg"
+        webp_name = f"{stem}__{label}.webp"
+        write(jpg_name, jpg_bytes)
+        if webp_bytes is not None:
+            write(webp_name, webp_bytes)
         meta["variants"][label] = {
             "jpg": jpg_name,
-            "webp": webp_name if webp_saved else None,
-            "width": variant_img.width,
-            "height": variant_img.height,
+            "webp": webp_name if webp_bytes is not None else None,
+            "width": sizes[label][0],
+            "height": sizes[label][1],
         }
+    return meta
+
+
+def _is_blob_path(path: Path) -> bool:
+    from users.blob_store import BLOB_PREFIX
+    return path.parent.parent.name == BLOB_PREFIX
+
+
+def process_profile_photo(path: str) -> Dict[str, Any]:
+    """Process original profile photo in-place and generate variant files.
+    Returns metadata dict with variant relative paths and quality flags.
+    A content-addressed blob original is never rewritten or removed.
+    """
+    p = Path(path)
+    if not p.exists():
+        return {"error": "file-missing"}
+    if p.stat().st_size > MAX_FILE_BYTES:
+        return {"error": "file-too-large"}
+    try:
+        raw = p.read_bytes()
+    except Exception as e:
+        return {"error": f"unreadable: {e}"}
 
+    base_dir = p.parent
+
+    def write(name: str, data: bytes) -> None:
+        (base_dir / name).write_bytes(data)
+
+    immutable = _is_blob_path(p)
+    meta = _run_pipeline(raw, write, p.stem, immutable)
+    # Normalized original replaces the upload (same name for .jpg sources)
+    if not immutable and meta.get("normalized") and base_dir / meta["normalized"] != p:
+        try:
+            p.unlink()
+        except Exception:
+            pass
     return meta
 
+
 def process_profile_photo_storage(field_file) -> Dict[str, Any]:
     """Process a profile photo that may be stored on a storage backend without local path (e.g. S3).
     Downloads into memory, generates variants, uploads them alongside original directory.
@@ -206,117 +360,27 @@ def process_profile_photo_storage(field_file) -> Dict[str, Any]:
     except Exception:
         pass
 
-    # Remote / pathless storage path
-    # Load file bytes
+    # Remote / pathless storage: one download feeds both the hash and the decoder
     try:
         with storage.open(name, 'rb') as f:
-            img = Image.open(f)
-            img = _ensure_orientation(img).convert('RGB')
+            raw = f.read()
     except Exception as e:
         return {"error": f"unreadable: {e}"}
 
-    meta: Dict[str, Any] = {"variants": {}, "flags": [], "original": {}, "pipeline_version": PIPELINE_VERSION}
-    w, h = img.size
-    meta["original"]["width"] = w
-    meta["original"]["height"] = h
-    # Hash original bytes (re-open)
-    try:
-        with storage.open(name, 'rb') as f2:
-            meta["original"]["sha256"] = _hash_bytes(f2.read())
-    except Exception:
-        pass
-    if w < MIN_ACCEPT_WIDTH or h < MIN_ACCEPT_HEIGHT:
-        meta["flags"].append(ImageQualityFlags.REJECTED)
-        meta["reason"] = "too_small"
-        return meta
-    if min(w, h) < WARN_MIN_SIDE:
-        meta["flags"].append(ImageQualityFlags.LOW_RES)
-    aspect = max(w / h, h / w)
-    if aspect > MAX_ASPECT_RATIO:
-        meta["flags"].append(ImageQualityFlags.REJECTED)
-        meta["reason"] = "extreme_aspect"
-        return meta
-    if max(w, h) > MAX_ORIGINAL_SIDE:
-        scale = MAX_ORIGINAL_SIDE / float(max(w, h))
-        img = img.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
-        w, h = img.size
-    try:
-        sharpness_var = _laplacian_variance(img)
-        meta["original"]["sharpness_var"] = round(sharpness_var, 2)
-        if sharpness_var < 60:
-            meta["flags"].append(ImageQualityFlags.BLURRY)
-    except Exception:
-        pass
+    dir_name = os.path.dirname(name)  # storage relative dir
 
-    def sharpen(im: Image.Image, is_thumb=False) -> Image.Image:
-        return im.filter(ImageFilter.UnsharpMask(radius=1.2, percent=(130 if is_thumb else 110), threshold=3))
+    def write(rel: str, data: bytes) -> None:
+        full = f"{dir_name}/{rel}" if dir_name else rel
+        if storage.exists(full):
+            try:
+                storage.delete(full)
+            except Exception:
+                pass
+        storage.save(full, ContentFile(data))
 
-    dir_name = os.path.dirname(name)  # storage relative dir
-    stem = os.path.splitext(os.path.basename(name))[0]
-
-    # Normalized original jpg
-    normalized_rel = f"{stem}.jpg"
-    normalized_full = f"{dir_name}/{normalized_rel}" if dir_name else normalized_rel
-    buf = ContentFile(b"")
-    out_bytes = ContentFile(b"")
-    tmp = ContentFile(b"")
-    norm_bytes = ContentFile(b"")
-    # Save normalized
-    tmp_io = Image.new('RGB', (1,1))  # placeholder to keep names unique (ignored)
-    out = ContentFile(b"")
-    # Actually save normalized image
-    norm_buffer = ContentFile(b"")
-    from io import BytesIO
-    b = BytesIO()
-    img.save(b, "JPEG", quality=85, optimize=True, progressive=True)
-    b.seek(0)
-    if storage.exists(normalized_full):
-        try:
-            storage.delete(normalized_full)
-        except Exception:
-            pass
-    storage.save(normalized_full, ContentFile(b.read()))
-    meta["normalized"] = normalized_rel
-    meta["processed_at"] = datetime.now(timezone.utc).isoformat()
+    from users.blob_store import is_blob_name
+    return _run_pipeline(raw, write, os.path.splitext(os.path.basename(name))[0], is_blob_name(name))
 
-    for label, max_w_val, max_h_val, square in VARIANTS:
-        if square:
-            variant_img = _square_crop(img, max_w_val)
-        else:
-            variant_img = _resize_preserve(img, max_w_val, max_h_val)
-        variant_img = sharpen(variant_img, is_thumb=(label == "thumb"))
-        jpg_rel = f"{stem}__{label}.jpg"
-        webp_rel = f"{stem}__{label}.webp"
-        jpg_full = f"{dir_name}/{jpg_rel}" if dir_name else jpg_rel
-        webp_full = f"{dir_name}/{webp_rel}" if dir_name else webp_rel
-        # Save JPEG
-        jb = BytesIO()
-        variant_img.save(jb, "JPEG", quality=82, optimize=True, progressive=True)
-        jb.seek(0)
-        if storage.exists(jpg_full):
-            try: storage.delete(jpg_full)
-            except Exception: pass
-        storage.save(jpg_full, ContentFile(jb.read()))
-        # Save WebP
-        wb_saved = False
-        try:
-            wb = BytesIO()
-            variant_img.save(wb, "WEBP", quality=80, method=6)
-            wb.seek(0)
-            if storage.exists(webp_full):
-                try: storage.delete(webp_full)
-                except Exception: pass
-            storage.save(webp_full, ContentFile(wb.read()))
-            wb_saved = True
-        except Exception:
-            wb_saved = False
-        meta["variants"][label] = {
-            "jpg": jpg_rel,
-            "webp": webp_rel if wb_saved else None,
-            "width": variant_img.width,
-            "height": variant_img.height,
-        }
-    return meta
 
 def process_generic_image(field_file):
     """Process any ImageField file (gallery, blog) returning metadata; reuses profile pipeline.
@@ -329,6 +393,7 @@ def process_generic_image(field_file):
         return process_profile_photo_storage(field_file)
 
 __all__ = [
+    "normalized_name",
     "process_profile_photo",
     "process_profile_photo_storage",
     "process_generic_image",
@@ -1,5 +1,6 @@
 from users.models_profile import TherapistProfile, Location, ZipCode
-from math import radians, sin, cos, atan2, sqrt
+from users.zip_index import get_zip_index, haversine_miles
+from users.cache_utils import TieredCache
 from typing import Optional
 
 # Dynamic zipcode enrichment uses uszipcode if an unknown ZIP is requested.
@@ -8,23 +9,53 @@ try:
 except Exception:  # pragma: no cover - defensive if library missing in some env
     SearchEngine = None
 
-_ZIP_CACHE = {}
+# ZIP lookups shared by every worker (users/cache_utils.py); None results are cached too.
+# forget_zip() drops an entry when the ZipCode row is inserted or removed.
+ZIP_CACHE_TIMEOUT = 60 * 60 * 24  # 24h
+_ZIP_COORDS = TieredCache('zip.coords', maxsize=4096, timeout=ZIP_CACHE_TIMEOUT)
+_ZIP_META = TieredCache('zip.meta', maxsize=4096, timeout=ZIP_CACHE_TIMEOUT)
+
+
+def _load_latlng(z5: str):
+    try:
+        zobj = ZipCode.objects.filter(pk=z5).only('latitude','longitude').first()
+        return (float(zobj.latitude), float(zobj.longitude)) if zobj else None
+    except Exception:
+        return None
+
 
 def get_zip_latlng(zip_code: str):
     if not zip_code:
         return None
     z5 = str(zip_code)[:5]
-    if z5 in _ZIP_CACHE:
-        return _ZIP_CACHE[z5]
+    return _ZIP_COORDS.get_or_set(z5, lambda: _load_latlng(z5))
+
+
+def _load_city_state(z5: str):
+    # Query local table; dynamically enrich if missing
     try:
-        zobj = ZipCode.objects.filter(pk=z5).only('latitude','longitude').first()
-        if zobj:
-            _ZIP_CACHE[z5] = (float(zobj.latitude), float(zobj.longitude))
-        else:
-            _ZIP_CACHE[z5] = None
+        row = ZipCode.objects.filter(pk=z5).only('city','state').first()
+        if not row:
+            row = ensure_zipcode(z5)
+        if row:
+            return row.city, row.state
     except Exception:
-        _ZIP_CACHE[z5] = None
-    return _ZIP_CACHE[z5]
+        pass
+    return None, None
+
+
+def get_zip_city_state(zip_code: str):
+    """(city, state) for a ZIP, or (None, None) when unknown."""
+    if not zip_code:
+        return None, None
+    z5 = str(zip_code)[:5]
+    return _ZIP_META.get_or_set(z5, lambda: _load_city_state(z5))
+
+
+def forget_zip(zip_code: str) -> None:
+    z5 = str(zip_code or '')[:5]
+    for cache in (_ZIP_COORDS, _ZIP_META):
+        cache.delete(z5)
 
 def ensure_zipcode(zip_code: str) -> Optional[ZipCode]:
     """Ensure a ZipCode row exists; if missing, attempt to fetch via uszipcode and insert.
@@ -53,7 +84,7 @@ def ensure_zipcode(zip_code: str) -> Optional[ZipCode]:
                     longitude=str(rec.lng),
                 )
                 # prime cache
-                _ZIP_CACHE[z5] = (float(created.latitude), float(created.longitude))
+                _ZIP_COORDS.set(z5, (float(created.latitude), float(created.longitude)))
                 return created
             except Exception:
                 return ZipCode.objects.filter(pk=z5).first()
@@ -61,15 +92,6 @@ def ensure_zipcode(zip_code: str) -> Optional[ZipCode]:
         return None
     return None
 
-def haversine_miles(lat1, lon1, lat2, lon2):
-    R = 3958.8
-    phi1, phi2 = radians(lat1), radians(lat2)
-    dphi = radians(lat2 - lat1)
-    dlmb = radians(lon2 - lon1)
-    a = sin(dphi/2)**2 + cos(phi1)*cos(phi2)*sin(dlmb/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    return R * c
-
 def min_distance_between_zip_and_locations(user_zip: str, locations):
     user_ll = get_zip_latlng(user_zip)
     if not user_ll:
@@ -102,23 +124,11 @@ def get_primary_location(locations_queryset):
     return locations[0] if locations else None
 
 def nearest_zip_from_coordinates(lat: float, lng: float) -> Optional[str]:
-    """Find nearest stored ZipCode to provided lat/lng. If table is sparsely populated,
-    this is a full scan; for large tables consider spatial indexing in future.
+    """Find nearest stored ZipCode to provided lat/lng using the in-process spatial index
+    (grid ring search; only the cells around the point are examined).
     """
     try:
-        rows = list(ZipCode.objects.all().only('zip','latitude','longitude'))
-        if not rows:
-            return None
-        best_zip = None
-        best_d = None
-        for r in rows:
-            try:
-                d = haversine_miles(float(lat), float(lng), float(r.latitude), float(r.longitude))
-            except Exception:
-                continue
-            if best_d is None or d < best_d:
-                best_d = d
-                best_zip = r.zip
-        return best_zip
+        hits = get_zip_index().nearest(float(lat), float(lng), k=1)
+        return hits[0][0] if hits else None
     except Exception:
         return None
@@ -0,0 +1,199 @@
+"""Process-wide registry of lookup tables (license types, specialties, identities, ...).
+
+Every lookup table is small and read on nearly every directory / profile request, so
+each one is loaded once as an ordered tuple of LookupOption(id, name, category,
+sort_order) rows and served from memory:
+
+    options('license_type')            rows ordered by (sort_order, name), or name when
+                                       the table has no sort_order
+    options_by_name('license_type')    rows ordered by name
+    names('gender')                    just the names, registry order
+    search_options('therapy_type', q)  case-insensitive substring match, registry order
+
+Freshness is tracked with a version stamp kept in the Django cache. post_save /
+post_delete on any lookup model (including admin edits and the admin purge actions)
+replace the stamp on commit; a worker compares its stamp at most every
+STAMP_CHECK_SECONDS and drops its tables when the stamp changed. Without a shared
+backend (CACHE_URL unset) the stamp is per process, so tables are also reloaded
+after MAX_AGE_SECONDS to pick up edits made by other workers or by queryset.update()
+(seed_lookups.py), which send no signals.
+
+Search documents and profile snapshots copy lookup names; `referencing_profile_ids()`
+finds the profiles naming a changed row so only those are refreshed.
+"""
+from collections import namedtuple
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import time
+import uuid
+
+LookupOption = namedtuple('LookupOption', 'id name category sort_order')
+
+# registry key -> lookup model name in users.models_profile
+LOOKUP_MODELS = {
+    'license_type': 'LicenseType',
+    'participant_type': 'ParticipantType',
+    'age_group': 'AgeGroup',
+    'therapy_type': 'TherapyType',
+    'testing_type': 'TestingType',
+    'specialty': 'SpecialtyLookup',
+    'payment_method': 'PaymentMethod',
+    'insurance_provider': 'InsuranceProvider',
+    'title': 'Title',
+    'gender': 'Gender',
+    'race_ethnicity': 'RaceEthnicity',
+    'faith': 'Faith',
+    'lgbtqia': 'LGBTQIA',
+    'other_identity': 'OtherIdentity',
+}
+VERSION_CACHE_KEY = 'lookups:version'
+STAMP_CHECK_SECONDS = 5
+MAX_AGE_SECONDS = 300
+
+# key -> (rows in registry order, rows by name)
+_TABLES: Dict[str, Tuple[Tuple[LookupOption, ...], Tuple[LookupOption, ...]]] = {}
+_VERSION = None
+_CHECKED_AT = 0.0
+_LOADED_AT = 0.0
+_LOCK = Lock()
+
+
+def lookup_model(key: str):
+    from users import models_profile
+    return getattr(models_profile, LOOKUP_MODELS[key])
+
+
+def _field_names(model) -> set:
+    return {f.name for f in model._meta.concrete_fields}
+
+
+def _load_table(key: str):
+    model = lookup_model(key)
+    fields = _field_names(model)
+    has_category = 'category' in fields
+    has_sort = 'sort_order' in fields
+    cols = ['id', 'name'] + (['category'] if has_category else []) + (['sort_order'] if has_sort else [])
+    rows = []
+    for values in model.objects.order_by(*(['sort_order', 'name'] if has_sort else ['name'])).values_list(*cols):
+        row = dict(zip(cols, values))
+        rows.append(LookupOption(row['id'], row['name'], row.get('category', ''), row.get('sort_order', 0)))
+    ordered = tuple(rows)
+    by_name = ordered if not has_sort else tuple(sorted(rows, key=lambda r: r.name))
+    return ordered, by_name
+
+
+def _stamp():
+    from django.core.cache import cache
+    value = cache.get(VERSION_CACHE_KEY)
+    if value is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        value = cache.get(VERSION_CACHE_KEY)
+    return value
+
+
+def _check_version() -> None:
+    """Drop this process's tables when the shared stamp moved or they are too old."""
+    global _VERSION, _CHECKED_AT, _LOADED_AT
+    now = time.monotonic()
+    if now - _CHECKED_AT < STAMP_CHECK_SECONDS:
+        return
+    try:
+        stamp = _stamp()
+    except Exception:
+        stamp = _VERSION  # cache unavailable: rely on MAX_AGE_SECONDS
+    with _LOCK:
+        if stamp != _VERSION or now - _LOADED_AT >= MAX_AGE_SECONDS:
+            _TABLES.clear()
+            _VERSION = stamp
+            _LOADED_AT = now
+        _CHECKED_AT = now
+
+
+def _table(key: str):
+    _check_version()
+    table = _TABLES.get(key)
+    if table is None:
+        table = _load_table(key)
+        with _LOCK:
+            _TABLES[key] = table
+    return table
+
+
+def options(key: str) -> Tuple[LookupOption, ...]:
+    """All rows of a lookup table ordered by (sort_order, name), or by name."""
+    return _table(key)[0]
+
+
+def options_by_name(key: str) -> Tuple[LookupOption, ...]:
+    return _table(key)[1]
+
+
+def names(key: str, by_name: bool = False) -> List[str]:
+    return [r.name for r in _table(key)[1 if by_name else 0]]
+
+
+def search_options(key: str, query: str = '', limit: Optional[int] = 20) -> List[LookupOption]:
+    """Rows whose name contains `query` (case-insensitive), registry order, at most `limit`."""
+    rows = options(key)
+    q = (query or '').strip().lower()
+    if q:
+        rows = [r for r in rows if q in r.name.lower()]
+    return list(rows[:limit] if limit else rows)
+
+
+def referencing_profile_ids(instance) -> set:
+    """Ids of the therapist profiles naming a lookup row, directly (FK / M2M on the profile)
+    or through a per-therapist selection table (Specialty, Credential, InsuranceDetail, ...)."""
+    from django.core.exceptions import FieldDoesNotExist
+    from users.models_profile import TherapistProfile
+    ids = set()
+    for rel in instance._meta.concrete_model._meta.related_objects:
+        related = rel.related_model
+        match = {rel.field.name: instance.pk}
+        if related is TherapistProfile:
+            ids.update(TherapistProfile.objects.filter(**match).values_list('pk', flat=True))
+            continue
+        try:
+            owner = related._meta.get_field('therapist')
+        except FieldDoesNotExist:
+            continue
+        if owner.related_model is TherapistProfile:
+            ids.update(related.objects.filter(**match).values_list('therapist_id', flat=True))
+    ids.discard(None)
+    return ids
+
+
+def invalidate_lookups() -> None:
+    """Forget this process's tables (the next read reloads them)."""
+    global _CHECKED_AT
+    with _LOCK:
+        _TABLES.clear()
+        _CHECKED_AT = 0.0
+
+
+def bump_lookup_version() -> None:
+    """Mark every worker's lookup tables stale. Applied after the current transaction commits."""
+    from django.db import transaction
+
+    def _bump():
+        try:
+            from django.core.cache import cache
+            cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        finally:
+            invalidate_lookups()
+
+    transaction.on_commit(_bump)
+
+
+__all__ = [
+    "LookupOption",
+    "LOOKUP_MODELS",
+    "lookup_model",
+    "options",
+    "options_by_name",
+    "names",
+    "search_options",
+    "referencing_profile_ids",
+    "invalidate_lookups",
+    "bump_lookup_version",
+]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from users.feed_timeline import backfill_user
+
+
+class Command(BaseCommand):
+    help = "Add every visible connections-only post missing from members' feed timelines (all users, or selected ids). Never removes rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='*', type=int, help='Only backfill these user ids')
+
+    def handle(self, *args, **options):
+        from users.models import User
+        ids = options.get('users') or User.objects.order_by('pk').values_list('pk', flat=True)
+        users = offered = 0
+        for user_id in ids:
+            offered += backfill_user(user_id)
+            users += 1
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {users} timelines ({offered} rows offered, existing rows kept)"))
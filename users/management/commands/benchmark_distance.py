@@ -0,0 +1,81 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from users.geo import nearest_locations, np
+from users.zip_index import ZipIndex, haversine_miles
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark the batched distance kernel against the legacy per-pair haversine loop (synthetic data, no DB)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated location counts')
+        parser.add_argument('--locations-per-profile', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=3, help='Best-of-N timing')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _legacy(self, origin_row, profiles, zip_rows):
+        # Mirrors the pre-kernel view code: Decimal -> float per pair, pure Python loop
+        out = {}
+        for pid, zips in profiles.items():
+            min_d = None
+            nearest = None
+            for z in zips:
+                zr = zip_rows.get(z)
+                if zr:
+                    d = haversine_miles(float(origin_row[0]), float(origin_row[1]), float(zr[0]), float(zr[1]))
+                    if min_d is None or d < min_d:
+                        min_d, nearest = d, z
+            if min_d is not None:
+                out[pid] = (min_d, nearest)
+        return out
+
+    def _best_of(self, fn, repeat):
+        best = None
+        result = None
+        for _ in range(repeat):
+            t = time.perf_counter()
+            result = fn()
+            dt = time.perf_counter() - t
+            best = dt if best is None else min(best, dt)
+        return best, result
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        per_profile = max(1, options['locations_per_profile'])
+        repeat = max(1, options['repeat'])
+        backend = 'numpy %s' % np.__version__ if np is not None else 'pure-python fallback (numpy not installed)'
+        self.stdout.write(f"Kernel backend: {backend}")
+        for size in [int(s) for s in options['sizes'].split(',') if s.strip()]:
+            # Synthetic keys are 5-digit ZIPs, so one run tops out at 100k distinct locations
+            size = min(size, 100000)
+            zip_rows = {}
+            for n in range(size):
+                # Continental US bounding box
+                lat = Decimal(str(round(rnd.uniform(24.5, 49.0), 6)))
+                lng = Decimal(str(round(rnd.uniform(-124.7, -67.0), 6)))
+                zip_rows[f"{n:05d}"] = (lat, lng)
+            zips = list(zip_rows.keys())
+            profiles = {}
+            rows = []
+            for i, z in enumerate(zips):
+                pid = i // per_profile
+                profiles.setdefault(pid, []).append(z)
+                rows.append((pid, z))
+            index = ZipIndex((z, lat, lng) for z, (lat, lng) in zip_rows.items())
+            origin_row = zip_rows[zips[0]]
+            olat, olng = float(origin_row[0]), float(origin_row[1])
+
+            legacy_t, legacy = self._best_of(lambda: self._legacy(origin_row, profiles, zip_rows), repeat)
+            kernel_t, kernel = self._best_of(lambda: nearest_locations(olat, olng, rows, index=index), repeat)
+
+            mismatches = sum(1 for pid, (d, _) in legacy.items() if abs(kernel.get(pid, (float('inf'),))[0] - d) > 1e-6)
+            speedup = legacy_t / kernel_t if kernel_t else float('inf')
+            self.stdout.write(
+                f"{size:>7} locations / {len(profiles):>6} profiles: legacy {legacy_t * 1000:8.1f}ms  "
+                f"kernel {kernel_t * 1000:8.1f}ms  speedup x{speedup:.1f}  mismatches {mismatches}"
+            )
+        self.stdout.write(self.style.SUCCESS("Distance benchmark complete."))
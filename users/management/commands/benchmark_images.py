@@ -0,0 +1,98 @@
+import io
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+
+def _synthetic_jpeg(width: int, height: int, seed: int) -> bytes:
+    """Photo-like test image: smooth gradients plus sensor-style noise (noise alone would overstate encode cost)."""
+    from PIL import Image, ImageFilter
+    rnd = random.Random(seed)
+    small = Image.new('RGB', (64, 48))
+    small.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)) for _ in range(64 * 48)])
+    img = small.resize((width, height), Image.Resampling.BICUBIC).filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise((width, height), 18).convert('RGB')
+    img = Image.blend(img, noise, 0.12)
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=92)
+    return buf.getvalue()
+
+
+class _PathlessFile:
+    """FieldFile stand-in for a storage without local paths (the S3 code path)."""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+    @property
+    def path(self):
+        raise NotImplementedError("This backend doesn't support absolute paths.")
+
+
+def _run_once(mode: str, src: bytes, workdir: str, conn) -> None:
+    # Runs in a fresh child process so ru_maxrss is this pipeline's own high-water mark
+    from django.core.files.storage import FileSystemStorage
+    from users.image_utils import _reset_pool, process_profile_photo, process_profile_photo_storage
+    name = 'photo.jpg'
+    with open(os.path.join(workdir, name), 'wb') as f:
+        f.write(src)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t = time.perf_counter()
+    if mode == 'local':
+        meta = process_profile_photo(os.path.join(workdir, name))
+    else:
+        meta = process_profile_photo_storage(_PathlessFile(FileSystemStorage(location=workdir), name))
+    elapsed = time.perf_counter() - t
+    # Reap the encoder processes: a multiprocessing child does not run the executor's exit hook,
+    # and RUSAGE_CHILDREN only counts processes that have been waited for
+    _reset_pool(wait=True)
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    conn.send((elapsed, rss_before, self_rss, children_rss, sorted((meta.get('variants') or {})), meta.get('error')))
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the profile photo pipeline (wall time and peak RSS) on synthetic 12MP JPEGs, local and storage paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=4000)
+        parser.add_argument('--height', type=int, default=3000)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path (each in a fresh process)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        src = _synthetic_jpeg(options['width'], options['height'], options['seed'])
+        self.stdout.write(f"Input: {options['width']}x{options['height']} JPEG, {len(src) / 1e6:.1f} MB; "
+                          f"{os.cpu_count()} CPU(s)")
+        ctx = multiprocessing.get_context('fork')
+        for mode in ('local', 'storage'):
+            times, peaks, deltas, pools = [], [], [], []
+            for _ in range(max(1, options['repeat'])):
+                workdir = tempfile.mkdtemp(prefix='bench_img_')
+                try:
+                    parent, child = ctx.Pipe(duplex=False)
+                    proc = ctx.Process(target=_run_once, args=(mode, src, workdir, child))
+                    proc.start()
+                    elapsed, rss_before, self_rss, children_rss, variants, error = parent.recv()
+                    proc.join()
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                if error:
+                    self.stderr.write(f"{mode}: pipeline error {error}")
+                    return
+                times.append(elapsed)
+                peaks.append(self_rss / 1024)
+                deltas.append((self_rss - rss_before) / 1024)
+                pools.append(children_rss / 1024)
+            self.stdout.write(
+                f"{mode:8s} wall best {min(times) * 1000:7.0f} ms  median {sorted(times)[len(times) // 2] * 1000:7.0f} ms  "
+                f"peak RSS {max(peaks):6.0f} MB (+{max(deltas):.0f} MB during run; encoder processes {max(pools):.0f} MB)  "
+                f"variants={','.join(variants)}")
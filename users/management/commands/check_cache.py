@@ -0,0 +1,39 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Verify the configured cache backend (CACHE_URL): set/get/add/incr/delete round trip and latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200, help='get/set pairs to time')
+
+    def handle(self, *args, **options):
+        conf = settings.CACHES['default']
+        self.stdout.write(f"Backend: {conf['BACKEND']} ({conf.get('LOCATION') or '-'})")
+        key = f'check_cache:{uuid.uuid4().hex}'
+        try:
+            cache.set(key, {'ok': True}, 30)
+            if cache.get(key) != {'ok': True}:
+                raise CommandError('Value read back differs from value written')
+            if cache.add(key, 'other', 30):
+                raise CommandError('add() overwrote an existing key')
+            cache.set(f'{key}:n', 1, 30)
+            if cache.incr(f'{key}:n') != 2:
+                raise CommandError('incr() did not increment')
+            rounds = max(1, options['rounds'])
+            started = time.perf_counter()
+            for i in range(rounds):
+                cache.set(key, i, 30)
+                cache.get(key)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        finally:
+            cache.delete_many([key, f'{key}:n'])
+        if cache.get(key) is not None:
+            raise CommandError('delete() left the key behind')
+        self.stdout.write(self.style.SUCCESS(
+            f"Cache OK: {rounds} set+get in {elapsed_ms:.1f} ms ({elapsed_ms / rounds:.3f} ms each)"))
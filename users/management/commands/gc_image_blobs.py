@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from users.blob_store import GC_GRACE_SECONDS, collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed image blobs (original + variants) that no profile, gallery, blog or feed row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=GC_GRACE_SECONDS / 3600,
+                            help='Only collect blobs unreferenced for at least this long')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recompute every blob\'s reference count from the tables first')
+        parser.add_argument('--orphans', action='store_true',
+                            help='Also delete files under blobs/ that have no ImageBlob row')
+
+    def handle(self, *args, **options):
+        result = collect_garbage(
+            grace_seconds=int(options['grace_hours'] * 3600),
+            dry_run=options['dry_run'],
+            recount_all=options['recount'],
+            orphans=options['orphans'],
+        )
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['blobs']} blobs ({result['files']} files, {result['orphan_files']} orphan files); "
+            f"corrected {result['recounted']} reference counts"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from users.profile_snapshot import rebuild_profile_snapshots, refresh_profile_snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized TherapistProfileSnapshot table (all profiles, or selected ids)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='*', type=int, help='Only refresh these TherapistProfile ids')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        ids = options.get('ids')
+        if ids:
+            written = refresh_profile_snapshots(ids)
+        else:
+            written = rebuild_profile_snapshots(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Profile snapshots written: {written}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from users.search import rebuild_search_documents, refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized TherapistSearchDocument table (all profiles, or selected ids)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='*', type=int, help='Only refresh these TherapistProfile ids')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ids = options.get('ids')
+        if ids:
+            written = refresh_search_documents(ids)
+        else:
+            written = rebuild_search_documents(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Search documents written: {written}"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from users.fulltext import get_backend
+from users.search import rebuild_search_documents
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search structures (Postgres tsvector / SQLite FTS5) and repopulate them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-documents', action='store_true', help='Do not rebuild TherapistSearchDocument rows first')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        self.stdout.write(f"Full-text backend: {backend.name}")
+        backend.ensure_schema()
+        if not options['skip_documents']:
+            written = rebuild_search_documents()
+            self.stdout.write(f"Search documents written: {written}")
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS("Full-text index rebuilt."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from users.feed_timeline import repair_user
+
+
+class Command(BaseCommand):
+    help = "Reconcile members' feed timelines with the visibility rules: add missing posts and remove ones no longer visible."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='*', type=int, help='Only repair these user ids')
+        parser.add_argument('--dry-run', action='store_true', help='Report differences without writing')
+
+    def handle(self, *args, **options):
+        from users.models import User
+        ids = options.get('users') or User.objects.order_by('pk').values_list('pk', flat=True)
+        added = removed = drifted = 0
+        for user_id in ids:
+            a, r = repair_user(user_id, dry_run=options['dry_run'])
+            if a or r:
+                drifted += 1
+                self.stdout.write(f"user {user_id}: +{a} -{r}")
+            added += a
+            removed += r
+        if options['dry_run']:
+            summary = f"Would add {added} and remove {removed} rows across {drifted} timelines"
+        else:
+            summary = f"Added {added} and removed {removed} rows across {drifted} timelines"
+        self.stdout.write(self.style.SUCCESS(summary))
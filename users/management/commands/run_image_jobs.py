@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.image_jobs import run_pending, worker_id
+from users.models_jobs import ImageJob
+
+
+class Command(BaseCommand):
+    help = "Process queued image variant jobs (profile photos, gallery and blog images). Runs until stopped unless --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the due jobs and exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Exit after processing this many jobs')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue permanently failed jobs again before starting')
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        if options['retry_failed']:
+            retried = 0
+            for job in ImageJob.objects.filter(status=ImageJob.STATUS_FAILED):
+                if not ImageJob.objects.filter(kind=job.kind, object_id=job.object_id,
+                                               status=ImageJob.STATUS_PENDING).exists():
+                    retried += ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.STATUS_PENDING, attempts=0)
+            self.stdout.write(f"Re-queued {retried} failed jobs")
+        max_jobs = options['max_jobs']
+        total = 0
+        try:
+            while True:
+                batch = run_pending(max_jobs=None if max_jobs is None else max_jobs - total, worker=worker)
+                total += batch
+                if batch:
+                    self.stdout.write(f"Processed {total} jobs so far ...")
+                if options['once'] or (max_jobs is not None and total >= max_jobs):
+                    break
+                if not batch:
+                    # Long-running worker: drop connections the database may have timed out
+                    close_old_connections()
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Done. processed={total}"))
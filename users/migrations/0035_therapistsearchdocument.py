@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Rows are built by users.search.sync_after_migrate (post_migrate), with the live code and schema
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0034_therapistprofile_preferred_contact_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TherapistSearchDocument',
+            fields=[
+                ('therapist', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='users.therapistprofile')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('listed', models.BooleanField(db_index=True, default=False)),
+                ('last_login', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('first_name', models.CharField(blank=True, max_length=64)),
+                ('last_name', models.CharField(blank=True, max_length=64)),
+                ('slug', models.SlugField(blank=True, max_length=160)),
+                ('license_type_id', models.IntegerField(blank=True, null=True)),
+                ('license_name', models.CharField(blank=True, max_length=128)),
+                ('facets', models.JSONField(blank=True, default=dict)),
+                ('facet_keys', models.TextField(blank=True)),
+                ('search_text', models.TextField(blank=True)),
+                ('locations', models.JSONField(blank=True, default=list)),
+                ('primary_zip', models.CharField(blank=True, max_length=16)),
+                ('primary_lat', models.FloatField(blank=True, null=True)),
+                ('primary_lng', models.FloatField(blank=True, null=True)),
+                ('card', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listed', 'last_name', 'first_name'], name='search_doc_name_idx'), models.Index(fields=['listed', '-last_login'], name='search_doc_recent_idx')],
+            },
+        ),
+    ]
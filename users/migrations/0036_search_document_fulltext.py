@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+
+def drop_fulltext_schema(apps, schema_editor):
+    # The vendor structures are created after migrate by users.fulltext.ensure_after_migrate.
+    # They reference the text columns, so drop them before those columns are removed.
+    table = 'users_therapistsearchdocument'
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_vector_gin")
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0035_therapistsearchdocument'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='therapistsearchdocument',
+            name='search_text',
+        ),
+        migrations.AddField(
+            model_name='therapistsearchdocument',
+            name='name_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='therapistsearchdocument',
+            name='license_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='therapistsearchdocument',
+            name='place_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='therapistsearchdocument',
+            name='statement_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, drop_fulltext_schema),
+    ]
@@ -0,0 +1,25 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0036_search_document_fulltext'),
+    ]
+
+    operations = [
+        # Rows are built lazily on first read (or with `manage.py rebuild_profile_snapshots`)
+        migrations.CreateModel(
+            name='TherapistProfileSnapshot',
+            fields=[
+                ('therapist', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='users.therapistprofile')),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('slug', models.SlugField(blank=True, db_index=True, max_length=160)),
+                ('version', models.PositiveSmallIntegerField(default=0)),
+                ('document', models.JSONField(default=dict, encoder=DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
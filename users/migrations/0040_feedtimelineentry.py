@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_feed_timelines(apps, schema_editor):
+    # Connections-only posts go to their author and the author's accepted connections
+    # (public and members posts are read from FeedPost directly, see 0041)
+    FeedPost = apps.get_model('users', 'FeedPost')
+    Connection = apps.get_model('users', 'Connection')
+    FeedTimelineEntry = apps.get_model('users', 'FeedTimelineEntry')
+    connections = {}
+    for a, b in Connection.objects.filter(status='accepted').values_list('requester_id', 'addressee_id'):
+        if a and b and a != b:
+            connections.setdefault(a, set()).add(b)
+            connections.setdefault(b, set()).add(a)
+    batch = []
+    posts = FeedPost.objects.filter(visibility='connections').order_by().values_list('id', 'author_id', 'created_at')
+    for post_id, author_id, created_at in posts.iterator(chunk_size=1000):
+        for user_id in connections.get(author_id, set()) | {author_id}:
+            batch.append(FeedTimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at))
+        if len(batch) >= 1000:
+            FeedTimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedTimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0039_imageblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedTimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='users.feedpost')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-post'], name='feedtimeline_user_recent_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feedtimelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='feedtimeline_user_post_uniq'),
+        ),
+        migrations.RunPython(populate_feed_timelines, migrations.RunPython.noop),
+    ]
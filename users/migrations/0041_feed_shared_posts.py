@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+def drop_shared_post_rows(apps, schema_editor):
+    # Timelines now hold connections-only posts; public and members posts are read from the index below
+    FeedTimelineEntry = apps.get_model('users', 'FeedTimelineEntry')
+    FeedTimelineEntry.objects.exclude(post__visibility='connections').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0040_feedtimelineentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedpost',
+            index=models.Index(fields=['-created_at', '-id', 'visibility'], name='feedpost_recent_idx'),
+        ),
+        migrations.RunPython(drop_shared_post_rows, migrations.RunPython.noop),
+    ]
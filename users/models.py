@@ -105,6 +105,12 @@ class FeedPost(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Members feed: public/members posts are read by everyone from here, newest first, with
+            # visibility checked in the index (connections-only posts come from FeedTimelineEntry,
+            # users/feed_timeline.py)
+            models.Index(fields=['-created_at', '-id', 'visibility'], name='feedpost_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Feed by {self.author.email} @ {self.created_at:%Y-%m-%d}"
@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class ImageBlob(models.Model):
+    """One stored upload, addressed by the sha256 of its bytes (see users/blob_store.py).
+
+    Profile photos, gallery images, blog images and composer media whose bytes hash
+    to an existing blob point their file field at the blob's `name` instead of
+    storing another copy. `ref_count` is the number of file fields currently naming
+    the blob (kept by signals; `manage.py gc_image_blobs` recounts before deleting),
+    and `meta` caches the image pipeline's output so a duplicate upload reuses the
+    variants instead of being processed again.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    # Storage name of the original, e.g. blobs/3f/3f9c...e1.jpg; variants sit next to it
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    # users.image_utils metadata of the processed blob (empty until a job has processed it)
+    meta = models.JSONField(blank=True, default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when ref_count drops to zero; garbage collection waits out a grace period from here
+    unreferenced_since = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'unreferenced_since'], name='imageblob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
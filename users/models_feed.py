@@ -0,0 +1,29 @@
+from django.db import models
+from users.models import FeedPost, User
+
+
+class FeedTimelineEntry(models.Model):
+    """One connections-only post on one member's feed: the materialized result of the visibility rules.
+
+    Public and members posts are not copied here; feeds read them from FeedPost's
+    shared index. Written by users.feed_timeline when a post is created or its
+    visibility changes and when a connection is accepted or removed (signal
+    driven, applied on commit). `created_at` is copied from the post so a feed page
+    is one range scan of (user, -created_at, -post). Repair with
+    `manage.py repair_feed_timelines`; never edit by hand.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_timeline')
+    post = models.ForeignKey(FeedPost, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Also serves the new-post poll: (user, post_id > since_id)
+            models.UniqueConstraint(fields=['user', 'post'], name='feedtimeline_user_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='feedtimeline_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} on {self.user_id}'s feed"
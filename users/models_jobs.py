@@ -0,0 +1,53 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class ImageJob(models.Model):
+    """Queued image variant generation for one uploaded file (see users/image_jobs.py).
+
+    Signals enqueue a job instead of processing inside the request; `manage.py
+    run_image_jobs` claims due jobs, processes them and writes the target's meta.
+    At most one pending job exists per target (partial unique constraint), so
+    repeated saves collapse into one unit of work.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # users.image_jobs.TARGETS key: which model / file field / meta field the job processes
+    kind = models.CharField(max_length=32)
+    object_id = models.PositiveIntegerField()
+    # Storage name of the file at enqueue time; a job whose file was replaced since is skipped
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    # Idempotency: content hash and image_utils.PIPELINE_VERSION of the processed file
+    content_sha256 = models.CharField(max_length=64, blank=True)
+    pipeline_version = models.PositiveSmallIntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='imagejob_status_due_idx'),
+            models.Index(fields=['kind', 'object_id'], name='imagejob_target_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], condition=Q(status='pending'),
+                                    name='imagejob_one_pending_per_target'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} ({self.status})"
@@ -278,6 +278,11 @@ class TherapistProfile(models.Model):
     def photo_pipeline_version(self):
         return (self.profile_photo_meta or {}).get('pipeline_version')
 
+    @property
+    def photo_is_processing(self):
+        # Variants are being generated off-request (users/image_jobs.py); templates show the original upload
+        return (self.profile_photo_meta or {}).get('status') == 'processing'
+
 # Credential model for multi-value therapist credentials
 class Credential(models.Model):
     therapist = models.ForeignKey('TherapistProfile', on_delete=models.CASCADE, related_name='credentials')
@@ -0,0 +1,48 @@
+from django.db import models
+from users.models_profile import TherapistProfile
+
+
+class TherapistSearchDocument(models.Model):
+    """Denormalized, single-table projection of a TherapistProfile used by directory search.
+
+    One row per profile whose user is active. Rows are rebuilt from the profile and its
+    selection tables by users.search (signal driven) and can be fully regenerated with
+    `manage.py rebuild_search_documents`. Never edit by hand.
+    """
+    therapist = models.OneToOneField(TherapistProfile, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    user_id = models.IntegerField(db_index=True)
+    # True when the user's onboarding is complete (the default directory population)
+    listed = models.BooleanField(default=False, db_index=True)
+    last_login = models.DateTimeField(blank=True, null=True, db_index=True)
+    first_name = models.CharField(max_length=64, blank=True)
+    last_name = models.CharField(max_length=64, blank=True)
+    slug = models.SlugField(max_length=160, blank=True)
+    license_type_id = models.IntegerField(blank=True, null=True)
+    license_name = models.CharField(max_length=128, blank=True)
+    # {"license": [3], "participant": [1, 2], "age": [...], "therapy_type": [...], "specialty": [...],
+    #  "gender": [...], "race": [...], "faith": [...], "lgbtqia": [...], "other_identity": [...]}
+    facets = models.JSONField(default=dict, blank=True)
+    # Delimited tokens ("|participant:1|age:4|state:ny|") so facet filters are plain LIKE predicates on one row
+    facet_keys = models.TextField(blank=True)
+    # Weighted full-text fields (see users/fulltext.py): name > license > place > statements
+    name_text = models.TextField(blank=True)
+    license_text = models.TextField(blank=True)
+    place_text = models.TextField(blank=True)
+    statement_text = models.TextField(blank=True)
+    # [{"id": 5, "zip": "10001", "city": "New York", "state": "NY", "primary": true}, ...]
+    locations = models.JSONField(default=list, blank=True)
+    primary_zip = models.CharField(max_length=16, blank=True)
+    primary_lat = models.FloatField(blank=True, null=True)
+    primary_lng = models.FloatField(blank=True, null=True)
+    # Pre-rendered card fields (names, license, intro, photo meta, top specialties, ...)
+    card = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['listed', 'last_name', 'first_name'], name='search_doc_name_idx'),
+            models.Index(fields=['listed', '-last_login'], name='search_doc_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search document for {self.first_name} {self.last_name}".strip()
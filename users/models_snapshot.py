@@ -0,0 +1,22 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from users.models_profile import TherapistProfile
+
+
+class TherapistProfileSnapshot(models.Model):
+    """Materialized profile document read by the public profile page and the full-profile API.
+
+    One row per profile, rebuilt from the profile and all of its related tables by
+    users.profile_snapshot (signal driven, on commit) and lazily on a read miss.
+    Never edit by hand; `manage.py rebuild_profile_snapshots` regenerates every row.
+    """
+    therapist = models.OneToOneField(TherapistProfile, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    user_id = models.IntegerField(db_index=True)
+    slug = models.SlugField(max_length=160, db_index=True, blank=True)
+    # users.profile_snapshot.SNAPSHOT_VERSION the document was built with; older rows are rebuilt on read
+    version = models.PositiveSmallIntegerField(default=0)
+    document = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Profile snapshot for therapist {self.therapist_id}"
@@ -0,0 +1,155 @@
+"""Top-k nearest listed therapists without ranking the whole directory.
+
+The facet index keeps a zip5 -> profile-bitset map for listed profiles. Starting
+from the origin, `top_k_nearest()` asks the ZipIndex for ZIP centroids inside
+expanding radius rings (RING_MILES), keeps only ZIPs that have therapists, and
+walks them nearest-first so the first time a profile is seen is its closest
+location. As soon as a ring yields k profiles the answer is exact: any profile not
+yet seen has every location beyond that ring. Only if the widest ring is still
+short does it fall back to the batched kernel over every candidate location.
+
+`nearest_for_zip()` caches the no-query home page result per origin ZIP for
+CACHE_TTL_SECONDS. Entries are tied to the facet index instance they were computed
+from and dropped by `invalidate_area()` when a therapist in the result, or one with
+a location inside the entry's k-th distance, is refreshed in this process.
+"""
+import heapq
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from users.facet_index import get_facet_index, ids_of
+from users.geo import nearest_locations
+from users.zip_index import get_zip_index, haversine_miles
+
+RING_MILES = (10, 25, 50, 100, 250, 500, 1000, 2000)
+CACHE_TTL_SECONDS = 60
+MAX_CACHE_ENTRIES = 2000
+
+# (therapist_id, miles or None, zip5 or None)
+Neighbour = Tuple[int, Optional[float], Optional[str]]
+
+
+def top_k_nearest(lat: float, lng: float, k: int, within: Optional[int] = None,
+                  facet_index=None, zip_index=None) -> List[Neighbour]:
+    """The k listed profiles closest to (lat, lng), nearest first.
+
+    `within` optionally restricts candidates to a profile bitset (e.g. text matches).
+    When fewer than k profiles have a resolvable location the list is padded with
+    the remaining candidates (ascending id) with no distance.
+    """
+    facet_index = facet_index or get_facet_index()
+    zip_index = zip_index or get_zip_index()
+    candidates = facet_index.match(within=within)
+    if k <= 0 or not candidates:
+        return []
+    by_zip = facet_index.by_zip()
+    found: Dict[int, Tuple[float, str]] = {}
+    for radius in RING_MILES:
+        ring = [(d, z) for z, d in zip_index.within(lat, lng, radius).items() if z in by_zip]
+        ring.sort()
+        found = {}
+        for d, z in ring:
+            for tid in ids_of(by_zip[z] & candidates):
+                if tid not in found:
+                    found[tid] = (d, z)
+        if len(found) >= k:
+            break
+    else:
+        # Sparse area or tiny candidate set: rank every candidate location
+        found = nearest_locations(lat, lng, facet_index.location_rows(ids_of(candidates)), index=zip_index)
+    ranked = heapq.nsmallest(k, found.items(), key=lambda kv: (kv[1][0], kv[0]))
+    out: List[Neighbour] = [(tid, d, z) for tid, (d, z) in ranked]
+    if len(out) < k:
+        out.extend((tid, None, None) for tid in ids_of(candidates) if tid not in found)
+    return out[:k]
+
+
+def nearest_after(lat: float, lng: float, limit: int, after: Optional[Tuple[float, int]] = None,
+                  within: Optional[int] = None, facet_index=None, zip_index=None) -> List[Tuple[float, int, Optional[str]]]:
+    """Keyset page of listed profiles ordered by (miles, id), strictly after `after`.
+
+    Returns [(miles, therapist_id, zip5)]; profiles without a resolvable location sort
+    last with miles = inf. Rings smaller than the cursor distance are skipped, so a deep
+    page costs about the same as the first.
+    """
+    facet_index = facet_index or get_facet_index()
+    zip_index = zip_index or get_zip_index()
+    candidates = facet_index.match(within=within)
+    if limit <= 0 or not candidates:
+        return []
+    after = tuple(after) if after else (-1.0, -1)
+    by_zip = facet_index.by_zip()
+    keyed: List[Tuple[float, int, Optional[str]]] = []
+    for radius in RING_MILES:
+        if radius < after[0]:
+            continue
+        found: Dict[int, Tuple[float, str]] = {}
+        for d, z in sorted((d, z) for z, d in zip_index.within(lat, lng, radius).items() if z in by_zip):
+            for tid in ids_of(by_zip[z] & candidates):
+                if tid not in found:
+                    found[tid] = (d, z)
+        keyed = [(d, tid, z) for tid, (d, z) in found.items() if (d, tid) > after]
+        if len(keyed) >= limit:
+            break
+    else:
+        found = nearest_locations(lat, lng, facet_index.location_rows(ids_of(candidates)), index=zip_index)
+        keyed = [(d, tid, z) for tid, (d, z) in found.items() if (d, tid) > after]
+        keyed += [(float('inf'), tid, None) for tid in ids_of(candidates)
+                  if tid not in found and (float('inf'), tid) > after]
+    return heapq.nsmallest(limit, keyed)
+
+
+# origin zip5 -> (expires_at, facet index, origin lat/lng, k, results, k-th distance)
+_CACHE: Dict[Tuple[str, int], Tuple] = {}
+_CACHE_LOCK = Lock()
+
+
+def nearest_for_zip(zip5: str, k: int) -> List[Neighbour]:
+    """Cached top_k_nearest for an origin ZIP; [] when the ZIP has no coordinates."""
+    zip_index = get_zip_index()
+    origin = zip_index.coords(zip5)
+    if not origin:
+        return []
+    facet_index = get_facet_index()
+    key = (str(zip5)[:5], k)
+    now = time.monotonic()
+    entry = _CACHE.get(key)
+    if entry is not None and entry[0] > now and entry[1] is facet_index:
+        return entry[4]
+    results = top_k_nearest(origin[0], origin[1], k, facet_index=facet_index, zip_index=zip_index)
+    known = [d for _, d, _ in results if d is not None]
+    # Beyond this radius a change cannot alter the answer (unless k was not filled)
+    radius = known[-1] if len(known) >= k else float('inf')
+    with _CACHE_LOCK:
+        if len(_CACHE) >= MAX_CACHE_ENTRIES:
+            _CACHE.clear()
+        _CACHE[key] = (now + CACHE_TTL_SECONDS, facet_index, origin, k, results, radius)
+    return results
+
+
+def invalidate_area(therapist_ids: Iterable[int], zips: Iterable[str]) -> None:
+    """Drop cached entries a change to these profiles / location ZIPs could affect."""
+    therapist_ids = set(therapist_ids)
+    zip_index = get_zip_index()
+    points = [ll for ll in (zip_index.coords(z) for z in set(zips)) if ll]
+    with _CACHE_LOCK:
+        for key, (_, _, origin, _, results, radius) in list(_CACHE.items()):
+            if (any(tid in therapist_ids for tid, _, _ in results)
+                    or any(haversine_miles(origin[0], origin[1], p[0], p[1]) <= radius for p in points)):
+                del _CACHE[key]
+
+
+def clear_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+__all__ = [
+    "RING_MILES",
+    "top_k_nearest",
+    "nearest_after",
+    "nearest_for_zip",
+    "invalidate_area",
+    "clear_cache",
+]
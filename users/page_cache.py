@@ -0,0 +1,154 @@
+"""Fragment cache for the anonymous home page and directory listing.
+
+Anonymous traffic on `/` and `/therapists/` varies only by the visitor ZIP cookie, filters and
+page, so the expensive part of those views (ranking, hydration and rendering of the
+card list / top-therapists section / featured carousel) is cached as a payload dict
+under
+
+    page:<fragment>:<dependency generations>:<sha1(zip5, filter signature, page)>
+
+Only request-independent HTML is cached; base.html, CSRF tokens and per-user chrome
+are rendered per request around it.
+
+Invalidation is event driven through generation counters, which are the versions of the
+`page.<name>` namespaces in users/cache_utils.py:
+`bump_generation('directory' | 'featured' | 'blog')` is called (on commit) when search
+documents, lookup tables, featured history or blog posts change, which moves every
+dependent key. Entries also expire after FRAGMENT_TTL_SECONDS, which bounds staleness
+when the cache backend is per process (CACHE_URL unset).
+
+Stampede protection: one thread per process recomputes a missing key while the others
+wait on a per-key lock, and across processes a short `cache.add()` lease lets one
+worker recompute while the rest poll for its result (computing themselves only if the
+lease holder is slow).
+
+Hit / miss / wait counts per fragment are kept in process and logged every
+STATS_LOG_EVERY lookups; `stats()` returns them with hit rates.
+"""
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from users.cache_utils import CacheStats, bump_namespace, namespace_version
+
+FRAGMENT_TTL_SECONDS = 60
+LEASE_SECONDS = 10
+LEASE_WAIT_SECONDS = 2.0
+LEASE_POLL_SECONDS = 0.05
+STATS_LOG_EVERY = 500
+GENERATIONS = ('directory', 'featured', 'blog')
+
+_key_locks: Dict[str, threading.Lock] = {}
+_key_locks_guard = threading.Lock()
+_stats = CacheStats('Page fragment cache', log_every=STATS_LOG_EVERY)
+
+
+def _cache():
+    from django.core.cache import cache
+    return cache
+
+
+def generation(name: str) -> int:
+    return namespace_version(f'page.{name}')
+
+
+def bump_generation(*names: str) -> None:
+    """Invalidate every fragment depending on `names` once the current transaction commits."""
+    bump_namespace(*(f'page.{name}' for name in names))
+
+
+def filter_signature(querydict, exclude: Iterable[str] = ('page',)) -> str:
+    """Canonical form of the request's GET filters (order-insensitive, blanks dropped)."""
+    exclude = set(exclude)
+    parts = []
+    for k in sorted(querydict.keys()):
+        if k in exclude:
+            continue
+        values = sorted(v.strip() for v in querydict.getlist(k) if v.strip())
+        if values:
+            parts.append(f"{k}={','.join(values)}")
+    return '&'.join(parts)
+
+
+def fragment_key(fragment: str, depends_on: Sequence[str], *parts) -> str:
+    gens = '.'.join(str(generation(name)) for name in depends_on)
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f'page:{fragment}:{gens}:{digest}'
+
+
+def _count(fragment: str, outcome: str) -> None:
+    _stats.count(fragment, outcome)
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """{fragment: {hits, misses, waits, hit_rate}} for this process."""
+    return _stats.snapshot()
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _key_locks_guard:
+        lock = _key_locks.get(key)
+        if lock is None:
+            if len(_key_locks) > 10000:
+                _key_locks.clear()
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+def get_or_build(fragment: str, key: str, builder: Callable[[], dict],
+                 ttl: int = FRAGMENT_TTL_SECONDS) -> dict:
+    """Return the cached payload for `key`, building it once when missing."""
+    cache = _cache()
+    payload = cache.get(key)
+    if payload is not None:
+        _count(fragment, 'hits')
+        return payload
+    with _key_lock(key):
+        # Another thread in this process may have filled it while we waited
+        payload = cache.get(key)
+        if payload is not None:
+            _count(fragment, 'hits')
+            return payload
+        lease_key = f'{key}:lease'
+        if not cache.add(lease_key, 1, LEASE_SECONDS):
+            _count(fragment, 'waits')
+            deadline = time.monotonic() + LEASE_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(LEASE_POLL_SECONDS)
+                payload = cache.get(key)
+                if payload is not None:
+                    _count(fragment, 'hits')
+                    return payload
+        _count(fragment, 'misses')
+        try:
+            payload = builder()
+            cache.set(key, payload, ttl)
+        finally:
+            cache.delete(lease_key)
+        return payload
+
+
+def cacheable(request) -> bool:
+    """Anonymous GETs only; signed-in users see per-user state and are never cached."""
+    user = getattr(request, 'user', None)
+    return request.method == 'GET' and not (user is not None and user.is_authenticated)
+
+
+def normalized_zip(zip_code: Optional[str]) -> str:
+    import re
+    m = re.match(r"\d{5}", zip_code or '')
+    return m.group(0) if m else ''
+
+
+__all__ = [
+    "GENERATIONS",
+    "generation",
+    "bump_generation",
+    "filter_signature",
+    "fragment_key",
+    "get_or_build",
+    "cacheable",
+    "normalized_zip",
+    "stats",
+]
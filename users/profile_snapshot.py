@@ -0,0 +1,575 @@
+"""Materialized therapist profile documents (TherapistProfileSnapshot).
+
+The public profile page and `api_full_profile` used to walk ~20 related managers
+per request (locations and office hours, educations, specialties, insurance,
+gallery, identities, ...), several of them without select_related. Instead, each
+profile is flattened once into a canonical JSON document:
+
+    build_snapshot(profile)         one planned fetch (SNAPSHOT_SELECT + SNAPSHOT_PREFETCH)
+    get_snapshot(slug=... | user_id=...)
+                                    one query on the hot path; a missing or outdated row
+                                    (SNAPSHOT_VERSION) is rebuilt and stored on read
+
+and the views compose their legacy payloads from it (`public_profile_data`,
+`full_profile_data`). Per-request values (distance from the session ZIP, years in
+practice, lookup option lists) are added at read time.
+
+Rows are rebuilt by change signals on every table the document reads (see
+users/signals.py). Like search documents, refreshes requested inside a transaction
+are de-duplicated and applied once on commit. A lookup rename or delete refreshes
+only the profiles naming that row (`lookups.referencing_profile_ids()`). `manage.py rebuild_profile_snapshots` regenerates the table.
+
+The profile editor (`_profile_json`) keeps reading the live profile, since it must
+reflect writes made in the same request, but applies the same prefetch plan via
+`prefetch_snapshot_relations()`.
+"""
+import logging
+import re
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+
+from users.commit_batch import CommitBatch
+
+logger = logging.getLogger(__name__)
+
+# Bump when the document layout changes; older rows are rebuilt on first read
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_SELECT = ('license_type', 'gender', 'title', 'user')
+SNAPSHOT_PREFETCH = (
+    'locations__office_hours', 'gallery_images', 'video_gallery',
+    'accepted_payment_methods__payment_method', 'types_of_therapy__therapy_type',
+    'specialties__specialty', 'race_ethnicities__race_ethnicity', 'faiths__faith',
+    'lgbtqia_identities__lgbtqia', 'other_identities__other_identity',
+    'additional_credentials', 'educations', 'testing_types__testing_type',
+    'other_therapy_types', 'areas_of_expertise', 'participant_types', 'age_groups',
+    'insurance_details__provider',
+)
+
+# Profile columns copied verbatim into the document
+SCALAR_FIELDS = (
+    'first_name', 'middle_name', 'last_name', 'display_title',
+    'intro_note', 'intro_statement', 'personal_statement_01',
+    'personal_statement_q1', 'personal_statement_q2', 'personal_statement_q3',
+    'practice_name', 'therapy_delivery_method', 'practice_email', 'phone_number',
+    'phone_extension', 'mobile_number', 'office_email', 'accepting_new_clients',
+    'offers_intro_call', 'individual_session_cost', 'couples_session_cost',
+    'sliding_scale_pricing_available', 'finance_note', 'no_show_policy', 'credentials_note',
+    'practice_website_url', 'show_website_on_public', 'facebook_url', 'instagram_url',
+    'linkedin_url', 'twitter_url', 'tiktok_url', 'youtube_url', 'online_scheduling_url',
+    'show_online_scheduling', 'receive_calls_from_client', 'receive_texts_from_clients',
+    'receive_emails_from_clients', 'email_contact_destination', 'preferred_contact_method',
+    'receive_emails_when_client_calls', 'therapy_types_note', 'specialties_note',
+    'license_number', 'license_expiration', 'license_state', 'license_first_name',
+    'license_last_name', 'year_started_practice', 'offers_testing',
+)
+
+# Some public sample hosts block hotlinking and return 403; the public page swaps in a permissive CC0 clip
+BLOCKED_VIDEO_HOST = 'samplelib.com/mp4/'
+FALLBACK_VIDEO_URL = 'https://interactive-examples.mdn.mozilla.net/media/cc0-videos/flower.mp4'
+
+
+def snapshot_queryset():
+    from users.models_profile import TherapistProfile
+    return TherapistProfile.objects.select_related(*SNAPSHOT_SELECT).prefetch_related(*SNAPSHOT_PREFETCH)
+
+
+def prefetch_snapshot_relations(profile):
+    """Apply the snapshot fetch plan to an already loaded profile (relations already cached are kept)."""
+    from django.db.models import prefetch_related_objects
+    prefetch_related_objects([profile], *SNAPSHOT_SELECT, *SNAPSHOT_PREFETCH)
+    return profile
+
+
+def _file_url(field_file) -> Optional[str]:
+    try:
+        return field_file.url if field_file else None
+    except Exception:
+        return None
+
+
+def build_snapshot(profile) -> dict:
+    """Canonical JSON document for a profile loaded with snapshot_queryset()."""
+    license_type = profile.license_type
+    doc = {f: getattr(profile, f) for f in SCALAR_FIELDS}
+    doc.update({
+        'user_id': profile.user_id,
+        'slug': profile.slug,
+        'name': f"{profile.first_name} {profile.last_name}".strip(),
+        'title': profile.title.name if profile.title else None,
+        'gender': profile.gender.name if profile.gender else None,
+        'license_type': license_type.name if license_type else None,
+        'license_type_description': license_type.description if license_type else None,
+        'license_type_short': license_type.short_description if license_type else None,
+        'profile_photo_url': profile.profile_photo.url if profile.profile_photo else None,
+        # pk order, matching locations.first() in templates
+        'locations': [
+            {
+                'id': loc.id,
+                'practice_name': loc.practice_name,
+                'street_address': loc.street_address,
+                'address_line_2': loc.address_line_2,
+                'city': loc.city,
+                'state': loc.state,
+                'zip': loc.zip,
+                'hide_address_from_public': loc.hide_address_from_public,
+                'is_primary_address': loc.is_primary_address,
+                'office_hours': [
+                    {
+                        'weekday': oh.weekday,
+                        'is_closed': oh.is_closed,
+                        'by_appointment_only': oh.by_appointment_only,
+                        'start_time_1': oh.start_time_1,
+                        'end_time_1': oh.end_time_1,
+                        'start_time_2': oh.start_time_2,
+                        'end_time_2': oh.end_time_2,
+                        'notes': oh.notes,
+                    } for oh in loc.office_hours.all()
+                ],
+            } for loc in sorted(profile.locations.all(), key=lambda l: l.pk)
+        ],
+        'gallery_images': [
+            {'url': url, 'caption': gi.caption, 'is_primary': gi.is_primary}
+            for gi, url in ((gi, _file_url(gi.image)) for gi in profile.gallery_images.all()) if url
+        ],
+        # Raw URLs (None for missing files); the public page filters and rewrites them
+        'video_gallery': [{'video_url': _file_url(v.video), 'caption': v.caption} for v in profile.video_gallery.all()],
+        'accepted_payment_methods': [sel.payment_method.name for sel in profile.accepted_payment_methods.all()],
+        'therapy_types': [sel.therapy_type.name for sel in profile.types_of_therapy.all()],
+        'other_therapy_types': [ot.therapy_type for ot in profile.other_therapy_types.all()],
+        'testing_types': [sel.testing_type.name for sel in profile.testing_types.all() if getattr(sel, 'testing_type', None)],
+        'specialties': [
+            {'name': sp.specialty.name if sp.specialty else None, 'is_top': sp.is_top_specialty}
+            for sp in profile.specialties.all()
+        ],
+        'race_ethnicities': [s.race_ethnicity.name for s in profile.race_ethnicities.all() if s.race_ethnicity],
+        'faiths': [s.faith.name for s in profile.faiths.all() if s.faith],
+        'lgbtqia_identities': [s.lgbtqia.name for s in profile.lgbtqia_identities.all() if s.lgbtqia],
+        'other_identities': [s.other_identity.name for s in profile.other_identities.all() if s.other_identity],
+        'insurance_details': [
+            {'provider': ins.provider.name if ins.provider else '', 'out_of_network': ins.out_of_network}
+            for ins in profile.insurance_details.all()
+        ],
+        'additional_credentials': [
+            {
+                'type': ac.additional_credential_type,
+                'organization_name': ac.organization_name,
+                'id_number': ac.id_number,
+                'year_issued': ac.year_issued,
+            } for ac in profile.additional_credentials.all()
+        ],
+        'educations': [
+            {
+                'school': ed.school,
+                'degree_diploma': ed.degree_diploma,
+                'year_graduated': ed.year_graduated,
+                'year_began_practice': ed.year_began_practice,
+            } for ed in profile.educations.all()
+        ],
+        'participant_types': [pt.name for pt in profile.participant_types.all()],
+        'age_groups': [ag.name for ag in profile.age_groups.all()],
+        'areas_of_expertise': [ae.expertise for ae in profile.areas_of_expertise.all()],
+    })
+    return doc
+
+
+# --- Storage ---------------------------------------------------------------------------------
+
+def _write_snapshots(therapist_ids: Iterable[int]) -> Dict[int, dict]:
+    from users.models_snapshot import TherapistProfileSnapshot
+    ids = {int(i) for i in therapist_ids if i}
+    if not ids:
+        return {}
+    docs = {p.pk: build_snapshot(p) for p in snapshot_queryset().filter(pk__in=ids)}
+    with transaction.atomic():
+        TherapistProfileSnapshot.objects.filter(therapist_id__in=ids).delete()
+        TherapistProfileSnapshot.objects.bulk_create([
+            TherapistProfileSnapshot(therapist_id=pk, user_id=doc['user_id'], slug=doc['slug'] or '',
+                                     version=SNAPSHOT_VERSION, document=doc)
+            for pk, doc in docs.items()
+        ])
+    return docs
+
+
+def refresh_profile_snapshots(therapist_ids: Iterable[int]) -> int:
+    """Rebuild (or drop) the snapshot rows for the given profile ids. Returns rows written."""
+    return len(_write_snapshots(therapist_ids))
+
+
+def rebuild_profile_snapshots(batch_size: int = 200) -> int:
+    """Regenerate every snapshot row. Returns rows written."""
+    from users.models_profile import TherapistProfile
+    ids = list(TherapistProfile.objects.order_by('pk').values_list('pk', flat=True))
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        written += refresh_profile_snapshots(ids[start:start + batch_size])
+    return written
+
+
+def get_snapshot(slug: Optional[str] = None, user_id: Optional[int] = None) -> Optional[dict]:
+    """The profile document by public slug or user id; None when there is no such profile."""
+    from users.models_profile import TherapistProfile
+    from users.models_snapshot import TherapistProfileSnapshot
+    lookup = {'slug': slug} if slug is not None else {'user_id': user_id}
+    row = TherapistProfileSnapshot.objects.filter(**lookup).values_list('version', 'document').first()
+    if row is not None and row[0] == SNAPSHOT_VERSION:
+        return row[1]
+    profile_id = TherapistProfile.objects.filter(**lookup).values_list('pk', flat=True).first()
+    if profile_id is None:
+        return None
+    try:
+        doc = _write_snapshots([profile_id]).get(profile_id)
+    except Exception as e:
+        # Concurrent rebuild of the same row: serve a fresh build without storing it
+        logger.warning("Failed to store profile snapshot %s: %s", profile_id, e)
+        profile = snapshot_queryset().filter(pk=profile_id).first()
+        doc = build_snapshot(profile) if profile else None
+    return doc
+
+
+def snapshot_updated_at(slug: Optional[str] = None, user_id: Optional[int] = None):
+    """When the stored snapshot last changed (conditional GET validator); None if missing or outdated."""
+    from users.models_snapshot import TherapistProfileSnapshot
+    lookup = {'slug': slug} if slug is not None else {'user_id': user_id}
+    row = TherapistProfileSnapshot.objects.filter(**lookup).values_list('version', 'updated_at').first()
+    if row is None or row[0] != SNAPSHOT_VERSION:
+        return None
+    return row[1]
+
+
+_PENDING = CommitBatch('profile snapshots', refresh_profile_snapshots)
+
+
+def schedule_snapshot_refresh(therapist_id) -> None:
+    """Queue a profile's snapshot rebuild once the current transaction commits (immediately in autocommit)."""
+    _PENDING.add(therapist_id)
+
+
+# --- Read-time composition -------------------------------------------------------------------
+
+def distance_from_zip(doc: dict, user_zip: Optional[str]) -> Optional[float]:
+    """Miles (0.1) from the visitor's ZIP to the profile's closest location, or None."""
+    if not user_zip:
+        return None
+    try:
+        from users.geo import nearest_locations
+        from users.zip_index import get_zip_index
+        m = re.match(r"\d{5}", user_zip or "")
+        zip_index = get_zip_index()
+        origin = zip_index.coords(m.group(0) if m else user_zip)
+        if not origin:
+            return None
+        best = nearest_locations(origin[0], origin[1], [(i, loc['zip']) for i, loc in enumerate(doc['locations'])], index=zip_index)
+        if not best:
+            return None
+        return round(min(d for d, _ in best.values()), 1)
+    except Exception:
+        return None
+
+
+def years_in_practice(doc: dict) -> Optional[int]:
+    """Years since the earliest plausible practice start (explicit year, else education years)."""
+    from django.utils import timezone
+    current_year = timezone.now().year
+    candidate_years = []
+    started = doc.get('year_started_practice')
+    if started and started.isdigit() and len(started) == 4:
+        candidate_years.append(int(started))
+    for e in doc['educations']:
+        if e['year_began_practice'] and e['year_began_practice'].isdigit() and len(e['year_began_practice']) == 4:
+            candidate_years.append(int(e['year_began_practice']))
+        elif e['year_graduated'] and e['year_graduated'].isdigit() and len(e['year_graduated']) == 4:
+            candidate_years.append(int(e['year_graduated']))
+    if candidate_years:
+        start_year = min(candidate_years)
+        if 1900 < start_year <= current_year:
+            return current_year - start_year
+    return None
+
+
+def primary_location(doc: dict) -> Optional[dict]:
+    locs = doc['locations']
+    return next((l for l in locs if l['is_primary_address']), locs[0] if locs else None)
+
+
+def _office_hours(loc: dict) -> list:
+    return [dict(oh) for oh in loc['office_hours']]
+
+
+def public_profile_data(doc: dict, distance: Optional[float] = None) -> dict:
+    """Payload embedded in the standalone public profile page (profile modal contract)."""
+    primary = primary_location(doc)
+    videos = []
+    for v in doc['video_gallery']:
+        vurl = v['video_url']
+        if not vurl:
+            continue
+        if BLOCKED_VIDEO_HOST in vurl:
+            vurl = FALLBACK_VIDEO_URL
+        videos.append({'video_url': vurl, 'caption': v['caption']})
+    return {
+        'id': doc['user_id'],
+        'first_name': doc['first_name'],
+        'middle_name': doc['middle_name'],
+        'last_name': doc['last_name'],
+        'name': doc['name'],
+        'title': doc['title'],
+        'display_title': doc['display_title'],
+        'intro_note': doc['intro_note'],
+        'intro_statement': doc['intro_statement'],
+        'personal_statement_q1': doc['personal_statement_q1'],
+        'personal_statement_q2': doc['personal_statement_q2'],
+        'personal_statement_q3': doc['personal_statement_q3'],
+        'practice_name': doc['practice_name'],
+        'therapy_delivery_method': doc['therapy_delivery_method'],
+        'practice_email': doc['practice_email'],
+        'phone_number': doc['phone_number'],
+        'phone_extension': doc['phone_extension'],
+        'mobile_number': doc['mobile_number'],
+        'office_email': doc['office_email'],
+        'accepting_new_clients': doc['accepting_new_clients'],
+        'offers_intro_call': doc['offers_intro_call'],
+        'individual_session_cost': doc['individual_session_cost'],
+        'couples_session_cost': doc['couples_session_cost'],
+        'sliding_scale_pricing_available': doc['sliding_scale_pricing_available'],
+        'finance_note': doc['finance_note'],
+        'credentials_note': doc['credentials_note'],
+        'profile_photo_url': doc['profile_photo_url'],
+        'practice_website_url': doc['practice_website_url'],
+        'show_website_on_public': doc['show_website_on_public'],
+        'facebook_url': doc['facebook_url'],
+        'instagram_url': doc['instagram_url'],
+        'linkedin_url': doc['linkedin_url'],
+        'twitter_url': doc['twitter_url'],
+        'tiktok_url': doc['tiktok_url'],
+        'youtube_url': doc['youtube_url'],
+        'online_scheduling_url': doc['online_scheduling_url'],
+        'show_online_scheduling': doc['show_online_scheduling'],
+        'receive_calls_from_client': doc['receive_calls_from_client'],
+        'receive_texts_from_clients': doc['receive_texts_from_clients'],
+        'receive_emails_from_clients': doc['receive_emails_from_clients'],
+        'email_contact_destination': doc['email_contact_destination'],
+        'preferred_contact_method': doc['preferred_contact_method'],
+        'receive_emails_when_client_calls': doc['receive_emails_when_client_calls'],
+        'therapy_types_note': doc['therapy_types_note'],
+        'specialties_note': doc['specialties_note'],
+        'license_type': doc['license_type'],
+        'license_type_description': doc['license_type_description'],
+        'license_type_short': doc['license_type_short'],
+        'license_number': doc['license_number'],
+        'license_expiration': doc['license_expiration'],
+        'license_state': doc['license_state'],
+        'license_first_name': doc['license_first_name'],
+        'license_last_name': doc['license_last_name'],
+        'gender': doc['gender'],
+        'years_in_practice': years_in_practice(doc),
+        'city': primary['city'] if primary else None,
+        'state': primary['state'] if primary else None,
+        'locations': [
+            {
+                'practice_name': loc['practice_name'],
+                'street_address': loc['street_address'],
+                'address_line_2': loc['address_line_2'],
+                'city': loc['city'],
+                'state': loc['state'],
+                'zip': loc['zip'],
+                'is_primary_address': loc['is_primary_address'],
+                'lat': None,
+                'lng': None,
+                'office_hours': _office_hours(loc),
+            } for loc in doc['locations']
+        ],
+        'gallery_images': [dict(gi) for gi in doc['gallery_images']],
+        'video_gallery': videos,
+        'accepted_payment_methods': list(doc['accepted_payment_methods']),
+        'types_of_therapy': list(doc['therapy_types']),
+        'therapy_types': list(doc['therapy_types']),  # alias for modal
+        'other_therapy_types': list(doc['other_therapy_types']),
+        'offers_testing': doc['offers_testing'],
+        'testing_types': list(doc['testing_types']),
+        'specialties': [{'name': sp['name'] or '', 'is_top': sp['is_top']} for sp in doc['specialties']],
+        'top_specialties': [sp['name'] for sp in doc['specialties'] if sp['is_top'] and sp['name']],
+        'race_ethnicities': list(doc['race_ethnicities']),
+        'faiths': list(doc['faiths']),
+        'lgbtqia_identities': list(doc['lgbtqia_identities']),
+        'other_identities': list(doc['other_identities']),
+        'insurance_details': [dict(ins) for ins in doc['insurance_details']],
+        'additional_credentials': [dict(ac) for ac in doc['additional_credentials']],
+        'educations': [
+            {'school': ed['school'], 'degree_diploma': ed['degree_diploma'], 'year_graduated': ed['year_graduated']}
+            for ed in doc['educations']
+        ],
+        'participant_types': list(doc['participant_types']),
+        'age_groups': list(doc['age_groups']),
+        'areas_of_expertise': list(doc['areas_of_expertise']),
+        'distance': distance,
+    }
+
+
+def full_profile_data(doc: dict, distance: Optional[float] = None) -> dict:
+    """Payload of `api_full_profile` without the lookup option lists (added by the view)."""
+    primary = primary_location(doc)
+    return {
+        'id': doc['user_id'],
+        'first_name': doc['first_name'],
+        'last_name': doc['last_name'],
+        'name': doc['name'],
+        'title': doc['title'],
+        'display_title': doc['display_title'],
+        'intro_note': doc['intro_note'],
+        'intro_statement': doc['intro_statement'],
+        'personal_statement_q1': doc['personal_statement_q1'],
+        'personal_statement_q2': doc['personal_statement_q2'],
+        'personal_statement_q3': doc['personal_statement_q3'],
+        'practice_name': doc['practice_name'],
+        'therapy_delivery_method': doc['therapy_delivery_method'],
+        'practice_email': doc['practice_email'],
+        'phone_number': doc['phone_number'],
+        'phone_extension': doc['phone_extension'],
+        'mobile_number': doc['mobile_number'],
+        'office_email': doc['office_email'],
+        'accepting_new_clients': doc['accepting_new_clients'],
+        'offers_intro_call': doc['offers_intro_call'],
+        'individual_session_cost': doc['individual_session_cost'],
+        'couples_session_cost': doc['couples_session_cost'],
+        'sliding_scale_pricing_available': doc['sliding_scale_pricing_available'],
+        'finance_note': doc['finance_note'],
+        'no_show_policy': doc['no_show_policy'],
+        'credentials_note': doc['credentials_note'],
+        'profile_photo_url': doc['profile_photo_url'],
+        'practice_website_url': doc['practice_website_url'],
+        'show_website_on_public': doc['show_website_on_public'],
+        'online_scheduling_url': doc['online_scheduling_url'],
+        'show_online_scheduling': doc['show_online_scheduling'],
+        'facebook_url': doc['facebook_url'],
+        'instagram_url': doc['instagram_url'],
+        'linkedin_url': doc['linkedin_url'],
+        'twitter_url': doc['twitter_url'],
+        'tiktok_url': doc['tiktok_url'],
+        'receive_calls_from_client': doc['receive_calls_from_client'],
+        'receive_texts_from_clients': doc['receive_texts_from_clients'],
+        'receive_emails_from_clients': doc['receive_emails_from_clients'],
+        'email_contact_destination': doc['email_contact_destination'],
+        'preferred_contact_method': doc['preferred_contact_method'],
+        'receive_emails_when_client_calls': doc['receive_emails_when_client_calls'],
+        'therapy_types_note': doc['therapy_types_note'],
+        'specialties_note': doc['specialties_note'],
+        'license_type': doc['license_type'],
+        'license_type_description': doc['license_type_description'],
+        'license_type_short': doc['license_type_short'],
+        'license_number': doc['license_number'],
+        'license_expiration': doc['license_expiration'],
+        'license_state': doc['license_state'],
+        'license_first_name': doc['license_first_name'],
+        'license_last_name': doc['license_last_name'],
+        'gender': doc['gender'],
+        'years_in_practice': years_in_practice(doc),
+        'year_started_practice': doc['year_started_practice'],
+        'city': primary['city'] if primary else None,
+        'state': primary['state'] if primary else None,
+        'primary_location': {
+            'practice_name': primary['practice_name'],
+            'city': primary['city'],
+            'state': primary['state'],
+            'street_address': primary['street_address'],
+            'zip': primary['zip'],
+        } if primary else None,
+        'locations': [
+            {
+                'practice_name': loc['practice_name'],
+                'street_address': loc['street_address'],
+                'address_line_2': loc['address_line_2'],
+                'city': loc['city'],
+                'state': loc['state'],
+                'zip': loc['zip'],
+                'hide_address_from_public': loc['hide_address_from_public'],
+                'is_primary_address': loc['is_primary_address'],
+                'office_hours': _office_hours(loc),
+            } for loc in doc['locations']
+        ],
+        'participant_types': list(doc['participant_types']),
+        'age_groups': list(doc['age_groups']),
+        'race_ethnicities': list(doc['race_ethnicities']),
+        'faiths': list(doc['faiths']),
+        'lgbtqia_identities': list(doc['lgbtqia_identities']),
+        'other_identities': list(doc['other_identities']),
+        'specialties': [dict(sp) for sp in doc['specialties']],
+        'top_specialties': [sp['name'] for sp in doc['specialties'] if sp['is_top'] and sp['name']],
+        'therapy_types': list(doc['therapy_types']),
+        'offers_testing': doc['offers_testing'],
+        'testing_types': list(doc['testing_types']),
+        'other_therapy_types': list(doc['other_therapy_types']),
+        'areas_of_expertise': list(doc['areas_of_expertise']),
+        'accepted_payment_methods': list(doc['accepted_payment_methods']),
+        'insurance_details': [dict(ins) for ins in doc['insurance_details']],
+        'gallery_images': [dict(gi) for gi in doc['gallery_images']],
+        'video_gallery': [dict(v) for v in doc['video_gallery']],
+        'educations': [dict(ed) for ed in doc['educations']],
+        'additional_credentials': [dict(ac) for ac in doc['additional_credentials']],
+        'distance': distance,
+    }
+
+
+class _Rows:
+    """Just enough of a related manager (all / first / count) for templates."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+    def count(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _Obj:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class SnapshotProfile:
+    """Template stand-in for `profile_obj` on the public profile page, backed by a snapshot document."""
+
+    def __init__(self, doc: dict):
+        self._doc = doc
+        self.license_type = _Obj(name=doc['license_type'], description=doc['license_type_description'],
+                                 short_description=doc['license_type_short']) if doc['license_type'] else None
+        self.profile_photo = _Obj(url=doc['profile_photo_url']) if doc['profile_photo_url'] else None
+        self.locations = _Rows([
+            _Obj(**dict(loc, office_hours=_Rows([_Obj(**oh) for oh in loc['office_hours']])))
+            for loc in doc['locations']
+        ])
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._doc[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+__all__ = [
+    "SNAPSHOT_VERSION",
+    "snapshot_queryset",
+    "prefetch_snapshot_relations",
+    "build_snapshot",
+    "refresh_profile_snapshots",
+    "rebuild_profile_snapshots",
+    "schedule_snapshot_refresh",
+    "get_snapshot",
+    "snapshot_updated_at",
+    "distance_from_zip",
+    "years_in_practice",
+    "public_profile_data",
+    "full_profile_data",
+    "SnapshotProfile",
+]
@@ -0,0 +1,285 @@
+"""Therapist directory search over the denormalized TherapistSearchDocument table.
+
+Profiles and their selection tables are flattened into one row per therapist
+(facet ids, weighted full-text fields, location ZIPs, card fields) so directory
+queries filter and sort a single table without fan-out joins or DISTINCT.
+
+Rows are refreshed incrementally from signal handlers (see users/signals.py);
+refreshes requested inside a transaction are de-duplicated and applied once on
+commit. `manage.py rebuild_search_documents` regenerates the whole table.
+
+Migrations only change the schema: flattening needs the live models and code, which
+would not match the historical schema mid-migration. `sync_after_migrate` (a
+post_migrate receiver, see users/apps.py) fills the table once the schema is
+current: every row after a migration touched the document model, otherwise only
+profiles that have no row yet.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+
+from users.commit_batch import CommitBatch
+from users.utils.state_normalize import STATE_ABBR
+
+logger = logging.getLogger(__name__)
+
+STATE_NAMES = {abbr: name for name, abbr in STATE_ABBR.items()}
+
+# GET parameter name -> facet key stored on the document
+FACET_PARAMS = {
+    'license': 'license',
+    'participant': 'participant',
+    'age': 'age',
+    'therapy_type': 'therapy_type',
+    'specialty': 'specialty',
+    'gender': 'gender',
+    'race': 'race',
+    'faith': 'faith',
+    'lgbtqia': 'lgbtqia',
+    'other_identity': 'other_identity',
+}
+
+# Relations needed to flatten a profile in a single batch of queries
+DOCUMENT_PREFETCH = (
+    'credentials__license_type',
+    'locations',
+    'participant_types',
+    'age_groups',
+    'types_of_therapy',
+    'specialties__specialty',
+    'race_ethnicities',
+    'faiths',
+    'lgbtqia_identities',
+    'other_identities',
+)
+
+
+def facet_token(facet: str, value) -> str:
+    return f"|{facet}:{value}|"
+
+
+def _profile_queryset():
+    from users.models_profile import TherapistProfile
+    return (TherapistProfile.objects
+            .select_related('user', 'license_type')
+            .prefetch_related(*DOCUMENT_PREFETCH))
+
+
+def build_search_document(profile):
+    """Return an unsaved TherapistSearchDocument for a (prefetched) TherapistProfile."""
+    from users.models_search import TherapistSearchDocument
+    from users.zip_index import get_zip_index
+
+    user = profile.user
+    facets = {
+        'license': [profile.license_type_id] if profile.license_type_id else [],
+        'participant': sorted({p.id for p in profile.participant_types.all()}),
+        'age': sorted({a.id for a in profile.age_groups.all()}),
+        'therapy_type': sorted({s.therapy_type_id for s in profile.types_of_therapy.all()}),
+        'specialty': sorted({s.specialty_id for s in profile.specialties.all() if s.specialty_id}),
+        'gender': [profile.gender_id] if profile.gender_id else [],
+        'race': sorted({s.race_ethnicity_id for s in profile.race_ethnicities.all()}),
+        'faith': sorted({s.faith_id for s in profile.faiths.all()}),
+        'lgbtqia': sorted({s.lgbtqia_id for s in profile.lgbtqia_identities.all()}),
+        'other_identity': sorted({s.other_identity_id for s in profile.other_identities.all()}),
+    }
+    locs = list(profile.locations.all())
+    states = sorted({(l.state or '').strip().lower() for l in locs if (l.state or '').strip()})
+    tokens = [facet_token(k, v) for k, values in facets.items() for v in values]
+    tokens += [facet_token('state', s) for s in states]
+    # Joined as "|a:1||b:2|" -> collapse doubled delimiters so every token is "|key:val|"
+    facet_keys = ''.join(tokens).replace('||', '|')
+
+    def text(parts):
+        return '\n'.join(dict.fromkeys(p.strip() for p in parts if p and p.strip()))
+
+    license_parts = [profile.license_type.name, profile.license_type.description] if profile.license_type_id else []
+    for cred in profile.credentials.all():
+        lt = cred.license_type
+        if lt is not None:
+            license_parts += [lt.name, lt.description]
+    place_parts = []
+    for loc in locs:
+        place_parts += [loc.city, loc.state, STATE_NAMES.get((loc.state or '').strip().upper(), '')]
+
+    primary = next((l for l in locs if l.is_primary_address), locs[0] if locs else None)
+    primary_zip = (primary.zip or '')[:5] if primary else ''
+    ll = get_zip_index().coords(primary_zip) if primary_zip else None
+
+    top_specialties = [s.specialty.name for s in profile.specialties.all() if s.is_top_specialty and s.specialty_id]
+    license_type = profile.license_type
+    card = {
+        'user_id': profile.user_id,
+        'name': f"{profile.first_name} {profile.last_name}".strip(),
+        'license': license_type.name if license_type else None,
+        'license_short': (license_type.short_description or None) if license_type else None,
+        'credentials_note': profile.credentials_note,
+        'intro_note': profile.intro_note,
+        'intro_statement': profile.intro_statement,
+        'photo': profile.profile_photo.name if profile.profile_photo else None,
+        'photo_meta': profile.profile_photo_meta or {},
+        'participant_types': sorted(p.name for p in profile.participant_types.all()),
+        'age_groups': sorted(a.name for a in profile.age_groups.all()),
+        'top_specialties': top_specialties,
+    }
+    return TherapistSearchDocument(
+        therapist_id=profile.pk,
+        user_id=profile.user_id,
+        listed=bool(user.is_active and user.onboarding_status == 'active'),
+        last_login=user.last_login,
+        first_name=profile.first_name,
+        last_name=profile.last_name,
+        slug=profile.slug,
+        license_type_id=profile.license_type_id,
+        license_name=license_type.name if license_type else '',
+        facets=facets,
+        facet_keys=facet_keys,
+        name_text=text([profile.first_name, profile.last_name]),
+        license_text=text(license_parts),
+        place_text=text(place_parts),
+        statement_text=text([
+            profile.personal_statement_q1, profile.personal_statement_q2, profile.personal_statement_q3,
+            profile.intro_statement, profile.credentials_note,
+        ]),
+        locations=[
+            {'id': l.id, 'zip': (l.zip or '')[:5], 'city': l.city, 'state': l.state, 'primary': bool(l.is_primary_address)}
+            for l in locs
+        ],
+        primary_zip=primary_zip,
+        primary_lat=ll[0] if ll else None,
+        primary_lng=ll[1] if ll else None,
+        card=card,
+    )
+
+
+def refresh_search_documents(therapist_ids: Iterable[int]) -> int:
+    """Rebuild (or drop) the search rows for the given profile ids. Returns rows written."""
+    from users.models_search import TherapistSearchDocument
+    ids = {int(i) for i in therapist_ids if i}
+    if not ids:
+        return 0
+    profiles = list(_profile_queryset().filter(pk__in=ids, user__is_active=True))
+    docs = [build_search_document(p) for p in profiles]
+    with transaction.atomic():
+        stale = ids - {p.pk for p in profiles}
+        if stale:
+            TherapistSearchDocument.objects.filter(therapist_id__in=stale).delete()
+        if docs:
+            TherapistSearchDocument.objects.filter(therapist_id__in=[d.therapist_id for d in docs]).delete()
+            TherapistSearchDocument.objects.bulk_create(docs)
+    try:
+        from users.facet_index import index_documents_written
+        index_documents_written(docs, stale)
+    except Exception as e:
+        logger.warning("Failed to patch facet index: %s", e)
+    try:
+        from users.page_cache import bump_generation
+        bump_generation('directory')
+    except Exception as e:
+        logger.warning("Failed to invalidate cached directory pages: %s", e)
+    return len(docs)
+
+
+def rebuild_search_documents(batch_size: int = 500) -> int:
+    """Regenerate every search row from scratch. Returns rows written."""
+    from users.models_profile import TherapistProfile
+    from users.models_search import TherapistSearchDocument
+    ids = list(TherapistProfile.objects.filter(user__is_active=True).order_by('pk').values_list('pk', flat=True))
+    written = 0
+    with transaction.atomic():
+        TherapistSearchDocument.objects.exclude(therapist_id__in=ids).delete()
+        for start in range(0, len(ids), batch_size):
+            written += refresh_search_documents(ids[start:start + batch_size])
+    return written
+
+
+DOCUMENT_MODEL = 'therapistsearchdocument'
+
+
+def _touches_documents(plan) -> bool:
+    for migration, backwards in plan or ():
+        for op in migration.operations:
+            if not backwards and DOCUMENT_MODEL in (getattr(op, 'model_name_lower', None), getattr(op, 'name_lower', None)):
+                return True
+    return False
+
+
+def sync_after_migrate(sender=None, using=DEFAULT_DB_ALIAS, plan=None, apps=None, **kwargs) -> int:
+    """post_migrate: build the search rows the migrations left to live code. Returns rows written."""
+    from users.models_profile import TherapistProfile
+    from users.models_search import TherapistSearchDocument
+    if using != DEFAULT_DB_ALIAS or apps is None:
+        return 0
+    # Migrated to an older state (or not at all yet): the live model does not match the tables
+    live = {f.column for f in TherapistSearchDocument._meta.concrete_fields}
+    try:
+        state = {f.column for f in apps.get_model('users', 'TherapistSearchDocument')._meta.concrete_fields}
+    except LookupError:
+        return 0
+    if state != live:
+        return 0
+    if _touches_documents(plan):
+        return rebuild_search_documents()
+    ids = set(TherapistProfile.objects.filter(user__is_active=True).values_list('pk', flat=True))
+    missing = ids - set(TherapistSearchDocument.objects.values_list('therapist_id', flat=True))
+    return refresh_search_documents(missing)
+
+
+_PENDING = CommitBatch('search documents', refresh_search_documents)
+
+
+def schedule_search_refresh(therapist_id) -> None:
+    """Queue a profile for re-indexing once the current transaction commits (immediately in autocommit)."""
+    _PENDING.add(therapist_id)
+
+
+def parse_facet_filters(params) -> Dict[str, List[int]]:
+    """Extract {facet: [ids]} from a QueryDict using the directory filter parameter names."""
+    out: Dict[str, List[int]] = {}
+    for param, facet in FACET_PARAMS.items():
+        values = []
+        for v in params.getlist(param):
+            try:
+                values.append(int(v))
+            except (TypeError, ValueError):
+                continue
+        if values:
+            out[facet] = values
+    return out
+
+
+def search_documents(query: str = '', facets: Optional[Dict[str, List[int]]] = None, tier: str = '', listed_only: bool = True):
+    """Return a TherapistSearchDocument queryset filtered like the directory page.
+
+    Values within one facet are OR-ed, facets are AND-ed; `query` goes through the full-text
+    backend (names, license names/descriptions, cities, states and personal statements).
+    """
+    from users.models_search import TherapistSearchDocument
+    qs = TherapistSearchDocument.objects.all()
+    if listed_only:
+        qs = qs.filter(listed=True)
+    if query:
+        from users.fulltext import search as fulltext_search
+        qs = qs.filter(therapist_id__in=list(fulltext_search(query)))
+    if tier:
+        qs = qs.filter(license_name__iexact=tier)
+    for facet, values in (facets or {}).items():
+        any_of = Q()
+        for v in values:
+            any_of |= Q(facet_keys__contains=facet_token(facet, v))
+        qs = qs.filter(any_of)
+    return qs
+
+
+__all__ = [
+    "FACET_PARAMS",
+    "build_search_document",
+    "refresh_search_documents",
+    "rebuild_search_documents",
+    "sync_after_migrate",
+    "schedule_search_refresh",
+    "parse_facet_filters",
+    "search_documents",
+]
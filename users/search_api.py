@@ -0,0 +1,173 @@
+"""Compact card records and JSON encoding for the directory search API.
+
+`/api/therapists/search/` (and the `?cursor=&format=json` variant of /therapists/)
+returns one small record per therapist instead of rendered HTML or the full
+profile. Clients choose the keys with `fields=` (comma separated, see CARD_FIELDS);
+without it DEFAULT_FIELDS are returned.
+
+Records are read straight from TherapistSearchDocument with `values()` limited to
+the columns the requested fields need, so no model instances are built and the
+`card` / `locations` JSON blobs are only loaded when a field reads them.
+
+Responses are encoded with orjson when it is installed and otherwise with a
+pre-built compact `json.JSONEncoder` (no whitespace, no circular check).
+"""
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except Exception:  # optional dependency
+    orjson = None
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+DEFAULT_FIELDS = ('id', 'user_id', 'slug', 'name', 'license', 'distance', 'city', 'state')
+
+# public field -> search document columns it reads
+CARD_FIELDS = {
+    'id': (),
+    'user_id': ('user_id',),
+    'slug': ('slug',),
+    'url': ('slug',),
+    'name': ('card',),
+    'first_name': ('first_name',),
+    'last_name': ('last_name',),
+    'license': ('card',),
+    'license_short': ('card',),
+    'credentials_note': ('card',),
+    'intro_note': ('card',),
+    'photo_url': ('card',),
+    'participant_types': ('card',),
+    'age_groups': ('card',),
+    'top_specialties': ('card',),
+    'distance': (),
+    'zip': ('locations',),
+    'city': ('locations',),
+    'state': ('locations',),
+    'lat': ('locations', 'primary_lat', 'primary_lng'),
+    'lng': ('locations', 'primary_lat', 'primary_lng'),
+}
+
+_ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, check_circular=False)
+
+
+def parse_fields(raw: Optional[str]) -> Tuple[str, ...]:
+    """Requested field names in order; ValueError naming any unknown field."""
+    if not raw or not raw.strip():
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in CARD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or DEFAULT_FIELDS
+
+
+def parse_limit(raw: Optional[str], default: int = DEFAULT_LIMIT) -> int:
+    try:
+        return max(1, min(int(raw), MAX_LIMIT))
+    except (TypeError, ValueError):
+        return default
+
+
+def _photo_url(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    from users.models_profile import TherapistProfile
+    try:
+        return TherapistProfile._meta.get_field('profile_photo').storage.url(name)
+    except Exception:
+        return None
+
+
+def card_records(rows: Sequence[Tuple[int, Optional[float], Optional[str]]],
+                 fields: Sequence[str] = DEFAULT_FIELDS) -> Tuple[List[dict], List[int]]:
+    """([record], [user_id]) for (therapist_id, miles, closest zip5) rows, in row order.
+
+    The user ids are returned for impression counting whether or not `user_id` was requested.
+    """
+    from django.urls import reverse
+    from users.models_search import TherapistSearchDocument
+    from users.zip_index import get_zip_index
+
+    if not rows:
+        return [], []
+    columns = {'therapist_id', 'user_id'}
+    for f in fields:
+        columns.update(CARD_FIELDS[f])
+    docs = {d['therapist_id']: d for d in TherapistSearchDocument.objects.filter(
+        therapist_id__in=[r[0] for r in rows]).values(*columns)}
+    wants_location = any('locations' in CARD_FIELDS[f] for f in fields)
+    zip_index = get_zip_index()
+    records, user_ids = [], []
+    for tid, distance, closest_zip in rows:
+        doc = docs.get(tid)
+        if doc is None:
+            continue
+        user_ids.append(doc['user_id'])
+        card = doc.get('card') or {}
+        loc = None
+        ll = None
+        if wants_location:
+            locs = doc.get('locations') or []
+            if closest_zip:
+                loc = next((l for l in locs if l.get('zip') == closest_zip), None)
+            if loc is None:
+                # No origin: cards and map views show the primary location
+                loc = next((l for l in locs if l.get('primary')), locs[0] if locs else None)
+            if loc is not None and ('lat' in fields or 'lng' in fields):
+                ll = zip_index.coords(loc.get('zip'))
+                if ll is None and doc.get('primary_lat') is not None and loc.get('primary'):
+                    ll = (doc['primary_lat'], doc['primary_lng'])
+        record = {}
+        for f in fields:
+            if f == 'id':
+                record[f] = tid
+            elif f == 'distance':
+                record[f] = distance
+            elif f == 'url':
+                record[f] = reverse('therapist_profile_public_slug', args=[doc['slug']]) if doc['slug'] else None
+            elif f in ('user_id', 'slug', 'first_name', 'last_name'):
+                record[f] = doc[f]
+            elif f == 'photo_url':
+                record[f] = _photo_url(card.get('photo'))
+            elif f in ('zip', 'city', 'state'):
+                record[f] = loc.get(f) if loc else None
+            elif f == 'lat':
+                record[f] = ll[0] if ll else None
+            elif f == 'lng':
+                record[f] = ll[1] if ll else None
+            else:
+                record[f] = card.get(f)
+        records.append(record)
+    return records, user_ids
+
+
+def compact_counts(facet_counts: Optional[Dict[str, Dict[int, int]]]) -> Optional[Dict[str, Dict[str, int]]]:
+    """Facet counts without zero entries, with string keys (valid JSON object keys)."""
+    if facet_counts is None:
+        return None
+    return {facet: {str(v): n for v, n in counts.items() if n} for facet, counts in facet_counts.items()}
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return _ENCODER.encode(payload).encode('utf-8')
+
+
+def json_response(payload, status: int = 200):
+    from django.http import HttpResponse
+    return HttpResponse(dumps(payload), content_type='application/json', status=status)
+
+
+__all__ = [
+    "DEFAULT_FIELDS",
+    "CARD_FIELDS",
+    "parse_fields",
+    "parse_limit",
+    "card_records",
+    "compact_counts",
+    "dumps",
+    "json_response",
+]
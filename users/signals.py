@@ -1,52 +1,40 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models_profile import TherapistProfile, GalleryImage
-from .models_blog import BlogPost
-from .image_utils import (
-    process_profile_photo,
-    process_profile_photo_storage,
-    process_generic_image,
-    ImageQualityFlags,
-    PIPELINE_VERSION,
+from .models import User, FeedPost, Connection
+from .models_profile import (
+    TherapistProfile, GalleryImage, ZipCode, Location, Credential, Specialty,
+    TherapyTypeSelection, RaceEthnicitySelection, FaithSelection, LGBTQIASelection, OtherIdentitySelection,
 )
+from .models_search import TherapistSearchDocument
+from .models_snapshot import TherapistProfileSnapshot  # noqa: F401  (registers the model)
+from .models_blog import BlogPost
+from .models_jobs import ImageJob  # noqa: F401  (registers the model)
+from .models_blobs import ImageBlob  # noqa: F401  (registers the model)
+from .models_feed import FeedTimelineEntry  # noqa: F401  (registers the model)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# --- Image variants ---------------------------------------------------------------------------
+# Variant generation runs in `manage.py run_image_jobs`; the signals only queue it (users/image_jobs.py).
+
+def _enqueue_image(kind, instance):
+    try:
+        from .image_jobs import enqueue_image
+        enqueue_image(kind, instance)
+    except Exception as e:
+        logger.warning("Failed to queue %s processing for %s: %s", kind, instance.pk, e)
+
+
 @receiver(post_save, sender=TherapistProfile)
 def generate_profile_photo_variants(sender, instance: TherapistProfile, created, update_fields=None, **kwargs):
-    """Generate image variants after profile save if a photo exists.
-    Avoid infinite recursion by skipping when only profile_photo_meta was updated.
-    """
+    """Queue variant generation when the photo changed or the pipeline version moved."""
     # If this save only updated meta, skip
     if update_fields and set(update_fields) == {"profile_photo_meta"}:
         return
     if not instance.profile_photo:
         return
-    try:
-        existing = instance.profile_photo_meta or {}
-        # If existing meta has current pipeline version and a content hash, we can attempt a short-circuit
-        # (Skip only if file hash matches. For storage without path this still re-hashes inside processor.)
-        try:
-            current_hash = existing.get('original', {}).get('sha256')
-        except Exception:
-            current_hash = None
-
-        # Process image (local or remote)
-        try:
-            path = instance.profile_photo.path
-            new_meta = process_profile_photo(path)
-        except Exception:
-            new_meta = process_profile_photo_storage(instance.profile_photo)
-
-        new_hash = new_meta.get('original', {}).get('sha256')
-        if (existing and existing.get('pipeline_version') == PIPELINE_VERSION and current_hash and new_hash and current_hash == new_hash):
-            # Skip update; identical content & pipeline version
-            return
-        if existing != new_meta:
-            TherapistProfile.objects.filter(pk=instance.pk).update(profile_photo_meta=new_meta)
-    except Exception as e:
-        logger.warning("Failed to process profile photo for therapist %s: %s", instance.pk, e)
+    _enqueue_image('profile_photo', instance)
 
 
 @receiver(post_save, sender=GalleryImage)
@@ -56,19 +44,7 @@ def generate_gallery_image_variants(sender, instance: GalleryImage, created, upd
     # Skip if only meta updated
     if update_fields and set(update_fields) == {"image_meta"}:
         return
-    try:
-        existing = instance.image_meta or {}
-        try:
-            new_meta = process_generic_image(instance.image)
-        except Exception as e:
-            logger.warning("Gallery image process fail id=%s: %s", instance.pk, e)
-            return
-        if existing and existing.get('pipeline_version') == PIPELINE_VERSION and existing.get('original', {}).get('sha256') == new_meta.get('original', {}).get('sha256'):
-            return
-        if existing != new_meta:
-            GalleryImage.objects.filter(pk=instance.pk).update(image_meta=new_meta)
-    except Exception as e:
-        logger.warning("Failed to process gallery image %s: %s", instance.pk, e)
+    _enqueue_image('gallery_image', instance)
 
 
 @receiver(post_save, sender=BlogPost)
@@ -77,16 +53,385 @@ def generate_blog_image_variants(sender, instance: BlogPost, created, update_fie
         return
     if update_fields and set(update_fields) == {"image_meta"}:
         return
+    _enqueue_image('blog_image', instance)
+
+
+@receiver(post_save, sender=ZipCode)
+def update_zip_index_on_save(sender, instance: ZipCode, **kwargs):
+    """Keep this process's spatial index and the shared ZIP caches in sync with ZIP inserts (e.g. ensure_zipcode enrichment)."""
+    try:
+        from .zip_index import index_zip_saved
+        from .location_utils import forget_zip
+        index_zip_saved(instance.zip, instance.latitude, instance.longitude)
+        forget_zip(instance.zip)
+    except Exception as e:
+        logger.warning("Failed to update ZIP index for %s: %s", instance.pk, e)
+
+
+@receiver(post_delete, sender=ZipCode)
+def update_zip_index_on_delete(sender, instance: ZipCode, **kwargs):
+    try:
+        from .zip_index import index_zip_deleted
+        from .location_utils import forget_zip
+        index_zip_deleted(instance.zip)
+        forget_zip(instance.zip)
+    except Exception as e:
+        logger.warning("Failed to drop ZIP %s from index: %s", instance.pk, e)
+
+
+# --- Therapist search documents -------------------------------------------------------------
+# Every table flattened into TherapistSearchDocument schedules a refresh of the owning profile;
+# refreshes are de-duplicated per transaction and applied on commit (see users/search.py).
+
+def _schedule_search_refresh(therapist_id):
+    try:
+        from .search import schedule_search_refresh
+        schedule_search_refresh(therapist_id)
+    except Exception as e:
+        logger.warning("Failed to schedule search refresh for therapist %s: %s", therapist_id, e)
+
+
+@receiver(post_save, sender=TherapistProfile)
+def refresh_search_document_on_profile_save(sender, instance: TherapistProfile, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_viewed_at"}:
+        return
+    _schedule_search_refresh(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def refresh_search_document_on_user_save(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {"last_login"}:
+        # Login bookkeeping only touches the recency sort key; skip the full rebuild
+        try:
+            TherapistSearchDocument.objects.filter(user_id=instance.pk).update(last_login=instance.last_login)
+            from .facet_index import index_last_login
+            index_last_login(instance.pk, instance.last_login)
+        except Exception as e:
+            logger.warning("Failed to update search last_login for user %s: %s", instance.pk, e)
+        return
+    profile_id = TherapistProfile.objects.filter(user_id=instance.pk).values_list('pk', flat=True).first()
+    if profile_id:
+        _schedule_search_refresh(profile_id)
+
+
+def _refresh_search_document_for_selection(sender, instance, **kwargs):
+    _schedule_search_refresh(getattr(instance, 'therapist_id', None))
+
+
+for _selection_model in (
+    Location, Credential, Specialty, TherapyTypeSelection,
+    RaceEthnicitySelection, FaithSelection, LGBTQIASelection, OtherIdentitySelection,
+):
+    post_save.connect(_refresh_search_document_for_selection, sender=_selection_model,
+                      dispatch_uid=f"search_doc_save_{_selection_model.__name__}")
+    post_delete.connect(_refresh_search_document_for_selection, sender=_selection_model,
+                        dispatch_uid=f"search_doc_delete_{_selection_model.__name__}")
+
+
+def _refresh_search_document_for_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        _schedule_search_refresh(instance.pk)
+    elif pk_set:
+        for profile_id in pk_set:
+            _schedule_search_refresh(profile_id)
+
+
+m2m_changed.connect(_refresh_search_document_for_m2m, sender=TherapistProfile.participant_types.through,
+                    dispatch_uid="search_doc_participant_types")
+m2m_changed.connect(_refresh_search_document_for_m2m, sender=TherapistProfile.age_groups.through,
+                    dispatch_uid="search_doc_age_groups")
+
+
+# --- Lookup registry -------------------------------------------------------------------------
+# Any write to a lookup table (forms, admin, proxy admin) marks every worker's cached lookup
+# options stale; see users/lookups.py.
+
+def _bump_lookup_version(sender, **kwargs):
+    try:
+        from .lookups import bump_lookup_version
+        from .page_cache import bump_generation
+        bump_lookup_version()
+        # Cards render lookup names (license, specialties, ...)
+        bump_generation('directory')
+    except Exception as e:
+        logger.warning("Failed to bump lookup version after %s change: %s", sender.__name__, e)
+
+
+def _refresh_documents_for_lookup(sender, instance, created=False, **kwargs):
+    # Search cards, license text and profile snapshots copy lookup names (license, specialties,
+    # participant types, insurance, ...): refresh only the profiles naming a renamed row. Runs
+    # pre_delete for deletes, while the references (set to NULL or cascaded) can still be found.
+    if created:
+        return
     try:
-        existing = instance.image_meta or {}
+        from .lookups import referencing_profile_ids
+        ids = referencing_profile_ids(instance)
+    except Exception as e:
+        logger.warning("Failed to find profiles using %s %s: %s", sender.__name__, instance.pk, e)
+        return
+    for profile_id in ids:
+        _schedule_search_refresh(profile_id)
+        _schedule_snapshot_refresh(profile_id)
+
+
+def _connect_lookup_signals():
+    from .lookups import LOOKUP_MODELS, lookup_model
+    from .models_profile import LookupMaintenance
+    # Proxy saves are sent with the proxy class as sender, so it is registered separately
+    models = [lookup_model(key) for key in LOOKUP_MODELS] + [LookupMaintenance]
+    for model in models:
+        post_save.connect(_bump_lookup_version, sender=model, dispatch_uid=f"lookup_version_save_{model.__name__}")
+        post_delete.connect(_bump_lookup_version, sender=model, dispatch_uid=f"lookup_version_delete_{model.__name__}")
+        post_save.connect(_refresh_documents_for_lookup, sender=model,
+                          dispatch_uid=f"lookup_documents_save_{model.__name__}")
+        pre_delete.connect(_refresh_documents_for_lookup, sender=model,
+                           dispatch_uid=f"lookup_documents_delete_{model.__name__}")
+
+
+_connect_lookup_signals()
+
+
+# --- Anonymous page fragment cache -------------------------------------------------------------
+# Featured history and blog posts feed the home page carousel; see users/page_cache.py.
+
+def _bump_page_generation(name):
+    def handler(sender, **kwargs):
         try:
-            new_meta = process_generic_image(instance.image)
+            from .page_cache import bump_generation
+            bump_generation(name)
         except Exception as e:
-            logger.warning("Blog image process fail id=%s: %s", instance.pk, e)
+            logger.warning("Failed to invalidate cached %s fragments after %s change: %s", name, sender.__name__, e)
+    return handler
+
+
+_bump_featured_pages = _bump_page_generation('featured')
+_bump_blog_pages = _bump_page_generation('blog')
+
+
+def _connect_page_cache_signals():
+    from .models_featured import FeaturedTherapistHistory, FeaturedBlogPostHistory
+    for model in (FeaturedTherapistHistory, FeaturedBlogPostHistory):
+        post_save.connect(_bump_featured_pages, sender=model, dispatch_uid=f"page_cache_save_{model.__name__}")
+        post_delete.connect(_bump_featured_pages, sender=model, dispatch_uid=f"page_cache_delete_{model.__name__}")
+    post_save.connect(_bump_blog_pages, sender=BlogPost, dispatch_uid="page_cache_save_BlogPost")
+    post_delete.connect(_bump_blog_pages, sender=BlogPost, dispatch_uid="page_cache_delete_BlogPost")
+
+
+_connect_page_cache_signals()
+
+
+# --- Profile snapshots -----------------------------------------------------------------------
+# Every table read by users.profile_snapshot.build_snapshot schedules a rebuild of the owning
+# profile's snapshot; rebuilds are de-duplicated per transaction and applied on commit.
+
+def _schedule_snapshot_refresh(therapist_id):
+    try:
+        from .profile_snapshot import schedule_snapshot_refresh
+        schedule_snapshot_refresh(therapist_id)
+    except Exception as e:
+        logger.warning("Failed to schedule snapshot refresh for therapist %s: %s", therapist_id, e)
+
+
+@receiver(post_save, sender=TherapistProfile)
+def refresh_snapshot_on_profile_save(sender, instance: TherapistProfile, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_viewed_at"}:
+        return
+    _schedule_snapshot_refresh(instance.pk)
+
+
+def _refresh_snapshot_for_related(sender, instance, **kwargs):
+    _schedule_snapshot_refresh(getattr(instance, 'therapist_id', None))
+
+
+def _refresh_snapshot_for_office_hour(sender, instance, **kwargs):
+    therapist_id = Location.objects.filter(pk=instance.location_id).values_list('therapist_id', flat=True).first()
+    _schedule_snapshot_refresh(therapist_id)
+
+
+def _refresh_snapshot_for_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        _schedule_snapshot_refresh(instance.pk)
+    elif pk_set:
+        for profile_id in pk_set:
+            _schedule_snapshot_refresh(profile_id)
+
+
+def _connect_snapshot_signals():
+    from .models_profile import (
+        OfficeHour, GalleryImage, VideoGallery, Education, AdditionalCredential, InsuranceDetail,
+        PaymentMethodSelection, TestingTypeSelection, OtherTherapyType, AreasOfExpertise,
+    )
+    related = (
+        Location, Specialty, TherapyTypeSelection, RaceEthnicitySelection, FaithSelection,
+        LGBTQIASelection, OtherIdentitySelection, GalleryImage, VideoGallery, Education,
+        AdditionalCredential, InsuranceDetail, PaymentMethodSelection, TestingTypeSelection,
+        OtherTherapyType, AreasOfExpertise,
+    )
+    for model in related:
+        post_save.connect(_refresh_snapshot_for_related, sender=model, dispatch_uid=f"snapshot_save_{model.__name__}")
+        post_delete.connect(_refresh_snapshot_for_related, sender=model, dispatch_uid=f"snapshot_delete_{model.__name__}")
+    post_save.connect(_refresh_snapshot_for_office_hour, sender=OfficeHour, dispatch_uid="snapshot_save_OfficeHour")
+    post_delete.connect(_refresh_snapshot_for_office_hour, sender=OfficeHour, dispatch_uid="snapshot_delete_OfficeHour")
+    for through in (TherapistProfile.participant_types.through, TherapistProfile.age_groups.through):
+        m2m_changed.connect(_refresh_snapshot_for_m2m, sender=through, dispatch_uid=f"snapshot_m2m_{through.__name__}")
+
+
+_connect_snapshot_signals()
+
+
+# --- Blog post versions ----------------------------------------------------------------------
+# Conditional GET on blog pages (users/conditional.py) validates against BlogPost.updated_at, so
+# changes to what a post page shows besides the post row itself also move it.
+
+def _touch_blog_posts(**filters):
+    try:
+        from django.utils import timezone
+        BlogPost.objects.filter(**filters).update(updated_at=timezone.now())
+    except Exception as e:
+        logger.warning("Failed to touch blog posts %s: %s", filters, e)
+
+
+def _touch_post_for_media(sender, instance, **kwargs):
+    _touch_blog_posts(pk=instance.post_id)
+
+
+def _touch_posts_for_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        _touch_blog_posts(pk=instance.pk)
+    elif pk_set:
+        _touch_blog_posts(pk__in=pk_set)
+
+
+@receiver(post_save, sender=TherapistProfile)
+def touch_blog_posts_on_author_profile_save(sender, instance: TherapistProfile, update_fields=None, **kwargs):
+    # Post pages show the author's name, photo and profile link
+    if update_fields and set(update_fields) <= {"last_viewed_at"}:
+        return
+    _touch_blog_posts(author_id=instance.user_id)
+
+
+def _connect_blog_version_signals():
+    from .models_blog import BlogMedia
+    post_save.connect(_touch_post_for_media, sender=BlogMedia, dispatch_uid="blog_version_save_BlogMedia")
+    post_delete.connect(_touch_post_for_media, sender=BlogMedia, dispatch_uid="blog_version_delete_BlogMedia")
+    m2m_changed.connect(_touch_posts_for_tags, sender=BlogPost.tags.through, dispatch_uid="blog_version_tags")
+
+
+_connect_blog_version_signals()
+
+
+# --- Content-addressed image blobs -----------------------------------------------------------
+# Image uploads are stored once per sha256 and reference-counted; see users/blob_store.py.
+
+def _blob_handlers(kind):
+    def remember(sender, instance, **kwargs):
+        try:
+            from .blob_store import remember_loaded_name
+            remember_loaded_name(kind, instance)
+        except Exception as e:
+            logger.warning("Failed to track %s blob name: %s", kind, e)
+
+    def attach(sender, instance, raw=False, **kwargs):
+        if raw:
             return
-        if existing and existing.get('pipeline_version') == PIPELINE_VERSION and existing.get('original', {}).get('sha256') == new_meta.get('original', {}).get('sha256'):
+        try:
+            from .blob_store import attach_upload
+            attach_upload(kind, instance)
+        except Exception as e:
+            # The upload is then stored under its upload_to name as before
+            logger.warning("Failed to deduplicate %s upload: %s", kind, e)
+
+    def saved(sender, instance, raw=False, **kwargs):
+        if raw:
             return
-        if existing != new_meta:
-            BlogPost.objects.filter(pk=instance.pk).update(image_meta=new_meta)
+        try:
+            from .blob_store import sync_refs
+            sync_refs(kind, instance)
+        except Exception as e:
+            logger.warning("Failed to update %s blob references for %s: %s", kind, instance.pk, e)
+
+    def deleted(sender, instance, **kwargs):
+        try:
+            from .blob_store import BLOB_FIELDS, drop_ref
+            drop_ref(getattr(instance, '_blob_name', None) or getattr(instance, BLOB_FIELDS[kind][1]).name)
+        except Exception as e:
+            logger.warning("Failed to drop %s blob reference for %s: %s", kind, instance.pk, e)
+
+    return remember, attach, saved, deleted
+
+
+_BLOB_HANDLERS = {}
+
+
+def _connect_blob_signals():
+    from django.apps import apps
+    from .blob_store import BLOB_FIELDS
+    for kind, (label, _, _, _) in BLOB_FIELDS.items():
+        model = apps.get_model(label)
+        # Module-level references: signals hold receivers weakly
+        remember, attach, saved, deleted = _BLOB_HANDLERS[kind] = _blob_handlers(kind)
+        post_init.connect(remember, sender=model, dispatch_uid=f"blob_init_{kind}")
+        pre_save.connect(attach, sender=model, dispatch_uid=f"blob_attach_{kind}")
+        post_save.connect(saved, sender=model, dispatch_uid=f"blob_refs_save_{kind}")
+        post_delete.connect(deleted, sender=model, dispatch_uid=f"blob_refs_delete_{kind}")
+
+
+_connect_blob_signals()
+
+
+# --- Feed timelines ---------------------------------------------------------------------------
+# Connections-only posts reach members' feeds through FeedTimelineEntry; these keep it in line with
+# the visibility rules (users/feed_timeline.py). Post and user deletes cascade.
+
+@receiver(post_init, sender=FeedPost)
+def remember_feed_post_visibility(sender, instance: FeedPost, **kwargs):
+    instance._timeline_visibility = instance.__dict__.get('visibility')
+
+
+@receiver(post_save, sender=FeedPost)
+def fan_out_feed_post(sender, instance: FeedPost, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.visibility != getattr(instance, '_timeline_visibility', None):
+        try:
+            from .feed_timeline import schedule_fan_out
+            schedule_fan_out(instance.pk)
+        except Exception as e:
+            logger.warning("Failed to schedule feed fan-out for post %s: %s", instance.pk, e)
+    instance._timeline_visibility = instance.visibility
+
+
+@receiver(post_init, sender=Connection)
+def remember_connection_status(sender, instance: Connection, **kwargs):
+    instance._timeline_status = instance.__dict__.get('status')
+
+
+def _sync_connection_timelines(instance: Connection):
+    try:
+        from .feed_timeline import schedule_connection_sync
+        schedule_connection_sync(instance.requester_id, instance.addressee_id)
     except Exception as e:
-        logger.warning("Failed to process blog image %s: %s", instance.pk, e)
+        logger.warning("Failed to schedule feed sync for connection %s: %s", instance.pk, e)
+
+
+@receiver(post_save, sender=Connection)
+def sync_timelines_on_connection_save(sender, instance: Connection, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_timeline_status', None)
+    if instance.status != previous and 'accepted' in (instance.status, previous):
+        _sync_connection_timelines(instance)
+    instance._timeline_status = instance.status
+
+
+@receiver(post_delete, sender=Connection)
+def sync_timelines_on_connection_delete(sender, instance: Connection, **kwargs):
+    if 'accepted' in (instance.status, getattr(instance, '_timeline_status', None)):
+        _sync_connection_timelines(instance)
+
@@ -0,0 +1,197 @@
+"""Write-behind buffer for TherapistProfileStats counters.
+
+Search impressions, profile clicks and contact clicks are accumulated in process
+memory keyed on (therapist user id, date) and flushed in bulk instead of doing a
+get_or_create + save() per event:
+
+    1. missing (therapist, date) rows are inserted with bulk_create(ignore_conflicts=True)
+    2. every counter is applied with a single UPDATE per date using
+       F(counter) + CASE WHEN therapist_id = ... THEN delta END
+
+so increments are atomic in the database and concurrent workers never overwrite each
+other's counts. Only a background daemon thread flushes, on its own connection and
+outside any request transaction (ATOMIC_REQUESTS): every FLUSH_INTERVAL_SECONDS, or
+as soon as a record call finds MAX_PENDING_KEYS keys buffered and wakes it. Request
+threads only append to the buffer. A last flush runs at interpreter shutdown.
+
+`pending_size()` reports the buffered key / event counts (also logged on each flush);
+`pending_for()` lets views overlay not-yet-flushed counts for the current process.
+"""
+import atexit
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 10
+MAX_PENDING_KEYS = 1000
+COUNTERS = ('search_impressions', 'profile_clicks', 'contact_clicks')
+
+# (therapist_user_id, date) -> {'search_impressions': n, 'profile_clicks': n, 'contact_clicks': n, 'search_rank': r}
+_buffer: Dict[Tuple[int, object], Dict[str, int]] = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+# Set by record calls when the buffer is full, so the flusher does not wait out its interval
+_wake = threading.Event()
+
+
+def _today():
+    from django.utils import timezone
+    return timezone.now().date()
+
+
+def _record(user_id: int, counter: str, amount: int = 1, rank: Optional[int] = None, day=None) -> None:
+    if not user_id:
+        return
+    key = (int(user_id), day or _today())
+    with _lock:
+        entry = _buffer.get(key)
+        if entry is None:
+            entry = _buffer[key] = {}
+        entry[counter] = entry.get(counter, 0) + amount
+        if rank is not None:
+            entry['search_rank'] = rank  # last rank seen for the day
+        full = len(_buffer) >= MAX_PENDING_KEYS
+    _ensure_flusher()
+    if full:
+        _wake.set()
+
+
+def record_impressions(ranked_user_ids: Iterable[int], start_rank: int = 1) -> None:
+    """Count one search impression per therapist user id, remembering its rank in the results
+    (`start_rank` is the first card's overall position: rows on earlier pages + 1)."""
+    day = _today()
+    for rank, user_id in enumerate(ranked_user_ids, start=start_rank):
+        _record(user_id, 'search_impressions', rank=rank, day=day)
+
+
+def record_profile_click(user_id: int) -> None:
+    _record(user_id, 'profile_clicks')
+
+
+def record_contact_click(user_id: int) -> None:
+    _record(user_id, 'contact_clicks')
+
+
+def pending_size() -> Dict[str, int]:
+    """Buffered (therapist, date) keys and total buffered events for this process."""
+    with _lock:
+        events = sum(v for entry in _buffer.values() for k, v in entry.items() if k in COUNTERS)
+        return {'keys': len(_buffer), 'events': events}
+
+
+def pending_for(user_id: int, day=None) -> Dict[str, int]:
+    """Not-yet-flushed counter deltas for one therapist/day in this process."""
+    with _lock:
+        return dict(_buffer.get((int(user_id), day or _today()), {}))
+
+
+def _flusher_loop() -> None:
+    from django.db import close_old_connections
+    while True:
+        _wake.wait(FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.warning("Stats buffer background flush failed: %s", e)
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher() -> None:
+    # The only flusher: request threads never write, so no flush runs on a request's connection or transaction
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(target=_flusher_loop, name='stats-buffer-flush', daemon=True)
+        _flusher.start()
+
+
+def flush() -> int:
+    """Apply all buffered counters to the database. Returns the number of keys written."""
+    global _buffer
+    if not _flush_lock.acquire(blocking=False):
+        return 0  # another thread is already flushing
+    try:
+        with _lock:
+            pending, _buffer = _buffer, {}
+        if not pending:
+            return 0
+        try:
+            _write(pending)
+        except Exception as e:
+            logger.warning("Stats buffer flush failed (%s keys re-queued): %s", len(pending), e)
+            _requeue(pending)
+            return 0
+        logger.info("Stats buffer flushed keys=%s events=%s", len(pending),
+                    sum(v for entry in pending.values() for k, v in entry.items() if k in COUNTERS))
+        return len(pending)
+    finally:
+        _flush_lock.release()
+
+
+def _requeue(pending) -> None:
+    with _lock:
+        for key, entry in pending.items():
+            current = _buffer.setdefault(key, {})
+            for counter, value in entry.items():
+                if counter == 'search_rank':
+                    current.setdefault('search_rank', value)
+                else:
+                    current[counter] = current.get(counter, 0) + value
+
+
+def _write(pending) -> None:
+    from django.db import transaction
+    from django.db.models import Case, F, IntegerField, Value, When
+    from django.utils import timezone
+    from users.models import TherapistProfileStats, User
+
+    # Drop counts for users deleted since the event (the FK insert would fail the whole batch)
+    live = set(User.objects.filter(pk__in={uid for uid, _ in pending}).values_list('pk', flat=True))
+    by_day: Dict[object, Dict[int, Dict[str, int]]] = {}
+    for (user_id, day), entry in pending.items():
+        if user_id in live:
+            by_day.setdefault(day, {})[user_id] = entry
+    with transaction.atomic():
+        for day, entries in by_day.items():
+            TherapistProfileStats.objects.bulk_create(
+                [TherapistProfileStats(therapist_id=uid, date=day) for uid in entries],
+                ignore_conflicts=True,
+            )
+            updates = {}
+            for counter in COUNTERS:
+                whens = [When(therapist_id=uid, then=Value(e[counter])) for uid, e in entries.items() if e.get(counter)]
+                if whens:
+                    updates[counter] = F(counter) + Case(*whens, default=Value(0), output_field=IntegerField())
+            rank_whens = [When(therapist_id=uid, then=Value(e['search_rank'])) for uid, e in entries.items() if 'search_rank' in e]
+            if rank_whens:
+                updates['search_rank'] = Case(*rank_whens, default=F('search_rank'), output_field=IntegerField())
+            if updates:
+                # updated_at is auto_now; queryset.update() does not touch it, so set it explicitly
+                updates['updated_at'] = timezone.now()
+                TherapistProfileStats.objects.filter(date=day, therapist_id__in=list(entries)).update(**updates)
+
+
+@atexit.register
+def _flush_on_shutdown() -> None:
+    try:
+        flush()
+    except Exception:
+        pass
+
+
+__all__ = [
+    "record_impressions",
+    "record_profile_click",
+    "record_contact_click",
+    "pending_size",
+    "pending_for",
+    "flush",
+]
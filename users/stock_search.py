@@ -0,0 +1,449 @@
+"""Stock image search for the post composer (used by `views.api_feed_stock_images`).
+
+The composer searches as the user types and pages through results. Every query and
+page used to call Pexels or Unsplash synchronously (8 s timeout), so identical
+searches from different users, or the same user paging back, each cost a provider
+round trip and a unit of the provider's hourly quota. Here:
+
+  * each backend is a `StockProvider` (Pexels, Unsplash, the DEBUG Picsum
+    placeholders, and `FakeProvider` for tests) returning normalized results;
+  * results are cached in a TieredCache keyed on (provider, normalized query,
+    page, per_page). A result younger than FRESH_SECONDS is served as is; an older
+    one (up to CACHE_SECONDS) is served immediately and refreshed in the background,
+    so a repeated search never waits on the provider;
+  * identical searches in flight in one process share one provider call
+    (`SingleFlight`);
+  * after page N is served, page N+1 is fetched in the background when the
+    result says there is one, so "load more" is usually a cache hit;
+  * each provider's published quota is enforced across all workers by a
+    `SharedRateLimit` (users/cache_utils.py): `burst` calls per burst / rate seconds,
+    counted in the shared cache. Foreground searches may use the whole window;
+    prefetches and refreshes only run while at least half of it (and never fewer
+    than PREFETCH_RESERVE calls) is left. A search that finds the window spent fails
+    fast with `rate_limited` instead of queueing behind the quota. If the cache is
+    down, or is the per-process locmem default (CACHE_URL unset), a per-process
+    `TokenBucket` holding this worker's share of the quota (WEB_CONCURRENCY workers
+    assumed) decides instead.
+
+Single-flight and the background pool are per process; the result cache and the
+quota are shared through the Django cache backend.
+
+Usage:
+    search('  Mountain   lake ', page=1, per_page=20)
+      -> {"results": [...], "total": 812, "page": 1, "per_page": 20, "cached": False}
+    raises SearchError("rate_limited" | "unauthorized" | "provider_http" | "provider_error")
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from users.cache_utils import SharedRateLimit, TieredCache
+
+logger = logging.getLogger(__name__)
+
+# A cached result is served without a refresh for FRESH_SECONDS and kept (served stale, refreshed
+# in the background) for CACHE_SECONDS
+FRESH_SECONDS = 15 * 60
+CACHE_SECONDS = 24 * 3600
+PROVIDER_TIMEOUT = 8
+# Calls a background prefetch / refresh must leave in the quota window for interactive searches:
+# the larger of PREFETCH_RESERVE and PREFETCH_SHARE of the window
+PREFETCH_RESERVE = 3
+PREFETCH_SHARE = 0.5
+BACKGROUND_WORKERS = 2
+MAX_QUERY_LENGTH = 100
+
+_RESULTS = TieredCache('stock.search', maxsize=512, timeout=CACHE_SECONDS, local_ttl=FRESH_SECONDS)
+
+
+class SearchError(Exception):
+    """A search the provider refused or failed; `code` is the JSON error code returned to the composer."""
+
+    def __init__(self, code: str, status: int = 502):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+
+# --- Rate limiting and coalescing ---------------------------------------------------------
+
+class TokenBucket:
+    """`capacity` tokens, refilled at `rate` per second; thread-safe, never blocks."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, reserve: float = 0) -> bool:
+        """Take one token unless that would leave fewer than `reserve`."""
+        with self._lock:
+            self._refill()
+            if self._tokens - 1 < reserve:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class SingleFlight:
+    """Runs fn once per key at a time; concurrent callers with the same key wait for and share its outcome."""
+
+    def __init__(self):
+        self._calls: Dict[Any, list] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn: Callable[[], Any], timeout: Optional[float] = None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                # [done event, result, exception]
+                call = self._calls[key] = [threading.Event(), None, None]
+        if not leader:
+            if not call[0].wait(timeout):
+                return fn()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+        try:
+            call[1] = fn()
+            return call[1]
+        except BaseException as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call[0].set()
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+
+# --- Providers ----------------------------------------------------------------------------
+
+class StockProvider:
+    """One search backend. `search` returns (normalized results, total) or raises SearchError."""
+
+    name = ''
+    # Quota: tokens per second and burst size (None = unlimited)
+    rate: Optional[float] = None
+    burst: float = 1
+    note: Optional[str] = None
+    # Shared-cache counter name; providers with the same quota_name share one quota
+    quota_name: Optional[str] = None
+
+    def __init__(self):
+        self.bucket = None
+        if self.rate:
+            # Used while the cache is unreachable or per process: this worker's share of the quota
+            workers = max(1, int(os.environ.get('WEB_CONCURRENCY') or 1))
+            fallback = TokenBucket(self.rate / workers, max(1.0, self.burst / workers))
+            self.bucket = SharedRateLimit(f'stock.{self.quota_name or self.name}', int(self.burst),
+                                          self.burst / self.rate, fallback=fallback)
+
+    def search(self, query: str, page: int, per_page: int) -> Tuple[List[Dict[str, Any]], int]:
+        raise NotImplementedError
+
+    def _get(self, url: str, headers: Dict[str, str], params: Dict[str, Any]):
+        from users.image_proxy import get_session
+        try:
+            resp = get_session().get(url, headers=headers, params=params, timeout=PROVIDER_TIMEOUT)
+        except Exception as e:
+            logger.warning("Stock search via %s failed: %s", self.name, e)
+            raise SearchError('provider_error')
+        if resp.status_code != 200:
+            # Propagate provider errors (e.g., 401 invalid key) with a generic error code
+            raise SearchError('unauthorized' if resp.status_code in (401, 403) else 'provider_http')
+        try:
+            return resp.json()
+        except ValueError:
+            raise SearchError('provider_error')
+
+
+class PexelsProvider(StockProvider):
+    name = 'pexels'
+    rate = 200 / 3600.0   # 200 requests / hour
+    burst = 20
+
+    def __init__(self, api_key: str):
+        super().__init__()
+        self.api_key = api_key
+
+    def search(self, query, page, per_page):
+        data = self._get('https://api.pexels.com/v1/search', {'Authorization': self.api_key},
+                         {'query': query, 'per_page': per_page, 'page': page})
+        results = []
+        for p in data.get('photos', []):
+            src = p.get('src', {})
+            # Use large variant for composer preview; original available if needed
+            results.append({
+                'id': f"pexels_{p.get('id')}",
+                'thumb_url': src.get('medium') or src.get('small') or src.get('tiny'),
+                'full_url': src.get('large2x') or src.get('large') or src.get('original'),
+                'width': p.get('width'),
+                'height': p.get('height'),
+                'provider': 'pexels',
+                'attribution': (p.get('photographer') or '').strip(),
+                'attribution_url': p.get('photographer_url'),
+                'license': 'Pexels License',
+                'license_url': 'https://www.pexels.com/license/',
+            })
+        return results, data.get('total_results', 0)
+
+
+class UnsplashProvider(StockProvider):
+    name = 'unsplash'
+    rate = 50 / 3600.0    # demo applications: 50 requests / hour
+    burst = 10
+
+    def __init__(self, access_key: str):
+        super().__init__()
+        self.access_key = access_key
+
+    def search(self, query, page, per_page):
+        data = self._get('https://api.unsplash.com/search/photos', {'Authorization': f'Client-ID {self.access_key}'},
+                         {'query': query, 'per_page': per_page, 'page': page,
+                          'content_filter': 'high', 'orientation': 'landscape'})
+        results = []
+        for p in data.get('results', []):
+            urls = p.get('urls', {})
+            user = p.get('user', {})
+            results.append({
+                'id': f"unsplash_{p.get('id')}",
+                'thumb_url': urls.get('small') or urls.get('thumb'),
+                'full_url': urls.get('regular') or urls.get('full'),
+                'width': p.get('width'),
+                'height': p.get('height'),
+                'provider': 'unsplash',
+                'attribution': (user.get('name') or user.get('username') or '').strip(),
+                'attribution_url': user.get('links', {}).get('html') or user.get('portfolio_url'),
+                'license': 'Unsplash License',
+                'license_url': 'https://unsplash.com/license',
+            })
+        return results, data.get('total', 0)
+
+
+def _seeded_results(query: str, page: int, per_page: int, provider: str, attribution: str,
+                    license_name: str) -> List[Dict[str, Any]]:
+    # Derive a deterministic seed from the search query so different queries yield different images
+    q_hash = int(hashlib.md5((query or 'default').encode('utf-8')).hexdigest(), 16) % 10_000_000
+    base_id = (page - 1) * per_page
+    results = []
+    for i in range(per_page):
+        seed = q_hash + base_id + i + 1
+        results.append({
+            'id': f'picsum_{seed}',
+            'thumb_url': f'https://picsum.photos/seed/{seed}/300/200',
+            'full_url': f'https://picsum.photos/seed/{seed}/1200/800',
+            'width': 1200,
+            'height': 800,
+            'provider': provider,
+            'attribution': attribution,
+            'attribution_url': 'https://picsum.photos/',
+            'license': license_name,
+            'license_url': 'https://picsum.photos/',
+        })
+    return results
+
+
+class PicsumProvider(StockProvider):
+    """No API keys in DEBUG: placeholder results so the composer UI can be exercised."""
+
+    name = 'picsum.dev'
+    note = 'DEBUG placeholder images'
+
+    def search(self, query, page, per_page):
+        return _seeded_results(query, page, per_page, 'picsum.dev', 'Lorem Picsum (demo)',
+                               'Placeholder (dev only)'), 9999
+
+
+class FakeProvider(StockProvider):
+    """Local, deterministic provider for tests: optional latency, quota and failure, and a call log."""
+
+    name = 'fake'
+
+    def __init__(self, latency: float = 0.0, total: int = 200, rate: Optional[float] = None,
+                 burst: float = 1, fail_with: Optional[str] = None):
+        self.rate, self.burst = rate, burst
+        # Each instance gets its own quota so tests do not see each other's calls
+        self.quota_name = f'fake.{id(self):x}'
+        super().__init__()
+        self.latency = latency
+        self.total = total
+        self.fail_with = fail_with
+        self.calls: List[Tuple[str, int, int]] = []
+        self._calls_lock = threading.Lock()
+
+    def search(self, query, page, per_page):
+        with self._calls_lock:
+            self.calls.append((query, page, per_page))
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_with:
+            raise SearchError(self.fail_with)
+        count = max(0, min(per_page, self.total - (page - 1) * per_page))
+        return _seeded_results(query, page, count, 'fake', 'Fake provider', 'Test only'), self.total
+
+
+_UNSET = object()
+_PROVIDER = _UNSET
+_PROVIDER_LOCK = threading.Lock()
+
+
+def _build_provider() -> Optional[StockProvider]:
+    from django.conf import settings
+    choice = (getattr(settings, 'STOCK_IMAGE_PROVIDER', '') or '').lower()
+    if choice == 'fake':
+        return FakeProvider()
+    pexels_key = getattr(settings, 'PEXELS_API_KEY', None)
+    unsplash_key = getattr(settings, 'UNSPLASH_ACCESS_KEY', None)
+    # Prefer Pexels if both keys are present
+    if pexels_key and choice in ('', 'pexels'):
+        return PexelsProvider(pexels_key)
+    if unsplash_key and choice in ('', 'unsplash'):
+        return UnsplashProvider(unsplash_key)
+    if choice == 'picsum' or getattr(settings, 'DEBUG', False):
+        return PicsumProvider()
+    return None
+
+
+def get_provider() -> Optional[StockProvider]:
+    """The process-wide provider chosen from settings; None when none is configured."""
+    global _PROVIDER
+    if _PROVIDER is _UNSET:
+        with _PROVIDER_LOCK:
+            if _PROVIDER is _UNSET:
+                _PROVIDER = _build_provider()
+    return _PROVIDER
+
+
+def set_provider(provider: Optional[StockProvider]) -> None:
+    """Replace the process-wide provider (tests point this at a FakeProvider)."""
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        _PROVIDER = provider
+
+
+# --- Search -------------------------------------------------------------------------------
+
+_FLIGHTS = SingleFlight()
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _EXECUTOR = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='stock-search')
+        return _EXECUTOR
+
+
+def normalize_query(query: str) -> str:
+    """NFKC, case-folded, whitespace-collapsed query: the form results are cached under."""
+    query = unicodedata.normalize('NFKC', query or '')
+    return ' '.join(query.casefold().split())[:MAX_QUERY_LENGTH]
+
+
+def cache_key(provider: StockProvider, query: str, page: int, per_page: int) -> Tuple[str, str, int, int]:
+    return provider.name, normalize_query(query), page, per_page
+
+
+def _fetch(provider: StockProvider, key, reserve: float) -> Dict[str, Any]:
+    _, query, page, per_page = key
+
+    def call():
+        if provider.bucket is not None and not provider.bucket.try_acquire(reserve):
+            raise SearchError('rate_limited', 429)
+        results, total = provider.search(query, page, per_page)
+        entry = {'results': results, 'total': total, 'fetched_at': time.time()}
+        _RESULTS.set(key, entry)
+        return entry
+
+    return _FLIGHTS.do(key, call, timeout=PROVIDER_TIMEOUT + 2)
+
+
+def _background_reserve(provider: StockProvider) -> float:
+    return max(PREFETCH_RESERVE, PREFETCH_SHARE * provider.bucket.capacity) if provider.bucket is not None else 0
+
+
+def _fetch_in_background(provider: StockProvider, key) -> None:
+    if _FLIGHTS.in_flight(key):
+        return
+    reserve = _background_reserve(provider)
+    if provider.bucket is not None and provider.bucket.tokens - 1 < reserve:
+        return
+
+    def run():
+        try:
+            _fetch(provider, key, reserve)
+        except SearchError as e:
+            logger.debug("Background stock search %s skipped: %s", key, e.code)
+        except Exception as e:
+            logger.warning("Background stock search %s failed: %s", key, e)
+
+    try:
+        _executor().submit(run)
+    except RuntimeError:
+        # Interpreter shutting down
+        pass
+
+
+def search(query: str, page: int = 1, per_page: int = 20, prefetch: bool = True) -> Dict[str, Any]:
+    """Results for one page of a search; raises SearchError (see module docstring)."""
+    provider = get_provider()
+    if provider is None:
+        return {'results': [], 'total': 0, 'page': page, 'per_page': per_page,
+                'note': 'No stock image provider configured'}
+    key = cache_key(provider, query, page, per_page)
+    entry = _RESULTS.get(key)
+    cached = entry is not None
+    if entry is None:
+        entry = _fetch(provider, key, 0)
+    elif time.time() - entry.get('fetched_at', 0) > FRESH_SECONDS:
+        _fetch_in_background(provider, key)
+    if prefetch and page * per_page < (entry.get('total') or 0):
+        next_key = cache_key(provider, query, page + 1, per_page)
+        if _RESULTS.get(next_key) is None:
+            _fetch_in_background(provider, next_key)
+    out = {'results': entry['results'], 'total': entry['total'], 'page': page, 'per_page': per_page,
+           'cached': cached}
+    if provider.note:
+        out['note'] = provider.note
+    return out
+
+
+__all__ = [
+    "SearchError",
+    "TokenBucket",
+    "SingleFlight",
+    "StockProvider",
+    "PexelsProvider",
+    "UnsplashProvider",
+    "PicsumProvider",
+    "FakeProvider",
+    "get_provider",
+    "set_provider",
+    "normalize_query",
+    "search",
+]
@@ -30,16 +30,23 @@ def profile_photo_variant(tp, variant_label="medium", fmt="jpg"):
     # fallback
     return tp.profile_photo.url
 
-@register.simple_tag
-def profile_photo_srcset(tp, fmt_preference="webp"):
-    """Build a srcset string using available variants; prefer webp else jpg."""
-    if not getattr(tp, 'profile_photo', None):
-        return ''
-    meta = getattr(tp, 'profile_photo_meta', None) or {}
-    variants = meta.get('variants') or {}
-    if not variants:
-        return ''
-    base_dir = os.path.dirname(tp.profile_photo.url)
+def _resized_srcset(kind, obj, meta, fmt):
+    """srcset over every width bucket of the on-demand endpoint; None when the image cannot use it yet."""
+    from django.urls import reverse
+    from users.image_resize import available_formats, source_key, srcset_widths
+    key = source_key(meta)
+    if key is None or fmt not in available_formats():
+        return None
+    widths = srcset_widths(meta)
+    if not widths:
+        return None
+    # One reverse() per image: width and format are the URL's last segment
+    prefix = reverse('resized_image', kwargs={'kind': kind, 'pk': obj.pk, 'key': key, 'width': 0, 'fmt': fmt})[:-len(f'0.{fmt}')]
+    return ', '.join(f"{prefix}{w}.{fmt} {w}w" for w in widths)
+
+
+def _static_srcset(field_file, variants, fmt_preference):
+    base_dir = os.path.dirname(field_file.url)
     parts = []
     order = [('thumb', 160), ('medium', 600), ('large', 1200)]
     for label, width in order:
@@ -53,6 +60,26 @@ def profile_photo_srcset(tp, fmt_preference="webp"):
     return ', '.join(parts)
 
 
+@register.simple_tag
+def profile_photo_srcset(tp, fmt_preference="webp"):
+    """Build a srcset string for the photo in `fmt_preference` (jpg / webp / avif).
+
+    Processed photos get every width bucket of the on-demand resize endpoint; photos
+    still processing (or processed before it existed) fall back to the fixed variants,
+    and to '' for avif, which only the endpoint produces.
+    """
+    if not getattr(tp, 'profile_photo', None):
+        return ''
+    meta = getattr(tp, 'profile_photo_meta', None) or {}
+    srcset = _resized_srcset('profile', tp, meta, fmt_preference)
+    if srcset is not None:
+        return srcset
+    variants = meta.get('variants') or {}
+    if not variants or fmt_preference == 'avif':
+        return ''
+    return _static_srcset(tp.profile_photo, variants, fmt_preference)
+
+
 # Generic image variant helpers (GalleryImage, BlogPost) expecting image + image_meta fields
 def _generic_variant(obj, variant_label, fmt):
     if not getattr(obj, 'image', None):
@@ -71,25 +98,22 @@ def _generic_variant(obj, variant_label, fmt):
 def image_variant(obj, variant_label='medium', fmt='jpg'):
     return _generic_variant(obj, variant_label, fmt)
 
+_IMAGE_URL_KINDS = {'galleryimage': 'gallery', 'blogpost': 'blog'}
+
+
 @register.simple_tag
 def image_srcset(obj, fmt_preference='webp'):
     if not getattr(obj, 'image', None):
         return ''
     meta = getattr(obj, 'image_meta', None) or {}
+    kind = _IMAGE_URL_KINDS.get(getattr(getattr(obj, '_meta', None), 'model_name', None))
+    srcset = _resized_srcset(kind, obj, meta, fmt_preference) if kind else None
+    if srcset is not None:
+        return srcset
     variants = meta.get('variants') or {}
-    if not variants:
+    if not variants or fmt_preference == 'avif':
         return ''
-    base_dir = os.path.dirname(obj.image.url)
-    order = [('thumb', 160), ('medium', 600), ('large', 1200)]
-    parts = []
-    for label, width in order:
-        v = variants.get(label)
-        if not v:
-            continue
-        name = v.get(fmt_preference) or v.get('jpg')
-        if name:
-            parts.append(f"{base_dir}/{name} {width}w")
-    return ', '.join(parts)
+    return _static_srcset(obj.image, variants, fmt_preference)
 
 @register.filter
 def to_ampm(value):
@@ -130,3 +154,14 @@ def weekday_long(val):
         return _WEEKDAY_LONG[i]
     return val
 
+
+
+@register.simple_tag
+def facet_count(facet_counts, facet, value_id):
+    """Number of therapists matching a filter option given the other active filters.
+    Usage: {% facet_count facet_counts 'license' lt.id %}
+    """
+    try:
+        return (facet_counts or {}).get(facet, {}).get(value_id, 0)
+    except Exception:
+        return 0
@@ -1,3 +1,596 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models_blobs import ImageBlob
+from users.models_blog import BlogMedia, BlogPost
+from users.models_profile import GalleryImage, Location, TherapistProfile
+
+
+STATIC_TEST_SETTINGS = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+
+
+class ConditionalGetMixin:
+    """Revalidation helpers for views wrapped in users.conditional.conditional_get."""
+
+    def fetch(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        return response
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.fetch(url)
+        return len(ctx.captured_queries)
+
+    def assert_revalidates(self, url, validator_queries):
+        """Both validators answer 304 after only the validator queries, well short of a full render."""
+        first = self.fetch(url)
+        full_render = self.count_queries(url)
+        self.assertGreater(full_render, validator_queries)
+        with self.assertNumQueries(validator_queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        with self.assertNumQueries(validator_queries):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def assert_etag_changes(self, url, edit):
+        before = self.fetch(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            edit()
+        after = self.fetch(url)
+        self.assertNotEqual(after['ETag'], before)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=before)
+        self.assertEqual(response.status_code, 200)
+
+
+@STATIC_TEST_SETTINGS
+class ProfileConditionalGetTests(ConditionalGetMixin, TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = get_user_model().objects.create_user(
+                username='pat', email='pat@example.com', password='x', first_name='Pat', last_name='Lee')
+            self.profile = TherapistProfile.objects.create(user=user, first_name='Pat', last_name='Lee')
+            self.location = Location.objects.create(
+                therapist=self.profile, city='Austin', state='TX', zip='78701', is_primary_address=True)
+            self.image = GalleryImage.objects.create(therapist=self.profile, image='gallery/office.jpg', caption='Office')
+        self.profile.refresh_from_db()
+        self.public_url = reverse('therapist_profile_public_slug', kwargs={'slug': self.profile.slug})
+        self.api_url = reverse('api_full_profile', kwargs={'user_id': user.pk})
+
+    def test_public_profile_revalidation_skips_view_queries(self):
+        # Only the snapshot row's (version, updated_at)
+        self.assert_revalidates(self.public_url, 1)
+
+    def test_api_full_profile_revalidation_skips_view_queries(self):
+        self.assert_revalidates(self.api_url, 1)
+
+    def test_location_edit_changes_etag(self):
+        def edit():
+            self.location.city = 'Round Rock'
+            self.location.save()
+        self.assert_etag_changes(self.public_url, edit)
+        self.assert_etag_changes(self.api_url, lambda: Location.objects.create(therapist=self.profile, city='Dallas'))
+
+    def test_gallery_image_edit_changes_etag(self):
+        def edit():
+            self.image.caption = 'Waiting room'
+            self.image.save()
+        self.assert_etag_changes(self.public_url, edit)
+        self.assert_etag_changes(self.api_url, self.image.delete)
+
+    def test_signed_in_visitors_get_the_full_page(self):
+        etag = self.fetch(self.public_url)['ETag']
+        self.client.force_login(self.profile.user)
+        response = self.client.get(self.public_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@STATIC_TEST_SETTINGS
+class BlogConditionalGetTests(ConditionalGetMixin, TestCase):
+    def setUp(self):
+        self.post = BlogPost.objects.create(
+            title='Finding a therapist', slug='finding-a-therapist', content='<p>Start here.</p>',
+            published=True, visibility='public')
+        self.index_url = reverse('blog_index')
+        self.detail_url = reverse('blog_detail', kwargs={'slug': self.post.slug})
+
+    def test_blog_index_revalidation_skips_view_queries(self):
+        # Published aggregate + tag digest
+        self.assert_revalidates(self.index_url, 2)
+
+    def test_blog_detail_revalidation_skips_view_queries(self):
+        # Visibility check + published aggregate + tag digest
+        self.assert_revalidates(self.detail_url, 3)
+
+    def test_media_edit_changes_etag(self):
+        self.assert_etag_changes(self.detail_url, lambda: BlogMedia.objects.create(
+            post=self.post, file='blog_media/cover.jpg', type='image'))
+        self.assert_etag_changes(self.index_url, lambda: BlogMedia.objects.filter(post=self.post).delete())
+
+    def test_unpublished_post_has_no_validators(self):
+        BlogPost.objects.filter(pk=self.post.pk).update(published=False)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+def png_upload(name='photo.png', size=(900, 700), color=(40, 120, 200)):
+    from PIL import Image
+    buf = BytesIO()
+    Image.new('RGB', size, color).save(buf, format='PNG')
+    return SimpleUploadedFile(name, buf.getvalue(), content_type='image/png')
+
+
+class MediaRootMixin:
+    """Uploads go to a throwaway MEDIA_ROOT; images are encoded in-process."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root, IMAGE_ENCODE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class BlobImmutabilityTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user(username='sam', email='sam@example.com', password='x')
+        self.profile = TherapistProfile.objects.create(user=user, first_name='Sam', last_name='Ng')
+
+    def test_processing_keeps_the_blob_original(self):
+        from users.image_jobs import run_pending
+        upload = png_upload()
+        sha = hashlib.sha256(upload.read()).hexdigest()
+        upload.seek(0)
+        image = GalleryImage.objects.create(therapist=self.profile, image=upload)
+        post = BlogPost.objects.create(title='Office', slug='office', content='x', published=True)
+        media = BlogMedia.objects.create(post=post, file=png_upload(), type='image')
+        blob = ImageBlob.objects.get(sha256=sha)
+        self.assertEqual(image.image.name, blob.name)
+        self.assertEqual(media.file.name, blob.name)
+
+        run_pending()
+
+        image.refresh_from_db()
+        self.assertEqual(image.image_meta['status'], 'ready')
+        self.assertEqual(image.image_meta['normalized'], f'{sha}__normalized.jpg')
+        with default_storage.open(blob.name, 'rb') as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), sha)
+        self.assertTrue(default_storage.exists(blob.name.replace('.png', '__normalized.jpg')))
+
+
+class ResizedImageTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        from users.image_jobs import run_pending
+        self.post = BlogPost.objects.create(title='Office', slug='office', content='x', image=png_upload())
+        run_pending()
+        self.post.refresh_from_db()
+
+    def url(self, key):
+        return reverse('resized_image', kwargs={'kind': 'blog', 'pk': self.post.pk, 'key': key, 'width': 160, 'fmt': 'jpg'})
+
+    def test_unpublished_images_are_not_served_or_redirected(self):
+        from users.image_resize import source_key
+        key = source_key(self.post.image_meta)
+        self.assertEqual(self.client.get(self.url(key)).status_code, 404)
+        self.assertEqual(self.client.get(self.url('0' * 16)).status_code, 404)
+        BlogPost.objects.filter(pk=self.post.pk).update(published=True, visibility='members')
+        self.assertEqual(self.client.get(self.url(key)).status_code, 404)
+        BlogPost.objects.filter(pk=self.post.pk).update(visibility='public')
+        self.assertEqual(self.client.get(self.url(key)).status_code, 200)
+        self.assertEqual(self.client.get(self.url('0' * 16)).status_code, 302)
+
+    def test_gc_finds_variants_of_older_keys(self):
+        from django.core.files.base import ContentFile
+        from users.blob_store import blob_files
+        from users.image_resize import variant_name
+        blob = ImageBlob.objects.get(name=self.post.image.name)
+        stale = default_storage.save(variant_name(blob.name, 'a' * 16, 320, 'webp'), ContentFile(b'x'))
+        self.assertIn(stale, blob_files(blob, default_storage))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met within %ss' % timeout)
+        time.sleep(0.01)
+
+
+class _StubImageHandler(BaseHTTPRequestHandler):
+    """Serves the stub server's `routes`: path -> callable(handler) returning (status, headers, body)."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+        status, headers, body = server.routes[self.path](self)
+        time.sleep(server.delay)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def image_route(body, etag='"v1"', max_age=3600):
+    """A cacheable image that answers a matching If-None-Match with 304."""
+    def route(handler):
+        headers = {'Content-Type': 'image/jpeg', 'ETag': etag, 'Cache-Control': f'max-age={max_age}',
+                   'Last-Modified': 'Mon, 05 Oct 2026 10:00:00 GMT'}
+        if handler.headers.get('If-None-Match') == etag:
+            return 304, headers, b''
+        return 200, headers, body
+    return route
+
+
+class ImageProxyTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubImageHandler)
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = f'127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        import requests
+        from users.image_proxy import ImageProxy
+        self.server.routes = {}
+        self.server.requests = []
+        self.server.delay = 0
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        session = requests.Session()
+        self.addCleanup(session.close)
+        self.proxy = ImageProxy(cache_dir, max_bytes=2500, allowed_hosts={self.host}, session=session)
+
+    def url(self, path):
+        return f'http://{self.host}{path}'
+
+    def fetch(self, path):
+        """(status, body) of one proxied request, consuming and closing the result like Django would."""
+        result = self.proxy.fetch(self.url(path))
+        if result.file is not None:
+            with result.file:
+                return result.status, result.file.read()
+        try:
+            return result.status, b''.join(result.stream)
+        finally:
+            result.stream.close()
+
+    def upstream_hits(self, path):
+        return sum(1 for p, _ in self.server.requests if p == path)
+
+    def test_miss_then_hit(self):
+        self.server.routes['/a.jpg'] = image_route(b'a' * 1000)
+        self.assertEqual(self.fetch('/a.jpg'), ('MISS', b'a' * 1000))
+        self.assertEqual(self.fetch('/a.jpg'), ('HIT', b'a' * 1000))
+        self.assertEqual(self.upstream_hits('/a.jpg'), 1)
+
+    def test_expired_entry_is_revalidated(self):
+        self.server.routes['/b.jpg'] = image_route(b'b' * 1000, max_age=0)
+        self.fetch('/b.jpg')
+        self.assertEqual(self.fetch('/b.jpg'), ('REVALIDATED', b'b' * 1000))
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers.get('If-None-Match'), '"v1"')
+        self.assertEqual(headers.get('If-Modified-Since'), 'Mon, 05 Oct 2026 10:00:00 GMT')
+
+    def test_upstream_5xx_serves_the_stale_copy(self):
+        self.server.routes['/c.jpg'] = image_route(b'c' * 1000, max_age=0)
+        self.fetch('/c.jpg')
+        self.server.routes['/c.jpg'] = lambda handler: (503, {}, b'down')
+        self.assertEqual(self.fetch('/c.jpg'), ('STALE', b'c' * 1000))
+
+    def test_concurrent_misses_fetch_once(self):
+        self.server.routes['/d.jpg'] = image_route(b'd' * 1000)
+        self.server.delay = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.fetch('/d.jpg'))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.upstream_hits('/d.jpg'), 1)
+        self.assertEqual(sorted(status for status, _ in results), ['HIT', 'HIT', 'HIT', 'MISS'])
+        self.assertEqual({body for _, body in results}, {b'd' * 1000})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        import os
+        from users import image_proxy
+        for path in ('/e1.jpg', '/e2.jpg', '/e3.jpg'):
+            self.server.routes[path] = image_route(path.encode() * 125)
+        self.fetch('/e1.jpg')
+        self.fetch('/e2.jpg')
+        now = time.time()
+        for path, age in (('/e1.jpg', 200), ('/e2.jpg', 100)):
+            body = os.path.join(self.proxy.cache.directory, f'{self.proxy.cache_key(self.url(path))}.body')
+            os.utime(body, (now - age, now - age))
+        with mock.patch.object(image_proxy, 'TOUCH_INTERVAL', 0):
+            self.assertEqual(self.fetch('/e1.jpg')[0], 'HIT')  # e1 is now the most recently used
+        self.fetch('/e3.jpg')  # 3000 bytes > 2500: evict down to 2250
+        cached = {path for path in ('/e1.jpg', '/e2.jpg', '/e3.jpg')
+                  if self.proxy.cache.get(self.proxy.cache_key(self.url(path))) is not None}
+        for entry in (self.proxy.cache.get(self.proxy.cache_key(self.url(p))) for p in cached):
+            entry[1].close()
+        self.assertEqual(cached, {'/e1.jpg', '/e3.jpg'})
+
+    def test_redirect_to_a_disallowed_host_is_refused(self):
+        from users.image_proxy import ProxyError
+        self.server.routes['/f.jpg'] = lambda handler: (302, {'Location': 'http://evil.example/f.jpg'}, b'')
+        with self.assertRaises(ProxyError) as ctx:
+            self.proxy.fetch(self.url('/f.jpg'))
+        self.assertEqual(ctx.exception.code, 'forbidden_host')
+        self.assertEqual(self.upstream_hits('/f.jpg'), 1)
+
+
+class StockSearchTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from users import stock_search
+        cache.clear()
+        stock_search._RESULTS.local.clear()
+        self.stock_search = stock_search
+
+    def use(self, provider):
+        patcher = mock.patch.object(self.stock_search, '_PROVIDER', provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return provider
+
+    def test_concurrent_identical_searches_share_one_call(self):
+        provider = self.use(self.stock_search.FakeProvider(latency=0.2))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.stock_search.search('Mountain  lake', prefetch=False))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(provider.calls, [('mountain lake', 1, 20)])
+        self.assertEqual(len(results), 5)
+        self.assertEqual({r['results'][0]['id'] for r in results}, {results[0]['results'][0]['id']})
+
+    def test_next_page_is_prefetched(self):
+        provider = self.use(self.stock_search.FakeProvider(total=60))
+        self.assertFalse(self.stock_search.search('forest', page=1)['cached'])
+        wait_for(lambda: ('forest', 2, 20) in provider.calls)
+        wait_for(lambda: self.stock_search._RESULTS.get(('fake', 'forest', 2, 20)) is not None)
+        self.assertTrue(self.stock_search.search('forest', page=2, prefetch=False)['cached'])
+        # The last page has nothing after it
+        calls = len(provider.calls)
+        self.stock_search.search('forest', page=3)
+        self.assertEqual(len(provider.calls), calls + 1)
+
+    def test_stale_result_is_served_and_refreshed(self):
+        provider = self.use(self.stock_search.FakeProvider())
+        self.stock_search.search('river', prefetch=False)
+        with mock.patch.object(self.stock_search, 'FRESH_SECONDS', -1):
+            response = self.stock_search.search('river', prefetch=False)
+        self.assertTrue(response['cached'])
+        wait_for(lambda: len(provider.calls) == 2)
+        self.assertEqual(provider.calls[1], ('river', 1, 20))
+
+    def test_spent_quota_fails_fast_and_skips_background_work(self):
+        provider = self.use(self.stock_search.FakeProvider(rate=1 / 3600.0, burst=2, total=100))
+        self.stock_search.search('one')
+        self.stock_search.search('two', prefetch=False)
+        with self.assertRaises(self.stock_search.SearchError) as ctx:
+            self.stock_search.search('three')
+        self.assertEqual((ctx.exception.code, ctx.exception.status), ('rate_limited', 429))
+        # Prefetch of 'one' page 2 was held back by the background reserve
+        self.assertEqual([c[0] for c in provider.calls], ['one', 'two'])
+        self.assertTrue(self.stock_search.search('one', prefetch=False)['cached'])
+
+
+class SharedRateLimitTests(SimpleTestCase):
+    def test_per_process_backend_uses_the_worker_share(self):
+        from users.cache_utils import SharedRateLimit, is_shared
+        from users.stock_search import TokenBucket
+        self.assertFalse(is_shared())
+        limit = SharedRateLimit('test.locmem', capacity=10, window=60, fallback=TokenBucket(0.0, 2))
+        self.assertEqual([limit.try_acquire() for _ in range(4)], [True, True, False, False])
+
+    def test_shared_backend_counts_across_instances(self):
+        from users.cache_utils import SharedRateLimit, is_shared
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir}}):
+            self.assertTrue(is_shared())
+            # Two workers' limiters over one counter
+            first = SharedRateLimit('test.shared', capacity=3, window=3600)
+            second = SharedRateLimit('test.shared', capacity=3, window=3600)
+            taken = [first.try_acquire(), second.try_acquire(), first.try_acquire(), second.try_acquire()]
+            self.assertEqual(taken, [True, True, True, False])
+            self.assertEqual(first.tokens, 0)
+
+
+class LookupRenameTests(TestCase):
+    def setUp(self):
+        from users.models_profile import ParticipantType, Specialty, SpecialtyLookup
+        with self.captureOnCommitCallbacks(execute=True):
+            user = get_user_model().objects.create_user(
+                username='ana', email='ana@example.com', password='x', onboarding_status='active')
+            self.profile = TherapistProfile.objects.create(user=user, first_name='Ana', last_name='Ruiz')
+            self.specialty = SpecialtyLookup.objects.create(name='Anxiety')
+            Specialty.objects.create(therapist=self.profile, specialty=self.specialty, is_top_specialty=True)
+            self.participant = ParticipantType.objects.create(name='Teens')
+            self.profile.participant_types.add(self.participant)
+            other = get_user_model().objects.create_user(username='bo', email='bo@example.com', password='x')
+            self.other = TherapistProfile.objects.create(user=other, first_name='Bo', last_name='Li')
+
+    def card(self):
+        from users.models_search import TherapistSearchDocument
+        return TherapistSearchDocument.objects.get(therapist=self.profile).card
+
+    def test_renames_refresh_search_cards(self):
+        from users.lookups import referencing_profile_ids
+        self.assertEqual(self.card()['top_specialties'], ['Anxiety'])
+        self.assertEqual(referencing_profile_ids(self.specialty), {self.profile.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.specialty.name = 'Anxiety & Worry'
+            self.specialty.save()
+            self.participant.name = 'Adolescents'
+            self.participant.save()
+        card = self.card()
+        self.assertEqual(card['top_specialties'], ['Anxiety & Worry'])
+        self.assertEqual(card['participant_types'], ['Adolescents'])
+
+    def test_deleted_lookup_leaves_the_cards(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.participant.delete()
+        self.assertEqual(self.card()['participant_types'], [])
+
+    def test_renames_refresh_only_the_snapshots_naming_the_row(self):
+        import json
+        from users.models_profile import InsuranceProvider
+        from users.models_snapshot import TherapistProfileSnapshot
+        snapshots = TherapistProfileSnapshot.objects.order_by('therapist_id')
+        self.assertEqual(snapshots.count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            InsuranceProvider.objects.create(name='Aetna')
+        self.assertEqual(snapshots.count(), 2)
+        other_before = snapshots.get(therapist=self.other).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.specialty.name = 'Anxiety & Worry'
+            self.specialty.save()
+        self.assertEqual(snapshots.count(), 2)
+        self.assertIn('Anxiety & Worry', json.dumps(snapshots.get(therapist=self.profile).document))
+        self.assertEqual(snapshots.get(therapist=self.other).updated_at, other_before)
+
+
+class CommitBatchTests(TestCase):
+    def setUp(self):
+        from users.commit_batch import CommitBatch
+        self.flushed = []
+        self.batch = CommitBatch('test ids', self.flushed.append)
+
+    def test_ids_are_flushed_once_per_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for item in (1, 2, 1, None):
+                self.batch.add(item)
+            self.assertEqual(self.flushed, [])
+        self.assertEqual(self.flushed, [{1, 2}])
+
+    def test_ids_of_a_rolled_back_block_are_not_orphaned(self):
+        from django.db import transaction
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.batch.add(3)
+                raise RuntimeError
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.add(4)
+        self.assertEqual(self.flushed, [{3, 4}])
+
+
+class ZipIndexTests(TestCase):
+    def test_writes_swap_in_a_copy(self):
+        from users import zip_index
+        from users.models_profile import ZipCode
+        zip_index.invalidate_zip_index()
+        self.addCleanup(zip_index.invalidate_zip_index)
+        ZipCode.objects.create(zip='00501', city='Holtsville', state='NY', latitude=40.81, longitude=-73.04)
+        before = zip_index.get_zip_index()
+        rows = before.arrays()[0]
+        ZipCode.objects.create(zip='00502', city='Holtsville', state='NY', latitude=40.82, longitude=-73.05)
+        after = zip_index.get_zip_index()
+        self.assertIsNot(after, before)
+        self.assertIsNone(before.coords('00502'))
+        self.assertIs(before.arrays()[0], rows)
+        self.assertIn('00502', after.arrays()[0])
+        self.assertEqual([z for z, _ in after.nearest(40.82, -73.05, k=2)], ['00502', '00501'])
+        ZipCode.objects.filter(zip='00501').delete()
+        self.assertEqual(len(zip_index.get_zip_index()), len(after) - 1)
+        self.assertIsNotNone(after.coords('00501'))
+
+class FacetIndexTests(TestCase):
+    def setUp(self):
+        from users import facet_index
+        self.facet_index = facet_index
+        facet_index.invalidate_facet_index()
+        self.addCleanup(facet_index.invalidate_facet_index)
+        self.profiles = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('ava', 'ben', 'cy'):
+                user = get_user_model().objects.create_user(
+                    username=name, email=f'{name}@example.com', password='x', onboarding_status='active')
+                self.profiles.append(TherapistProfile.objects.create(user=user, first_name=name, last_name='Kim'))
+        self.index = facet_index.get_facet_index()
+        self.assertEqual(len(self.index), 3)
+
+    def recheck(self):
+        """Run the periodic staleness check now; True when it rebuilt the index."""
+        with mock.patch.object(self.facet_index, '_INDEX_CHECKED_AT', 0.0), \
+                mock.patch.object(self.facet_index, '_build_index', wraps=self.facet_index._build_index) as build:
+            self.facet_index.get_facet_index()
+        return build.called
+
+    def test_own_patch_is_not_rebuilt_but_other_writes_are(self):
+        from django.utils import timezone
+        from users.models_search import TherapistSearchDocument
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profiles[0].first_name = 'Ava'
+            self.profiles[0].save()
+        self.assertFalse(self.recheck())
+        # A write this worker did not patch (another worker's refresh)
+        TherapistSearchDocument.objects.filter(therapist=self.profiles[1]).update(updated_at=timezone.now())
+        self.assertTrue(self.recheck())
+
+    def test_login_updates_the_live_index_in_place(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        index = self.index
+        bits = index.match()
+        user = self.profiles[2].user
+        user.last_login = timezone.now() + timedelta(minutes=1)
+        user.save(update_fields=['last_login'])
+        self.assertIs(self.facet_index.get_facet_index(), index)
+        self.assertEqual(index.seek('recent', None, bits, 1)[0][-1], self.profiles[2].pk)
+        self.assertFalse(self.recheck())
+        self.assertIs(self.facet_index.get_facet_index(), index)
+
+    def test_cursor_pages_continue_impression_ranks(self):
+        from django.http import QueryDict
+        from users import stats_buffer
+        from users.directory import seek_page
+        first = seek_page(QueryDict(), None, limit=2)
+        second = seek_page(QueryDict(), None, cursor=first.next_cursor, limit=2)
+        self.assertEqual((first.offset, second.offset, len(second.rows)), (0, 2, 1))
+        with mock.patch.object(stats_buffer, '_record') as record:
+            stats_buffer.record_impressions([self.profiles[0].user_id], start_rank=second.offset + 1)
+        self.assertEqual(record.call_args.kwargs['rank'], 3)
@@ -0,0 +1,130 @@
+"""In-process prefix-trie typeahead over the lookup registry (users/lookups.py).
+
+One trie per lookup kind. Every word of an option's name is inserted character by
+character and each trie node holds the registry positions of the options having a
+word with that prefix, so "beh" finds "Cognitive Behavioral Therapy (CBT)" and a
+multi-word query ("cog beh") intersects its words' sets. Because registry positions
+follow (sort_order, name), sorting the matched positions is the ranking.
+
+A kind's trie is rebuilt whenever the registry hands out a new options tuple for it
+(any lookup write bumps the registry version), so there is no separate invalidation.
+
+`suggest()` keeps the old `name__icontains` contract of the lookup endpoints: when
+word-prefix matches fill fewer than `limit` slots, the remaining slots are topped up
+with plain substring matches (also in registry order).
+"""
+import re
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from users.lookups import LOOKUP_MODELS, LookupOption, options
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+# Public kind names accepted by /api/lookups/typeahead/ in addition to the registry keys
+KIND_ALIASES = {
+    'insurance_providers': 'insurance_provider',
+    'therapy_types': 'therapy_type',
+    'testing_types': 'testing_type',
+    'specialties': 'specialty',
+    'participant_types': 'participant_type',
+    'age_groups': 'age_group',
+    'license_types': 'license_type',
+    'payment_methods': 'payment_method',
+}
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall((text or '').lower())
+
+
+def resolve_kind(kind: str) -> Optional[str]:
+    kind = (kind or '').strip().lower()
+    kind = KIND_ALIASES.get(kind, kind)
+    return kind if kind in LOOKUP_MODELS else None
+
+
+class PrefixTrie:
+    """Word-prefix index over an ordered tuple of LookupOption rows."""
+
+    __slots__ = ('rows', '_root')
+
+    def __init__(self, rows: Tuple[LookupOption, ...]):
+        self.rows = rows
+        # node: [children dict, set of row positions]
+        self._root = [{}, set()]
+        for pos, row in enumerate(rows):
+            for word in _words(row.name):
+                node = self._root
+                for ch in word:
+                    child = node[0].get(ch)
+                    if child is None:
+                        child = node[0][ch] = [{}, set()]
+                    child[1].add(pos)
+                    node = child
+
+    def _positions(self, prefix: str) -> set:
+        node = self._root
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return set()
+        return node[1]
+
+    def match(self, query: str, limit: Optional[int] = DEFAULT_LIMIT) -> List[LookupOption]:
+        """Rows having a word starting with every query word, in registry order."""
+        words = _words(query)
+        if not words:
+            return list(self.rows[:limit] if limit else self.rows)
+        # Intersect smallest first
+        sets = sorted((self._positions(w) for w in words), key=len)
+        hits = set(sets[0])
+        for s in sets[1:]:
+            hits &= s
+            if not hits:
+                break
+        ranked = sorted(hits)
+        if limit:
+            ranked = ranked[:limit]
+        return [self.rows[p] for p in ranked]
+
+
+_TRIES: Dict[str, PrefixTrie] = {}
+_LOCK = Lock()
+
+
+def get_trie(kind: str) -> PrefixTrie:
+    rows = options(kind)
+    trie = _TRIES.get(kind)
+    if trie is None or trie.rows is not rows:
+        trie = PrefixTrie(rows)
+        with _LOCK:
+            _TRIES[kind] = trie
+    return trie
+
+
+def suggest(kind: str, query: str = '', limit: int = DEFAULT_LIMIT) -> List[LookupOption]:
+    """Word-prefix matches for `query`, topped up with substring matches up to `limit`."""
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    trie = get_trie(kind)
+    results = trie.match(query, limit)
+    q = (query or '').strip().lower()
+    if q and len(results) < limit:
+        seen = {r.id for r in results}
+        for row in trie.rows:
+            if row.id not in seen and q in row.name.lower():
+                results.append(row)
+                if len(results) >= limit:
+                    break
+    return results
+
+
+__all__ = [
+    "KIND_ALIASES",
+    "PrefixTrie",
+    "resolve_kind",
+    "get_trie",
+    "suggest",
+]
@@ -41,6 +41,7 @@ urlpatterns = [
     path('api/lookups/specialties/', views.api_specialties_lookup, name='api_specialties_lookup'),
     path('api/lookups/participant_types/', views.api_participant_types, name='api_participant_types'),
     path('api/lookups/age_groups/', views.api_age_groups, name='api_age_groups'),
+    path('api/lookups/typeahead/', views.api_lookups_typeahead, name='api_lookups_typeahead'),
     # Members area
     path('members/', views.members_home, name='members_home'),
     path('members/profile/', views.members_profile, name='members_profile'),
@@ -66,6 +67,8 @@ urlpatterns = [
     path('api/feed/<int:post_id>/repost/', views.api_feed_repost, name='api_feed_repost'),
     path('api/feed/<int:post_id>/', views.api_feed_post_item, name='api_feed_post_item'),
     path('api/feed/<int:post_id>/reactions/', views.api_feed_reactions, name='api_feed_reactions'),
+    path('api/feed/<int:post_id>/comments/', views.api_feed_comments, name='api_feed_comments'),
+    path('api/feed/', views.api_feed, name='api_feed'),
     path('api/feed/new_count/', views.api_feed_new_count, name='api_feed_new_count'),
     # Stock images search for composer
     path('api/feed/stock_images/', views.api_feed_stock_images, name='api_feed_stock_images'),
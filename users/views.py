@@ -14,13 +14,13 @@ def ajax_profile_click(request):
             profile = TherapistProfile.objects.filter(user__id=user_id).first()
             if not profile:
                 return JsonResponse({"success": False, "error": "Profile not found"}, status=404)
+            from users.stats_buffer import record_profile_click, pending_for
+            record_profile_click(profile.user_id)
+            # Timestamp only; a full save() would re-run profile signal handlers
+            TherapistProfile.objects.filter(pk=profile.pk).update(last_viewed_at=timezone.now())
             today = timezone.now().date()
-            stats, _ = TherapistProfileStats.objects.get_or_create(therapist=profile.user, date=today)
-            stats.profile_clicks += 1
-            stats.save()
-            profile.last_viewed_at = timezone.now()
-            profile.save()
-            return JsonResponse({"success": True, "profile_clicks": stats.profile_clicks})
+            stored = TherapistProfileStats.objects.filter(therapist_id=profile.user_id, date=today).values_list('profile_clicks', flat=True).first() or 0
+            return JsonResponse({"success": True, "profile_clicks": stored + pending_for(profile.user_id, today).get('profile_clicks', 0)})
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)}, status=400)
     return JsonResponse({"success": False, "error": "Invalid request method"}, status=405)
@@ -63,6 +63,9 @@ from users.models import TherapistProfileStats
 from django.utils import timezone
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse
+from users.conditional import conditional_get
+from users.visitor_zip import get_user_zip
+from users.blob_store import release_file
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.core.exceptions import ValidationError
@@ -182,11 +185,14 @@ def dashboard(request):
     if profile:
         today = timezone.now().date()
         stat_obj = TherapistProfileStats.objects.filter(therapist=request.user, date=today).first()
+        # Overlay counts still buffered in this process (flushed every few seconds)
+        from users.stats_buffer import pending_for
+        pending = pending_for(request.user.pk, today)
         stats = {
-            'visit_count': stat_obj.profile_clicks if stat_obj else 0,
-            'contact_count': stat_obj.contact_clicks if stat_obj else 0,
-            'search_impressions': stat_obj.search_impressions if stat_obj else 0,
-            'search_rank': stat_obj.search_rank if stat_obj else None,
+            'visit_count': (stat_obj.profile_clicks if stat_obj else 0) + pending.get('profile_clicks', 0),
+            'contact_count': (stat_obj.contact_clicks if stat_obj else 0) + pending.get('contact_clicks', 0),
+            'search_impressions': (stat_obj.search_impressions if stat_obj else 0) + pending.get('search_impressions', 0),
+            'search_rank': pending.get('search_rank', stat_obj.search_rank if stat_obj else None),
             'last_viewed_at': profile.last_viewed_at,
         }
     # Get user's blog posts
@@ -285,7 +291,6 @@ def payment(request):
 
 def therapist_profile(request, user_id):
     from users.models_profile import TherapistProfile
-    from users.models import TherapistProfileStats
     from django.utils import timezone
     profile = TherapistProfile.objects.filter(user__id=user_id).first()
     if not profile:
@@ -294,262 +299,40 @@ def therapist_profile(request, user_id):
     if not profile.slug:
         profile.save()  # triggers slug generation in model.save
     # Track click (maintain stats parity with old template response)
-    today = timezone.now().date()
-    stats, _ = TherapistProfileStats.objects.get_or_create(therapist=profile.user, date=today)
-    stats.profile_clicks += 1
-    stats.save()
-    profile.last_viewed_at = timezone.now()
-    profile.save(update_fields=['last_viewed_at'])
+    from users.stats_buffer import record_profile_click
+    record_profile_click(profile.user_id)
+    TherapistProfile.objects.filter(pk=profile.pk).update(last_viewed_at=timezone.now())
     # Permanent redirect to canonical slug page
     return redirect('therapist_profile_public_slug', slug=profile.slug)
 
+def _profile_validators(request, slug=None, user_id=None):
+    """ETag parts / Last-Modified for snapshot-backed profile responses (users/conditional.py)."""
+    from users.profile_snapshot import snapshot_updated_at
+    updated_at = snapshot_updated_at(slug=slug, user_id=user_id)
+    if updated_at is None:
+        return None
+    # Distance (and the header's location) follow the visitor ZIP; years in practice follow the calendar year
+    parts = (slug or user_id, updated_at.isoformat(), get_user_zip(request) or '', timezone.now().year)
+    return parts, updated_at
+
+
+@conditional_get(lambda request, slug: _profile_validators(request, slug=slug), anonymous_only=True)
 def public_therapist_profile(request, slug):
     """Standalone SEO-friendly therapist profile page matching modal content.
     Adds gallery images and video gallery media for parity with in-app modal.
+    Served from the materialized profile snapshot (users/profile_snapshot.py).
     """
-    from django.shortcuts import get_object_or_404
-    from users.models_profile import TherapistProfile
-    profile = get_object_or_404(
-        TherapistProfile.objects.select_related('license_type', 'gender', 'title', 'user')
-        .prefetch_related(
-            'locations__office_hours', 'gallery_images', 'video_gallery',
-            'accepted_payment_methods__payment_method', 'types_of_therapy__therapy_type',
-            'specialties__specialty', 'race_ethnicities__race_ethnicity', 'faiths__faith',
-            'lgbtqia_identities__lgbtqia', 'other_identities__other_identity',
-            'additional_credentials', 'educations',
-            'testing_types__testing_type'
-        ), slug=slug)
-    # Compute approximate distance (miles) from visitor session zip (if set) mirroring search view logic
-    profile.distance = None  # default so template condition exists
-    user_zip = request.session.get('user_zip')
-    if user_zip:
-        try:
-            import math, re
-            from users.models_profile import ZipCode
-            user_zip_clean = re.match(r"\d{5}", user_zip or "")
-            user_zip_clean = user_zip_clean.group(0) if user_zip_clean else user_zip
-            user_zip_row = ZipCode.objects.filter(pk=user_zip_clean).first()
-            if user_zip_row:
-                # Preload location zip rows to avoid N queries
-                loc_zips = {loc.zip for loc in profile.locations.all() if getattr(loc, 'zip', None)}
-                zip_rows = {z.zip: z for z in ZipCode.objects.filter(zip__in=loc_zips)}
-
-                def haversine(lat1, lon1, lat2, lon2):
-                    R = 3958.8
-                    phi1 = math.radians(lat1)
-                    phi2 = math.radians(lat2)
-                    dphi = math.radians(lat2 - lat1)
-                    dlambda = math.radians(lon2 - lon1)
-                    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-                    return R * c
-
-                min_d = None
-                for loc in profile.locations.all():
-                    zr = zip_rows.get(getattr(loc, 'zip', None))
-                    if zr and zr.latitude and zr.longitude:
-                        try:
-                            d = haversine(float(user_zip_row.latitude), float(user_zip_row.longitude), float(zr.latitude), float(zr.longitude))
-                        except Exception:
-                            continue
-                        if min_d is None or d < min_d:
-                            min_d = d
-                if min_d is not None:
-                    profile.distance = round(min_d, 1)
-        except Exception:
-            # Swallow errors silently; distance just stays None
-            pass
-    # Build JSON structure analogous to api_full_profile
-    primary_location = profile.locations.filter(is_primary_address=True).first() or profile.locations.first()
-    def office_hours(loc):
-        return [
-            {
-                'weekday': oh.weekday,
-                'is_closed': oh.is_closed,
-                'by_appointment_only': oh.by_appointment_only,
-                'start_time_1': oh.start_time_1,
-                'end_time_1': oh.end_time_1,
-                'start_time_2': oh.start_time_2,
-                'end_time_2': oh.end_time_2,
-                'notes': oh.notes,
-            } for oh in loc.office_hours.all()
-        ]
-    from django.utils import timezone
-    current_year = timezone.now().year
-    # derive years in practice similar to api_full_profile
-    candidate_years = []
-    # Explicit override if present & valid
-    if getattr(profile, 'year_started_practice', None) and profile.year_started_practice.isdigit() and len(profile.year_started_practice) == 4:
-        candidate_years.append(int(profile.year_started_practice))
-    for e in profile.educations.all():
-        if getattr(e, 'year_began_practice', None) and e.year_began_practice.isdigit() and len(e.year_began_practice) == 4:
-            candidate_years.append(int(e.year_began_practice))
-        elif getattr(e, 'year_graduated', None) and e.year_graduated.isdigit() and len(e.year_graduated) == 4:
-            candidate_years.append(int(e.year_graduated))
-    years_in_practice = None
-    if candidate_years:
-        start_year = min(candidate_years)
-        if 1900 < start_year <= current_year:
-            years_in_practice = current_year - start_year
-
-    data = {
-        'id': profile.user.id,
-        'first_name': profile.first_name,
-    'middle_name': profile.middle_name,
-        'last_name': profile.last_name,
-        'name': f"{profile.first_name} {profile.last_name}".strip(),
-        'title': profile.title.name if profile.title else None,
-        'display_title': profile.display_title,
-    # Short intro: explicitly include intro_note from DB for modal binding
-    'intro_note': getattr(profile, 'intro_note', ''),
-    'intro_statement': profile.intro_statement,
-        'personal_statement_q1': profile.personal_statement_q1,
-        'personal_statement_q2': profile.personal_statement_q2,
-        'personal_statement_q3': profile.personal_statement_q3,
-        'practice_name': profile.practice_name,
-        'therapy_delivery_method': profile.therapy_delivery_method,
-    'practice_email': profile.practice_email,
-        'phone_number': profile.phone_number,
-        'phone_extension': profile.phone_extension,
-        'mobile_number': profile.mobile_number,
-        'office_email': profile.office_email,
-        'accepting_new_clients': profile.accepting_new_clients,
-        'offers_intro_call': profile.offers_intro_call,
-        'individual_session_cost': profile.individual_session_cost,
-        'couples_session_cost': profile.couples_session_cost,
-        'sliding_scale_pricing_available': profile.sliding_scale_pricing_available,
-        'finance_note': profile.finance_note,
-        'credentials_note': profile.credentials_note,
-        'profile_photo_url': profile.profile_photo.url if profile.profile_photo else None,
-    'practice_website_url': profile.practice_website_url,
-    'show_website_on_public': getattr(profile, 'show_website_on_public', True),
-    'facebook_url': profile.facebook_url,
-    'instagram_url': profile.instagram_url,
-    'linkedin_url': profile.linkedin_url,
-    'twitter_url': profile.twitter_url,
-    'tiktok_url': profile.tiktok_url,
-    'youtube_url': profile.youtube_url,
-    'online_scheduling_url': getattr(profile, 'online_scheduling_url', ''),
-    'show_online_scheduling': getattr(profile, 'show_online_scheduling', False),
-    'receive_calls_from_client': getattr(profile, 'receive_calls_from_client', False),
-    'receive_texts_from_clients': getattr(profile, 'receive_texts_from_clients', False),
-    'receive_emails_from_clients': getattr(profile, 'receive_emails_from_clients', False),
-    'email_contact_destination': getattr(profile, 'email_contact_destination', 'therapist'),
-    'preferred_contact_method': getattr(profile, 'preferred_contact_method', ''),
-    'receive_emails_when_client_calls': getattr(profile, 'receive_emails_when_client_calls', False),
-        'youtube_url': profile.youtube_url,
-        'therapy_types_note': profile.therapy_types_note,
-        'specialties_note': profile.specialties_note,
-        'license_type': profile.license_type.name if profile.license_type else None,
-        'license_type_description': profile.license_type.description if profile.license_type else None,
-        'license_type_short': profile.license_type.short_description if profile.license_type else None,
-        'license_number': profile.license_number,
-        'license_expiration': profile.license_expiration,
-        'license_state': profile.license_state,
-    'license_first_name': profile.license_first_name,
-    'license_last_name': profile.license_last_name,
-        'gender': profile.gender.name if profile.gender else None,
-    'years_in_practice': years_in_practice,
-        'city': primary_location.city if primary_location else None,
-        'state': primary_location.state if primary_location else None,
-        'locations': [
-            {
-                'practice_name': loc.practice_name,
-                'street_address': loc.street_address,
-                'address_line_2': loc.address_line_2,
-                'city': loc.city,
-                'state': loc.state,
-                'zip': loc.zip,
-                'is_primary_address': loc.is_primary_address,
-                'lat': None,
-                'lng': None,
-                'office_hours': office_hours(loc),
-            } for loc in profile.locations.all()
-        ],
-        # Populated below
-        'gallery_images': [],
-        'video_gallery': [],
-        'accepted_payment_methods': [sel.payment_method.name for sel in profile.accepted_payment_methods.all()],
-        'types_of_therapy': [sel.therapy_type.name for sel in profile.types_of_therapy.all()],
-        'therapy_types': [sel.therapy_type.name for sel in profile.types_of_therapy.all()],  # alias for modal
-        'other_therapy_types': [ot.therapy_type for ot in profile.other_therapy_types.all()],
-    'offers_testing': getattr(profile, 'offers_testing', False),
-    'testing_types': [sel.testing_type.name for sel in profile.testing_types.all() if getattr(sel, 'testing_type', None)],
-        'specialties': [
-            {
-                'name': sp.specialty.name if sp.specialty else '',
-                'is_top': sp.is_top_specialty,
-            } for sp in profile.specialties.all()
-        ],
-        'top_specialties': [sp.specialty.name for sp in profile.specialties.filter(is_top_specialty=True) if sp.specialty],
-        'race_ethnicities': [s.race_ethnicity.name for s in profile.race_ethnicities.all() if s.race_ethnicity],
-        'faiths': [s.faith.name for s in profile.faiths.all() if s.faith],
-        'lgbtqia_identities': [s.lgbtqia.name for s in profile.lgbtqia_identities.all() if s.lgbtqia],
-        'other_identities': [s.other_identity.name for s in profile.other_identities.all() if s.other_identity],
-        'insurance_details': [
-            {
-                'provider': ins.provider.name if ins.provider else '',
-                'out_of_network': ins.out_of_network,
-            } for ins in profile.insurance_details.all()
-        ],
-        'additional_credentials': [
-            {
-                'type': ac.additional_credential_type,
-                'organization_name': ac.organization_name,
-                'id_number': ac.id_number,
-                'year_issued': ac.year_issued,
-            } for ac in profile.additional_credentials.all()
-        ],
-        'educations': [
-            {
-                'school': ed.school,
-                'degree_diploma': ed.degree_diploma,
-                'year_graduated': ed.year_graduated,
-            } for ed in profile.educations.all()
-        ],
-        'participant_types': [pt.name for pt in profile.participant_types.all()],
-        'age_groups': [ag.name for ag in profile.age_groups.all()],
-        'areas_of_expertise': [ae.expertise for ae in profile.areas_of_expertise.all()],
-    'distance': profile.distance,
-    }
-    # Gallery Images (match modal expectations: url, caption, is_primary)
-    images = []
-    for gi in profile.gallery_images.all():
-        try:
-            url = gi.image.url
-        except Exception:
-            url = None
-        if not url:
-            continue
-        images.append({
-            'url': url,
-            'caption': gi.caption,
-            'is_primary': gi.is_primary,
-        })
-    data['gallery_images'] = images
-
-    # Video Gallery (provide video_url + caption)
-    # Normalize any known blocked demo hosts (e.g., samplelib.com) to a permissive sample
-    vids = []
-    for vg in profile.video_gallery.all():
-        try:
-            vurl = vg.video.url
-        except Exception:
-            vurl = None
-        if not vurl:
-            continue
-        # Some public sample hosts block hotlinking and return 403. Replace with a permissive CC0 demo clip.
-        if isinstance(vurl, str) and 'samplelib.com/mp4/' in vurl:
-            vurl = 'https://interactive-examples.mdn.mozilla.net/media/cc0-videos/flower.mp4'
-        vids.append({
-            'video_url': vurl,
-            'caption': vg.caption,
-        })
-    data['video_gallery'] = vids
+    from django.http import Http404
+    from users.profile_snapshot import SnapshotProfile, distance_from_zip, get_snapshot, public_profile_data
+    doc = get_snapshot(slug=slug)
+    if doc is None:
+        raise Http404("No TherapistProfile matches the given query.")
+    # Approximate distance (miles) from the visitor's ZIP, mirroring the search view
+    data = public_profile_data(doc, distance=distance_from_zip(doc, get_user_zip(request)))
     # Render with full modal partial in standalone mode
     import json
     return render(request, 'users/therapist_profile_public_full.html', {
-        'profile_obj': profile,
+        'profile_obj': SnapshotProfile(doc),
         'serialized': json.dumps(data),
     })
 
@@ -628,6 +411,9 @@ FIELD_ALIASES = {
 
 def _profile_json(profile):
     """Subset JSON for edit context (can expand)."""
+    # Read-after-write: built from the live profile, with the snapshot's planned prefetches
+    from users.profile_snapshot import prefetch_snapshot_relations
+    prefetch_snapshot_relations(profile)
     completion = compute_profile_completion(profile)
     # Related collections
     locations = [
@@ -717,49 +503,44 @@ def _profile_json(profile):
             'video_url': vurl,
             'caption': v.caption,
         })
-    # Resolve title & options; license_type options
-    from users.models_profile import Title as TitleModel, LicenseType as LicenseTypeModel
+    # Resolve title & options; license_type options (option lists come from the lookup registry)
+    from users.lookups import names as lookup_names
     try:
         title_name = profile.title.name if getattr(profile, 'title', None) else None
     except Exception:
         title_name = None
-    title_options = list(TitleModel.objects.order_by('name').values_list('name', flat=True))
+    title_options = lookup_names('title')
     # Ensure current title present even if not in list (legacy)
     if title_name and title_name not in title_options:
         title_options.append(title_name)
     # License type options
-    license_type_options = list(LicenseTypeModel.objects.order_by('sort_order','name').values_list('name', flat=True))
+    license_type_options = lookup_names('license_type')
     current_license = profile.license_type.name if getattr(profile, 'license_type', None) else None
     if current_license and current_license not in license_type_options:
         license_type_options.append(current_license)
     # Race / Ethnicity options
     try:
-        from users.models_profile import RaceEthnicity
-        race_ethnicity_options = list(RaceEthnicity.objects.order_by('name').values_list('name', flat=True))
+        race_ethnicity_options = lookup_names('race_ethnicity')
     except Exception:
         race_ethnicity_options = []
     # Gender options
     try:
-        from users.models_profile import Gender
-        gender_options = list(Gender.objects.order_by('name').values_list('name', flat=True))
+        gender_options = lookup_names('gender')
     except Exception:
         gender_options = []
     # Faith options
     try:
-        from users.models_profile import Faith
-        faith_options = list(Faith.objects.order_by('name').values_list('name', flat=True))
+        faith_options = lookup_names('faith')
     except Exception:
         faith_options = []
     # LGBTQIA options
     try:
-        from users.models_profile import LGBTQIA
-        lgbtqia_options = list(LGBTQIA.objects.order_by('name').values_list('name', flat=True))
+        lgbtqia_options = lookup_names('lgbtqia')
     except Exception:
         lgbtqia_options = []
     # Other identity options
     try:
-        from users.models_profile import OtherIdentity
-        other_identity_options = list(OtherIdentity.objects.order_by('name').values_list('name', flat=True))
+        other_identity_options = lookup_names('other_identity')
     except Exception:
         other_identity_options = []
     data = {
@@ -816,6 +597,7 @@ def _profile_json(profile):
     'lgbtqia_options': lgbtqia_options,
     'other_identity_options': other_identity_options,
         'profile_photo_url': profile.profile_photo.url if profile.profile_photo else None,
+        'profile_photo_status': (profile.profile_photo_meta or {}).get('status') if profile.profile_photo else None,
     'locations': locations,
     'gallery_images': gallery_images,
     'video_gallery': video_gallery,
@@ -963,7 +745,7 @@ def api_profile_update(request):
                 if (value or '') == '':
                     if getattr(profile, 'profile_photo', None):
                         try:
-                            profile.profile_photo.delete(save=False)
+                            release_file(profile.profile_photo)
                         except Exception:
                             pass
                     profile.profile_photo = None
@@ -1511,74 +1293,79 @@ def api_profile_update(request):
 def api_insurance_providers(request):
     """Lookup insurance providers with optional fuzzy name search (?q=...).
     Returns list of {id,name}. Limits to 20 results."""
-    from users.models_profile import InsuranceProvider
+    from users.typeahead import suggest
     q = (request.GET.get('q') or '').strip()
-    qs = InsuranceProvider.objects.all().order_by('sort_order','name')
-    if q:
-        qs = qs.filter(name__icontains=q)
-    data = [{'id': p.id, 'name': p.name} for p in qs[:20]]
+    data = [{'id': p.id, 'name': p.name} for p in suggest('insurance_provider', q, limit=20)]
     return JsonResponse({'results': data})
 
 @login_required
 @require_http_methods(["GET"])
 def api_therapy_types(request):
     """Lookup therapy types (?q=) limit 20."""
-    from users.models_profile import TherapyType
+    from users.typeahead import suggest
     q = (request.GET.get('q') or '').strip()
-    qs = TherapyType.objects.all().order_by('sort_order','name')
-    if q:
-        qs = qs.filter(name__icontains=q)
-    data = [{'id': t.id, 'name': t.name} for t in qs[:20]]
+    data = [{'id': t.id, 'name': t.name} for t in suggest('therapy_type', q, limit=20)]
     return JsonResponse({'results': data})
 
 @login_required
 @require_http_methods(["GET"])
 def api_testing_types(request):
     """Lookup testing types (?q=) limit 20."""
-    from users.models_profile import TestingType
+    from users.typeahead import suggest
     q = (request.GET.get('q') or '').strip()
-    qs = TestingType.objects.all().order_by('sort_order','name')
-    if q:
-        qs = qs.filter(name__icontains=q)
-    data = [{'id': t.id, 'name': t.name} for t in qs[:20]]
+    data = [{'id': t.id, 'name': t.name} for t in suggest('testing_type', q, limit=20)]
     return JsonResponse({'results': data})
 
 @login_required
 @require_http_methods(["GET"])
 def api_specialties_lookup(request):
     """Lookup specialties (?q=) limit 20."""
-    from users.models_profile import SpecialtyLookup
+    from users.typeahead import suggest
     q = (request.GET.get('q') or '').strip()
-    qs = SpecialtyLookup.objects.all().order_by('sort_order','name')
-    if q:
-        qs = qs.filter(name__icontains=q)
-    data = [{'id': s.id, 'name': s.name} for s in qs[:20]]
+    data = [{'id': s.id, 'name': s.name} for s in suggest('specialty', q, limit=20)]
     return JsonResponse({'results': data})
 
 @login_required
 @require_http_methods(["GET"])
 def api_participant_types(request):
     """Lookup participant types (?q=) limit 20."""
-    from users.models_profile import ParticipantType
+    from users.typeahead import suggest
     q = (request.GET.get('q') or '').strip()
-    qs = ParticipantType.objects.all().order_by('name')
-    if q:
-        qs = qs.filter(name__icontains=q)
-    data = [{'id': p.id, 'name': p.name} for p in qs[:20]]
+    data = [{'id': p.id, 'name': p.name} for p in suggest('participant_type', q, limit=20)]
     return JsonResponse({'results': data})
 
 @login_required
 @require_http_methods(["GET"])
 def api_age_groups(request):
     """Lookup age groups (?q=) limit 20."""
-    from users.models_profile import AgeGroup
+    from users.typeahead import suggest
     q = (request.GET.get('q') or '').strip()
-    qs = AgeGroup.objects.all().order_by('name')
-    if q:
-        qs = qs.filter(name__icontains=q)
-    data = [{'id': a.id, 'name': a.name} for a in qs[:20]]
+    data = [{'id': a.id, 'name': a.name} for a in suggest('age_group', q, limit=20)]
     return JsonResponse({'results': data})
 
+@login_required
+@require_http_methods(["GET"])
+def api_lookups_typeahead(request):
+    """Consolidated lookup autocomplete: ?kind=<lookup>&q=<text>[&limit=N].
+
+    Word-prefix matches ranked by sort_order then name (see users/typeahead.py).
+    Returns {kind, results: [{id, name, category}]}; responses may be cached briefly by the browser.
+    """
+    from django.utils.cache import patch_cache_control
+    from users.typeahead import resolve_kind, suggest, DEFAULT_LIMIT
+    kind = resolve_kind(request.GET.get('kind'))
+    if not kind:
+        return JsonResponse({'error': 'Unknown lookup kind'}, status=400)
+    q = (request.GET.get('q') or '').strip()
+    try:
+        limit = int(request.GET.get('limit') or DEFAULT_LIMIT)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    data = [{'id': o.id, 'name': o.name, 'category': o.category} for o in suggest(kind, q, limit=limit)]
+    response = JsonResponse({'kind': kind, 'results': data})
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
 @login_required
 @require_http_methods(["POST"])
 def api_profile_submit(request):
@@ -1611,9 +1398,9 @@ def api_profile_upload_photo(request):
         # Clear existing photo
         try:
             if profile.profile_photo:
-                # Delete file from storage but ignore errors silently
+                # Delete file from storage (shared blobs are left to gc_image_blobs) but ignore errors silently
                 try:
-                    profile.profile_photo.delete(save=False)
+                    release_file(profile.profile_photo)
                 except Exception:
                     pass
             profile.profile_photo = None
@@ -1981,266 +1768,37 @@ def api_location_office_hours(request, location_id):
 
 def contact_therapist(request, user_id):
     from users.models_profile import TherapistProfile
-    from users.models import TherapistProfileStats
-    from django.utils import timezone
     profile = TherapistProfile.objects.filter(user__id=user_id).first()
     if not profile:
         return HttpResponse('Profile not found', status=404)
     # Increment contact click
-    today = timezone.now().date()
-    stats, _ = TherapistProfileStats.objects.get_or_create(therapist=profile.user, date=today)
-    stats.contact_clicks += 1
-    stats.save()
+    from users.stats_buffer import record_contact_click
+    record_contact_click(profile.user_id)
     # Render minimal template with mailto link
     return render(request, 'users/contact_redirect.html', {'email_address': profile.email_address})
 
-# JSON API: full therapist profile by user id
+# JSON API: full therapist profile by user id (served from the profile snapshot)
+@conditional_get(lambda request, user_id: _profile_validators(request, user_id=user_id))
 def api_full_profile(request, user_id):
-    from django.shortcuts import get_object_or_404
-    from users.models_profile import (
-        TherapistProfile,
-        Specialty,
-        TherapyTypeSelection,
-        OtherTherapyType,
-        AreasOfExpertise,
-        PaymentMethodSelection,
-        InsuranceDetail,
-        GalleryImage,
-        VideoGallery,
-        Education,
-        AdditionalCredential,
-        Location,
-        OfficeHour,
-    Title as TitleModel,
-    )
-    from django.utils import timezone
-    profile = get_object_or_404(
-        TherapistProfile.objects.select_related('license_type', 'gender', 'title', 'user')
-        .prefetch_related('locations__office_hours', 'testing_types__testing_type'),
-        user__id=user_id
-    )
-    # Compute approximate distance (miles) from session user_zip if present
-    distance_value = None
-    user_zip = request.session.get('user_zip')
-    if user_zip:
-        try:
-            import math, re
-            from users.models_profile import ZipCode
-            user_zip_clean = re.match(r"\d{5}", user_zip or "")
-            user_zip_clean = user_zip_clean.group(0) if user_zip_clean else user_zip
-            user_zip_row = ZipCode.objects.filter(pk=user_zip_clean).first()
-            if user_zip_row:
-                loc_zips = {loc.zip for loc in profile.locations.all() if getattr(loc, 'zip', None)}
-                zip_rows = {z.zip: z for z in ZipCode.objects.filter(zip__in=loc_zips)}
-                def haversine(lat1, lon1, lat2, lon2):
-                    R = 3958.8
-                    phi1 = math.radians(lat1)
-                    phi2 = math.radians(lat2)
-                    dphi = math.radians(lat2 - lat1)
-                    dlambda = math.radians(lon2 - lon1)
-                    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-                    return R * c
-                min_d = None
-                for loc in profile.locations.all():
-                    zr = zip_rows.get(getattr(loc, 'zip', None))
-                    if zr and zr.latitude and zr.longitude:
-                        try:
-                            d = haversine(float(user_zip_row.latitude), float(user_zip_row.longitude), float(zr.latitude), float(zr.longitude))
-                        except Exception:
-                            continue
-                        if min_d is None or d < min_d:
-                            min_d = d
-                if min_d is not None:
-                    distance_value = round(min_d, 1)
-        except Exception:
-            pass
-    # Primary location
-    primary_location = profile.locations.filter(is_primary_address=True).first() or profile.locations.first()
-    def img_url(image_field):
-        try:
-            return image_field.url if image_field else None
-        except Exception:
-            return None
-    # Years in practice (derive from earliest education.year_began_practice or year_graduated)
-    current_year = timezone.now().year
-    candidate_years = []
-    if getattr(profile, 'year_started_practice', None) and profile.year_started_practice.isdigit() and len(profile.year_started_practice) == 4:
-        candidate_years.append(int(profile.year_started_practice))
-    for e in profile.educations.all():
-        if e.year_began_practice and e.year_began_practice.isdigit() and len(e.year_began_practice) == 4:
-            candidate_years.append(int(e.year_began_practice))
-        elif e.year_graduated and e.year_graduated.isdigit() and len(e.year_graduated) == 4:
-            candidate_years.append(int(e.year_graduated))
-    years_in_practice = None
-    if candidate_years:
-        start_year = min(candidate_years)
-        if 1900 < start_year <= current_year:
-            years_in_practice = current_year - start_year
-
-    data = {
-        'id': profile.user.id,
-        'first_name': profile.first_name,
-        'last_name': profile.last_name,
-        'name': f"{profile.first_name} {profile.last_name}".strip(),
-        'title': profile.title.name if profile.title else None,
-        'display_title': profile.display_title,
-    'intro_note': profile.intro_note,
-        'intro_statement': profile.intro_statement,
-        'personal_statement_q1': profile.personal_statement_q1,
-        'personal_statement_q2': profile.personal_statement_q2,
-        'personal_statement_q3': profile.personal_statement_q3,
-        'practice_name': profile.practice_name,
-    'therapy_delivery_method': profile.therapy_delivery_method,
-    'practice_email': profile.practice_email,
-        'phone_number': profile.phone_number,
-        'phone_extension': profile.phone_extension,
-        'mobile_number': profile.mobile_number,
-        'office_email': profile.office_email,
-        'accepting_new_clients': profile.accepting_new_clients,
-        'offers_intro_call': profile.offers_intro_call,
-        'individual_session_cost': profile.individual_session_cost,
-        'couples_session_cost': profile.couples_session_cost,
-        'sliding_scale_pricing_available': profile.sliding_scale_pricing_available,
-        'finance_note': profile.finance_note,
-        'no_show_policy': getattr(profile, 'no_show_policy', ''),
-        'credentials_note': profile.credentials_note,
-        'profile_photo_url': profile.profile_photo.url if profile.profile_photo else None,
-    'title_options': list(TitleModel.objects.order_by('name').values_list('name', flat=True)),
-    'practice_website_url': profile.practice_website_url,
-    'show_website_on_public': getattr(profile, 'show_website_on_public', True),
-    # Online scheduling (ensure modal parity with standalone public view)
-    'online_scheduling_url': getattr(profile, 'online_scheduling_url', ''),
-    'show_online_scheduling': getattr(profile, 'show_online_scheduling', False),
-        'facebook_url': profile.facebook_url,
-        'instagram_url': profile.instagram_url,
-        'linkedin_url': profile.linkedin_url,
-        'twitter_url': profile.twitter_url,
-        'tiktok_url': profile.tiktok_url,
-    # Contact preferences (booleans)
-    'receive_calls_from_client': getattr(profile, 'receive_calls_from_client', False),
-    'receive_texts_from_clients': getattr(profile, 'receive_texts_from_clients', False),
-    'receive_emails_from_clients': getattr(profile, 'receive_emails_from_clients', False),
-    'email_contact_destination': getattr(profile, 'email_contact_destination', 'therapist'),
-    'preferred_contact_method': getattr(profile, 'preferred_contact_method', ''),
-    'receive_emails_when_client_calls': getattr(profile, 'receive_emails_when_client_calls', False),
-        'therapy_types_note': profile.therapy_types_note,
-        'specialties_note': profile.specialties_note,
-        'license_type': profile.license_type.name if profile.license_type else None,
-        'license_type_description': profile.license_type.description if profile.license_type else None,
-    'license_type_short': profile.license_type.short_description if profile.license_type else None,
-        'license_number': profile.license_number,
-        'license_expiration': profile.license_expiration,
-        'license_state': profile.license_state,
-    'license_first_name': profile.license_first_name,
-    'license_last_name': profile.license_last_name,
-        'gender': profile.gender.name if profile.gender else None,
-    'years_in_practice': years_in_practice,
-    'year_started_practice': getattr(profile, 'year_started_practice', ''),
-        'city': primary_location.city if primary_location else None,
-        'state': primary_location.state if primary_location else None,
-        'primary_location': {
-            'practice_name': primary_location.practice_name if primary_location else None,
-            'city': primary_location.city if primary_location else None,
-            'state': primary_location.state if primary_location else None,
-            'street_address': primary_location.street_address if primary_location else None,
-            'zip': primary_location.zip if primary_location else None,
-        } if primary_location else None,
-        'locations': [
-            {
-                'practice_name': loc.practice_name,
-                'street_address': loc.street_address,
-                'address_line_2': loc.address_line_2,
-                'city': loc.city,
-                'state': loc.state,
-                'zip': loc.zip,
-                'hide_address_from_public': loc.hide_address_from_public,
-                'is_primary_address': loc.is_primary_address,
-                'office_hours': [
-                    {
-                        'weekday': oh.weekday,
-                        'is_closed': oh.is_closed,
-                        'by_appointment_only': oh.by_appointment_only,
-                        'start_time_1': oh.start_time_1,
-                        'end_time_1': oh.end_time_1,
-                        'start_time_2': oh.start_time_2,
-                        'end_time_2': oh.end_time_2,
-                        'notes': oh.notes,
-                    } for oh in loc.office_hours.all()
-                ],
-            }
-            for loc in profile.locations.all()
-        ],
-        'participant_types': [pt.name for pt in profile.participant_types.all()],
-        'age_groups': [ag.name for ag in profile.age_groups.all()],
-        'race_ethnicities': [r.race_ethnicity.name for r in profile.race_ethnicities.select_related('race_ethnicity').all()],
-        'faiths': [f.faith.name for f in profile.faiths.select_related('faith').all()],
-        'lgbtqia_identities': [l.lgbtqia.name for l in profile.lgbtqia_identities.select_related('lgbtqia').all()],
-    'other_identities': [o.other_identity.name for o in profile.other_identities.select_related('other_identity').all()],
+    from django.http import Http404
+    from users.lookups import names as lookup_names
+    from users.profile_snapshot import distance_from_zip, full_profile_data, get_snapshot
+    doc = get_snapshot(user_id=user_id)
+    if doc is None:
+        raise Http404("No TherapistProfile matches the given query.")
+    # Approximate distance (miles) from the visitor's ZIP if present
+    data = full_profile_data(doc, distance=distance_from_zip(doc, get_user_zip(request)))
+    data['title_options'] = lookup_names('title')
     # Option lists (identity) for potential client-side editors
-    'gender_options': [],
-    'faith_options': [],
-    'lgbtqia_options': [],
-    'other_identity_options': [],
-        'specialties': [
-            {
-                'name': s.specialty.name if s.specialty else None,
-                'is_top': s.is_top_specialty,
-            } for s in profile.specialties.select_related('specialty').all()
-        ],
-        'top_specialties': [s.specialty.name for s in profile.specialties.select_related('specialty').filter(is_top_specialty=True) if s.specialty],
-        'therapy_types': [sel.therapy_type.name for sel in profile.types_of_therapy.select_related('therapy_type').all()],
-    'offers_testing': getattr(profile, 'offers_testing', False),
-    'testing_types': [sel.testing_type.name for sel in profile.testing_types.all() if getattr(sel, 'testing_type', None)],
-        'other_therapy_types': [o.therapy_type for o in profile.other_therapy_types.all()],
-        'areas_of_expertise': [a.expertise for a in profile.areas_of_expertise.all()],
-        'accepted_payment_methods': [sel.payment_method.name for sel in profile.accepted_payment_methods.select_related('payment_method').all()],
-        'insurance_details': [
-            {
-                'provider': det.provider.name,
-                'out_of_network': det.out_of_network,
-            } for det in profile.insurance_details.select_related('provider').all()
-        ],
-        'gallery_images': [
-            {
-                'url': img_url(img.image),
-                'caption': img.caption,
-                'is_primary': img.is_primary,
-            }
-            for img in profile.gallery_images.all()
-            if img_url(img.image)
-        ],
-        'video_gallery': [
-            {
-                'video_url': img_url(v.video),
-                'caption': v.caption,
-            } for v in profile.video_gallery.all()
-        ],
-        'educations': [
-            {
-                'school': e.school,
-                'degree_diploma': e.degree_diploma,
-                'year_graduated': e.year_graduated,
-                'year_began_practice': e.year_began_practice,
-            } for e in profile.educations.all()
-        ],
-        'additional_credentials': [
-            {
-                'type': ac.additional_credential_type,
-                'organization_name': ac.organization_name,
-                'id_number': ac.id_number,
-                'year_issued': ac.year_issued,
-            } for ac in profile.additional_credentials.all()
-        ],
-    'distance': distance_value,
-    }
-    # Populate identity option lists (avoid large duplication if not needed)
+    data['gender_options'] = []
+    data['faith_options'] = []
+    data['lgbtqia_options'] = []
+    data['other_identity_options'] = []
     try:
-        from users.models_profile import Gender, Faith, LGBTQIA, OtherIdentity
-        data['gender_options'] = list(Gender.objects.order_by('name').values_list('name', flat=True))
-        data['faith_options'] = list(Faith.objects.order_by('name').values_list('name', flat=True))
-        data['lgbtqia_options'] = list(LGBTQIA.objects.order_by('name').values_list('name', flat=True))
-        data['other_identity_options'] = list(OtherIdentity.objects.order_by('name').values_list('name', flat=True))
+        data['gender_options'] = lookup_names('gender')
+        data['faith_options'] = lookup_names('faith')
+        data['lgbtqia_options'] = lookup_names('lgbtqia')
+        data['other_identity_options'] = lookup_names('other_identity')
     except Exception:
         pass
     return JsonResponse(data, safe=False)
@@ -2857,75 +2415,9 @@ def members_feed(request):
                     post.save(update_fields=['post_type'])
         # Post/Redirect/Get to avoid form resubmission
         return redirect('members_feed')
-    # List visible posts
-    from .models import FeedPost, Connection, FeedReaction
-    # Accepted connections for current user (either direction)
-    accepted_ids = set(Connection.objects.filter(
-        Q(requester=request.user, status='accepted') | Q(addressee=request.user, status='accepted')
-    ).values_list('requester_id', 'addressee_id'))
-    # Flatten to user IDs excluding self duplicates
-    connected_user_ids = set()
-    for a, b in accepted_ids:
-        if a:
-            connected_user_ids.add(a)
-        if b:
-            connected_user_ids.add(b)
-    connected_user_ids.discard(request.user.id)
-    base_qs = FeedPost.objects.filter(
-        Q(visibility__in=['public', 'members']) |
-        Q(visibility='connections', author_id__in=list(connected_user_ids)) |
-        Q(author=request.user)
-    )
-    # Apply search filter if present
-    if query:
-        search_q = (
-            Q(content__icontains=query) |
-            Q(title__icontains=query) |
-            Q(author__first_name__icontains=query) |
-            Q(author__last_name__icontains=query) |
-            Q(author__username__icontains=query) |
-            Q(repost_of__content__icontains=query) |
-            Q(repost_of__title__icontains=query)
-        )
-        base_qs = base_qs.filter(search_q)
-    posts = base_qs.select_related('author', 'repost_of', 'repost_of__author')\
-        .prefetch_related('comments__author', 'reactions', 'media', 'repost_of__media')\
-        .order_by('-created_at')[:100]
-    # Compute per-reaction counts for visible posts
-    from django.db.models import Count
-    post_list = list(posts)
-    if post_list:
-        counts = (
-            FeedReaction.objects
-            .filter(post__in=post_list)
-            .values('post_id', 'reaction')
-            .annotate(c=Count('id'))
-        )
-        # Initialize per post for ALL defined reaction choices dynamically (future-proof)
-        all_reactions = list(dict(FeedReaction.REACTION_CHOICES).keys())
-        rc_map = {}
-        for p in post_list:
-            rc_map[p.id] = {r: 0 for r in all_reactions}
-            rc_map[p.id]['total'] = 0
-        for row in counts:
-            pid = row['post_id']
-            r = row['reaction']
-            c = row['c'] or 0
-            if pid in rc_map and r in rc_map[pid]:
-                rc_map[pid][r] = c
-                rc_map[pid]['total'] += c
-        # Attach for template access
-        for p in post_list:
-            # Provide a safe default including total
-            default_counts = {r: 0 for r in (rc_map.get(p.id, {}) if rc_map.get(p.id, {}) else all_reactions)}
-            if isinstance(default_counts, list):
-                # If previous line produced list (when p.id missing), convert to dict
-                default_counts = {r: 0 for r in all_reactions}
-            default_counts['total'] = default_counts.get('total', 0)
-            setattr(p, 'reaction_counts', rc_map.get(p.id, default_counts))
-        # Reorder if sorting by top
-        if sort == 'top':
-            post_list.sort(key=lambda p: (getattr(p, 'reaction_counts', {}).get('total', 0), getattr(p, 'created_at', None)), reverse=True)
+    # First page of visible posts; later pages come from api_feed (users/feed_pages.py)
+    from .feed_pages import feed_page
+    post_list, next_cursor = feed_page(request.user, query=query, sort=sort)
     # Current user's avatar (if any) for composer
     me_avatar_url = None
     try:
@@ -2938,53 +2430,9 @@ def members_feed(request):
                 me_avatar_url = None
     except Exception:
         me_avatar_url = None
-    # Attach author avatars for posts (and original authors for reposts) to avoid extra queries in template
-    try:
-        from users.models_profile import TherapistProfile as _TP2
-        author_ids = {p.author_id for p in post_list}
-        for p in post_list:
-            if getattr(p, 'repost_of', None):
-                author_ids.add(p.repost_of.author_id)
-        profiles = {pr.user_id: pr for pr in _TP2.objects.filter(user_id__in=author_ids)}
-        for p in post_list:
-            av = profiles.get(p.author_id)
-            setattr(p, 'author_avatar_url', (getattr(av, 'profile_photo', None).url if av and getattr(av, 'profile_photo', None) else None))
-            # Compose display name and license info for header
-            try:
-                u = p.author
-                first = (getattr(av, 'first_name', '') or getattr(u, 'first_name', '') or '').strip()
-                last = (getattr(av, 'last_name', '') or getattr(u, 'last_name', '') or '').strip()
-                display_name = (f"{first} {last}".strip()) or (getattr(u, 'username', '') or getattr(u, 'email', ''))
-                setattr(p, 'author_display_name', display_name)
-                lt_name = getattr(getattr(av, 'license_type', None), 'name', None)
-                lt_short = getattr(getattr(av, 'license_type', None), 'short_description', None)
-                setattr(p, 'author_license_type', lt_name)
-                setattr(p, 'author_license_type_short', lt_short)
-            except Exception:
-                setattr(p, 'author_display_name', getattr(p.author, 'get_full_name', lambda: '')() or p.author.username)
-                setattr(p, 'author_license_type', None)
-                setattr(p, 'author_license_type_short', None)
-            if getattr(p, 'repost_of', None):
-                pav = profiles.get(p.repost_of.author_id)
-                setattr(p, 'orig_author_avatar_url', (getattr(pav, 'profile_photo', None).url if pav and getattr(pav, 'profile_photo', None) else None))
-                try:
-                    ou = p.repost_of.author
-                    ofirst = (getattr(pav, 'first_name', '') or getattr(ou, 'first_name', '') or '').strip()
-                    olast = (getattr(pav, 'last_name', '') or getattr(ou, 'last_name', '') or '').strip()
-                    odisplay = (f"{ofirst} {olast}".strip()) or (getattr(ou, 'username', '') or getattr(ou, 'email', ''))
-                    setattr(p, 'orig_author_display_name', odisplay)
-                    olt_name = getattr(getattr(pav, 'license_type', None), 'name', None)
-                    olt_short = getattr(getattr(pav, 'license_type', None), 'short_description', None)
-                    setattr(p, 'orig_author_license_type', olt_name)
-                    setattr(p, 'orig_author_license_type_short', olt_short)
-                except Exception:
-                    setattr(p, 'orig_author_display_name', getattr(p.repost_of.author, 'get_full_name', lambda: '')() or p.repost_of.author.username)
-                    setattr(p, 'orig_author_license_type', None)
-                    setattr(p, 'orig_author_license_type_short', None)
-    except Exception:
-        pass
     return render(request, 'users/members/feed.html', {
         'posts': post_list,
+        'next_cursor': next_cursor,
         'current_sort': sort,
         'me_avatar_url': me_avatar_url,
     'query': query,
@@ -2992,6 +2440,51 @@ def members_feed(request):
     })
 
 
+@login_required
+@require_http_methods(["GET"])
+def api_feed(request):
+    """Next page of the members feed after ?cursor= (keyset on created_at, id).
+
+    Accepts the page's sort / q; returns posts as JSON plus their rendered cards and next_cursor (null at the end).
+    """
+    from django.template.loader import render_to_string
+    from .feed_pages import FEED_PAGE_SIZE, clamp_limit, feed_page, serialize_post
+    sort = (request.GET.get('sort') or '').strip().lower()
+    if sort not in {'recent', 'top'}:
+        sort = 'recent'
+    query = (request.GET.get('q') or '').strip()
+    try:
+        posts, next_cursor = feed_page(request.user, cursor=request.GET.get('cursor'), query=query, sort=sort,
+                                       limit=clamp_limit(request.GET.get('limit'), FEED_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'invalid_cursor'}, status=400)
+    html = ''.join(
+        render_to_string('users/members/_feed_post.html', {'post': p, 'me_id': request.user.id}, request=request)
+        for p in posts
+    )
+    return JsonResponse({'ok': True, 'posts': [serialize_post(p) for p in posts], 'html': html, 'next_cursor': next_cursor})
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_feed_comments(request, post_id):
+    """Page of a post's top-level comments (newest first), or of one comment's replies with ?parent=<id>."""
+    from .feed_pages import COMMENT_PAGE_SIZE, clamp_limit, comment_page, serialize_comment
+    from .feed_timeline import can_see
+    if not can_see(request.user.id, post_id):
+        return JsonResponse({'error': 'Not found'}, status=404)
+    try:
+        parent_id = int(request.GET['parent']) if request.GET.get('parent') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'invalid_parent'}, status=400)
+    try:
+        comments, next_cursor = comment_page(post_id, parent_id=parent_id, cursor=request.GET.get('cursor'),
+                                             limit=clamp_limit(request.GET.get('limit'), COMMENT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'invalid_cursor'}, status=400)
+    return JsonResponse({'ok': True, 'comments': [serialize_comment(c) for c in comments], 'next_cursor': next_cursor})
+
+
 @login_required
 @require_http_methods(["GET"])
 def api_feed_stock_images(request):
@@ -3007,10 +2500,9 @@ def api_feed_stock_images(request):
       - UNSPLASH_ACCESS_KEY: https://unsplash.com/documentation
 
     For safety, only return URLs intended for hotlinking (provider-sanctioned) and attribution fields.
+    Results are cached, coalesced, prefetched and rate limited by users/stock_search.py.
     """
-    import math
-    from django.conf import settings
-    import requests
+    from .stock_search import SearchError, search
     q = (request.GET.get('q') or '').strip()
     try:
         page = max(1, int(request.GET.get('page') or 1))
@@ -3023,133 +2515,52 @@ def api_feed_stock_images(request):
     per_page = max(1, min(per_page, 30))
     if not q:
         return JsonResponse({'results': [], 'total': 0, 'page': page, 'per_page': per_page})
-
-    PEXELS_KEY = getattr(settings, 'PEXELS_API_KEY', None)
-    UNSPLASH_KEY = getattr(settings, 'UNSPLASH_ACCESS_KEY', None)
-    results = []
-    total = 0
     try:
-        if PEXELS_KEY:
-            url = 'https://api.pexels.com/v1/search'
-            headers = {'Authorization': PEXELS_KEY}
-            params = {'query': q, 'per_page': per_page, 'page': page}
-            resp = requests.get(url, headers=headers, params=params, timeout=8)
-            if resp.status_code == 200:
-                data = resp.json()
-                for p in data.get('photos', []):
-                    src = p.get('src', {})
-                    # Use large variant for composer preview; original available if needed
-                    results.append({
-                        'id': f"pexels_{p.get('id')}",
-                        'thumb_url': src.get('medium') or src.get('small') or src.get('tiny'),
-                        'full_url': src.get('large2x') or src.get('large') or src.get('original'),
-                        'width': p.get('width'),
-                        'height': p.get('height'),
-                        'provider': 'pexels',
-                        'attribution': (p.get('photographer') or '').strip(),
-                        'attribution_url': p.get('photographer_url'),
-                        'license': 'Pexels License',
-                        'license_url': 'https://www.pexels.com/license/',
-                    })
-                total = data.get('total_results', 0)
-            else:
-                # Propagate provider errors (e.g., 401 invalid key) with a generic error code
-                code = 'unauthorized' if resp.status_code in (401, 403) else 'provider_http'
-                return JsonResponse({'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'error': code}, status=502)
-        elif UNSPLASH_KEY:
-            url = 'https://api.unsplash.com/search/photos'
-            headers = {'Authorization': f'Client-ID {UNSPLASH_KEY}'}
-            params = {'query': q, 'per_page': per_page, 'page': page, 'content_filter': 'high', 'orientation': 'landscape'}
-            resp = requests.get(url, headers=headers, params=params, timeout=8)
-            if resp.status_code == 200:
-                data = resp.json()
-                for p in data.get('results', []):
-                    urls = p.get('urls', {})
-                    user = p.get('user', {})
-                    results.append({
-                        'id': f"unsplash_{p.get('id')}",
-                        'thumb_url': urls.get('small') or urls.get('thumb'),
-                        'full_url': urls.get('regular') or urls.get('full'),
-                        'width': p.get('width'),
-                        'height': p.get('height'),
-                        'provider': 'unsplash',
-                        'attribution': (user.get('name') or user.get('username') or '').strip(),
-                        'attribution_url': user.get('links', {}).get('html') or user.get('portfolio_url'),
-                        'license': 'Unsplash License',
-                        'license_url': 'https://unsplash.com/license',
-                    })
-                total = data.get('total', 0)
-            else:
-                code = 'unauthorized' if resp.status_code in (401, 403) else 'provider_http'
-                return JsonResponse({'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'error': code}, status=502)
-        else:
-            # No API keys; in DEBUG provide placeholder results so UI can be exercised
-            if getattr(settings, 'DEBUG', False):
-                import hashlib
-                count = per_page
-                base_id = (page - 1) * per_page
-                # Derive a deterministic seed from the search query so different queries yield different images
-                q_bytes = (q or 'default').encode('utf-8')
-                q_hash = int(hashlib.md5(q_bytes).hexdigest(), 16) % 10_000_000
-                results = []
-                for i in range(count):
-                    seed = (q_hash + base_id + i + 1)
-                    thumb = f'https://picsum.photos/seed/{seed}/300/200'
-                    full = f'https://picsum.photos/seed/{seed}/1200/800'
-                    results.append({
-                        'id': f'picsum_{seed}',
-                        'thumb_url': thumb,
-                        'full_url': full,
-                        'width': 1200,
-                        'height': 800,
-                        'provider': 'picsum.dev',
-                        'attribution': 'Lorem Picsum (demo)',
-                        'attribution_url': 'https://picsum.photos/',
-                        'license': 'Placeholder (dev only)',
-                        'license_url': 'https://picsum.photos/',
-                    })
-                return JsonResponse({'results': results, 'total': 9999, 'page': page, 'per_page': per_page, 'note': 'DEBUG placeholder images'})
-            # Otherwise return explicit setup note
-            return JsonResponse({'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'note': 'No stock image provider configured'})
-    except Exception as ex:
+        data = search(q, page=page, per_page=per_page)
+    except SearchError as e:
+        return JsonResponse({'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'error': e.code}, status=e.status)
+    except Exception:
         return JsonResponse({'results': [], 'total': 0, 'page': page, 'per_page': per_page, 'error': 'provider_error'}, status=502)
-
-    return JsonResponse({'results': results, 'total': total, 'page': page, 'per_page': per_page})
+    return JsonResponse(data)
 
 @login_required
 @require_http_methods(["GET"])
 def api_proxy_image(request):
     """Proxy stock image URLs to avoid CORS on the client.
 
-    Accepts ?url=... where host is whitelisted (unsplash, pexels, picsum).
+    Accepts ?url=... where host is whitelisted (unsplash, pexels, picsum). Bodies are
+    streamed and cached on disk by users/image_proxy.py; X-Cache reports HIT / MISS /
+    REVALIDATED / STALE.
     """
-    import requests
-    from urllib.parse import urlparse
+    from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+    from .image_proxy import ProxyError, get_image_proxy
     url = (request.GET.get('url') or '').strip()
     if not url:
         return JsonResponse({'error': 'missing_url'}, status=400)
     try:
-        parsed = urlparse(url)
-    except Exception:
-        return JsonResponse({'error': 'invalid_url'}, status=400)
-    allowed_hosts = {
-        'images.unsplash.com', 'unsplash.com', 'source.unsplash.com',
-        'www.pexels.com', 'images.pexels.com', 'cdn.pexels.com',
-        'picsum.photos', 'fastly.picsum.photos'
-    }
-    if parsed.scheme not in ('http', 'https') or parsed.netloc not in allowed_hosts:
-        return JsonResponse({'error': 'forbidden_host'}, status=400)
-    try:
-        resp = requests.get(url, stream=True, timeout=10)
-        if resp.status_code != 200:
-            return JsonResponse({'error': 'upstream', 'status': resp.status_code}, status=502)
-        content_type = resp.headers.get('Content-Type', 'image/jpeg')
-        from django.http import HttpResponse
-        out = HttpResponse(resp.content, content_type=content_type)
-        out['Cache-Control'] = 'public, max-age=3600'
-        return out
+        result = get_image_proxy().fetch(url)
+    except ProxyError as e:
+        payload = {'error': e.code}
+        if e.upstream_status is not None:
+            payload['status'] = e.upstream_status
+        return JsonResponse(payload, status=e.status)
     except Exception:
         return JsonResponse({'error': 'fetch_failed'}, status=502)
+    if result.file is not None:
+        if result.etag and result.etag in (request.META.get('HTTP_IF_NONE_MATCH') or ''):
+            result.file.close()
+            out = HttpResponseNotModified()
+        else:
+            out = FileResponse(result.file, content_type=result.content_type)
+    else:
+        out = StreamingHttpResponse(result.stream, content_type=result.content_type)
+        if result.length is not None:
+            out['Content-Length'] = str(result.length)
+    if result.etag:
+        out['ETag'] = result.etag
+    out['Cache-Control'] = 'public, max-age=3600'
+    out['X-Cache'] = result.status
+    return out
 
 
 @login_required
@@ -3298,28 +2709,12 @@ def api_feed_reactions(request, post_id):
 @require_http_methods(["GET"])
 def api_feed_new_count(request):
     """Return count of new visible posts with id greater than since_id."""
-    from django.db.models import Q
-    from .models import FeedPost, Connection
+    from .feed_timeline import new_post_count
     try:
         since_id = int(request.GET.get('since_id') or 0)
     except (ValueError, TypeError):
         since_id = 0
-    # Build connections set (same logic as members_feed)
-    accepted_ids = set(Connection.objects.filter(
-        Q(requester=request.user, status='accepted') | Q(addressee=request.user, status='accepted')
-    ).values_list('requester_id', 'addressee_id'))
-    connected_user_ids = set()
-    for a, b in accepted_ids:
-        if a: connected_user_ids.add(a)
-        if b: connected_user_ids.add(b)
-    connected_user_ids.discard(request.user.id)
-    qs = FeedPost.objects.filter(
-        Q(id__gt=since_id),
-        Q(visibility__in=['public', 'members']) |
-        Q(visibility='connections', author_id__in=list(connected_user_ids)) |
-        Q(author=request.user)
-    )
-    return JsonResponse({'ok': True, 'new_count': qs.count()})
+    return JsonResponse({'ok': True, 'new_count': new_post_count(request.user, since_id)})
 
 
 @login_required
@@ -3545,37 +2940,32 @@ def api_connections_discover(request):
 
     qs = qs.distinct()
 
-    # Compute distances if user_zip known
-    user_zip = request.session.get('user_zip')
-    zip_row = None
+    # Compute distances if user_zip known (coordinates resolved via the in-process ZIP index)
+    user_zip = get_user_zip(request)
+    origin = None
+    zip_index = None
     if user_zip:
         try:
             import re
+            from users.zip_index import get_zip_index
             uz = re.match(r"\d{5}", user_zip or "")
             uz = uz.group(0) if uz else user_zip
-            zip_row = ZipCode.objects.filter(pk=uz).first()
+            zip_index = get_zip_index()
+            origin = zip_index.coords(uz)
         except Exception:
-            zip_row = None
+            origin = None
     results = []
-    def haversine(lat1, lon1, lat2, lon2):
-        import math
-        R = 3958.8
-        phi1 = math.radians(lat1); phi2 = math.radians(lat2)
-        dphi = math.radians(lat2 - lat1); dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return R * c
-    # Prepare location zip rows
-    zip_rows = {}
-    if zip_row:
-        try:
-            loc_zips = set(qs.values_list('locations__zip', flat=True))
-            from users.models_profile import ZipCode as Z
-            zip_rows = {z.zip: z for z in Z.objects.filter(zip__in=loc_zips)}
-        except Exception:
-            zip_rows = {}
     # Iterate limited set first for performance
     candidates = list(qs[:200])
+    # Nearest location per candidate in one batched distance pass
+    best = {}
+    if origin:
+        try:
+            from users.geo import nearest_locations
+            rows = [(prof.id, loc.zip) for prof in candidates for loc in prof.locations.all()]
+            best = nearest_locations(origin[0], origin[1], rows, index=zip_index)
+        except Exception:
+            best = {}
     for prof in candidates:
         dist = None
         city_val = None
@@ -3596,20 +2986,13 @@ def api_connections_discover(request):
                 primary_loc = None
             if primary_loc and getattr(primary_loc, 'practice_name', None):
                 practice_val = primary_loc.practice_name
-        if zip_row and locs:
-            mind = None
-            for loc in locs:
-                zr = zip_rows.get(getattr(loc, 'zip', None))
-                if zr and zr.latitude and zr.longitude and zip_row.latitude and zip_row.longitude:
-                    try:
-                        d = haversine(float(zip_row.latitude), float(zip_row.longitude), float(zr.latitude), float(zr.longitude))
-                    except Exception:
-                        continue
-                    if mind is None or d < mind:
-                        mind = d
-                        city_val = getattr(loc, 'city', city_val)
-                        state_val = getattr(loc, 'state', state_val)
-            dist = round(mind, 1) if mind is not None else None
+        if prof.id in best and locs:
+            mind, z5 = best[prof.id]
+            nearest_loc = next((l for l in locs if (getattr(l, 'zip', '') or '')[:5] == z5), None)
+            if nearest_loc is not None:
+                city_val = getattr(nearest_loc, 'city', city_val)
+                state_val = getattr(nearest_loc, 'state', state_val)
+            dist = round(mind, 1)
         # Fallback practice name from profile
         if not practice_val:
             practice_val = getattr(prof, 'practice_name', None)
@@ -3652,7 +3035,7 @@ def api_connections_discover(request):
             'slug': getattr(prof, 'slug', None),
         })
     # Filter by within miles if distance available
-    if zip_row and within_miles is not None:
+    if origin and within_miles is not None:
         results = [r for r in results if (r['distance'] is None or r['distance'] <= within_miles)]
     # Sort
     if sort == 'name':
@@ -3747,11 +3130,14 @@ def members_stats(request):
     if profile:
         today = timezone.now().date()
         stat_obj = TherapistProfileStats.objects.filter(therapist=request.user, date=today).first()
+        # Overlay counts still buffered in this process (flushed every few seconds)
+        from users.stats_buffer import pending_for
+        pending = pending_for(request.user.pk, today)
         stats = {
-            'visit_count': stat_obj.profile_clicks if stat_obj else 0,
-            'contact_count': stat_obj.contact_clicks if stat_obj else 0,
-            'search_impressions': stat_obj.search_impressions if stat_obj else 0,
-            'search_rank': stat_obj.search_rank if stat_obj else None,
+            'visit_count': (stat_obj.profile_clicks if stat_obj else 0) + pending.get('profile_clicks', 0),
+            'contact_count': (stat_obj.contact_clicks if stat_obj else 0) + pending.get('contact_clicks', 0),
+            'search_impressions': (stat_obj.search_impressions if stat_obj else 0) + pending.get('search_impressions', 0),
+            'search_rank': pending.get('search_rank', stat_obj.search_rank if stat_obj else None),
             'last_viewed_at': profile.last_viewed_at,
         }
     return render(request, 'users/members/stats.html', {
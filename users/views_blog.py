@@ -9,6 +9,9 @@ from django.utils.text import slugify
 from django.http import JsonResponse
 from django.urls import reverse
 from django.utils.http import urlencode
+from .conditional import conditional_get
+from .visitor_zip import get_user_zip
+from .blob_store import release_file
 
 
 
@@ -62,6 +65,31 @@ def user_blog_edit(request, pk):
     return render(request, 'users/user_blog_form.html', {'form': form, 'edit_mode': True, 'post': post})
 
 
+def _blog_version():
+    """(published posts, latest post change, tag list digest). Media, tag links and author profile
+    edits touch BlogPost.updated_at (users/signals.py), so those are covered too."""
+    import hashlib
+    agg = BlogPost.objects.filter(published=True).aggregate(n=dj_models.Count('id'), latest=dj_models.Max('updated_at'))
+    tags = hashlib.sha1(repr(list(BlogTag.objects.order_by('id').values_list('id', 'name'))).encode('utf-8')).hexdigest()
+    return agg['n'], agg['latest'], tags
+
+
+def _blog_index_validators(request):
+    count, latest, tags = _blog_version()
+    if latest is None:
+        return None
+    return (request.get_full_path(), count, latest.isoformat(), tags, get_user_zip(request) or ''), latest
+
+
+def _blog_detail_validators(request, slug):
+    exists = BlogPost.objects.filter(slug=slug, published=True, visibility__in=['public','both']).exists()
+    if not exists:
+        return None
+    count, latest, tags = _blog_version()
+    return (slug, count, latest.isoformat(), tags, get_user_zip(request) or ''), latest
+
+
+@conditional_get(_blog_index_validators, anonymous_only=True)
 def blog_index(request):
     posts = BlogPost.objects.filter(published=True).filter(
         Q(visibility__in=['public','both'])
@@ -117,6 +145,7 @@ def blog_index(request):
     })
 
 
+@conditional_get(_blog_detail_validators, anonymous_only=True)
 def blog_detail(request, slug):
     post = get_object_or_404(BlogPost, slug=slug, published=True, visibility__in=['public','both'])
     tags = BlogTag.objects.all().order_by('name')
@@ -281,12 +310,12 @@ def user_blog_delete(request, pk):
         for m in list(post.media.all()):
             try:
                 if getattr(m, 'file', None):
-                    m.file.delete(save=False)
+                    release_file(m.file)
             except Exception:
                 pass
         try:
             if getattr(post, 'image', None):
-                post.image.delete(save=False)
+                release_file(post.image)
         except Exception:
             pass
     except Exception:
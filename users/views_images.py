@@ -0,0 +1,59 @@
+from django.apps import apps
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.shortcuts import redirect
+from django.views.decorators.http import require_GET
+
+from .image_jobs import TARGETS
+from .image_resize import CONTENT_TYPES, URL_KINDS, WIDTH_BUCKETS, available_formats, get_variant, source_key
+
+# Immutable: the key in the URL changes whenever the underlying image does
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# users.image_jobs.TARGETS kind -> filter matching rows the owning page shows publicly
+PUBLIC_FILTERS = {
+    'profile_photo': {'user__is_active': True, 'user__onboarding_status': 'active'},
+    'gallery_image': {'therapist__user__is_active': True, 'therapist__user__onboarding_status': 'active'},
+    'blog_image': {'published': True, 'visibility__in': ['public', 'both']},
+}
+
+
+@require_GET
+def resized_image(request, kind, pk, key, width, fmt):
+    """Serve one width bucket / format of a processed image, rendering it on first request.
+
+    Only images of listed profiles and published public posts are served; anything else
+    is a 404 (never a redirect, which would disclose the current key)."""
+    target = URL_KINDS.get(kind)
+    if target is None or width not in WIDTH_BUCKETS or fmt not in available_formats():
+        raise Http404
+    etag = f'"{key}-{width}-{fmt}"'
+    if etag in (request.META.get('HTTP_IF_NONE_MATCH') or ''):
+        # The URL names immutable bytes, so a cached copy is always still valid
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+    label, file_field, meta_field = TARGETS[target]
+    row = (apps.get_model(label).objects.filter(pk=pk, **PUBLIC_FILTERS[target])
+           .values_list(file_field, meta_field).first())
+    if not row or not row[0]:
+        raise Http404
+    file_name, meta = row[0], row[1] or {}
+    current = source_key(meta)
+    if current is None:
+        raise Http404
+    if current != key:
+        # Stale page or CDN entry pointing at a replaced image: send it to the current bytes
+        response = redirect('resized_image', kind=kind, pk=pk, key=current, width=width, fmt=fmt)
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+    field = apps.get_model(label)._meta.get_field(file_field)
+    try:
+        data = get_variant(field.storage, file_name, meta, width, fmt)
+    except FileNotFoundError:
+        raise Http404
+    response = HttpResponse(data, content_type=CONTENT_TYPES[fmt])
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response['Content-Length'] = str(len(data))
+    return response
@@ -0,0 +1,85 @@
+"""Visitor location preference kept in a signed cookie instead of the session.
+
+    zip5 = get_user_zip(request)          # '10001' or None
+    set_user_zip(response, '10001')       # from the /set_zip/ endpoint
+
+The ZIP the visitor picked lives in a signed cookie (COOKIE_NAME, signed with
+SECRET_KEY and COOKIE_SALT), so reading it costs no database query and anonymous
+visitors never get a session row. Views, validators and the `location_context`
+processor read it only through `get_user_zip()`, which memoizes on the request.
+
+Transition: a visitor who chose a ZIP before the cookie existed still has it in
+their session. When there is no ZIP cookie but a session cookie was sent, the
+session value is used once and VisitorZipMiddleware copies it into the cookie on
+the way out. Requests without a session cookie never touch the session store.
+
+Caching: every response whose content depended on the ZIP gets `Vary: Cookie`
+from the middleware (SessionMiddleware used to add it implicitly when the session
+was read), so shared caches keep one copy per cookie set and never serve one
+visitor's nearby results to another.
+"""
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+COOKIE_NAME = 'tc_zip'
+COOKIE_SALT = 'users.visitor_zip'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 365  # 1 year
+
+_ZIP5 = re.compile(r"\d{5}")
+_UNSET = object()
+
+
+def _clean(value) -> Optional[str]:
+    m = _ZIP5.match(str(value or ''))
+    return m.group(0) if m else None
+
+
+def get_user_zip(request) -> Optional[str]:
+    """The visitor's 5-digit ZIP from the signed cookie (legacy session fallback), or None."""
+    cached = getattr(request, '_visitor_zip', _UNSET)
+    if cached is not _UNSET:
+        return cached
+    zip5 = _clean(request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE))
+    if zip5 is None and settings.SESSION_COOKIE_NAME in request.COOKIES and hasattr(request, 'session'):
+        try:
+            zip5 = _clean(request.session.get('user_zip'))
+        except Exception:
+            zip5 = None
+        if zip5:
+            request._visitor_zip_migrate = zip5
+    request._visitor_zip = zip5
+    return zip5
+
+
+def set_user_zip(response, zip5: str) -> None:
+    response.set_signed_cookie(
+        COOKIE_NAME, zip5, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+        secure=getattr(settings, 'SESSION_COOKIE_SECURE', False), httponly=True, samesite='Lax',
+    )
+
+
+class VisitorZipMiddleware:
+    """Adds `Vary: Cookie` to ZIP-dependent responses and moves legacy session ZIPs into the cookie."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, '_visitor_zip', _UNSET) is not _UNSET:
+            patch_vary_headers(response, ('Cookie',))
+        zip5 = getattr(request, '_visitor_zip_migrate', None)
+        if zip5 and not response.cookies.get(COOKIE_NAME):
+            set_user_zip(response, zip5)
+        return response
+
+
+__all__ = [
+    "COOKIE_NAME",
+    "get_user_zip",
+    "set_user_zip",
+    "VisitorZipMiddleware",
+]
@@ -0,0 +1,287 @@
+"""In-process spatial index over the ZipCode reference table.
+
+ZIP centroids are bucketed into a fixed lat/lng grid so radius and nearest
+neighbour queries only touch the handful of cells around the origin instead
+of scanning every row. The index is built lazily once per process and kept
+current by the ZipCode signal handlers (local writes) plus a cheap periodic
+row-count check (writes made by other workers or bulk seed commands).
+
+For batched distance work (users/geo.py) the index also keeps the centroids resident
+as contiguous float64 NumPy arrays (radians, plus cos(latitude)) with a zip -> row
+dict, so a batch of ZIPs resolves to row numbers and the coordinates are gathered
+by fancy indexing. They are built on first use of each index.
+
+A published index is never mutated: the ZipCode signal handlers patch a copy under
+_INDEX_LOCK and swap it in, so requests iterating the previous one without the lock
+(within(), nearest(), arrays()) always see a consistent snapshot, and arrays()
+cached on an index always match its coordinates.
+
+Usage:
+    index = get_zip_index()
+    index.coords('10001')                 -> (40.75, -73.99) or None
+    index.within(lat, lng, 25)            -> {'10001': 0.0, '10011': 1.2, ...}
+    index.nearest(lat, lng, k=1)          -> [('10001', 0.3)]
+"""
+from math import radians, sin, cos, atan2, sqrt, floor
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import heapq
+import time
+
+try:
+    import numpy as np
+except Exception:  # optional dependency
+    np = None
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.05
+# ~35 miles per cell edge (latitude); small enough that a 150 mile radius touches < 100 cells
+CELL_DEGREES = 0.5
+# How often (seconds) a worker re-checks the table size to pick up writes made elsewhere
+STALE_CHECK_SECONDS = 300
+
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = radians(lat2 - lat1)
+    dlmb = radians(lon2 - lon1)
+    a = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dlmb / 2) ** 2
+    return EARTH_RADIUS_MILES * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return int(floor(lat / CELL_DEGREES)), int(floor(lng / CELL_DEGREES))
+
+
+class ZipIndex:
+    """Grid index of ZIP centroids. Writes are for building and copy(); use get_zip_index()."""
+
+    def __init__(self, rows: Iterable[Tuple[str, float, float]] = ()):
+        self._coords: Dict[str, Tuple[float, float]] = {}
+        self._cells: Dict[Tuple[int, int], List[str]] = {}
+        # arrays() cache; None until first used and after every write
+        self._arrays = None
+        for zip_code, lat, lng in rows:
+            self.add(zip_code, lat, lng)
+
+    def copy(self) -> 'ZipIndex':
+        """Writable copy for a copy-on-write update (cell buckets are shared: writes replace them)."""
+        clone = ZipIndex()
+        clone._coords = dict(self._coords)
+        clone._cells = dict(self._cells)
+        return clone
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    def add(self, zip_code: str, lat, lng) -> None:
+        try:
+            lat_f, lng_f = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return
+        z5 = str(zip_code)[:5]
+        if z5 in self._coords:
+            self.remove(z5)
+        self._arrays = None
+        self._coords[z5] = (lat_f, lng_f)
+        cell = _cell(lat_f, lng_f)
+        self._cells[cell] = self._cells.get(cell, []) + [z5]
+
+    def remove(self, zip_code: str) -> None:
+        z5 = str(zip_code)[:5]
+        ll = self._coords.pop(z5, None)
+        if ll is None:
+            return
+        self._arrays = None
+        cell = _cell(*ll)
+        bucket = [z for z in self._cells.get(cell, ()) if z != z5]
+        if bucket:
+            self._cells[cell] = bucket
+        else:
+            self._cells.pop(cell, None)
+
+    def coords(self, zip_code) -> Optional[Tuple[float, float]]:
+        if not zip_code:
+            return None
+        return self._coords.get(str(zip_code)[:5])
+
+    def arrays(self):
+        """(row_of, keys, lat_rad, lng_rad, cos_lat): zip5 -> row, row -> zip5 and row-aligned float64 arrays. Needs NumPy."""
+        arrays = self._arrays
+        if arrays is None:
+            coords = self._coords
+            keys = list(coords)
+            n = len(keys)
+            lat_rad = np.radians(np.fromiter((coords[z][0] for z in keys), dtype=np.float64, count=n))
+            lng_rad = np.radians(np.fromiter((coords[z][1] for z in keys), dtype=np.float64, count=n))
+            arrays = ({z: i for i, z in enumerate(keys)}, keys, lat_rad, lng_rad, np.cos(lat_rad))
+            self._arrays = arrays
+        return arrays
+
+    def rows_of(self, zip_codes: Sequence) -> 'np.ndarray':
+        """Row in arrays() of each ZIP, -1 for ZIPs the index does not know."""
+        get = self.arrays()[0].get
+        rows = np.array([get(z, -1) for z in zip_codes], dtype=np.intp)
+        # Slow path for ZIP+4, numeric or otherwise unnormalized values
+        for i in np.flatnonzero(rows < 0).tolist():
+            if zip_codes[i]:
+                rows[i] = get(str(zip_codes[i])[:5], -1)
+        return rows
+
+    def distance(self, lat: float, lng: float, zip_code) -> Optional[float]:
+        """Great-circle miles from (lat, lng) to a ZIP centroid, or None if the ZIP is unknown."""
+        ll = self.coords(zip_code)
+        if ll is None:
+            return None
+        return haversine_miles(lat, lng, ll[0], ll[1])
+
+    def _lng_span(self, lat: float, miles: float) -> float:
+        # Degrees of longitude covering `miles` at the most poleward latitude of the search band
+        band_lat = min(89.0, abs(lat) + miles / MILES_PER_DEGREE_LAT)
+        return miles / (MILES_PER_DEGREE_LAT * max(cos(radians(band_lat)), 0.01))
+
+    def within(self, lat: float, lng: float, radius_miles: float) -> Dict[str, float]:
+        """Return {zip: miles} for every ZIP centroid within radius_miles of (lat, lng)."""
+        out: Dict[str, float] = {}
+        if not self._coords or radius_miles < 0:
+            return out
+        dlat = radius_miles / MILES_PER_DEGREE_LAT
+        dlng = self._lng_span(lat, radius_miles)
+        i0, j0 = _cell(lat - dlat, lng - dlng)
+        i1, j1 = _cell(lat + dlat, lng + dlng)
+        cells = self._cells
+        coords = self._coords
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                bucket = cells.get((i, j))
+                if not bucket:
+                    continue
+                for z in bucket:
+                    zlat, zlng = coords[z]
+                    d = haversine_miles(lat, lng, zlat, zlng)
+                    if d <= radius_miles:
+                        out[z] = d
+        return out
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[str, float]]:
+        """Return the k nearest ZIPs as [(zip, miles), ...] ordered by distance.
+
+        Searches square rings of cells outward from the origin cell and stops once the
+        k-th best candidate is closer than anything an unvisited ring could contain.
+        """
+        if not self._coords or k <= 0:
+            return []
+        ci, cj = _cell(lat, lng)
+        keys = self._cells.keys()
+        max_ring = max(
+            max(abs(i - ci) for i, _ in keys),
+            max(abs(j - cj) for _, j in keys),
+        )
+        best: List[Tuple[float, str]] = []  # max-heap via negated distance
+        coords = self._coords
+        for r in range(0, max_ring + 1):
+            for i in range(ci - r, ci + r + 1):
+                for j in range(cj - r, cj + r + 1):
+                    if r and abs(i - ci) != r and abs(j - cj) != r:
+                        continue  # interior cells already visited
+                    bucket = self._cells.get((i, j))
+                    if not bucket:
+                        continue
+                    for z in bucket:
+                        zlat, zlng = coords[z]
+                        d = haversine_miles(lat, lng, zlat, zlng)
+                        if len(best) < k:
+                            heapq.heappush(best, (-d, z))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, z))
+            if len(best) >= k:
+                # Closest any point outside the visited (2r+1)^2 block can be
+                lat_edge = min(lat - (ci - r) * CELL_DEGREES, (ci + r + 1) * CELL_DEGREES - lat)
+                lng_edge = min(lng - (cj - r) * CELL_DEGREES, (cj + r + 1) * CELL_DEGREES - lng)
+                band_lat = min(89.0, abs(lat) + lat_edge)
+                bound = min(
+                    lat_edge * MILES_PER_DEGREE_LAT,
+                    lng_edge * MILES_PER_DEGREE_LAT * max(cos(radians(band_lat)), 0.01),
+                ) * 0.99
+                if -best[0][0] <= bound:
+                    break
+        return sorted(((z, -nd) for nd, z in best), key=lambda t: t[1])
+
+
+_INDEX: Optional[ZipIndex] = None
+_INDEX_ROW_COUNT = 0
+_INDEX_CHECKED_AT = 0.0
+_INDEX_LOCK = Lock()
+
+
+def _build_index() -> Tuple[ZipIndex, int]:
+    from users.models_profile import ZipCode
+    rows = ZipCode.objects.values_list('zip', 'latitude', 'longitude').iterator(chunk_size=5000)
+    index = ZipIndex(rows)
+    return index, len(index)
+
+
+def get_zip_index() -> ZipIndex:
+    """Return the process-wide ZipIndex, building or refreshing it when needed."""
+    global _INDEX, _INDEX_ROW_COUNT, _INDEX_CHECKED_AT
+    now = time.monotonic()
+    index = _INDEX
+    if index is not None and now - _INDEX_CHECKED_AT < STALE_CHECK_SECONDS:
+        return index
+    with _INDEX_LOCK:
+        if _INDEX is not None and now - _INDEX_CHECKED_AT < STALE_CHECK_SECONDS:
+            return _INDEX
+        if _INDEX is not None:
+            # Periodic staleness check: rebuild only if another process changed the table
+            try:
+                from users.models_profile import ZipCode
+                current = ZipCode.objects.count()
+            except Exception:
+                current = _INDEX_ROW_COUNT
+            _INDEX_CHECKED_AT = now
+            if current == _INDEX_ROW_COUNT:
+                return _INDEX
+        _INDEX, _INDEX_ROW_COUNT = _build_index()
+        _INDEX_CHECKED_AT = now
+        return _INDEX
+
+
+def invalidate_zip_index() -> None:
+    """Drop the process-wide index; the next get_zip_index() call rebuilds it."""
+    global _INDEX
+    with _INDEX_LOCK:
+        _INDEX = None
+
+
+def index_zip_saved(zip_code: str, lat, lng) -> None:
+    """Apply a single ZipCode insert/update to the live index (no-op if not built yet)."""
+    global _INDEX, _INDEX_ROW_COUNT
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            return
+        existed = _INDEX.coords(zip_code) is not None
+        index = _INDEX.copy()
+        index.add(zip_code, lat, lng)
+        _INDEX = index
+        if not existed:
+            _INDEX_ROW_COUNT += 1
+
+
+def index_zip_deleted(zip_code: str) -> None:
+    global _INDEX, _INDEX_ROW_COUNT
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.coords(zip_code) is None:
+            return
+        index = _INDEX.copy()
+        index.remove(zip_code)
+        _INDEX = index
+        _INDEX_ROW_COUNT -= 1
+
+
+__all__ = [
+    "ZipIndex",
+    "get_zip_index",
+    "invalidate_zip_index",
+    "haversine_miles",
+    "EARTH_RADIUS_MILES",
+]